@@ -1,9 +1,13 @@
+import hashlib
+import json
+import uuid
 from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from core.auth import require_admin, require_super_admin
 from core.services.supabase import DBConnection
+from core.utils.cache import Cache
 from core.utils.logger import logger
 from core.utils.pagination import PaginationService, PaginationParams, PaginatedResponse
 
@@ -41,165 +45,125 @@ class AdvancedSearchRequest(BaseModel):
     sort_by: str = "created_at"
     sort_order: str = "desc"
 
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+# Totals are only shown as page counts, so a briefly stale one is fine
+USER_COUNT_CACHE_TTL = 60
+
+async def _count_users(client, filters: Dict[str, Any]) -> int:
+    """Return the number of accounts matching the filters, cached per filter set.
+
+    Counting evaluates every matching account, so it is kept out of the page
+    query and done at most once per TTL for a given filter set.
+    """
+    digest = hashlib.sha1(json.dumps(filters, sort_keys=True, default=str).encode()).hexdigest()
+
+    async def count():
+        result = await client.rpc('admin_count_users', filters).execute()
+        return result.data or 0
+
+    try:
+        return await Cache.get_or_load(f"admin_user_count:{digest}", count, ttl=USER_COUNT_CACHE_TTL)
+    except Exception as cache_error:
+        logger.warning(f"Cache failed for admin user count: {str(cache_error)}")
+        return await count()
+
+def _parse_user_cursor(cursor: str, sort_by: str) -> tuple[str, str]:
+    cursor_data = PaginationService.parse_cursor(cursor)
+    if not cursor_data or cursor_data.get('sort_field') != sort_by:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        return str(cursor_data['sort_value']), str(uuid.UUID(cursor_data['id']))
+    except (KeyError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def _fetch_user_page(
+    client, pagination_params: PaginationParams, sort_by: str, sort_order: str, **filters
+) -> PaginatedResponse[Dict[str, Any]]:
+    """Fetch one page of admin user rows through the admin_list_users RPC.
+
+    Identity, credits, subscription status and activity are resolved in a
+    single query, with filtering and sorting done in SQL. The page after one
+    that was returned is reached through ``next_cursor`` (a keyset on the sort
+    column and id, so its cost does not grow with depth); a page number
+    without a cursor falls back to an offset. The total comes from a separate,
+    cached count.
+    """
+    filters = {key: value for key, value in filters.items() if value is not None}
+    rpc_params = {**filters, 'p_sort_by': sort_by, 'p_sort_order': sort_order, 'p_limit': pagination_params.page_size}
+    if pagination_params.cursor:
+        rpc_params['p_cursor_value'], rpc_params['p_cursor_id'] = _parse_user_cursor(pagination_params.cursor, sort_by)
+    else:
+        rpc_params['p_offset'] = (pagination_params.page - 1) * pagination_params.page_size
+
+    result = await client.rpc('admin_list_users', rpc_params).execute()
+    rows = result.data or []
+    total_count = await _count_users(client, filters)
+
+    page = await PaginationService.paginate_with_total_count(
+        items=rows,
+        total_count=total_count,
+        params=pagination_params
+    )
+    if len(rows) == pagination_params.page_size:
+        last = rows[-1]
+        page.pagination.next_cursor = PaginationService.create_cursor(last['id'], sort_by, last['sort_value'])
+    return page
+
+def _row_to_user_summary(row: Dict[str, Any]) -> UserSummary:
+    return UserSummary(
+        id=row['id'],
+        email=row.get('email') or 'N/A',
+        created_at=_parse_timestamp(row['created_at']),
+        tier=row.get('tier') or 'free',
+        credit_balance=float(row.get('credit_balance') or 0),
+        total_purchased=float(row.get('total_purchased') or 0),
+        total_used=float(row.get('total_used') or 0),
+        subscription_status=row.get('subscription_status'),
+        last_activity=_parse_timestamp(row.get('last_activity')),
+        trial_status=row.get('trial_status')
+    )
+
 @router.post("/search/advanced")
 async def advanced_user_search(
     request: AdvancedSearchRequest,
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(20, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="pagination.next_cursor of the previous page"),
     admin: dict = Depends(require_admin)
 ) -> PaginatedResponse[UserSummary]:
     try:
         db = DBConnection()
         client = await db.client
         
-        pagination_params = PaginationParams(page=page, page_size=page_size)
-        
-        account_ids_to_filter = None
-        
-        if request.email_contains:
-            email_result = await client.schema('basejump').from_('billing_customers').select(
-                'account_id'
-            ).ilike('email', f'%{request.email_contains}%').limit(1000).execute()
-            
-            account_ids_to_filter = [item['account_id'] for item in email_result.data or []]
-            
-            if not account_ids_to_filter:
-                return await PaginationService.paginate_with_total_count(
-                    items=[],
-                    total_count=0,
-                    params=pagination_params
-                )
-        
-        base_query = client.schema('basejump').from_('accounts').select(
-            '''
-            id,
-            created_at,
-            primary_owner_user_id,
-            billing_customers(email),
-            billing_subscriptions(status)
-            '''
+        pagination_params = PaginationParams(page=page, page_size=page_size, cursor=cursor)
+        
+        result = await _fetch_user_page(
+            client,
+            pagination_params,
+            request.sort_by,
+            request.sort_order,
+            p_email_contains=request.email_contains,
+            p_tiers=request.tier_in,
+            p_subscription_statuses=request.subscription_status_in,
+            p_trial_statuses=request.trial_status_in,
+            p_balance_min=request.balance_min,
+            p_balance_max=request.balance_max,
+            p_created_after=request.created_after.isoformat() if request.created_after else None,
+            p_created_before=request.created_before.isoformat() if request.created_before else None,
+            p_activity_since=request.has_activity_since.isoformat() if request.has_activity_since else None,
         )
         
-        if account_ids_to_filter:
-            base_query = base_query.in_('id', account_ids_to_filter)
-        
-        if request.created_after:
-            base_query = base_query.gte('created_at', request.created_after.isoformat())
-        
-        if request.created_before:
-            base_query = base_query.lte('created_at', request.created_before.isoformat())
-        
-        if request.subscription_status_in:
-            base_query = base_query.in_('billing_subscriptions.status', request.subscription_status_in)
-        
-        data_result = await base_query.execute()
-        
-        user_ids = [item['id'] for item in data_result.data or []]
-        
-        credit_accounts = {}
-        trial_statuses = {}
-        if user_ids:
-            credit_result = await client.from_('credit_accounts').select(
-                'account_id, balance, tier, lifetime_purchased, lifetime_used, trial_status'
-            ).in_('account_id', user_ids).execute()
-            
-            for credit in credit_result.data or []:
-                credit_accounts[credit['account_id']] = credit
-                trial_statuses[credit['account_id']] = credit.get('trial_status')
-        
-        recent_activity = {}
-        if request.has_activity_since and user_ids:
-            activity_result = await client.from_('agent_runs').select(
-                'threads!inner(account_id), created_at'
-            ).in_('threads.account_id', user_ids).gte('created_at', request.has_activity_since.isoformat()).execute()
-            
-            for activity in activity_result.data or []:
-                account_id = activity['threads']['account_id']
-                if account_id not in recent_activity or activity['created_at'] > recent_activity[account_id]:
-                    recent_activity[account_id] = activity['created_at']
-        
-        filtered_data = []
-        for item in data_result.data or []:
-            credit_account = credit_accounts.get(item['id'], {})
-            balance = float(credit_account.get('balance', 0))
-            tier = credit_account.get('tier', 'free')
-            trial_status = trial_statuses.get(item['id'])
-            
-            if request.tier_in and tier not in request.tier_in:
-                continue
-            
-            if request.trial_status_in and trial_status not in request.trial_status_in:
-                continue
-            
-            if request.balance_min is not None and balance < request.balance_min:
-                continue
-            
-            if request.balance_max is not None and balance > request.balance_max:
-                continue
-            
-            if request.has_activity_since and item['id'] not in recent_activity:
-                continue
-            
-            filtered_data.append(item)
-        
-        def get_sort_value(item):
-            credit = credit_accounts.get(item['id'], {})
-            if request.sort_by == "balance":
-                return float(credit.get('balance', 0))
-            elif request.sort_by == "tier":
-                return credit.get('tier', 'free')
-            elif request.sort_by == "email":
-                return item['billing_customers'][0]['email'] if item.get('billing_customers') else ''
-            elif request.sort_by == "last_activity":
-                return recent_activity.get(item['id'], '')
-            else:
-                return item.get('created_at', '')
-        
-        ascending = request.sort_order.lower() == "asc"
-        sorted_data = sorted(filtered_data, key=get_sort_value, reverse=not ascending)
-        
-        total_count = len(sorted_data)
-        offset = (pagination_params.page - 1) * pagination_params.page_size
-        paginated_data = sorted_data[offset:offset + pagination_params.page_size]
-        
-        users = []
-        for item in paginated_data:
-            subscription_status = None
-            if item.get('billing_subscriptions'):
-                subscription_status = item['billing_subscriptions'][0].get('status')
-            
-            credit_account = credit_accounts.get(item['id'], {})
-
-            email = 'N/A'
-            if item.get('billing_customers') and item['billing_customers'][0].get('email'):
-                email = item['billing_customers'][0]['email']
-            elif item.get('primary_owner_user_id'):
-                try:
-                    user_email_result = await client.rpc('get_user_email', {'user_id': item['primary_owner_user_id']}).execute()
-                    if user_email_result.data:
-                        email = user_email_result.data
-                except Exception as e:
-                    logger.warning(f"Failed to get email for account {item['id']}: {e}")
-            
-            users.append(UserSummary(
-                id=item['id'],
-                email=email,
-                created_at=datetime.fromisoformat(item['created_at'].replace('Z', '+00:00')),
-                tier=credit_account.get('tier', 'free'),
-                credit_balance=float(credit_account.get('balance', 0)),
-                total_purchased=float(credit_account.get('lifetime_purchased', 0)),
-                total_used=float(credit_account.get('lifetime_used', 0)),
-                subscription_status=subscription_status,
-                last_activity=datetime.fromisoformat(recent_activity[item['id']].replace('Z', '+00:00')) if item['id'] in recent_activity else None,
-                trial_status=trial_statuses.get(item['id'])
-            ))
-        
-        return await PaginationService.paginate_with_total_count(
-            items=users,
-            total_count=total_count,
-            params=pagination_params
+        return PaginatedResponse(
+            data=[_row_to_user_summary(row) for row in result.data],
+            pagination=result.pagination
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to perform advanced search: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to search users")
@@ -213,143 +177,32 @@ async def list_users(
     tier_filter: Optional[str] = Query(None, description="Filter by tier"),
     sort_by: str = Query("created_at", description="Sort field"),
     sort_order: str = Query("desc", description="Sort order: asc, desc"),
+    cursor: Optional[str] = Query(None, description="pagination.next_cursor of the previous page"),
     admin: dict = Depends(require_admin)
 ) -> PaginatedResponse[UserSummary]:
     try:
         db = DBConnection()
         client = await db.client
         
-        pagination_params = PaginationParams(page=page, page_size=page_size)
+        pagination_params = PaginationParams(page=page, page_size=page_size, cursor=cursor)
         
-        if search_email:
-            email_result = await client.schema('basejump').from_('billing_customers').select(
-                'account_id'
-            ).ilike('email', f'%{search_email}%').limit(1000).execute()
-            
-            matching_account_ids = [item['account_id'] for item in email_result.data or []]
-            
-            if not matching_account_ids:
-                return await PaginationService.paginate_with_total_count(
-                    items=[],
-                    total_count=0,
-                    params=pagination_params
-                )
-            
-            base_query = client.schema('basejump').from_('accounts').select(
-                '''
-                id,
-                created_at,
-                primary_owner_user_id,
-                billing_customers(email),
-                billing_subscriptions(status)
-                '''
-            ).in_('id', matching_account_ids)
-            
-            total_count = len(matching_account_ids)
-        else:
-            base_query = client.schema('basejump').from_('accounts').select(
-                '''
-                id,
-                created_at,
-                primary_owner_user_id,
-                billing_customers(email),
-                billing_subscriptions(status)
-                '''
-            )
-            
-            count_result = await client.schema('basejump').from_('accounts').select('*', count='exact').execute()
-            total_count = count_result.count or 0
-        
-        sort_column = sort_by
-        if sort_by == "email":
-            sort_column = "billing_customers.email"
-        
-        if sort_by not in ["balance", "tier"]:
-            ascending = sort_order.lower() == "asc"
-            base_query = base_query.order(sort_column, desc=not ascending)
-        
-        offset = (pagination_params.page - 1) * pagination_params.page_size
-        data_result = await base_query.range(offset, offset + pagination_params.page_size - 1).execute()
-        
-        user_ids = [item['id'] for item in data_result.data or []]
-        credit_accounts = {}
-        if user_ids:
-            credit_result = await client.from_('credit_accounts').select(
-                'account_id, balance, tier, lifetime_purchased, lifetime_used, trial_status'
-            ).in_('account_id', user_ids).execute()
-            
-            for credit in credit_result.data or []:
-                credit_accounts[credit['account_id']] = credit
-        
-        if tier_filter:
-            filtered_data = []
-            for item in data_result.data or []:
-                credit_account = credit_accounts.get(item['id'])
-                if credit_account and credit_account.get('tier') == tier_filter:
-                    filtered_data.append(item)
-            data_result.data = filtered_data
-            total_count = len(filtered_data)
-        
-        if sort_by in ["balance", "tier"]:
-            def get_sort_value(item):
-                credit = credit_accounts.get(item['id'], {})
-                if sort_by == "balance":
-                    return float(credit.get('balance', 0))
-                else:
-                    return credit.get('tier', 'free')
-            
-            ascending = sort_order.lower() == "asc"
-            data_result.data = sorted(
-                data_result.data or [], 
-                key=get_sort_value,
-                reverse=not ascending
-            )
-            if tier_filter:
-                paginated_data = data_result.data[offset:offset + pagination_params.page_size]
-            else:
-                paginated_data = data_result.data
-        else:
-            paginated_data = data_result.data or []
+        result = await _fetch_user_page(
+            client,
+            pagination_params,
+            sort_by,
+            sort_order,
+            p_email_contains=search_email,
+            p_name_contains=search_name,
+            p_tiers=[tier_filter] if tier_filter else None,
+        )
         
-        users = []
-        for item in paginated_data:
-            subscription_status = None
-            if item.get('billing_subscriptions'):
-                subscription_status = item['billing_subscriptions'][0].get('status')
-            
-            credit_account = credit_accounts.get(item['id'], {})
-            
-            # Get email from billing_customers or fetch from auth.users for OAuth users
-            email = 'N/A'
-            if item.get('billing_customers') and item['billing_customers'][0].get('email'):
-                email = item['billing_customers'][0]['email']
-            elif item.get('primary_owner_user_id'):
-                # Try to get email for OAuth users
-                try:
-                    user_email_result = await client.rpc('get_user_email', {'user_id': item['primary_owner_user_id']}).execute()
-                    if user_email_result.data:
-                        email = user_email_result.data
-                except Exception as e:
-                    logger.warning(f"Failed to get email for account {item['id']}: {e}")
-            
-            users.append(UserSummary(
-                id=item['id'],
-                email=email,
-                created_at=datetime.fromisoformat(item['created_at'].replace('Z', '+00:00')),
-                tier=credit_account.get('tier', 'free'),
-                credit_balance=float(credit_account.get('balance', 0)),
-                total_purchased=float(credit_account.get('lifetime_purchased', 0)),
-                total_used=float(credit_account.get('lifetime_used', 0)),
-                subscription_status=subscription_status,
-                trial_status=credit_account.get('trial_status')
-            ))
-        
-        return await PaginationService.paginate_with_total_count(
-            items=users,
-            total_count=total_count,
-            params=pagination_params
+        return PaginatedResponse(
+            data=[_row_to_user_summary(row) for row in result.data],
+            pagination=result.pagination
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to list users: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to retrieve users")
@@ -426,68 +279,36 @@ async def search_users_by_email(
     email: str = Query(..., description="Email to search for"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=50, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="pagination.next_cursor of the previous page"),
     admin: dict = Depends(require_admin)
 ) -> PaginatedResponse[Dict[str, Any]]:
     try:
         db = DBConnection()
         client = await db.client
         
-        pagination_params = PaginationParams(page=page, page_size=page_size)
-        
-        email_query = client.schema('basejump').from_('billing_customers').select(
-            'account_id, email'
-        ).ilike('email', f'%{email}%').limit(500)
+        pagination_params = PaginationParams(page=page, page_size=page_size, cursor=cursor)
         
-        email_result = await email_query.execute()
-        matching_customers = email_result.data or []
-        total_count = len(matching_customers)
-        
-        offset = (pagination_params.page - 1) * pagination_params.page_size
-        paginated_customers = matching_customers[offset:offset + pagination_params.page_size]
-        
-        if not paginated_customers:
-            return await PaginationService.paginate_with_total_count(
-                items=[],
-                total_count=total_count,
-                params=pagination_params
-            )
-        
-        account_ids = [item['account_id'] for item in paginated_customers]
-        email_map = {item['account_id']: item['email'] for item in paginated_customers}
+        result = await _fetch_user_page(
+            client,
+            pagination_params,
+            'email',
+            'asc',
+            p_email_contains=email,
+        )
         
-        accounts_result = await client.schema('basejump').from_('accounts').select(
-            'id, created_at'
-        ).in_('id', account_ids).execute()
+        users = [{
+            "id": row['id'],
+            "email": row.get('email') or 'N/A',
+            "created_at": row['created_at'],
+            "tier": row.get('tier') or 'free',
+            "credit_balance": float(row.get('credit_balance') or 0),
+            "trial_status": row.get('trial_status')
+        } for row in result.data]
         
-        accounts_map = {item['id']: item['created_at'] for item in accounts_result.data or []}
-        
-        credit_accounts = {}
-        if account_ids:
-            credit_result = await client.from_('credit_accounts').select(
-                'account_id, balance, tier, trial_status'
-            ).in_('account_id', account_ids).execute()
-            
-            for credit in credit_result.data or []:
-                credit_accounts[credit['account_id']] = credit
-        
-        users = []
-        for account_id in account_ids:
-            credit_account = credit_accounts.get(account_id, {})
-            users.append({
-                "id": account_id,
-                "email": email_map[account_id],
-                "created_at": accounts_map.get(account_id, ''),
-                "tier": credit_account.get('tier', 'free'),
-                "credit_balance": float(credit_account.get('balance', 0)),
-                "trial_status": credit_account.get('trial_status')
-            })
-        
-        return await PaginationService.paginate_with_total_count(
-            items=users,
-            total_count=total_count,
-            params=pagination_params
-        )
+        return PaginatedResponse(data=users, pagination=result.pagination)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to search users by email: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to search users")
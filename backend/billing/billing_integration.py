@@ -2,6 +2,7 @@ from decimal import Decimal
 from typing import Optional, Dict, Tuple
 from billing.api import calculate_token_cost
 from billing.credit_manager import credit_manager
+from core.utils import usage_journal
 from core.utils.config import config, EnvMode
 from core.utils.logger import logger
 from core.services.supabase import DBConnection
@@ -20,9 +21,53 @@ class BillingIntegration:
         model: str,
         message_id: Optional[str] = None,
         cache_read_tokens: int = 0,
-        cache_creation_tokens: int = 0
+        cache_creation_tokens: int = 0,
+        thread_id: Optional[str] = None
     ) -> Dict:
-        # Billing completely disabled - no cost deduction
-        return {'success': True, 'cost': 0, 'new_balance': 10000}
+        if config.ENV_MODE == EnvMode.LOCAL:
+            return {'success': True, 'cost': 0, 'new_balance': 999999}
 
-billing_integration = BillingIntegration() 
\ No newline at end of file
+        cost = calculate_token_cost(prompt_tokens, completion_tokens, model)
+        if cost <= 0:
+            return {'success': True, 'cost': 0}
+
+        if not thread_id:
+            result = await credit_manager.use_credits(
+                account_id=account_id,
+                amount=cost,
+                description=f"Usage: {model} ({prompt_tokens}+{completion_tokens} tokens)",
+                message_id=message_id,
+                allow_partial=True
+            )
+            return {'success': result.get('success', False), 'cost': float(cost), 'new_balance': result.get('new_total')}
+
+        # Charged with the rest of the thread's usage when the journal is flushed
+        if await usage_journal.record(thread_id, account_id, cost, prompt_tokens, completion_tokens):
+            await usage_journal.flush(thread_id, BillingIntegration._deduct_journal)
+        return {'success': True, 'cost': float(cost)}
+
+    @staticmethod
+    async def flush_usage(thread_id: str) -> None:
+        """Charge a thread's journaled usage once its run has finished."""
+        await usage_journal.finish(thread_id, BillingIntegration._deduct_journal)
+
+    @staticmethod
+    async def recover_usage() -> int:
+        return await usage_journal.recover(BillingIntegration._deduct_journal)
+
+    @staticmethod
+    async def _deduct_journal(account_id: str, amount: Decimal, flush_id: str, usage: Dict[str, int]) -> bool:
+        # The usage has already happened, so an account short of credits is
+        # taken to zero and the shortfall recorded rather than refused
+        result = await credit_manager.use_credits(
+            account_id=account_id,
+            amount=amount,
+            description=f"Usage: {usage['calls']} calls ({usage['prompt_tokens']}+{usage['completion_tokens']} tokens)",
+            reference_id=flush_id,
+            reference_type='usage_flush',
+            metadata=usage,
+            allow_partial=True
+        )
+        return result.get('success', False)
+
+billing_integration = BillingIntegration()
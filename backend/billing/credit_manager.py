@@ -127,17 +127,60 @@ class CreditManager:
         amount: Decimal,
         description: Optional[str] = None,
         thread_id: Optional[str] = None,
-        message_id: Optional[str] = None
+        message_id: Optional[str] = None,
+        reference_id: Optional[str] = None,
+        reference_type: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        allow_partial: bool = False
     ) -> Dict:
-        # Billing disabled - no actual credit deduction
+        """
+        Deduct credits through the deduct_credits function, which locks the
+        account row and writes the balance and ledger entry in one transaction.
+        A repeated reference_id is charged once.
+        """
+        client = await self.db.client
+        amount = Decimal(str(amount))
+
+        if reference_id is None and message_id:
+            reference_id, reference_type = message_id, 'message'
+        metadata = dict(metadata or {})
+        if thread_id:
+            metadata['thread_id'] = thread_id
+
+        result = await client.rpc('deduct_credits', {
+            'p_account_id': account_id,
+            'p_amount': float(amount),
+            'p_description': description,
+            'p_reference_id': reference_id,
+            'p_reference_type': reference_type,
+            'p_metadata': metadata,
+            'p_allow_partial': allow_partial
+        }).execute()
+        row = result.data[0] if result.data else None
+
+        if not row or not row.get('success'):
+            return {
+                'success': False,
+                'error': 'Insufficient credits',
+                'new_total': float(row['new_total']) if row else 0.0
+            }
+
+        if row.get('duplicate'):
+            logger.warning(f"[IDEMPOTENCY] Deduction {reference_type}:{reference_id} for {account_id} was already applied")
+        else:
+            await Cache.invalidate(f"credit_balance:{account_id}")
+            await Cache.invalidate(f"credit_summary:{account_id}")
+
         return {
             'success': True,
-            'amount_deducted': 0.0,
-            'from_expiring': 0.0,
-            'from_non_expiring': 0.0,
-            'new_expiring': 10000.0,
-            'new_non_expiring': 0.0,
-            'new_total': 10000.0
+            'duplicate': bool(row.get('duplicate')),
+            'transaction_id': row.get('transaction_id'),
+            'amount_deducted': float(row['amount_deducted']),
+            'from_expiring': float(row['from_expiring']),
+            'from_non_expiring': float(row['from_non_expiring']),
+            'new_expiring': float(row['new_expiring']),
+            'new_non_expiring': float(row['new_non_expiring']),
+            'new_total': float(row['new_total'])
         }
     
     async def reset_expiring_credits(
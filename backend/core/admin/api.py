@@ -3,6 +3,7 @@ from typing import Optional, Dict
 from core.utils.auth_utils import verify_admin_api_key
 from core.utils.suna_default_agent_service import SunaDefaultAgentService
 from core.utils.logger import logger
+from core.utils import run_lanes
 from core.utils.config import config, EnvMode
 from dotenv import load_dotenv, set_key, find_dotenv, dotenv_values
 
@@ -31,6 +32,15 @@ async def admin_install_suna_for_user(
             detail=f"Failed to install Suna agent for user {account_id}"
         )
 
+@router.get("/run-lanes")
+async def get_run_lane_stats(_: bool = Depends(verify_admin_api_key)):
+    """Queue depth, running runs and queue-wait percentiles (seconds) per run lane."""
+    try:
+        return await run_lanes.lane_stats()
+    except Exception as e:
+        logger.error(f"Failed to get run lane stats: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get run lane stats")
+
 @router.get("/env-vars")
 def get_env_vars() -> Dict[str, str]:
     """Get environment variables (local mode only)."""
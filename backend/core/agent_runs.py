@@ -10,6 +10,7 @@ from fastapi.responses import StreamingResponse
 
 from core.utils.auth_utils import verify_and_get_user_id_from_jwt, get_user_id_from_stream_auth, verify_and_authorize_thread_access
 from core.utils.logger import logger, structlog
+from core.utils import fastjson
 from core.services.billing import can_use_model
 
 # Import billing integration conditionally
@@ -42,8 +43,9 @@ except ImportError:
 
 from core.utils.config import config
 from core.services import redis_client
+from core.services.supabase import DBConnection
 from core.sandbox.sandbox import create_sandbox, delete_sandbox
-from run_agent_background import run_agent_background
+from run_agent_background import enqueue_run
 from core.ai_models import model_manager
 
 from .api_models import AgentStartRequest, AgentVersionResponse, AgentResponse, ThreadAgentResponse, InitiateAgentResponse
@@ -53,7 +55,9 @@ from .core_utils import (
     _get_version_service, generate_and_update_project_name
 )
 from .config_helper import extract_agent_config
+from .threads import invalidate_thread_count
 from .core_utils import check_agent_run_limit, check_project_count_limit
+from .utils import run_slots, active_runs, run_lanes, agent_config_store
 
 router = APIRouter()
 
@@ -265,24 +269,26 @@ async def start_agent(
     )
     logger.debug(f"Created new agent run: {agent_run_id}")
 
-    instance_key = f"active_run:{utils.instance_id}:{agent_run_id}"
+    await run_slots.acquire(agent_run_id, account_id, project_id, thread_id)
+
     try:
-        await redis_client.set(instance_key, "running", ex=redis_client.REDIS_KEY_TTL)
+        await active_runs.register(utils.instance_id, agent_run_id)
     except Exception as e:
-        logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
+        logger.warning(f"Failed to register agent run {agent_run_id} in Redis: {str(e)}")
 
     request_id = structlog.contextvars.get_contextvars().get('request_id')
 
     # Log the enqueue operation
     logger.info(f"📤 ENQUEUED RUN: {agent_run_id} for thread: {thread_id} (model: {model_name})")
     
-    run_agent_background.send(
+    await enqueue_run(
+        run_lanes.INTERACTIVE, account_id,
         agent_run_id=agent_run_id, thread_id=thread_id, instance_id=utils.instance_id,
         project_id=project_id,
         model_name=model_name,  # Already resolved above
         enable_thinking=body.enable_thinking, reasoning_effort=body.reasoning_effort,
         stream=body.stream, enable_context_manager=body.enable_context_manager,
-        agent_config=agent_config,  # Pass agent configuration
+        agent_config_ref=await agent_config_store.put(agent_config),
         request_id=request_id,
     )
     
@@ -515,10 +521,12 @@ async def stream_agent_run(
             initial_responses_json = await redis_client.lrange(response_list_key, 0, -1)
             initial_responses = []
             if initial_responses_json:
-                initial_responses = [json.loads(r) for r in initial_responses_json]
+                # Entries are already serialized JSON; frame them as-is instead of
+                # decoding and re-encoding every response.
+                initial_responses = initial_responses_json
                 logger.debug(f"Sending {len(initial_responses)} initial responses for {agent_run_id}")
-                for response in initial_responses:
-                    yield f"data: {json.dumps(response)}\n\n"
+                for response_json in initial_responses:
+                    yield f"data: {response_json}\n\n"
                 last_processed_index = len(initial_responses) - 1
             initial_yield_complete = True
 
@@ -527,7 +535,7 @@ async def stream_agent_run(
 
             if current_status != 'running':
                 logger.debug(f"Agent run {agent_run_id} is not running (status: {current_status}). Ending stream.")
-                yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
+                yield f"data: {fastjson.dumps({'type': 'status', 'status': 'completed'})}\n\n"
                 return
           
             structlog.contextvars.bind_contextvars(
@@ -591,11 +599,11 @@ async def stream_agent_run(
                         new_responses_json = await redis_client.lrange(response_list_key, new_start_index, -1)
 
                         if new_responses_json:
-                            new_responses = [json.loads(r) for r in new_responses_json]
-                            num_new = len(new_responses)
+                            num_new = len(new_responses_json)
                             # logger.debug(f"Received {num_new} new responses for {agent_run_id} (index {new_start_index} onwards)")
-                            for response in new_responses:
-                                yield f"data: {json.dumps(response)}\n\n"
+                            for response_json in new_responses_json:
+                                yield f"data: {response_json}\n\n"
+                                response = fastjson.loads(response_json)
                                 # Check if this response signals completion
                                 if response.get('type') == 'status' and response.get('status') in ['completed', 'failed', 'stopped']:
                                     logger.debug(f"Detected run completion via status message in stream: {response.get('status')}")
@@ -607,13 +615,13 @@ async def stream_agent_run(
                     elif queue_item["type"] == "control":
                         control_signal = queue_item["data"]
                         terminate_stream = True # Stop the stream on any control signal
-                        yield f"data: {json.dumps({'type': 'status', 'status': control_signal})}\n\n"
+                        yield f"data: {fastjson.dumps({'type': 'status', 'status': control_signal})}\n\n"
                         break
 
                     elif queue_item["type"] == "error":
                         logger.error(f"Listener error for {agent_run_id}: {queue_item['data']}")
                         terminate_stream = True
-                        yield f"data: {json.dumps({'type': 'status', 'status': 'error'})}\n\n"
+                        yield f"data: {fastjson.dumps({'type': 'status', 'status': 'error'})}\n\n"
                         break
 
                 except asyncio.CancelledError:
@@ -623,14 +631,14 @@ async def stream_agent_run(
                 except Exception as loop_err:
                     logger.error(f"Error in stream generator main loop for {agent_run_id}: {loop_err}", exc_info=True)
                     terminate_stream = True
-                    yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {loop_err}'})}\n\n"
+                    yield f"data: {fastjson.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {loop_err}'})}\n\n"
                     break
 
         except Exception as e:
             logger.error(f"Error setting up stream for agent run {agent_run_id}: {e}", exc_info=True)
             # Only yield error if initial yield didn't happen
             if not initial_yield_complete:
-                 yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
+                 yield f"data: {fastjson.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
         finally:
             terminate_stream = True
             # Graceful shutdown order: unsubscribe → close → cancel
@@ -795,12 +803,9 @@ async def initiate_agent_with_files(
     if not can_use:
         raise HTTPException(status_code=403, detail={"message": model_message, "allowed_models": allowed_models})
 
-    can_run, message, subscription = await check_billing_status(client, account_id)
     if not can_run:
         raise HTTPException(status_code=402, detail={"message": message, "subscription": subscription})
 
-    # Check agent run limit (maximum parallel runs in past 24 hours)
-    limit_check = await check_agent_run_limit(client, account_id)
     if not limit_check['can_start']:
         error_detail = {
             "message": f"Maximum of {config.MAX_PARALLEL_AGENT_RUNS} parallel agent runs allowed within 24 hours. You currently have {limit_check['running_count']} running.",
@@ -909,6 +914,7 @@ async def initiate_agent_with_files(
         thread = await client.table('threads').insert(thread_data).execute()
         thread_id = thread.data[0]['thread_id']
         logger.debug(f"Created new thread: {thread_id}")
+        await invalidate_thread_count(account_id)
 
         # Trigger Background Naming Task
         asyncio.create_task(generate_and_update_project_name(project_id=project_id, prompt=prompt))
@@ -1004,12 +1010,13 @@ async def initiate_agent_with_files(
             agent_run_id=agent_run_id,
         )
 
+        await run_slots.acquire(agent_run_id, account_id, project_id, thread_id)
+
         # Register run in Redis
-        instance_key = f"active_run:{utils.instance_id}:{agent_run_id}"
         try:
-            await redis_client.set(instance_key, "running", ex=redis_client.REDIS_KEY_TTL)
+            await active_runs.register(utils.instance_id, agent_run_id)
         except Exception as e:
-            logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
+            logger.warning(f"Failed to register agent run {agent_run_id} in Redis: {str(e)}")
 
         request_id = structlog.contextvars.get_contextvars().get('request_id')
 
@@ -1017,13 +1024,14 @@ async def initiate_agent_with_files(
         logger.info(f"📤 ENQUEUED RUN: {agent_run_id} for thread: {thread_id} (model: {model_name})")
 
         # Run agent in background
-        run_agent_background.send(
+        await enqueue_run(
+            run_lanes.INTERACTIVE, account_id,
             agent_run_id=agent_run_id, thread_id=thread_id, instance_id=utils.instance_id,
             project_id=project_id,
             model_name=model_name,  # Already resolved above
             enable_thinking=enable_thinking, reasoning_effort=reasoning_effort,
             stream=stream, enable_context_manager=enable_context_manager,
-            agent_config=agent_config,  # Pass agent configuration
+            agent_config_ref=await agent_config_store.put(agent_config),
             request_id=request_id,
         )
         
@@ -1050,9 +1058,19 @@ async def update_agent_run_status(client, agent_run_id: str, status: str, error_
         if status in ['completed', 'failed', 'stopped']:
             update_data['completed_at'] = datetime.now(timezone.utc).isoformat()
         
-        result = await client.table('agent_runs').update(update_data).eq('id', agent_run_id).execute()
+        pg = await DBConnection().pg
+        if pg:
+            updated = await pg.update_agent_run_status(
+                agent_run_id, status, error=error_message, completed='completed_at' in update_data
+            )
+        else:
+            result = await client.table('agent_runs').update(update_data).eq('id', agent_run_id).execute()
+            updated = bool(result.data)
+
+        if status in ['completed', 'failed', 'stopped']:
+            await run_slots.release(agent_run_id)
         
-        if result.data:
+        if updated:
             logger.info(f"✅ Agent run {agent_run_id} status updated to {status}")
             return True
         else:
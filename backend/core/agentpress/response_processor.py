@@ -103,6 +103,16 @@ class ResponseProcessor:
         self.is_agent_builder = False  # Deprecated - keeping for compatibility
         self.target_agent_id = None  # Deprecated - keeping for compatibility
         self.agent_config = agent_config
+        # Async callables run after every turn, once the turn's tools have executed
+        self.turn_end_hooks: List[Callable[[], Any]] = []
+
+    async def _run_turn_end_hooks(self) -> None:
+        """Run the registered turn-end hooks, logging rather than raising failures."""
+        for hook in self.turn_end_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"Error in turn end hook: {str(e)}", exc_info=True)
 
     async def _yield_message(self, message_obj: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         """Helper to yield a message with proper formatting.
@@ -955,6 +965,8 @@ class ResponseProcessor:
             raise # Use bare 'raise' to preserve the original exception with its traceback
 
         finally:
+            await self._run_turn_end_hooks()
+
             # Update continuous state for potential auto-continue
             if should_auto_continue:
                 continuous_state['accumulated_content'] = accumulated_content
@@ -1164,6 +1176,8 @@ class ResponseProcessor:
              raise # Use bare 'raise' to preserve the original exception with its traceback
 
         finally:
+            await self._run_turn_end_hooks()
+
              # Save and Yield the final thread_run_end status
             end_content = {"status_type": "thread_run_end"}
             end_msg_obj = await self.add_message(
@@ -1340,6 +1354,95 @@ class ResponseProcessor:
         
         return parsed_data
 
+    def pending_tool_calls(
+        self,
+        assistant_message: Dict[str, Any],
+        tool_messages: List[Dict[str, Any]],
+        config: ProcessorConfig
+    ) -> List[Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """Return ``(tool_index, tool_call, parsing_details)`` for each call of a saved
+        assistant message that has no result among ``tool_messages``.
+
+        Native results are matched by ``tool_call_id``. XML results carry no call
+        ID, but they are saved in tool index order, so the first N XML calls are
+        the ones with a recorded result.
+        """
+        content = ensure_dict(assistant_message.get('content'), {})
+        calls = []
+        if config.native_tool_calling:
+            for tc in content.get('tool_calls') or []:
+                calls.append(({
+                    "function_name": tc["function"]["name"],
+                    "arguments": tc["function"]["arguments"],
+                    "id": tc["id"]
+                }, None))
+        if config.xml_tool_calling:
+            parsed = self._parse_xml_tool_calls(content.get('content') or '')
+            if config.max_xml_tool_calls > 0:
+                parsed = parsed[:config.max_xml_tool_calls]
+            calls.extend((item['tool_call'], item['parsing_details']) for item in parsed)
+
+        recorded_ids = set()
+        recorded_xml = 0
+        for message in tool_messages:
+            if ensure_dict(message.get('metadata'), {}).get('assistant_message_id') != assistant_message['message_id']:
+                continue
+            tool_call_id = ensure_dict(message.get('content'), {}).get('tool_call_id')
+            if tool_call_id:
+                recorded_ids.add(tool_call_id)
+            else:
+                recorded_xml += 1
+
+        pending = []
+        for tool_index, (tool_call, parsing_details) in enumerate(calls):
+            if "id" in tool_call:
+                if tool_call["id"] in recorded_ids:
+                    continue
+            elif recorded_xml > 0:
+                recorded_xml -= 1
+                continue
+            pending.append((tool_index, tool_call, parsing_details))
+        return pending
+
+    async def resume_tool_calls(
+        self,
+        thread_id: str,
+        assistant_message: Dict[str, Any],
+        tool_messages: List[Dict[str, Any]],
+        config: ProcessorConfig
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Finish a turn whose worker was lost after saving its assistant message.
+
+        Executes only the calls without a recorded result (see
+        ``pending_tool_calls``), saves their results like the streaming path does
+        and runs the turn-end hooks.
+        """
+        assistant_message_id = assistant_message['message_id']
+        thread_run_id = ensure_dict(assistant_message.get('metadata'), {}).get('thread_run_id')
+        pending = self.pending_tool_calls(assistant_message, tool_messages, config)
+        if pending:
+            logger.info(f"Resuming {len(pending)} unrecorded tool call(s) of assistant message {assistant_message_id}")
+        try:
+            for tool_index, tool_call, parsing_details in pending:
+                context = self._create_tool_context(tool_call, tool_index, assistant_message_id, parsing_details)
+                started_msg_obj = await self._yield_and_save_tool_started(context, thread_id, thread_run_id)
+                if started_msg_obj: yield format_for_yield(started_msg_obj)
+
+                context.result = await self._execute_tool(tool_call)
+                saved_tool_result_object = await self._add_tool_result(
+                    thread_id, tool_call, context.result, config.xml_adding_strategy,
+                    assistant_message_id, parsing_details
+                )
+                completed_msg_obj = await self._yield_and_save_tool_completed(
+                    context,
+                    saved_tool_result_object['message_id'] if saved_tool_result_object else None,
+                    thread_id, thread_run_id
+                )
+                if completed_msg_obj: yield format_for_yield(completed_msg_obj)
+                if saved_tool_result_object: yield format_for_yield(saved_tool_result_object)
+        finally:
+            await self._run_turn_end_hooks()
+
     # Tool execution methods
     async def _execute_tool(self, tool_call: Dict[str, Any]) -> ToolResult:
         """Execute a single tool call and return the result."""
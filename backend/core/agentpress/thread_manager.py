@@ -11,7 +11,7 @@ This module provides comprehensive conversation management, including:
 """
 
 import json
-from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Literal, cast, Callable
+from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Literal, cast, Callable, Awaitable
 from core.services.llm import make_llm_api_call
 from core.utils.llm_cache_utils import apply_cache_to_messages, validate_cache_blocks
 from core.agentpress.tool import Tool
@@ -23,6 +23,7 @@ from core.agentpress.response_processor import (
 )
 from core.services.supabase import DBConnection
 from core.utils.logger import logger
+from core.utils import fastjson, image_artifacts
 from langfuse.client import StatefulGenerationClient, StatefulTraceClient
 from core.services.langfuse import langfuse
 from litellm.utils import token_counter
@@ -40,7 +41,7 @@ try:
             
             async def deduct_usage(self, account_id: str, prompt_tokens: int, completion_tokens: int, 
                                  model: str, message_id: str, cache_read_tokens: int = 0, 
-                                 cache_creation_tokens: int = 0):
+                                 cache_creation_tokens: int = 0, thread_id: Optional[str] = None):
                 logger.debug(f"[THREAD_MANAGER] Stub billing: deducting usage for {account_id} - {prompt_tokens}+{completion_tokens} tokens")
                 return True, "Billing disabled - usage not deducted", None
         
@@ -57,7 +58,7 @@ except ImportError:
         
         async def deduct_usage(self, account_id: str, prompt_tokens: int, completion_tokens: int, 
                              model: str, message_id: str, cache_read_tokens: int = 0, 
-                             cache_creation_tokens: int = 0):
+                             cache_creation_tokens: int = 0, thread_id: Optional[str] = None):
             logger.debug(f"[THREAD_MANAGER] Stub billing: deducting usage for {account_id} - {prompt_tokens}+{completion_tokens} tokens")
             return True, "Billing disabled - usage not deducted", None
     
@@ -82,14 +83,22 @@ class ThreadManager:
     XML-based tool execution patterns.
     """
 
-    def __init__(self, trace: Optional[StatefulTraceClient] = None, agent_config: Optional[dict] = None):
+    def __init__(
+        self,
+        trace: Optional[StatefulTraceClient] = None,
+        agent_config: Optional[dict] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ):
         """
         Initialize the ThreadManager
         
         Args:
             trace: Optional trace client for telemetry
             agent_config: Optional agent configuration
+            progress_callback: Optional async callable that publishes transient
+                progress events to the run's stream (see emit_progress)
         """
+        self.progress_callback = progress_callback
         self.db = DBConnection()
         self.tool_registry = ToolRegistry()
         self.trace = trace
@@ -105,11 +114,49 @@ class ThreadManager:
             agent_config=self.agent_config
         )
         self.context_manager = ContextManager()
+        # Async callables run once when the agent run finishes, however it ends
+        self.run_end_hooks: List[Callable[[], Awaitable[None]]] = []
 
     def add_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
         """Add a tool to the ThreadManager."""
         self.tool_registry.register_tool(tool_class, function_names, **kwargs)
 
+    def add_turn_end_hook(self, hook: Callable[[], Awaitable[None]]):
+        """Register an async callable to run at the end of every turn, after its tools have executed."""
+        self.response_processor.turn_end_hooks.append(hook)
+
+    def add_run_end_hook(self, hook: Callable[[], Awaitable[None]]):
+        """Register an async callable to run when the agent run finishes, e.g. to release a tool's connections."""
+        self.run_end_hooks.append(hook)
+
+    async def run_end(self):
+        """Run the registered run-end hooks, logging rather than raising failures."""
+        hooks, self.run_end_hooks = self.run_end_hooks, []
+        for hook in hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"Error in run end hook: {str(e)}", exc_info=True)
+
+    async def emit_progress(self, content: Dict[str, Any]):
+        """Publish a transient status message while a tool is still running.
+
+        Progress messages go to the run's stream only; they are not stored in
+        the thread and never reach the LLM. Does nothing when the run was
+        started without a progress callback.
+        """
+        if not self.progress_callback:
+            return
+        try:
+            await self.progress_callback({
+                "type": "status",
+                "is_llm_message": False,
+                "content": fastjson.dumps({"role": "assistant", **content}),
+                "metadata": fastjson.dumps({"transient": True}),
+            })
+        except Exception as e:
+            logger.debug(f"Failed to publish progress event: {str(e)}")
+
     async def create_thread(
         self,
         account_id: Optional[str] = None,
@@ -204,11 +251,16 @@ class ThreadManager:
             data_to_insert['agent_version_id'] = agent_version_id
 
         try:
-            result = await client.table('messages').insert(data_to_insert).execute()
+            pg = await self.db.pg
+            if pg:
+                result_data = [await pg.insert_message(data_to_insert)]
+            else:
+                result = await client.table('messages').insert(data_to_insert).execute()
+                result_data = result.data
             logger.debug(f"Successfully added message to thread {thread_id}")
 
-            if result.data and len(result.data) > 0 and isinstance(result.data[0], dict) and 'message_id' in result.data[0]:
-                saved_message = result.data[0]
+            if result_data and len(result_data) > 0 and isinstance(result_data[0], dict) and 'message_id' in result_data[0]:
+                saved_message = result_data[0]
                 if type == "assistant_response_end" and isinstance(content, dict):
                     try:
                         usage = content.get("usage", {}) if isinstance(content, dict) else {}
@@ -237,7 +289,8 @@ class ThreadManager:
                                 model=model or "unknown",
                                 message_id=saved_message['message_id'],
                                 cache_read_tokens=cache_read_tokens,
-                                cache_creation_tokens=cache_creation_tokens
+                                cache_creation_tokens=cache_creation_tokens,
+                                thread_id=thread_id
                             )
                             
                             if deduct_result.get('success'):
@@ -252,7 +305,7 @@ class ThreadManager:
                         logger.error(f"[THREAD_MANAGER] Error handling credit usage for message {saved_message.get('message_id')}: {str(billing_e)}", exc_info=True)
                 return saved_message
             else:
-                logger.error(f"Insert operation failed or did not return expected data structure for thread {thread_id}. Result data: {result.data}")
+                logger.error(f"Insert operation failed or did not return expected data structure for thread {thread_id}. Result data: {result_data}")
                 return None
         except Exception as e:
             logger.error(f"Failed to add message to thread {thread_id}: {str(e)}", exc_info=True)
@@ -282,19 +335,24 @@ class ThreadManager:
             batch_size = 1000
             offset = 0
             
-            while True:
-                result = await client.table('messages').select('message_id, type, content').eq('thread_id', thread_id).eq('is_llm_message', True).order('created_at').range(offset, offset + batch_size - 1).execute()
+            pg = await self.db.pg
+            if pg:
+                # A single prepared query; no PostgREST row limit to page around
+                all_messages = await pg.get_llm_messages(thread_id)
+            else:
+                while True:
+                    result = await client.table('messages').select('message_id, type, content').eq('thread_id', thread_id).eq('is_llm_message', True).order('created_at').range(offset, offset + batch_size - 1).execute()
                 
-                if not result.data or len(result.data) == 0:
-                    break
+                    if not result.data or len(result.data) == 0:
+                        break
                     
-                all_messages.extend(result.data)
+                    all_messages.extend(result.data)
                 
-                # If we got fewer than batch_size records, we've reached the end
-                if len(result.data) < batch_size:
-                    break
+                    # If we got fewer than batch_size records, we've reached the end
+                    if len(result.data) < batch_size:
+                        break
                     
-                offset += batch_size
+                    offset += batch_size
             
             # Use all_messages instead of result.data in the rest of the method
             result_data = all_messages
@@ -310,7 +368,7 @@ class ThreadManager:
                 
                 # Handle image_context messages specially
                 if message_type == 'image_context':
-                    image_message = self._process_image_context_message(item)
+                    image_message = await self._process_image_context_message(item)
                     if image_message:
                         messages.append(image_message)
                     continue
@@ -318,10 +376,10 @@ class ThreadManager:
                 # Handle regular messages
                 if isinstance(item['content'], str):
                     try:
-                        parsed_item = json.loads(item['content'])
+                        parsed_item = fastjson.loads(item['content'])
                         parsed_item['message_id'] = item['message_id']
                         messages.append(parsed_item)
-                    except json.JSONDecodeError:
+                    except fastjson.JSONDecodeError:
                         logger.error(f"Failed to parse message: {item['content']}")
                 else:
                     content = item['content']
@@ -334,7 +392,7 @@ class ThreadManager:
             logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
             return []
     
-    def _process_image_context_message(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def _process_image_context_message(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Process an image_context message into LLM-compatible format.
         
         Args:
@@ -349,8 +407,8 @@ class ThreadManager:
             # Handle both string and dict content
             if isinstance(content, str):
                 try:
-                    content = json.loads(content)
-                except json.JSONDecodeError:
+                    content = fastjson.loads(content)
+                except fastjson.JSONDecodeError:
                     logger.error(f"Failed to parse image_context content: {content}")
                     return None
             
@@ -358,13 +416,13 @@ class ThreadManager:
                 logger.error(f"Image context content is not a dict: {type(content)}")
                 return None
             
-            # Extract image data
-            base64_data = content.get('base64')
-            mime_type = content.get('mime_type', 'image/jpeg')
+            # Extract image data; newer messages reference a stored artifact
+            # instead of embedding the base64 image
             file_path = content.get('file_path', 'image')
-            
-            if not base64_data:
-                logger.error("Image context message missing base64 data")
+            data_url = await image_artifacts.resolve_data_url(content)
+
+            if not data_url:
+                logger.error(f"Image context message for '{file_path}' has no resolvable image data")
                 return None
             
             # Create LLM-compatible image message
@@ -378,7 +436,7 @@ class ThreadManager:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:{mime_type};base64,{base64_data}"
+                            "url": data_url
                         }
                     }
                 ],
@@ -1031,11 +1031,13 @@ async def composio_webhook(request: Request):
                     trigger_type=TriggerType.EVENT,
                     raw_data=payload,
                     context=ctx,
+                    delivery_id=wid or provider_event_id,
                 )
                 await execution_service.execute_trigger_result(
                     agent_id=trigger.agent_id,
                     trigger_result=result,
                     trigger_event=event,
+                    trigger=trigger,
                 )
                 executed += 1
 
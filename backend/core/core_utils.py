@@ -8,6 +8,7 @@ from .utils.cache import Cache
 from .utils.logger import logger
 from .utils.config import config
 from .utils.auth_utils import verify_and_authorize_thread_access
+from .utils import run_slots, active_runs
 from core.services import redis_client as rc
 from core.services.supabase import DBConnection
 from core.services.llm import make_llm_api_call
@@ -30,17 +31,11 @@ async def cleanup():
     # Use the instance_id to find and clean up this instance's keys
     try:
         if instance_id: # Ensure instance_id is set
-            running_keys = await rc.keys(f"active_run:{instance_id}:*")
-            logger.debug(f"Found {len(running_keys)} running agent runs for instance {instance_id} to clean up")
-
-            for key in running_keys:
-                # Key format: active_run:{instance_id}:{agent_run_id}
-                parts = key.split(":")
-                if len(parts) == 3:
-                    agent_run_id = parts[2]
-                    await stop_agent_run_with_helpers(agent_run_id, error_message=f"Instance {instance_id} shutting down")
-                else:
-                    logger.warning(f"Unexpected key format found: {key}")
+            running_run_ids = await active_runs.get_instance_runs(instance_id)
+            logger.debug(f"Found {len(running_run_ids)} running agent runs for instance {instance_id} to clean up")
+
+            for agent_run_id in running_run_ids:
+                await stop_agent_run_with_helpers(agent_run_id, error_message=f"Instance {instance_id} shutting down")
         else:
             logger.warning("Instance ID not set, cannot clean up instance-specific agent runs.")
 
@@ -88,22 +83,16 @@ async def stop_agent_run_with_helpers(agent_run_id: str, error_message: Optional
 
     # Find all instances handling this agent run and send STOP to instance-specific channels
     try:
-        instance_keys = await rc.keys(f"active_run:*:{agent_run_id}")
-        logger.debug(f"Found {len(instance_keys)} active instance keys for agent run {agent_run_id}")
-
-        for key in instance_keys:
-            # Key format: active_run:{instance_id}:{agent_run_id}
-            parts = key.split(":")
-            if len(parts) == 3:
-                instance_id_from_key = parts[1]
-                instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
-                try:
-                    await rc.publish(instance_control_channel, "STOP")
-                    logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
-                except Exception as e:
-                    logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
-            else:
-                 logger.warning(f"Unexpected key format found: {key}")
+        instance_ids = await active_runs.get_run_instances(agent_run_id)
+        logger.debug(f"Found {len(instance_ids)} active instances for agent run {agent_run_id}")
+
+        for instance_id_from_key in instance_ids:
+            instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
+            try:
+                await rc.publish(instance_control_channel, "STOP")
+                logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
+            except Exception as e:
+                logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
 
         # Clean up the response list immediately on stop/fail
         await _cleanup_redis_response_list(agent_run_id)
@@ -358,6 +347,11 @@ async def _cleanup_redis_response_list(agent_run_id: str):
 
 
 async def check_for_active_project_agent_run(client, project_id: str):
+    try:
+        return await run_slots.get_project_running_run(project_id)
+    except Exception as e:
+        logger.warning(f"Run slot lookup failed for project {project_id}, falling back to database: {str(e)}")
+
     project_threads = await client.table('threads').select('thread_id').eq('project_id', project_id).execute()
     project_thread_ids = [t['thread_id'] for t in project_threads.data]
 
@@ -394,7 +388,7 @@ async def stop_agent_run(db, agent_run_id: str, error_message: Optional[str] = N
 
     from core.agent_runs import update_agent_run_status
     update_success = await update_agent_run_status(
-        client, agent_run_id, final_status, error=error_message, responses=all_responses
+        client, agent_run_id, final_status, error_message=error_message
     )
 
     if not update_success:
@@ -408,21 +402,16 @@ async def stop_agent_run(db, agent_run_id: str, error_message: Optional[str] = N
         logger.error(f"Failed to publish STOP signal to global channel {global_control_channel}: {str(e)}")
 
     try:
-        instance_keys = await rc.keys(f"active_run:*:{agent_run_id}")
-        logger.debug(f"Found {len(instance_keys)} active instance keys for agent run {agent_run_id}")
-
-        for key in instance_keys:
-            parts = key.split(":")
-            if len(parts) == 3:
-                instance_id_from_key = parts[1]
-                instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
-                try:
-                    await rc.publish(instance_control_channel, "STOP")
-                    logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
-                except Exception as e:
-                    logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
-            else:
-                logger.warning(f"Unexpected key format found: {key}")
+        instance_ids = await active_runs.get_run_instances(agent_run_id)
+        logger.debug(f"Found {len(instance_ids)} active instances for agent run {agent_run_id}")
+
+        for instance_id_from_key in instance_ids:
+            instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
+            try:
+                await rc.publish(instance_control_channel, "STOP")
+                logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
+            except Exception as e:
+                logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
 
         await _cleanup_redis_response_list(agent_run_id)
 
@@ -439,8 +428,22 @@ async def check_agent_run_limit(client, account_id: str) -> Dict[str, Any]:
     Returns:
         Dict with 'can_start' (bool), 'running_count' (int), 'running_thread_ids' (list)
         
-    Note: This function does not use caching to ensure real-time limit checks.
+    Running runs are counted from the Redis run slots (see ``utils.run_slots``),
+    which costs O(1) regardless of how many threads the account owns. The
+    database scan below is only used when Redis is unavailable.
     """
+    try:
+        running_runs = await run_slots.get_running_runs(account_id)
+        running_count = len(running_runs)
+        logger.debug(f"Account {account_id} has {running_count} running agent runs (run slots)")
+        return {
+            'can_start': running_count < config.MAX_PARALLEL_AGENT_RUNS,
+            'running_count': running_count,
+            'running_thread_ids': [run['thread_id'] for run in running_runs if run['thread_id']]
+        }
+    except Exception as e:
+        logger.warning(f"Run slot lookup failed for account {account_id}, falling back to database: {str(e)}")
+
     try:
 
         # Calculate 24 hours ago
@@ -2,7 +2,8 @@ import os
 import json
 import asyncio
 import datetime
-from typing import Optional, Dict, List, Any, AsyncGenerator
+from typing import Optional, Dict, List, Any, AsyncGenerator, Awaitable, Callable
+from contextlib import aclosing
 from dataclasses import dataclass
 
 from core.tools.message_tool import MessageTool
@@ -22,6 +23,7 @@ from core.prompts.prompt import get_system_prompt
 
 from core.utils.logger import logger
 from core.utils.llm_cache_utils import format_message_with_cache
+from core.utils.run_checkpoints import TurnTracker
 
 # Import billing integration conditionally
 try:
@@ -74,6 +76,11 @@ class AgentConfig:
     enable_context_manager: bool = True
     agent_config: Optional[dict] = None
     trace: Optional[StatefulTraceClient] = None
+    progress_callback: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    # Receives the checkpoint fields after every completed turn
+    checkpoint_callback: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    # Checkpoint of an earlier attempt at this run, to continue from
+    resume_state: Optional[Dict[str, Any]] = None
 
 
 class ToolManager:
@@ -465,7 +472,8 @@ class AgentRunner:
         
         self.thread_manager = ThreadManager(
             trace=self.config.trace, 
-            agent_config=self.config.agent_config
+            agent_config=self.config.agent_config,
+            progress_callback=self.config.progress_callback
         )
         
         self.client = await self.thread_manager.db.client
@@ -585,7 +593,35 @@ class AgentRunner:
             return 8192
         return None
     
+    async def _get_latest_message(self, pg, types: List[str]) -> Optional[Dict[str, Any]]:
+        if pg:
+            return await pg.get_latest_message(self.config.thread_id, types)
+        result = await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).in_('type', types).order('created_at', desc=True).limit(1).execute()
+        return result.data[0] if result.data else None
+
+    async def _get_interrupted_turn(self, since: str) -> Optional[tuple]:
+        """Return the newest assistant message saved since ``since`` and the tool
+        results saved with it, or None if the run saved no assistant message."""
+        result = await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).in_(
+            'type', ['assistant', 'tool']
+        ).gte('created_at', since).order('created_at').execute()
+        messages = result.data or []
+        assistant_message = next((m for m in reversed(messages) if m['type'] == 'assistant'), None)
+        if not assistant_message:
+            return None
+        return assistant_message, [m for m in messages if m['type'] == 'tool']
+
     async def run(self) -> AsyncGenerator[Dict[str, Any], None]:
+        try:
+            async with aclosing(self._run()) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            # Tools release per-run resources (e.g. the browser channel) however the run ends
+            if getattr(self, 'thread_manager', None) is not None:
+                await self.thread_manager.run_end()
+
+    async def _run(self) -> AsyncGenerator[Dict[str, Any], None]:
         await self.setup()
         await self.setup_tools()
         mcp_wrapper_instance = await self.setup_mcp_tools()
@@ -601,9 +637,10 @@ class AgentRunner:
         continue_execution = True
         error_detected = False
 
-        latest_user_message = await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).eq('type', 'user').order('created_at', desc=True).limit(1).execute()
-        if latest_user_message.data and len(latest_user_message.data) > 0:
-            data = latest_user_message.data[0]['content']
+        pg = await self.thread_manager.db.pg
+        latest_user_message = await self._get_latest_message(pg, ['user'])
+        if latest_user_message:
+            data = latest_user_message['content']
             if isinstance(data, str):
                 data = json.loads(data)
             if self.config.trace:
@@ -612,6 +649,50 @@ class AgentRunner:
         message_manager = MessageManager(self.client, self.config.thread_id, self.config.model_name, self.config.trace, 
                                          agent_config=self.config.agent_config, enable_context_manager=self.config.enable_context_manager)
 
+        processor_config = ProcessorConfig(
+            xml_tool_calling=True,
+            native_tool_calling=False,
+            execute_tools=True,
+            execute_on_stream=True,
+            tool_execution_strategy="parallel",
+            xml_adding_strategy="user_message",
+            max_xml_tool_calls=1
+        )
+
+        resume_state = self.config.resume_state
+        tracker = TurnTracker({'message_id': resume_state.get('last_message_id'), 'created_at': resume_state.get('last_message_at')}
+                              if resume_state else latest_user_message)
+
+        if self.config.checkpoint_callback:
+            async def checkpoint_turn():
+                state = tracker.end_turn(self.thread_manager.response_processor, processor_config)
+                state.update(iteration_count=iteration_count, auto_continue=continue_execution and not tracker.terminated)
+                await self.config.checkpoint_callback(state)
+
+            self.thread_manager.add_turn_end_hook(checkpoint_turn)
+
+        if resume_state:
+            iteration_count = resume_state.get('iteration_count', 0)
+            continue_execution = resume_state.get('auto_continue', True)
+            logger.info(f"Resuming thread {self.config.thread_id} after iteration {iteration_count}")
+            since = resume_state.get('last_message_at') or (latest_user_message or {}).get('created_at')
+            interrupted = await self._get_interrupted_turn(since) if continue_execution and since else None
+            if interrupted:
+                # The lost worker saved this turn's assistant message: finish its
+                # tool calls instead of asking the LLM again
+                assistant_message, tool_messages = interrupted
+                if assistant_message['message_id'] != resume_state.get('last_message_id'):
+                    iteration_count += 1
+                for message in [assistant_message, *tool_messages]:
+                    tracker.observe(message)
+                async for chunk in self.thread_manager.response_processor.resume_tool_calls(
+                    self.config.thread_id, assistant_message, tool_messages, processor_config
+                ):
+                    tracker.observe(chunk)
+                    yield chunk
+                if tracker.terminated:
+                    continue_execution = False
+
         while continue_execution and iteration_count < self.config.max_iterations:
             iteration_count += 1
 
@@ -625,9 +706,9 @@ class AgentRunner:
                 }
                 break
 
-            latest_message = await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
-            if latest_message.data and len(latest_message.data) > 0:
-                message_type = latest_message.data[0].get('type')
+            latest_message = await self._get_latest_message(pg, ['assistant', 'tool', 'user'])
+            if latest_message:
+                message_type = latest_message.get('type')
                 if message_type == 'assistant':
                     continue_execution = False
                     # Emit completion status when agent already has an assistant response
@@ -708,14 +789,7 @@ class AgentRunner:
                     tool_choice="auto",
                     max_xml_tool_calls=1,
                     temporary_message=temporary_message,
-                    processor_config=ProcessorConfig(
-                        xml_tool_calling=True,
-                        native_tool_calling=False,
-                        execute_tools=True,
-                        execute_on_stream=True,
-                        tool_execution_strategy="parallel",
-                        xml_adding_strategy="user_message"
-                    ),
+                    processor_config=processor_config,
                     native_max_auto_continues=self.config.native_max_auto_continues,
                     include_xml_examples=True,
                     enable_thinking=self.config.enable_thinking,
@@ -736,6 +810,7 @@ class AgentRunner:
                 try:
                     if hasattr(response, '__aiter__') and not isinstance(response, dict):
                         async for chunk in response:
+                            tracker.observe(chunk)
                             if isinstance(chunk, dict) and chunk.get('type') == 'status' and chunk.get('status') == 'error':
                                 error_detected = True
                                 yield chunk
@@ -875,7 +950,10 @@ async def run_agent(
     reasoning_effort: Optional[str] = 'low',
     enable_context_manager: bool = True,
     agent_config: Optional[dict] = None,    
-    trace: Optional[StatefulTraceClient] = None
+    trace: Optional[StatefulTraceClient] = None,
+    progress_callback: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    checkpoint_callback: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    resume_state: Optional[Dict[str, Any]] = None
 ):
     effective_model = model_name
     is_tier_default = model_name in ["Kimi K2", "Claude Sonnet 4", "gemini/gemini-2.5-flash"]
@@ -899,9 +977,13 @@ async def run_agent(
         reasoning_effort=reasoning_effort,
         enable_context_manager=enable_context_manager,
         agent_config=agent_config,
-        trace=trace
+        trace=trace,
+        progress_callback=progress_callback,
+        checkpoint_callback=checkpoint_callback,
+        resume_state=resume_state
     )
     
     runner = AgentRunner(config)
-    async for chunk in runner.run():
-        yield chunk
\ No newline at end of file
+    async with aclosing(runner.run()) as chunks:
+        async for chunk in chunks:
+            yield chunk
\ No newline at end of file
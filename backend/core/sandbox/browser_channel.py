@@ -0,0 +1,212 @@
+"""
+Persistent channel from the backend to the sandbox's browser automation API.
+
+``browserApi.ts`` listens on port 8004 inside the sandbox. Rather than running
+``curl`` through ``process.exec`` for every action, which costs an exec round
+trip and a process spawn per call and pushes the JSON body through shell
+quoting, ``BrowserChannel`` talks to the server over the sandbox preview link
+with a keep-alive HTTP session. Sequential actions reuse the same open
+connection and concurrent requests are spread over a small connection pool.
+
+If the preview link cannot be resolved or the server cannot be reached through
+it, the channel falls back to ``curl`` through ``process.exec`` for the rest of
+its lifetime, so environments without preview access keep working.
+"""
+
+import asyncio
+import json
+import shlex
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from core.utils.logger import logger
+
+BROWSER_API_PORT = 8004
+REQUEST_TIMEOUT = 30
+INIT_TIMEOUT = 90
+# Concurrent requests beyond this wait for a pooled connection
+MAX_CONNECTIONS = 4
+# Idle connections are kept this long between actions; browserApi.ts keeps its
+# side open for 120 seconds
+KEEPALIVE_TIMEOUT = 110
+# Separates the response body from the HTTP status appended by ``curl -w``
+_STATUS_MARKER = "\n__BROWSER_API_STATUS__:"
+
+
+class BrowserAPIError(Exception):
+    """The browser API could not be reached or returned something other than JSON."""
+
+
+class BrowserChannel:
+    def __init__(self, sandbox, api_key: Optional[str] = None, port: int = BROWSER_API_PORT):
+        self.sandbox = sandbox
+        self.api_key = api_key
+        self.port = port
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._base_url: Optional[str] = None
+        self._headers: Dict[str, str] = {}
+        # None until the first request decides between "http" and "exec"
+        self._transport: Optional[str] = None
+        # Set once a response has come back over the preview link
+        self._http_verified = False
+        self._ready = False
+        self._setup_lock = asyncio.Lock()
+
+    @property
+    def transport(self) -> Optional[str]:
+        return self._transport
+
+    # ---- transport setup ----
+
+    async def _resolve_preview_link(self) -> bool:
+        try:
+            link = await self.sandbox.get_preview_link(self.port)
+        except Exception as e:
+            logger.warning(f"Browser API preview link unavailable, using exec transport: {e}")
+            return False
+
+        url = link.url if hasattr(link, 'url') else str(link)
+        token = getattr(link, 'token', None)
+        self._base_url = url.rstrip('/')
+        self._headers = {"X-Daytona-Skip-Preview-Warning": "true"}
+        if token:
+            self._headers["X-Daytona-Preview-Token"] = token
+        return True
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, keepalive_timeout=KEEPALIVE_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, headers=self._headers)
+        return self._session
+
+    async def _use_exec(self, reason: str) -> None:
+        logger.warning(f"Falling back to exec transport for the browser API: {reason}")
+        self._transport = "exec"
+        await self.close()
+
+    # ---- requests ----
+
+    async def _http_request(self, method: str, endpoint: str, payload: Optional[dict], timeout: int):
+        url = f"{self._base_url}/api{'/' + endpoint if endpoint else ''}"
+        session = self._get_session()
+        async with session.request(
+            method, url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            return response.status, await response.text()
+
+    async def _exec_request(self, method: str, endpoint: str, payload: Optional[dict], timeout: int,
+                            data_arg: Optional[str] = None, env: Optional[Dict[str, str]] = None):
+        url = f"http://localhost:{self.port}/api{'/' + endpoint if endpoint else ''}"
+        command = (
+            f"curl -s -X {method} {shlex.quote(url)} -H 'Content-Type: application/json' "
+            f"-w {shlex.quote(_STATUS_MARKER + '%{http_code}')}"
+        )
+        if payload is not None:
+            data_arg = shlex.quote(json.dumps(payload))
+        if data_arg is not None:
+            command += f" -d {data_arg}"
+
+        kwargs = {"env": env} if env else {}
+        response = await self.sandbox.process.exec(command, timeout=timeout, **kwargs)
+        if response.exit_code == 7:
+            raise BrowserAPIError(f"Browser API server is not available on port {self.port}")
+        if response.exit_code != 0:
+            raise BrowserAPIError(f"Browser API request failed with exit code {response.exit_code}: {response.result}")
+
+        body, _, status = response.result.rpartition(_STATUS_MARKER)
+        return int(status) if status.strip().isdigit() else 0, body
+
+    async def request(self, method: str, endpoint: str, payload: Optional[dict] = None,
+                      timeout: int = REQUEST_TIMEOUT) -> Dict[str, Any]:
+        """Send one request to the browser API and return its JSON body.
+
+        browserApi.ts answers errors with a JSON body too, so the body is
+        returned regardless of the HTTP status. Raises ``BrowserAPIError`` when
+        no JSON response could be obtained.
+        """
+        async with self._setup_lock:
+            if self._transport is None:
+                self._transport = "http" if await self._resolve_preview_link() else "exec"
+
+        if self._transport == "http":
+            try:
+                status, text = await self._http_request(method, endpoint, payload, timeout)
+                result = self._parse(status, text)
+                self._http_verified = True
+                return result
+            except (aiohttp.ClientConnectorError, BrowserAPIError) as e:
+                # Only switch transports while the link is unproven; once it has
+                # worked, a failure is the server's, and retrying a
+                # non-idempotent action over another transport could repeat it
+                if self._http_verified:
+                    raise BrowserAPIError(f"Browser API request failed: {e}") from e
+                await self._use_exec(str(e))
+            except aiohttp.ClientError as e:
+                raise BrowserAPIError(f"Browser API request failed: {e}") from e
+            except asyncio.TimeoutError as e:
+                raise BrowserAPIError(f"Browser API request timed out after {timeout} seconds") from e
+
+        status, text = await self._exec_request(method, endpoint, payload, timeout)
+        return self._parse(status, text)
+
+    @staticmethod
+    def _parse(status: int, text: str) -> Dict[str, Any]:
+        try:
+            result = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise BrowserAPIError(f"Browser API returned invalid JSON (HTTP {status}): {text[:200]}") from e
+        if not isinstance(result, dict):
+            raise BrowserAPIError(f"Browser API returned unexpected JSON (HTTP {status}): {text[:200]}")
+        return result
+
+    # ---- browser lifecycle ----
+
+    async def ensure_ready(self) -> bool:
+        """Make sure the browser is initialized, starting it if needed.
+
+        The result is remembered, so after the first healthy check actions go
+        straight to the server; ``call`` resets it when the server reports the
+        browser has gone away.
+        """
+        if self._ready:
+            return True
+
+        health = await self.request("GET", "")
+        if health.get("status") != "healthy":
+            logger.debug("Browser API is not healthy, initializing browser")
+            if self._transport == "exec":
+                # Keep the key off the command line; the shell expands it from env
+                status, text = await self._exec_request(
+                    "POST", "init", None, INIT_TIMEOUT,
+                    data_arg="'{\"api_key\": \"'\"$GEMINI_API_KEY\"'\"}'",
+                    env={"GEMINI_API_KEY": self.api_key or ""},
+                )
+                health = self._parse(status, text)
+            else:
+                health = await self.request("POST", "init", {"api_key": self.api_key}, timeout=INIT_TIMEOUT)
+
+        self._ready = health.get("status") == "healthy"
+        if not self._ready:
+            logger.warning(f"Browser API failed to become healthy: {health}")
+        return self._ready
+
+    async def call(self, endpoint: str, payload: Optional[dict] = None,
+                   timeout: int = REQUEST_TIMEOUT) -> Dict[str, Any]:
+        """POST an action to the browser API, initializing the browser first if needed."""
+        if not await self.ensure_ready():
+            raise BrowserAPIError("Browser API server is not healthy")
+
+        result = await self.request("POST", endpoint, payload, timeout=timeout)
+        if result.get("status") == "error" and "not initialized" in str(result.get("message", "")):
+            # The browser crashed or was closed since the last action
+            self._ready = False
+            if not await self.ensure_ready():
+                raise BrowserAPIError("Browser API server is not healthy")
+            result = await self.request("POST", endpoint, payload, timeout=timeout)
+        return result
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
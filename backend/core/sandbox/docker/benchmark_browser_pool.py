@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark HTML presentation conversion with a cold browser versus the shared pool.
+
+Generates a synthetic deck under /workspace, then converts it repeatedly:
+
+- cold:   a fresh BrowserPool per conversion, i.e. one Chromium launch per
+          request as the converters did before the pool existed
+- pooled: one warm BrowserPool reused by every conversion
+
+Run inside the sandbox container:
+
+    python benchmark_browser_pool.py [--slides 30] [--rounds 3] [--format pdf|pptx]
+"""
+
+import argparse
+import asyncio
+import json
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from browser_pool import BrowserPool
+
+
+SLIDE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<style>
+  body {{ margin: 0; font-family: 'DejaVu Sans', sans-serif; }}
+  .slide-container {{ width: 1920px; height: 1080px; background: linear-gradient(135deg, #1e3a8a, #0ea5e9); color: white; padding: 120px; box-sizing: border-box; }}
+  h1 {{ font-size: 96px; margin: 0 0 40px; }}
+  li {{ font-size: 40px; margin-bottom: 20px; }}
+  .badge {{ position: absolute; right: 120px; bottom: 120px; width: 160px; height: 160px; border-radius: 50%; background: #f59e0b; }}
+</style>
+</head>
+<body>
+<div class="slide-container">
+  <h1>Slide {number}</h1>
+  <ul>
+    <li>Quarterly revenue grew {number}%</li>
+    <li>Active users reached {users}</li>
+    <li>Churn dropped to {churn}%</li>
+  </ul>
+  <div class="badge"></div>
+</div>
+</body>
+</html>
+"""
+
+
+def build_deck(slides: int) -> Path:
+    name = f"benchmark_deck_{uuid.uuid4().hex[:8]}"
+    deck_dir = Path("/workspace/presentations") / name
+    deck_dir.mkdir(parents=True, exist_ok=True)
+
+    metadata = {"presentation_name": name, "slides": {}}
+    for number in range(1, slides + 1):
+        filename = f"slide_{number:02d}.html"
+        (deck_dir / filename).write_text(
+            SLIDE_TEMPLATE.format(number=number, users=number * 1000, churn=round(10 / number, 2)),
+            encoding="utf-8",
+        )
+        metadata["slides"][str(number)] = {
+            "title": f"Slide {number}",
+            "filename": filename,
+            "file_path": f"presentations/{name}/{filename}",
+        }
+
+    (deck_dir / "metadata.json").write_text(json.dumps(metadata), encoding="utf-8")
+    return deck_dir
+
+
+async def convert(fmt: str, deck_dir: Path, pool: BrowserPool) -> None:
+    if fmt == "pdf":
+        from html_to_pdf_router import PresentationToPDFAPI
+        await PresentationToPDFAPI(str(deck_dir), pool=pool).convert_to_pdf(store_locally=False)
+    else:
+        from html_to_pptx_router import OptimizedHTMLToPPTXConverter
+        await OptimizedHTMLToPPTXConverter(str(deck_dir), pool=pool).convert_to_pptx(store_locally=False)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold vs pooled browser conversions")
+    parser.add_argument("--slides", type=int, default=30, help="Number of slides in the generated deck")
+    parser.add_argument("--rounds", type=int, default=3, help="Conversions per mode")
+    parser.add_argument("--format", choices=["pdf", "pptx"], default="pdf", help="Output format to convert to")
+    args = parser.parse_args()
+
+    deck_dir = build_deck(args.slides)
+    try:
+        cold_times = []
+        for _ in range(args.rounds):
+            pool = BrowserPool()
+            start = time.perf_counter()
+            try:
+                await convert(args.format, deck_dir, pool)
+            finally:
+                await pool.close()
+            cold_times.append(time.perf_counter() - start)
+
+        pooled_times = []
+        pool = BrowserPool()
+        await pool.start()
+        try:
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                await convert(args.format, deck_dir, pool)
+                pooled_times.append(time.perf_counter() - start)
+        finally:
+            await pool.close()
+
+        print(f"\n{args.slides}-slide deck -> {args.format}, {args.rounds} rounds, pool size {pool.size}")
+        print(f"{'mode':<8} {'best':>9} {'mean':>9}")
+        for mode, times in (("cold", cold_times), ("pooled", pooled_times)):
+            print(f"{mode:<8} {min(times):8.2f}s {sum(times) / len(times):8.2f}s")
+        print(f"speedup (mean): {(sum(cold_times) / sum(pooled_times)):.2f}x")
+    finally:
+        shutil.rmtree(deck_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
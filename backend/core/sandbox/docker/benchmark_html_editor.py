@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark the visual HTML editor endpoints on a large page: full re-parse per
+call versus the parsed-DOM cache.
+
+Generates a page of roughly ``--size-mb`` megabytes in a temporary directory and
+times the work behind each endpoint:
+
+- legacy: what the router did before the cache, read the file, parse it with
+          BeautifulSoup's html.parser, walk it and, for edits and deletions,
+          write back ``str(soup)``
+- cached: ``html_dom_cache.load_document`` (cold on the first call) followed by
+          index lookups and byte-range patches with an atomic write; the
+          re-index a deletion leaves for the next read is timed separately
+
+Usage:
+
+    python benchmark_html_editor.py [--size-mb 5] [--edits 20] [--legacy-edits 1]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from statistics import mean
+
+from bs4 import BeautifulSoup, Comment, NavigableString
+
+import html_dom_cache
+from html_dom_cache import TEXT_ELEMENTS
+
+
+SECTION_TEMPLATE = """<div class="section" id="s{n}">
+  <h2>Section {n}: {title}</h2>
+  <p>{sentence} <strong>{word}</strong> {sentence}</p>
+  Summary for section {n} &amp; its {word} figures.
+  <ul><li>{word} &lt;{n}&gt;</li><li>{sentence}</li></ul>
+  <table><tr><th>Metric</th><th>Value</th></tr><tr><td>{word}</td><td>{n}.{m}</td></tr></table>
+  <!-- generated block {n} -->
+</div>
+"""
+
+WORDS = "revenue growth margin churn pipeline forecast quarter region segment retention pricing".split()
+
+
+def generate_page(size_bytes):
+    rng = random.Random(11)
+    parts = ["<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"UTF-8\">\n<title>Generated report</title>\n"
+             "<style>body { font-family: sans-serif; } .section { margin: 24px; }</style>\n</head>\n<body>\n"]
+    size, n = len(parts[0]), 0
+    while size < size_bytes:
+        section = SECTION_TEMPLATE.format(
+            n=n, m=rng.randint(0, 99), title=rng.choice(WORDS).title(), word=rng.choice(WORDS),
+            sentence=" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))),
+        )
+        parts.append(section)
+        size += len(section)
+        n += 1
+    parts.append("</body>\n</html>\n")
+    return "".join(parts)
+
+
+def legacy_elements(soup):
+    """The editable-elements walk as the router did it, returning the element or wrapper for each ID."""
+    targets = []
+    for element in soup.find_all(TEXT_ELEMENTS + ['div']):
+        if all(isinstance(child, Comment) or (isinstance(child, NavigableString) and not child.strip())
+               for child in element.children):
+            continue
+        if element.string and element.string.strip():
+            targets.append(element)
+        elif element.contents:
+            for child in list(element.contents):
+                if isinstance(child, Comment) or not (isinstance(child, NavigableString) and child.strip()):
+                    continue
+                wrapper = soup.new_tag('span')
+                wrapper.string = child.strip()
+                child.replace_with(wrapper)
+                targets.append(wrapper)
+    return targets
+
+
+def legacy_parse(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+    return soup, legacy_elements(soup)
+
+
+def legacy_write(path, soup):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(str(soup))
+
+
+def legacy_edit(path, index, text):
+    soup, targets = legacy_parse(path)
+    targets[index].string.replace_with(text)
+    legacy_write(path, soup)
+
+
+def legacy_delete(path, index):
+    soup, targets = legacy_parse(path)
+    targets[index].decompose()
+    legacy_write(path, soup)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def report(label, seconds):
+    print(f"  {label:<22} {mean(seconds) * 1000:10.1f} ms" + (f"   ({len(seconds)} calls)" if len(seconds) > 1 else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=5.0)
+    parser.add_argument("--edits", type=int, default=20, help="Edits and deletions timed against the cache")
+    parser.add_argument("--legacy-edits", type=int, default=1, help="Edits and deletions timed without the cache")
+    args = parser.parse_args()
+
+    html = generate_page(int(args.size_mb * 1024 * 1024))
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as workspace:
+        path = os.path.join(workspace, "report.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html)
+
+        elapsed, (_, targets) = timed(legacy_parse, path)
+        print(f"{len(html) / 1024 / 1024:.1f} MB page, {len(targets)} editable elements\n")
+        print("legacy")
+        report("editable-elements", [elapsed])
+        report("edit-text", [timed(legacy_edit, path, rng.randrange(len(targets)), "Edited")[0]
+                             for _ in range(args.legacy_edits)])
+        report("delete-element", [timed(legacy_delete, path, rng.randrange(len(targets)))[0]
+                                  for _ in range(args.legacy_edits)])
+        legacy_get = elapsed
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        print("\ncached")
+        cold, document = timed(html_dom_cache.load_document, path)
+        report("first load (parse)", [cold])
+        warm = [timed(lambda: html_dom_cache.load_document(path).editable_elements())[0] for _ in range(args.edits)]
+        report("editable-elements", warm)
+
+        edits, deletes, reindexes = [], [], []
+        for _ in range(args.edits):
+            element_id = rng.choice(list(document.editable))
+            edits.append(timed(lambda: html_dom_cache.load_document(path).replace_text(element_id, "Edited"))[0])
+            element_id = rng.choice(list(document.editable))
+            span = document.editable[element_id]['span']
+            deletes.append(timed(lambda: html_dom_cache.load_document(path).delete(span))[0])
+            # A deletion renumbers the elements, which the next read pays for
+            reindexes.append(timed(lambda: html_dom_cache.load_document(path).editable_elements())[0])
+        report("edit-text", edits)
+        report("delete-element", deletes)
+        report("read after delete", reindexes)
+
+        print(f"\n  editable-elements speedup {legacy_get / mean(warm):8.0f}x (warm), {legacy_get / cold:5.1f}x (cold)")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,29 @@ interface BrowserActionResult {
     action?: string;
 }
 
+interface BrowserStep {
+    type: 'navigate' | 'act' | 'extract' | 'wait';
+    url?: string;
+    action?: string;
+    variables?: Record<string, string>;
+    iframes?: boolean;
+    filePath?: string;
+    instruction?: string;
+    seconds?: number;
+    load_state?: 'load' | 'domcontentloaded' | 'networkidle';
+}
+
+interface BrowserStepResult {
+    index: number;
+    type: string;
+    success: boolean;
+    message: string;
+    action?: string;
+    extraction?: unknown;
+}
+
+const MAX_WAIT_SECONDS = 30;
+
 class BrowserAutomation {
     public router: express.Router;
 
@@ -31,6 +54,7 @@ class BrowserAutomation {
         this.router.post('/screenshot', this.screenshot.bind(this));
         this.router.post('/act', this.act.bind(this));
         this.router.post('/extract', this.extract.bind(this));
+        this.router.post('/run-actions', this.runActions.bind(this));
 
     }
 
@@ -306,6 +330,88 @@ class BrowserAutomation {
         }
     }
 
+    private async runStep(step: BrowserStep): Promise<Omit<BrowserStepResult, 'index' | 'type'>> {
+        const page = this.page as Page;
+        switch (step.type) {
+            case 'navigate': {
+                await page.goto(step.url as string, { waitUntil: 'domcontentloaded', timeout: 30000 });
+                return { success: true, message: "Navigated to " + step.url };
+            }
+            case 'act': {
+                const fileChooseHandler = async (fileChooser: FileChooser) => {
+                    await fileChooser.setFiles(step.filePath ? step.filePath : []);
+                };
+                page.on('filechooser', fileChooseHandler);
+                try {
+                    const result = await page.act({ action: step.action as string, iframes: step.iframes ?? true, variables: step.variables });
+                    return { success: result.success, message: result.message, action: result.action };
+                } finally {
+                    page.off('filechooser', fileChooseHandler);
+                }
+            }
+            case 'extract': {
+                const result = await page.extract({ instruction: step.instruction as string, iframes: step.iframes });
+                return { success: true, message: `Extracted result for: ${step.instruction}`, extraction: result.extraction };
+            }
+            case 'wait': {
+                if (step.load_state) {
+                    await page.waitForLoadState(step.load_state, { timeout: MAX_WAIT_SECONDS * 1000 });
+                }
+                const seconds = Math.min(Math.max(step.seconds ?? 0, 0), MAX_WAIT_SECONDS);
+                if (seconds > 0) {
+                    await page.waitForTimeout(seconds * 1000);
+                }
+                return { success: true, message: step.load_state ? `Reached ${step.load_state}` : `Waited ${seconds} seconds` };
+            }
+            default:
+                return { success: false, message: `Unknown step type: ${(step as BrowserStep).type}` };
+        }
+    }
+
+    // Runs a sequence of steps in one request and captures the page state
+    // (including the screenshot) once, after the last step that ran.
+    async runActions(req: express.Request, res: express.Response): Promise<void> {
+        if (!this.page || !this.browserInitialized) {
+            res.status(500).json({
+                "status": "error",
+                "message": "Browser not initialized"
+            })
+            return;
+        }
+
+        const { steps, stop_on_error } = req.body as { steps: BrowserStep[], stop_on_error?: boolean };
+        const results: BrowserStepResult[] = [];
+        let success = true;
+
+        for (const [index, step] of (steps || []).entries()) {
+            let outcome: Omit<BrowserStepResult, 'index' | 'type'>;
+            try {
+                outcome = await this.runStep(step);
+            } catch (error) {
+                console.error(error);
+                outcome = { success: false, message: `Step failed: ${error instanceof Error ? error.message : String(error)}` };
+            }
+            results.push({ index, type: step.type, ...outcome });
+            if (!outcome.success) {
+                success = false;
+                if (stop_on_error !== false) {
+                    break;
+                }
+            }
+        }
+
+        const page_info = await this.get_stagehand_state();
+        const completed = results.filter(result => result.success).length;
+        res.status(success ? 200 : 500).json({
+            success,
+            message: `Completed ${completed} of ${(steps || []).length} steps`,
+            steps: results,
+            url: page_info.url,
+            title: page_info.title,
+            screenshot_base64: page_info.screenshot_base64,
+        })
+    }
+
 }
 
 const browserAutomation = new BrowserAutomation();
@@ -346,6 +452,12 @@ app.post('/api/init', async (req, res) => {
     }
 });
 
-app.listen(8004, () => {
+const server = app.listen(8004, () => {
     console.log('Starting browser server on port 8004');
-});
\ No newline at end of file
+});
+
+// The backend keeps one connection open across a run's browser actions; keep
+// idle connections around longer than Node's 5 second default so they survive
+// the model's think time between tool calls.
+server.keepAliveTimeout = 120000;
+server.headersTimeout = 125000;
\ No newline at end of file
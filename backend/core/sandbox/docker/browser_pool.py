@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Shared Headless Browser Pool
+
+Keeps one Chromium instance alive for the lifetime of the sandbox server so that
+PDF and PPTX conversions no longer pay for a cold browser start on every request.
+
+The pool holds a fixed number of browser contexts, each with a fixed number of
+pages. Callers borrow a page with ``async with browser_pool.page() as page:``.
+Pages are reused across slides and recycled after ``BROWSER_POOL_PAGE_MAX_USES``
+uses; a page that crashed, or every page after the browser itself crashed, is
+transparently recreated on its next use. Callers beyond the available pages
+wait in a bounded queue, and ``BrowserPoolBusyError`` is raised once the queue
+is full or a page could not be obtained within the acquire timeout.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+try:
+    from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+except ImportError:
+    raise ImportError("Playwright is not installed. Please install it with: pip install playwright")
+
+
+POOL_CONTEXTS = int(os.getenv("BROWSER_POOL_CONTEXTS", "2"))
+POOL_PAGES_PER_CONTEXT = int(os.getenv("BROWSER_POOL_PAGES_PER_CONTEXT", "4"))
+PAGE_MAX_USES = int(os.getenv("BROWSER_POOL_PAGE_MAX_USES", "25"))
+MAX_QUEUE = int(os.getenv("BROWSER_POOL_MAX_QUEUE", "256"))
+ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_POOL_ACQUIRE_TIMEOUT", "120"))
+
+VIEWPORT = {"width": 1920, "height": 1080}
+
+LAUNCH_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--force-device-scale-factor=1',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+    '--disable-features=VizDisplayCompositor',
+    '--disable-extensions',
+    '--disable-plugins',
+    '--disable-web-security',
+    '--disable-features=TranslateUI',
+    '--disable-ipc-flooding-protection'
+]
+
+
+class BrowserPoolBusyError(Exception):
+    """Raised when the pool cannot hand out a page in time."""
+
+
+@dataclass
+class _PageSlot:
+    """One reusable page, pinned to a context index."""
+    context_index: int
+    page: Optional[Page] = None
+    uses: int = 0
+    generation: int = -1
+    broken: bool = False
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        contexts: int = POOL_CONTEXTS,
+        pages_per_context: int = POOL_PAGES_PER_CONTEXT,
+        page_max_uses: int = PAGE_MAX_USES,
+        max_queue: int = MAX_QUEUE,
+        acquire_timeout: float = ACQUIRE_TIMEOUT,
+    ):
+        self.contexts = max(1, contexts)
+        self.pages_per_context = max(1, pages_per_context)
+        self.page_max_uses = max(1, page_max_uses)
+        self.max_queue = max_queue
+        self.acquire_timeout = acquire_timeout
+
+        self._playwright = None
+        self._browser: Optional[Browser] = None
+        self._contexts: List[Optional[BrowserContext]] = [None] * self.contexts
+        self._context_generations: List[int] = [-1] * self.contexts
+        self._generation = 0
+        self._launches = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._slots: Optional[asyncio.Queue] = None
+        self._waiting = 0
+        self._in_use = 0
+
+    @property
+    def size(self) -> int:
+        """Maximum number of pages in use at the same time."""
+        return self.contexts * self.pages_per_context
+
+    def _ensure_slots(self) -> None:
+        if self._slots is None:
+            self._lock = asyncio.Lock()
+            self._slots = asyncio.Queue()
+            for i in range(self.size):
+                self._slots.put_nowait(_PageSlot(context_index=i % self.contexts))
+
+    async def start(self) -> None:
+        """Launch the browser ahead of the first conversion."""
+        self._ensure_slots()
+        await self._ensure_browser()
+
+    async def close(self) -> None:
+        """Shut the browser down. The pool relaunches it lazily if used again."""
+        if self._lock is None:
+            return
+        async with self._lock:
+            await self._shutdown_browser()
+            if self._playwright is not None:
+                try:
+                    await self._playwright.stop()
+                except Exception as e:
+                    print(f"Warning: Failed to stop Playwright: {e}")
+                self._playwright = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "browser_connected": bool(self._browser and self._browser.is_connected()),
+            "launches": self._launches,
+        }
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a page for the duration of the ``async with`` block."""
+        slot = await self._acquire_slot()
+        self._in_use += 1
+        try:
+            page = await self._prepare_page(slot)
+            yield page
+        except BaseException:
+            if slot.page is None or slot.page.is_closed() or not self._browser_alive():
+                slot.broken = True
+            raise
+        finally:
+            self._in_use -= 1
+            await self._release_slot(slot)
+
+    # ---- internals ----
+
+    def _browser_alive(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def _acquire_slot(self) -> _PageSlot:
+        self._ensure_slots()
+        if self._slots.empty() and self._waiting >= self.max_queue:
+            raise BrowserPoolBusyError(f"Browser pool queue is full ({self._waiting} waiting)")
+
+        self._waiting += 1
+        try:
+            return await asyncio.wait_for(self._slots.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise BrowserPoolBusyError(f"No browser page became available within {self.acquire_timeout:.0f}s")
+        finally:
+            self._waiting -= 1
+
+    async def _ensure_browser(self) -> int:
+        async with self._lock:
+            if self._browser_alive():
+                return self._generation
+
+            if self._browser is not None:
+                print("⚠️ Browser disconnected, relaunching...")
+                await self._shutdown_browser()
+
+            try:
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+            except Exception:
+                # The Playwright driver may have died along with the browser.
+                if self._playwright is not None:
+                    try:
+                        await self._playwright.stop()
+                    except Exception:
+                        pass
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+
+            self._generation += 1
+            self._launches += 1
+            print(f"🌐 Browser pool launched Chromium ({self.contexts} contexts x {self.pages_per_context} pages)")
+            return self._generation
+
+    async def _shutdown_browser(self) -> None:
+        browser, self._browser = self._browser, None
+        self._contexts = [None] * self.contexts
+        self._context_generations = [-1] * self.contexts
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    async def _get_context(self, index: int, generation: int) -> BrowserContext:
+        async with self._lock:
+            if self._contexts[index] is None or self._context_generations[index] != generation:
+                self._contexts[index] = await self._browser.new_context(viewport=VIEWPORT, device_scale_factor=1)
+                self._context_generations[index] = generation
+            return self._contexts[index]
+
+    async def _prepare_page(self, slot: _PageSlot) -> Page:
+        generation = await self._ensure_browser()
+
+        if (
+            slot.page is None
+            or slot.broken
+            or slot.generation != generation
+            or slot.page.is_closed()
+            or slot.uses >= self.page_max_uses
+        ):
+            await self._discard_page(slot)
+            context = await self._get_context(slot.context_index, generation)
+            page = await context.new_page()
+            page.on("crash", lambda _: setattr(slot, "broken", True))
+            slot.page = page
+            slot.generation = generation
+            slot.uses = 0
+            slot.broken = False
+
+        slot.uses += 1
+        return slot.page
+
+    async def _discard_page(self, slot: _PageSlot) -> None:
+        page, slot.page = slot.page, None
+        if page is not None and not page.is_closed():
+            try:
+                await page.close()
+            except Exception:
+                pass
+
+    async def _release_slot(self, slot: _PageSlot) -> None:
+        try:
+            if slot.broken or slot.uses >= self.page_max_uses:
+                await self._discard_page(slot)
+            elif slot.page is not None:
+                # Drop the previous slide's DOM so idle pages hold no memory.
+                await slot.page.goto("about:blank")
+        except Exception:
+            slot.broken = True
+            await self._discard_page(slot)
+        finally:
+            self._slots.put_nowait(slot)
+
+
+browser_pool = BrowserPool()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Parsed-DOM Cache for the Visual HTML Editor
+
+Parsing a large generated page with BeautifulSoup and serializing it back with
+``str(soup)`` takes seconds, and the editor endpoints used to do both on every
+call. ``load_document`` instead parses each file once per version (keyed by
+path, size and mtime) into an index of its editable and removable elements
+that records where every element and text node sits in the source.
+
+- Element IDs (``editable-N`` and ``div-N``) are assigned by the same walk the
+  editor page uses. The page numbers elements afresh every time it loads, so
+  the IDs have to keep matching a reloaded page. A text edit leaves the same
+  elements editable, so it only moves the spans after it; a deletion, or an
+  edit that empties a text node, can change the numbering, so the index is
+  rebuilt from the patched source the next time it is read.
+- ``edit_text`` and ``delete_element`` splice the affected source range instead
+  of re-serializing the tree, so the rest of the file is preserved byte for
+  byte, and the file is replaced atomically.
+
+The index is built by a single pass of the stdlib HTML tokenizer, which is what
+BeautifulSoup's ``html.parser`` builder uses, so element IDs match the ones in
+the editor page. Faster C parsers such as lxml do not report source positions,
+which the patches need.
+"""
+
+import html
+import os
+import re
+import uuid
+from collections import Counter, OrderedDict
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# All text elements that should be editable
+TEXT_ELEMENTS = [
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',  # Headings
+    'p',  # Paragraphs
+    'span', 'strong', 'em', 'b', 'i', 'u',  # Inline text formatting
+    'small', 'mark', 'del', 'ins', 'sub', 'sup',  # Text modifications
+    'code', 'kbd', 'samp', 'var', 'pre',  # Code and preformatted text
+    'blockquote', 'cite', 'q',  # Quotes and citations
+    'abbr', 'dfn', 'time', 'data',  # Semantic text
+    'address', 'figcaption', 'caption',  # Descriptive text
+    'th', 'td',  # Table cells
+    'dt', 'dd',  # Definition lists
+    'li',  # List items
+    'label', 'legend',  # Form text
+]
+EDITOR_CONTROL_CLASSES = {'edit-controls', 'remove-controls', 'save-cancel-controls', 'editor-header'}
+
+# Tags BeautifulSoup's html.parser builder closes as soon as they open
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer',
+}
+# Text inside these is written unescaped
+RAW_TEXT_ELEMENTS = {'script', 'style'}
+
+MAX_CACHED_DOCUMENTS = 8
+
+
+class _Span:
+    """A source range [start, end)."""
+
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start: int, end: int = -1):
+        self.start = start
+        self.end = end
+
+
+class _Node:
+    """An element, or a leaf holding a string (``kind`` 'string' or 'comment')."""
+
+    __slots__ = ('kind', 'name', 'attrs', 'text', 'children', 'parent', 'start', 'end')
+
+    def __init__(self, kind: str, name: Optional[str] = None, attrs: Optional[Dict[str, Any]] = None,
+                 text: str = '', parent: Optional['_Node'] = None, start: int = 0):
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs or {}
+        self.text = text
+        self.children: List['_Node'] = []
+        self.parent = parent
+        # Source range, filled in once the node is closed
+        self.start = start
+        self.end = -1
+
+    def string(self) -> Optional['_Node']:
+        """The single string leaf under this node, like BeautifulSoup's ``Tag.string``."""
+        node = self
+        while node.kind == 'element':
+            if len(node.children) != 1:
+                return None
+            node = node.children[0]
+        return node
+
+
+class _TreeBuilder(HTMLParser):
+    """Builds a lightweight tree with source spans, nesting tags like BeautifulSoup's html.parser builder."""
+
+    def __init__(self, source: str):
+        super().__init__(convert_charrefs=True)
+        self.source = source
+        self._line_starts = [0] + [m.end() for m in re.finditer('\n', source)]
+        self.root = _Node('element', '[document]')
+        self._stack = [self.root]
+        self._open = Counter()
+        # Nodes whose span ends where the next token starts
+        self._pending: List[_Node] = []
+        self._last_data: Optional[_Node] = None
+
+    def _token_start(self) -> int:
+        line, column = self.getpos()
+        pos = self._line_starts[line - 1] + column
+        for node in self._pending:
+            node.end = pos
+        self._pending.clear()
+        return pos
+
+    def _add(self, node: _Node) -> _Node:
+        self._stack[-1].children.append(node)
+        return node
+
+    def handle_starttag(self, tag, attrs):
+        pos = self._token_start()
+        node = self._add(_Node('element', tag, dict(attrs), parent=self._stack[-1], start=pos))
+        if tag in VOID_ELEMENTS:
+            self._pending.append(node)
+        else:
+            self._stack.append(node)
+            self._open[tag] += 1
+
+    def handle_startendtag(self, tag, attrs):
+        pos = self._token_start()
+        self._pending.append(self._add(_Node('element', tag, dict(attrs), parent=self._stack[-1], start=pos)))
+
+    def handle_endtag(self, tag):
+        pos = self._token_start()
+        if not self._open[tag]:
+            return
+        while True:
+            node = self._stack.pop()
+            self._open[node.name] -= 1
+            if node.name == tag:
+                self._pending.append(node)
+                return
+            # Closed implicitly by an outer end tag
+            node.end = pos
+
+    def handle_data(self, data):
+        pos = self._token_start()
+        siblings = self._stack[-1].children
+        if siblings and siblings[-1] is self._last_data and siblings[-1].end == pos:
+            # The tokenizer can split one text run (e.g. around a stray '<')
+            node = siblings[-1]
+            node.text += data
+        else:
+            node = self._add(_Node('string', text=data, parent=self._stack[-1], start=pos))
+        self._pending.append(node)
+        self._last_data = node
+
+    def handle_comment(self, data):
+        pos = self._token_start()
+        self._pending.append(self._add(_Node('comment', text=data, parent=self._stack[-1], start=pos)))
+
+    def _handle_declaration(self, data):
+        pos = self._token_start()
+        if data.startswith('CDATA['):
+            data = data[len('CDATA['):]
+        self._pending.append(self._add(_Node('string', text=data, parent=self._stack[-1], start=pos)))
+
+    handle_decl = handle_pi = unknown_decl = _handle_declaration
+
+    def build(self) -> _Node:
+        self.feed(self.source)
+        self.close()
+        for node in self._pending + self._stack[1:]:
+            node.end = len(self.source)
+        return self.root
+
+
+class HtmlDocument:
+    """One version of an HTML file together with its editable and removable element index."""
+
+    def __init__(self, path: str, source: str, stat: os.stat_result):
+        self.path = path
+        self.source = source
+        self._version = (stat.st_size, stat.st_mtime_ns)
+        self._index()
+
+    @property
+    def editable(self) -> Dict[str, Dict[str, Any]]:
+        if self._stale:
+            self._index()
+        return self._editable
+
+    @property
+    def removable(self) -> Dict[str, _Span]:
+        if self._stale:
+            self._index()
+        return self._removable
+
+    def is_current(self, stat: os.stat_result) -> bool:
+        return self._version == (stat.st_size, stat.st_mtime_ns)
+
+    def _index(self) -> None:
+        # element ID -> entry; an entry's 'text_span' is what edits replace, its 'span' what deletes remove
+        self._editable: Dict[str, Dict[str, Any]] = {}
+        self._removable: Dict[str, _Span] = {}
+        self._build_index(_TreeBuilder(self.source).build())
+        self._stale = False
+
+    def _span(self, spans: Dict[Tuple[int, bool], _Span], node: _Node, core: bool = False) -> _Span:
+        """The tracked span of a node, or with ``core`` of a string leaf without its surrounding whitespace.
+
+        Every entry referring to the same node shares one span.
+        """
+        key = (id(node), core)
+        span = spans.get(key)
+        if span is None:
+            start, end = node.start, node.end
+            if core:
+                raw = self.source[start:end]
+                start, end = start + len(raw) - len(raw.lstrip()), start + len(raw.rstrip())
+                end = max(start, end)
+            span = spans[key] = _Span(start, end)
+        return span
+
+    def _add_editable(self, tag: str, text: str, text_span: _Span, span: _Span, raw_text: bool) -> None:
+        element_id = f"editable-{len(self._editable)}"
+        self._editable[element_id] = {
+            'tag': tag, 'text': text, 'text_span': text_span, 'span': span, 'raw_text': raw_text,
+        }
+
+    def _build_index(self, root: _Node) -> None:
+        # Same walk as inject_editor_functionality, so the IDs line up with the editor page
+        spans: Dict[Tuple[int, bool], _Span] = {}
+        text_elements = set(TEXT_ELEMENTS + ['div'])
+        stack = list(reversed(root.children))
+        while stack:
+            element = stack.pop()
+            if element.kind != 'element':
+                continue
+            stack.extend(reversed(element.children))
+
+            if element.name == 'div':
+                classes = (element.attrs.get('class') or '').split()
+                if not EDITOR_CONTROL_CLASSES.intersection(classes):
+                    self._removable[f"div-{len(self._removable)}"] = self._span(spans, element)
+            if element.name not in text_elements:
+                continue
+            # Skip elements that only contain comments
+            if all(child.kind == 'comment' or (child.kind == 'string' and not child.text.strip())
+                   for child in element.children):
+                continue
+
+            leaf = element.string()
+            if leaf is not None and leaf.text.strip():
+                # Strategy 1: element with only text content
+                self._add_editable(element.name, leaf.text.strip(), self._span(spans, leaf, core=True),
+                                   self._span(spans, element), leaf.parent.name in RAW_TEXT_ELEMENTS)
+                continue
+
+            # Strategy 2: mixed content, each raw text node is editable on its own
+            for child in element.children:
+                if child.kind == 'string' and child.text.strip():
+                    core = self._span(spans, child, core=True)
+                    self._add_editable('text-node', child.text.strip(), core, core, False)
+
+    def editable_elements(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                'id': element_id,
+                'tag': entry['tag'],
+                'text': entry['text'],
+                'selector': f'[data-editable-id="{element_id}"]',
+                'innerHTML': entry['text'],
+            }
+            for element_id, entry in self.editable.items()
+        ]
+
+    def replace_text(self, element_id: str, new_text: str) -> None:
+        entry = self.editable[element_id]
+        replacement = new_text if entry['raw_text'] else html.escape(new_text, quote=False)
+        target = entry['text_span']
+        start, end = target.start, target.end
+        self._patch(target, replacement)
+
+        text = new_text.strip()
+        if not text or (entry['raw_text'] and '</' in new_text):
+            # Emptying a text node, or ending its script or style early, can
+            # change which elements are editable
+            self._stale = True
+            return
+        delta = len(replacement) - (end - start)
+        for span in self._spans():
+            if span is target:
+                continue
+            if span.start >= end:
+                span.start += delta
+            if span.end >= end:
+                span.end += delta
+        target.start = start + len(replacement) - len(replacement.lstrip())
+        target.end = target.start + len(replacement.strip())
+        for other in self._editable.values():
+            if other['text_span'] is target:
+                other['text'] = text
+
+    def delete(self, span: _Span) -> None:
+        self._patch(span, '')
+        # Renumber like the editor page will when it reloads the file
+        self._stale = True
+
+    def _spans(self) -> List[_Span]:
+        """Every tracked span once; entries referring to the same node share one."""
+        spans = {id(span): span for span in self._removable.values()}
+        for entry in self._editable.values():
+            spans[id(entry['text_span'])] = entry['text_span']
+            spans[id(entry['span'])] = entry['span']
+        return list(spans.values())
+
+    def _patch(self, target: _Span, replacement: str) -> None:
+        self.source = self.source[:target.start] + replacement + self.source[target.end:]
+        self._write()
+
+    def _write(self) -> None:
+        directory, name = os.path.split(self.path)
+        tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                f.write(self.source)
+            os.chmod(tmp_path, os.stat(self.path).st_mode & 0o7777)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        stat = os.stat(self.path)
+        self._version = (stat.st_size, stat.st_mtime_ns)
+
+
+_documents: "OrderedDict[str, HtmlDocument]" = OrderedDict()
+
+
+def load_document(path: str) -> HtmlDocument:
+    """Return the indexed document for ``path``, re-parsing only if the file changed since it was cached."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    document = _documents.get(path)
+    if document is None or not document.is_current(stat):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            source = f.read()
+        document = HtmlDocument(path, source, stat)
+        _documents[path] = document
+    _documents.move_to_end(path)
+    while len(_documents) > MAX_CACHED_DOCUMENTS:
+        _documents.popitem(last=False)
+    return document
+
+
+def parse_selector(selector: str) -> Tuple[Optional[str], str]:
+    """Split ``[data-editable-id="…"]`` / ``[data-removable-id="…"]`` into the attribute kind and ID."""
+    for kind in ('editable', 'removable'):
+        prefix = f'[data-{kind}-id="'
+        if prefix in selector:
+            return kind, selector.replace(prefix, '').replace('"]', '')
+    return None, selector
@@ -15,10 +15,8 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
 
-try:
-    from playwright.async_api import async_playwright
-except ImportError:
-    raise ImportError("Playwright is not installed. Please install it with: pip install playwright")
+from browser_pool import browser_pool, BrowserPool, BrowserPoolBusyError
+from render_cache import SlideRenderCache, slide_key, PDF_RENDERER_VERSION
 
 try:
     from PyPDF2 import PdfWriter, PdfReader
@@ -48,9 +46,11 @@ class ConvertResponse(BaseModel):
 
 
 class PresentationToPDFAPI:
-    def __init__(self, presentation_dir: str):
+    def __init__(self, presentation_dir: str, pool: BrowserPool = browser_pool):
         """Initialize the converter with presentation directory."""
         self.presentation_dir = Path(presentation_dir).resolve()
+        self.pool = pool
+        self.render_cache = SlideRenderCache(self.presentation_dir, "pdf")
         self.metadata_path = self.presentation_dir / "metadata.json"
         self.metadata = None
         self.slides_info = []
@@ -106,16 +106,13 @@ class PresentationToPDFAPI:
         except Exception as e:
             raise ValueError(f"Error loading metadata: {e}")
     
-    async def render_slide_to_pdf(self, browser, slide_info: Dict, temp_dir: Path) -> Path:
+    async def render_slide_to_pdf(self, page, slide_info: Dict, temp_dir: Path) -> Path:
         """Render a single HTML slide to PDF using Playwright."""
         html_path = slide_info['path']
         slide_num = slide_info['number']
         
         print(f"Rendering slide {slide_num}: {slide_info['title']}")
         
-        # Create new page with exact presentation dimensions
-        page = await browser.new_page()
-        
         try:
             # Set exact viewport to 1920x1080
             await page.set_viewport_size({"width": 1920, "height": 1080})
@@ -176,8 +173,17 @@ class PresentationToPDFAPI:
             
         except Exception as e:
             raise RuntimeError(f"Error rendering slide {slide_num}: {e}")
-        finally:
-            await page.close()
+    
+    async def render_slide_with_pool(self, slide_info: Dict, temp_dir: Path) -> Path:
+        """Return the slide's cached PDF page, rendering it on a pooled page if it changed."""
+        cache_key = slide_info['cache_key']
+        cached_pdf = self.render_cache.get_pdf(cache_key)
+        if cached_pdf:
+            return cached_pdf
+        
+        async with self.pool.page() as page:
+            rendered_pdf = await self.render_slide_to_pdf(page, slide_info, temp_dir)
+        return self.render_cache.put_pdf(cache_key, rendered_pdf)
     
     def combine_pdfs(self, pdf_paths: List[Path], output_path: Path) -> None:
         """Combine multiple PDF files into a single PDF."""
@@ -213,43 +219,29 @@ class PresentationToPDFAPI:
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
             
-            # Launch browser
-            async with async_playwright() as p:
-                print("🌐 Launching browser...")
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-gpu',
-                        '--force-device-scale-factor=1',
-                        '--disable-background-timer-throttling'
-                    ]
-                )
-                
-                try:
-                    # Process all slides concurrently using asyncio.gather
-                    print(f"📄 Processing {len(self.slides_info)} slides concurrently...")
-                    
-                    tasks = [
-                        self.render_slide_to_pdf(browser, slide_info, temp_path)
-                        for slide_info in self.slides_info
-                    ]
-                    
-                    # Wait for all slides to be processed concurrently
-                    pdf_paths = await asyncio.gather(*tasks)
-                    
-                finally:
-                    await browser.close()
+            for slide_info in self.slides_info:
+                slide_info['cache_key'] = slide_key(slide_info['path'], PDF_RENDERER_VERSION)
+            
+            # Process all slides concurrently; the pool bounds how many pages render at once
+            print(f"📄 Processing {len(self.slides_info)} slides concurrently...")
+            
+            tasks = [
+                self.render_slide_with_pool(slide_info, temp_path)
+                for slide_info in self.slides_info
+            ]
+            
+            # Wait for all slides to be processed concurrently
+            pdf_paths = await asyncio.gather(*tasks)
+            
+            print(f"🗂️ Render cache: {self.render_cache.hits} reused, {self.render_cache.misses} rendered")
+            self.render_cache.prune(slide_info['cache_key'] for slide_info in self.slides_info)
             
             # Create output path
             presentation_name = self.metadata.get('presentation_name', 'presentation')
             temp_output_path = temp_path / f"{presentation_name}.pdf"
             
-            # Combine all PDFs (sort by slide number to maintain order)
-            sorted_pdf_paths = sorted(pdf_paths, key=lambda p: int(p.stem.split('_')[1]))
-            self.combine_pdfs(sorted_pdf_paths, temp_output_path)
+            # Combine all PDFs (gather keeps the slide order)
+            self.combine_pdfs(pdf_paths, temp_output_path)
             
             if store_locally:
                 # Store in the static files directory for URL serving
@@ -312,6 +304,8 @@ async def convert_presentation_to_pdf(request: ConvertRequest):
         raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except BrowserPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         print(f"❌ Conversion error: {e}")
         raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
@@ -320,4 +314,4 @@ async def convert_presentation_to_pdf(request: ConvertRequest):
 @router.get("/health")
 async def pdf_health_check():
     """PDF service health check endpoint."""
-    return {"status": "healthy", "service": "HTML to PDF Converter"}
\ No newline at end of file
+    return {"status": "healthy", "service": "HTML to PDF Converter", "browser_pool": browser_pool.stats()}
\ No newline at end of file
@@ -13,16 +13,14 @@ from pathlib import Path
 from typing import Dict, List, Optional
 import tempfile
 import shutil
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
 
-try:
-    from playwright.async_api import async_playwright
-except ImportError:
-    raise ImportError("Playwright is not installed. Please install it with: pip install playwright")
+from browser_pool import browser_pool, BrowserPool, BrowserPoolBusyError
+from render_cache import SlideRenderCache, slide_key, PPTX_RENDERER_VERSION
 
 try:
     from pptx import Presentation
@@ -128,9 +126,11 @@ class CSSParser:
 
 
 class OptimizedHTMLToPPTXConverter:
-    def __init__(self, presentation_dir: str):
+    def __init__(self, presentation_dir: str, pool: BrowserPool = browser_pool):
         """Initialize the optimized converter."""
         self.presentation_dir = Path(presentation_dir).resolve()
+        self.pool = pool
+        self.render_cache = SlideRenderCache(self.presentation_dir, "pptx")
         self.metadata_path = self.presentation_dir / "metadata.json"
         self.metadata = None
         self.slides_info = []
@@ -190,6 +190,12 @@ class OptimizedHTMLToPPTXConverter:
         """Extract all visual elements (non-text) as individual images with positioning."""
         visual_elements = []
         
+        def handle_console(msg):
+            print(f"BROWSER CONSOLE: {msg.text}")
+
+        # Pages are reused across slides, so the listener is removed again below
+        page.on("console", handle_console)
+        
         try:
             # Set viewport and load HTML
             await page.set_viewport_size({"width": 1920, "height": 1080})
@@ -200,11 +206,6 @@ class OptimizedHTMLToPPTXConverter:
             await page.goto(file_url, wait_until="networkidle", timeout=25000)
             await page.wait_for_timeout(1000)
             
-            def handle_console(msg):
-                print(f"BROWSER CONSOLE: {msg.text}")
-
-            page.on("console", handle_console)
-            
             # Step 1: First extract icons BEFORE making text transparent
             icon_data = await page.evaluate(r"""
                 () => {
@@ -767,7 +768,10 @@ class OptimizedHTMLToPPTXConverter:
                 """)
             except:
                 pass
-            return []
+            # Raised rather than returned empty, so the caller does not cache a transient failure
+            raise
+        finally:
+            page.remove_listener("console", handle_console)
 
     async def capture_clean_background(self, page, html_path: Path, temp_dir: Path, visual_elements: List[Dict]) -> Path:
         """Capture the clean background with visual elements temporarily hidden."""
@@ -863,12 +867,16 @@ class OptimizedHTMLToPPTXConverter:
             return background_path
             
         except Exception as e:
-            # Create a simple white background as fallback
-            from PIL import Image
-            background_path = temp_dir / f"clean_background_{html_path.stem}.png"
-            blank_bg = Image.new('RGB', (1920, 1080), color='white')
-            blank_bg.save(background_path)
-            return background_path
+            print(f"Background capture failed: {e}")
+            raise
+    
+    def blank_background(self, html_path: Path, temp_dir: Path) -> Path:
+        """A plain white background, used when the clean background could not be captured."""
+        from PIL import Image
+        background_path = temp_dir / f"clean_background_{html_path.stem}.png"
+        blank_bg = Image.new('RGB', (1920, 1080), color='white')
+        blank_bg.save(background_path)
+        return background_path
     
     async def extract_text_elements(self, page, html_path: Path) -> List[TextElement]:
         """Extract all text elements with precise positioning for editable text boxes."""
@@ -1076,8 +1084,9 @@ class OptimizedHTMLToPPTXConverter:
             
             return text_elements
             
-        except Exception:
-            return []
+        except Exception as e:
+            print(f"Text element extraction failed: {e}")
+            raise
     
     def create_text_box(self, slide, text_element: TextElement) -> None:
         """Create an editable text box in PowerPoint with exact positioning and enhanced styling."""
@@ -1245,131 +1254,114 @@ class OptimizedHTMLToPPTXConverter:
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
             
-            # Launch browser for processing
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-gpu',
-                        '--force-device-scale-factor=1',
-                        '--disable-background-timer-throttling',
-                        '--disable-backgrounding-occluded-windows',
-                        '--disable-renderer-backgrounding',
-                        '--disable-features=VizDisplayCompositor',
-                        '--disable-extensions',
-                        '--disable-plugins',
-                        '--disable-web-security',
-                        '--disable-features=TranslateUI',
-                        '--disable-ipc-flooding-protection'
-                    ]
-                )
+            async def process_single_slide(slide_info: Dict) -> Dict:
+                """Process a single slide on a page borrowed from the browser pool."""
+                cache_key = slide_info['cache_key']
+                cached = self.render_cache.get_analysis(cache_key)
+                if cached:
+                    return {
+                        'slide_info': slide_info,
+                        'visual_elements': cached['visual_elements'],
+                        'background_path': cached['background_path'],
+                        'text_elements': [TextElement(**element) for element in cached['text_elements']]
+                    }
                 
-                try:
-                    # Process all slides in parallel
-                    # Create semaphore to limit concurrent operations
-                    semaphore = asyncio.Semaphore(5)
-                    context = await browser.new_context(
-                        viewport={'width': 1920, 'height': 1080}
-                    )
-                    
-                    context = await browser.new_context(
-                        viewport={'width': 1920, 'height': 1080}
-                    )
-                    
-                    async def process_single_slide(slide_info: Dict) -> Dict:
-                        """Process a single slide with controlled concurrency."""
-                        async with semaphore:
-                            slide_num = slide_info['number']
-                            
-                            try:
-                                # Create a new page for this slide
-                                page = await context.new_page()
-                                
-                                # Set exact viewport dimensions
-                                await page.set_viewport_size({"width": 1920, "height": 1080})
-                                await page.emulate_media(media='screen')
-                                
-                                # Force device pixel ratio to 1
-                                await page.evaluate(r"""
-                                    () => {
-                                        Object.defineProperty(window, 'devicePixelRatio', {
-                                            get: () => 1
-                                        });
-                                    }
-                                """)
-                                
-                                try:
-                                    # Extract visual elements
-                                    visual_elements = await self.extract_visual_elements(page, slide_info['path'], temp_path)
-                                    
-                                    # Capture clean background
-                                    background_path = await self.capture_clean_background(page, slide_info['path'], temp_path, visual_elements)
-                                    
-                                    # Extract text elements
-                                    text_elements = await self.extract_text_elements(page, slide_info['path'])
-                                    
-                                    slide_analysis = {
-                                        'slide_info': slide_info,
-                                        'visual_elements': visual_elements,
-                                        'background_path': background_path,
-                                        'text_elements': text_elements
-                                    }
-                                    
-                                    return slide_analysis
-                                    
-                                except Exception as e:
-                                    return {
-                                        'slide_info': slide_info,
-                                        'visual_elements': [],
-                                        'background_path': None,
-                                        'text_elements': [],
-                                        'error': str(e)
-                                    }
-                                    
-                                finally:
-                                    # Always close the page to free memory
-                                    await page.close()
-                                    
-                            except Exception as e:
-                                return {
-                                    'slide_info': slide_info,
-                                    'visual_elements': [],
-                                    'background_path': None,
-                                    'text_elements': [],
-                                    'error': f"Page creation failed: {str(e)}"
-                                }
-                    
-                    # Launch ALL slides in parallel
-                    parallel_tasks = [
-                        process_single_slide(slide_info) 
-                        for slide_info in self.slides_info
-                    ]
-                    
-                    # Wait for ALL slides to complete in parallel
-                    slide_analyses = await asyncio.gather(*parallel_tasks, return_exceptions=True)
-                    
-                    # Handle any top-level exceptions
-                    processed_analyses = []
-                    for i, result in enumerate(slide_analyses):
-                        if isinstance(result, Exception):
-                            error_analysis = {
-                                'slide_info': self.slides_info[i],
-                                'visual_elements': [],
-                                'background_path': None,
-                                'text_elements': [],
-                                'error': str(result)
+                async with self.pool.page() as page:
+                    try:
+                        # Set exact viewport dimensions
+                        await page.set_viewport_size({"width": 1920, "height": 1080})
+                        await page.emulate_media(media='screen')
+                        
+                        # Force device pixel ratio to 1
+                        await page.evaluate(r"""
+                            () => {
+                                Object.defineProperty(window, 'devicePixelRatio', {
+                                    get: () => 1
+                                });
                             }
-                            processed_analyses.append(error_analysis)
-                        else:
-                            processed_analyses.append(result)
-                    
-                    all_slide_analyses = processed_analyses
-                    
-                finally:
-                    await browser.close()
+                        """)
+                        
+                        # A step that fails falls back to an empty result for this
+                        # conversion only; a degraded analysis is never cached
+                        degraded = False
+                        
+                        # Extract visual elements
+                        try:
+                            visual_elements = await self.extract_visual_elements(page, slide_info['path'], temp_path)
+                        except Exception:
+                            visual_elements, degraded = [], True
+                        
+                        # Capture clean background
+                        try:
+                            background_path = await self.capture_clean_background(page, slide_info['path'], temp_path, visual_elements)
+                        except Exception:
+                            background_path, degraded = self.blank_background(slide_info['path'], temp_path), True
+                        
+                        # Extract text elements
+                        try:
+                            text_elements = await self.extract_text_elements(page, slide_info['path'])
+                        except Exception:
+                            text_elements, degraded = [], True
+                        
+                        slide_analysis = {
+                            'slide_info': slide_info,
+                            'visual_elements': visual_elements,
+                            'background_path': background_path,
+                            'text_elements': text_elements
+                        }
+                        
+                        if not degraded:
+                            self.render_cache.put_analysis(
+                                cache_key,
+                                visual_elements,
+                                background_path,
+                                [asdict(text_element) for text_element in text_elements]
+                            )
+                        
+                        return slide_analysis
+                        
+                    except Exception as e:
+                        return {
+                            'slide_info': slide_info,
+                            'visual_elements': [],
+                            'background_path': None,
+                            'text_elements': [],
+                            'error': str(e)
+                        }
+            
+            for slide_info in self.slides_info:
+                slide_info['cache_key'] = slide_key(slide_info['path'], PPTX_RENDERER_VERSION)
+            
+            # Launch ALL slides in parallel; the pool bounds how many pages render at once
+            parallel_tasks = [
+                process_single_slide(slide_info) 
+                for slide_info in self.slides_info
+            ]
+            
+            # Wait for ALL slides to complete in parallel
+            slide_analyses = await asyncio.gather(*parallel_tasks, return_exceptions=True)
+            
+            # Handle any top-level exceptions
+            processed_analyses = []
+            for i, result in enumerate(slide_analyses):
+                if isinstance(result, BrowserPoolBusyError):
+                    raise result
+                if isinstance(result, Exception):
+                    error_analysis = {
+                        'slide_info': self.slides_info[i],
+                        'visual_elements': [],
+                        'background_path': None,
+                        'text_elements': [],
+                        'error': str(result)
+                    }
+                    processed_analyses.append(error_analysis)
+                else:
+                    processed_analyses.append(result)
+            
+            all_slide_analyses = processed_analyses
+            
+            print(f"🗂️ Render cache: {self.render_cache.hits} reused, {self.render_cache.misses} rendered")
+            self.render_cache.prune(slide_info['cache_key'] for slide_info in self.slides_info)
             
             # Build PPTX presentation
             # Create new PowerPoint presentation
@@ -1496,6 +1488,8 @@ async def convert_presentation_to_pptx(request: ConvertRequest):
         raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except BrowserPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PPTX conversion failed: {str(e)}")
 
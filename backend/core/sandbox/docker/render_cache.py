@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Slide Render Cache
+
+Stores each slide's rendered output under a key derived from the slide HTML,
+the local assets it references and the renderer version, so that converting a
+deck only re-renders the slides that actually changed.
+
+Entries live next to the deck in ``<presentation>/.render_cache/<kind>/`` and
+are pruned down to the deck's current slides after every conversion. Bump the
+matching ``*_RENDERER_VERSION`` whenever a renderer's output changes so stale
+entries are never reused.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+
+PDF_RENDERER_VERSION = "pdf-1"
+PPTX_RENDERER_VERSION = "pptx-1"
+
+CACHE_DIR_NAME = ".render_cache"
+# Staging directories younger than this may belong to a conversion in flight
+STAGING_GRACE_SECONDS = 600
+
+_ASSET_REF_RE = re.compile(
+    r"""(?:src|href)\s*=\s*["']([^"']+)["']|url\(\s*["']?([^"')]+)["']?\s*\)""",
+    re.IGNORECASE,
+)
+
+# (path, size, mtime_ns) -> sha256, so unchanged assets are only read once per process
+_asset_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def _file_digest(path: Path) -> str:
+    stat = path.stat()
+    memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    digest = _asset_digests.get(memo_key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        _asset_digests[memo_key] = digest
+    return digest
+
+
+def _local_asset_paths(html: str, html_path: Path) -> Iterable[Path]:
+    """Resolve the local files an HTML slide references via src, href or url()."""
+    seen = set()
+    for match in _ASSET_REF_RE.finditer(html):
+        ref = (match.group(1) or match.group(2) or '').strip()
+        if not ref or ref.startswith('#'):
+            continue
+
+        parsed = urlparse(ref)
+        if parsed.scheme == 'file':
+            candidate = Path(unquote(parsed.path))
+        elif parsed.scheme or ref.startswith('//'):
+            # Remote and data: URLs are not part of the workspace
+            continue
+        else:
+            candidate = html_path.parent / unquote(parsed.path)
+
+        try:
+            candidate = candidate.resolve()
+        except OSError:
+            continue
+        if candidate in seen or not candidate.is_file():
+            continue
+        seen.add(candidate)
+        yield candidate
+
+
+def slide_key(html_path: Path, renderer_version: str) -> str:
+    """Hash a slide's HTML, its referenced local assets and the renderer version."""
+    html_bytes = html_path.read_bytes()
+    hasher = hashlib.sha256()
+    hasher.update(renderer_version.encode())
+    hasher.update(b'\0')
+    hasher.update(html_bytes)
+
+    html = html_bytes.decode('utf-8', errors='ignore')
+    for asset_path in sorted(_local_asset_paths(html, html_path)):
+        hasher.update(b'\0')
+        hasher.update(str(asset_path).encode())
+        hasher.update(_file_digest(asset_path).encode())
+
+    return hasher.hexdigest()
+
+
+class SlideRenderCache:
+    def __init__(self, presentation_dir: Path, kind: str):
+        self.root = Path(presentation_dir) / CACHE_DIR_NAME / kind
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def _publish(self, staging_dir: Path, key: str) -> Path:
+        """Atomically move a fully written staging directory into place."""
+        entry_dir = self._entry_dir(key)
+        try:
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            # Another conversion stored the same key first; keep its entry.
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return entry_dir
+
+    def _staging_dir(self, key: str) -> Path:
+        staging_dir = self.root / f".tmp-{key}-{uuid.uuid4().hex[:8]}"
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        return staging_dir
+
+    # ---- PDF pages ----
+
+    def get_pdf(self, key: str) -> Optional[Path]:
+        pdf_path = self._entry_dir(key) / "slide.pdf"
+        if pdf_path.exists():
+            self.hits += 1
+            return pdf_path
+        self.misses += 1
+        return None
+
+    def put_pdf(self, key: str, rendered_pdf: Path) -> Path:
+        staging_dir = self._staging_dir(key)
+        shutil.copy2(rendered_pdf, staging_dir / "slide.pdf")
+        return self._publish(staging_dir, key) / "slide.pdf"
+
+    # ---- PPTX slide analyses ----
+
+    def get_analysis(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached slide analysis with image paths pointing into the cache."""
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(entry_dir / "analysis.json", 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        for element in data['visual_elements']:
+            element['image_path'] = entry_dir / element['image_path']
+        if data['background_path']:
+            data['background_path'] = entry_dir / data['background_path']
+        self.hits += 1
+        return data
+
+    def put_analysis(self, key: str, visual_elements: list, background_path: Optional[Path], text_elements: list) -> None:
+        """Store a slide analysis, copying every referenced image into the entry.
+
+        ``text_elements`` must already be JSON-serializable dicts.
+        """
+        staging_dir = self._staging_dir(key)
+        stored_elements = []
+        for i, element in enumerate(visual_elements):
+            if not Path(element['image_path']).exists():
+                continue
+            image_name = f"visual_{i:03d}.png"
+            shutil.copy2(element['image_path'], staging_dir / image_name)
+            stored_elements.append({**element, 'image_path': image_name})
+
+        stored_background = None
+        if background_path and Path(background_path).exists():
+            stored_background = "background.png"
+            shutil.copy2(background_path, staging_dir / stored_background)
+
+        with open(staging_dir / "analysis.json", 'w', encoding='utf-8') as f:
+            json.dump({
+                'visual_elements': stored_elements,
+                'background_path': stored_background,
+                'text_elements': text_elements,
+            }, f)
+        self._publish(staging_dir, key)
+
+    # ---- housekeeping ----
+
+    def prune(self, keep: Iterable[str]) -> None:
+        """Drop every entry that no longer belongs to a slide in the deck."""
+        if not self.root.exists():
+            return
+        keep = set(keep)
+        staging_cutoff = time.time() - STAGING_GRACE_SECONDS
+        for entry in self.root.iterdir():
+            if entry.name in keep:
+                continue
+            if entry.name.startswith(".tmp-") and entry.stat().st_mtime > staging_cutoff:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
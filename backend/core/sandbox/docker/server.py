@@ -9,6 +9,7 @@ from pathlib import Path
 from html_to_pdf_router import router as pdf_router
 from visual_html_editor_router import router as editor_router
 from html_to_pptx_router import router as pptx_router
+from browser_pool import browser_pool
 
 # Ensure we're serving from the /workspace directory
 workspace_dir = "/workspace"
@@ -24,6 +25,9 @@ class WorkspaceDirMiddleware(BaseHTTPMiddleware):
 app = FastAPI()
 app.add_middleware(WorkspaceDirMiddleware)
 
+# Close the shared Chromium used by the PDF/PPTX converters on shutdown
+app.add_event_handler("shutdown", browser_pool.close)
+
 # Include routers
 app.include_router(pdf_router)
 app.include_router(editor_router)
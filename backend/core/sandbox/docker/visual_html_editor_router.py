@@ -16,28 +16,14 @@ from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from bs4 import BeautifulSoup, NavigableString, Comment
 
+from html_dom_cache import TEXT_ELEMENTS, load_document, parse_selector
+
 # Create router
 router = APIRouter(prefix="/api/html", tags=["visual-editor"])
 
 # Use /workspace as the default workspace directory
 workspace_dir = "/workspace"
 
-# All text elements that should be editable
-TEXT_ELEMENTS = [
-    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',  # Headings
-    'p',  # Paragraphs
-    'span', 'strong', 'em', 'b', 'i', 'u',  # Inline text formatting
-    'small', 'mark', 'del', 'ins', 'sub', 'sup',  # Text modifications
-    'code', 'kbd', 'samp', 'var', 'pre',  # Code and preformatted text
-    'blockquote', 'cite', 'q',  # Quotes and citations
-    'abbr', 'dfn', 'time', 'data',  # Semantic text
-    'address', 'figcaption', 'caption',  # Descriptive text
-    'th', 'td',  # Table cells
-    'dt', 'dd',  # Definition lists
-    'li',  # List items
-    'label', 'legend',  # Form text
-]
-
 
 class EditTextRequest(BaseModel):
     file_path: str
@@ -67,88 +53,11 @@ async def get_editable_elements(file_path: str):
         if not os.path.exists(full_path):
             raise HTTPException(status_code=404, detail="File not found")
         
-        with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        soup = BeautifulSoup(content, 'html.parser')
-        elements = []
-        
-        editable_counter = 0
-        
-        # Find all elements that could contain text
-        all_elements = soup.find_all(TEXT_ELEMENTS + ['div'])
-        
-        # Filter out elements that only contain comments
-        filtered_elements = []
-        for element in all_elements:
-            # Check if element only contains comments
-            only_comments = True
-            for child in element.children:
-                if isinstance(child, Comment):
-                    continue
-                if isinstance(child, NavigableString) and not child.strip():
-                    continue
-                only_comments = False
-                break
-                
-            if not only_comments:
-                filtered_elements.append(element)
-                
-        all_elements = filtered_elements
-        
-        for element in all_elements:
-            # Strategy 1: Elements with ONLY text content (no child elements)
-            if element.string and element.string.strip():
-                element_id = f"editable-{editable_counter}"
-                element['data-editable-id'] = element_id
-                element['class'] = element.get('class', []) + ['editable-element']
-                
-                elements.append({
-                    'id': element_id,
-                    'tag': element.name,
-                    'text': element.string.strip(),
-                    'selector': f'[data-editable-id="{element_id}"]',
-                    'innerHTML': element.string.strip()
-                })
-                editable_counter += 1
-            
-            # Strategy 2: Elements with mixed content - wrap raw text nodes individually
-            elif element.contents:
-                has_mixed_content = False
-                # Process each child node
-                for child in list(element.contents):  # Use list() to avoid modification during iteration
-                    # Skip comment nodes (Comments are a subclass of NavigableString)
-                    if isinstance(child, Comment):
-                        continue
-                    # Check if it's a NavigableString (raw text) with actual content
-                    if (isinstance(child, NavigableString) and child.strip()):
-                        
-                        # This is a raw text node with content
-                        text_content = child.strip()
-                        if text_content:
-                            # Create a wrapper span for the raw text
-                            wrapper_span = soup.new_tag('span')
-                            wrapper_span['data-editable-id'] = f"editable-{editable_counter}"
-                            wrapper_span['class'] = 'editable-element raw-text-wrapper'
-                            wrapper_span.string = text_content
-                            
-                            # Replace the text node with the wrapped span
-                            child.replace_with(wrapper_span)
-                            
-                            elements.append({
-                                'id': f"editable-{editable_counter}",
-                                'tag': 'text-node',
-                                'text': text_content,
-                                'selector': f'[data-editable-id="editable-{editable_counter}"]',
-                                'innerHTML': text_content
-                            })
-                            editable_counter += 1
-                            has_mixed_content = True
-                
-                # Removed fallback - prevents complex containers from becoming editable text
-        
-        return {"elements": elements}
+        document = load_document(full_path)
+        return {"elements": document.editable_elements()}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting editable elements: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -162,37 +71,27 @@ async def edit_text(request: EditTextRequest):
         if not os.path.exists(full_path):
             raise HTTPException(status_code=404, detail="File not found")
         
-        with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        soup = BeautifulSoup(content, 'html.parser')
+        document = load_document(full_path)
         
         # Extract element ID from selector
-        element_id = request.element_selector.replace('[data-editable-id="', '').replace('"]', '')
+        _, element_id = parse_selector(request.element_selector)
         
-        # Find the specific editable element by its data-editable-id
-        target_element = soup.find(attrs={'data-editable-id': element_id})
+        # IDs come from the index, which is renumbered after every write just like the editor page
+        target_element = document.editable.get(element_id)
         
         if not target_element:
             raise HTTPException(status_code=404, detail=f"Element with ID {element_id} not found")
         
-        print(f"🎯 Found element: {target_element.name} with ID {element_id} - '{target_element.get_text()[:50]}...'")
+        print(f"🎯 Found element: {target_element['tag']} with ID {element_id} - '{target_element['text'][:50]}...'")
         
-        # Simple replacement - whether it's a regular element or a wrapped text node
-        if target_element.string:
-            target_element.string.replace_with(request.new_text)
-        else:
-            # Clear content and add new text
-            target_element.clear()
-            target_element.string = request.new_text
-        
-        # Write back to file
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
+        # Patch only the element's text in the file
+        document.replace_text(element_id, request.new_text)
         
         print(f"✅ Successfully updated text in {request.file_path}: '{request.new_text}'")
         return {"success": True, "message": "Text updated successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error editing text: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -206,46 +105,35 @@ async def delete_element(request: DeleteElementRequest):
         if not os.path.exists(full_path):
             raise HTTPException(status_code=404, detail="File not found")
         
-        with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        soup = BeautifulSoup(content, 'html.parser')
+        document = load_document(full_path)
         
         # Handle both editable elements and removable divs
-        if '[data-editable-id="' in request.element_selector:
+        kind, element_id = parse_selector(request.element_selector)
+        if kind == 'editable':
             # Text element deletion
-            element_id = request.element_selector.replace('[data-editable-id="', '').replace('"]', '')
-            
-            # Find the specific editable element by its data-editable-id
-            target_element = soup.find(attrs={'data-editable-id': element_id})
-            
-            if not target_element:
-                raise HTTPException(status_code=404, detail=f"Element with ID {element_id} not found")
-                    
-        elif '[data-removable-id="' in request.element_selector:
+            target_element = document.editable.get(element_id)
+            span = target_element['span'] if target_element else None
+            description = f"{target_element['tag']} - '{target_element['text'][:50]}...'" if target_element else ''
+        elif kind == 'removable':
             # Div removal
-            element_id = request.element_selector.replace('[data-removable-id="', '').replace('"]', '')
-            
-            # Find the specific removable element by its data-removable-id
-            target_element = soup.find(attrs={'data-removable-id': element_id})
-            
-            if not target_element:
-                raise HTTPException(status_code=404, detail=f"Element with ID {element_id} not found")
+            span = document.removable.get(element_id)
+            description = f"div {element_id}"
         else:
             raise HTTPException(status_code=400, detail="Invalid element selector")
         
-        print(f"🗑️ Deleting element: {target_element.name} - '{target_element.get_text()[:50]}...'")
+        if span is None:
+            raise HTTPException(status_code=404, detail=f"Element with ID {element_id} not found")
         
-        # Remove element
-        target_element.decompose()
+        print(f"🗑️ Deleting element: {description}")
         
-        # Write back to file
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
+        # Cut the element out of the file
+        document.delete(span)
         
         print(f"🗑️ Successfully deleted element from {request.file_path}")
         return {"success": True, "message": "Element deleted successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error deleting element: {e}")
         raise HTTPException(status_code=500, detail=str(e))
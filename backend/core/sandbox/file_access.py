@@ -0,0 +1,337 @@
+"""
+Per-run file access layer for sandbox tools.
+
+Every sandbox tool in a run shares one ``SandboxFileAccess`` per sandbox (see
+``get_file_access``), which provides:
+
+- a content cache keyed by path and validated against the file's size and
+  modification time, so re-reading an unchanged file costs one metadata call
+  instead of a full download. A same-size rewrite within the mtime resolution
+  would slip past that check, so the cache is also dropped whenever a tool
+  that may write without going through this layer touches the sandbox
+- batched reads and writes that move many files through a single tar archive
+  and one shell command instead of one round trip per file
+- optional write deferral: writes made with ``defer=True`` are buffered and
+  uploaded together when the turn ends, when the buffer grows too large, or
+  as soon as a tool that does not go through this layer touches the sandbox.
+  ``flush`` raises ``DeferredWriteError`` for uploads that failed; failures of
+  the automatic flushes are kept until ``take_failed_writes`` hands them to
+  the next tool result, since the tools that made those writes have already
+  reported success
+"""
+
+import asyncio
+import io
+import os
+import shlex
+import tarfile
+import uuid
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from core.utils.logger import logger
+
+# Below this many files, individual fs calls beat the tar round trip
+BATCH_MIN_FILES = 3
+# Maximum files per tar batch, keeps the generated shell script bounded
+BATCH_MAX_FILES = 200
+# Flush deferred writes early once the buffer reaches either limit
+MAX_PENDING_FILES = 100
+MAX_PENDING_BYTES = 8 * 1024 * 1024
+EXEC_TIMEOUT = 120
+
+# thread_manager -> {sandbox_id: SandboxFileAccess}
+_registry: "weakref.WeakKeyDictionary[Any, Dict[str, SandboxFileAccess]]" = weakref.WeakKeyDictionary()
+
+
+class DeferredWriteError(Exception):
+    """Deferred writes that could not be uploaded; ``failed`` maps each path to its error."""
+
+    def __init__(self, failed: Dict[str, str]):
+        super().__init__(f"Failed to write {', '.join(failed)} to the sandbox")
+        self.failed = failed
+
+
+class SandboxFileAccess:
+    def __init__(self, sandbox, allow_deferred_writes: bool = True):
+        self.sandbox = sandbox
+        self.allow_deferred_writes = allow_deferred_writes
+        # path -> (size, mod_time, content)
+        self._cache: Dict[str, Tuple[int, str, bytes]] = {}
+        # path -> (content, permissions)
+        self._pending: Dict[str, Tuple[bytes, Optional[str]]] = {}
+        self._pending_bytes = 0
+        self._flush_lock = asyncio.Lock()
+        # path -> error, for failed automatic flushes not yet reported to a tool result
+        self._failed_writes: Dict[str, str] = {}
+
+    @property
+    def has_pending_writes(self) -> bool:
+        return bool(self._pending)
+
+    # ---- metadata ----
+
+    async def stat(self, path: str):
+        """Return the sandbox FileInfo for ``path``, or None if it does not exist."""
+        try:
+            return await self.sandbox.fs.get_file_info(path)
+        except Exception:
+            return None
+
+    async def exists(self, path: str) -> bool:
+        if path in self._pending:
+            return True
+        return await self.stat(path) is not None
+
+    async def list_dir(self, path: str) -> List[Any]:
+        """List a directory's entries (metadata only, no contents)."""
+        return await self.sandbox.fs.list_files(path)
+
+    # ---- reads ----
+
+    def _cached(self, path: str, info) -> Optional[bytes]:
+        entry = self._cache.get(path)
+        if entry is not None and info is not None and entry[0] == info.size and entry[1] == info.mod_time:
+            return entry[2]
+        return None
+
+    def _remember(self, path: str, info, content: bytes) -> None:
+        if info is not None:
+            self._cache[path] = (info.size, info.mod_time, content)
+
+    async def read(self, path: str) -> bytes:
+        """Read a file, serving it from the cache if it has not changed."""
+        if path in self._pending:
+            return self._pending[path][0]
+
+        info = await self.stat(path)
+        content = self._cached(path, info)
+        if content is not None:
+            return content
+
+        content = await self.sandbox.fs.download_file(path)
+        self._remember(path, info, content)
+        return content
+
+    async def read_many(self, paths: Iterable[str]) -> Dict[str, bytes]:
+        """Read several files, downloading every cache miss in as few round trips as possible.
+
+        Paths that do not exist are left out of the result.
+        """
+        paths = list(dict.fromkeys(paths))
+        results: Dict[str, bytes] = {}
+
+        to_check = []
+        for path in paths:
+            if path in self._pending:
+                results[path] = self._pending[path][0]
+            else:
+                to_check.append(path)
+
+        infos = await asyncio.gather(*(self.stat(path) for path in to_check))
+        misses = []
+        for path, info in zip(to_check, infos):
+            if info is None:
+                continue
+            content = self._cached(path, info)
+            if content is not None:
+                results[path] = content
+            else:
+                misses.append((path, info))
+
+        if len(misses) >= BATCH_MIN_FILES:
+            for start in range(0, len(misses), BATCH_MAX_FILES):
+                chunk = misses[start:start + BATCH_MAX_FILES]
+                downloaded = await self._download_batch([path for path, _ in chunk])
+                for path, info in chunk:
+                    if path in downloaded:
+                        results[path] = downloaded[path]
+                        self._remember(path, info, downloaded[path])
+        else:
+            downloads = await asyncio.gather(
+                *(self.sandbox.fs.download_file(path) for path, _ in misses),
+                return_exceptions=True
+            )
+            for (path, info), content in zip(misses, downloads):
+                if isinstance(content, Exception):
+                    logger.warning(f"Failed to read {path}: {str(content)}")
+                    continue
+                results[path] = content
+                self._remember(path, info, content)
+
+        return results
+
+    async def _download_batch(self, paths: List[str]) -> Dict[str, bytes]:
+        archive = f"/tmp/.sandbox-files-{uuid.uuid4().hex}.tar"
+        lines = ['d=$(mktemp -d)']
+        for i, path in enumerate(paths):
+            lines.append(f'cp {shlex.quote(path)} "$d/{i}" 2>/dev/null || true')
+        lines.append(f'tar -cf {shlex.quote(archive)} -C "$d" .')
+        lines.append('rm -rf "$d"')
+
+        response = await self.sandbox.process.exec(f"/bin/sh -c {shlex.quote(chr(10).join(lines))}", timeout=EXEC_TIMEOUT)
+        if response.exit_code != 0:
+            raise RuntimeError(f"Batch read failed: {response.result}")
+        try:
+            data = await self.sandbox.fs.download_file(archive)
+        finally:
+            await self._remove_quietly(archive)
+
+        results = {}
+        with tarfile.open(fileobj=io.BytesIO(data), mode='r:') as tar:
+            for member in tar.getmembers():
+                if not member.isfile():
+                    continue
+                index = os.path.basename(member.name)
+                if index.isdigit() and int(index) < len(paths):
+                    results[paths[int(index)]] = tar.extractfile(member).read()
+        return results
+
+    # ---- writes ----
+
+    async def write(self, path: str, content: bytes, permissions: Optional[str] = None, defer: bool = False) -> None:
+        """Write a file. With ``defer=True`` the upload is buffered until the next flush."""
+        if not (defer and self.allow_deferred_writes):
+            async with self._flush_lock:
+                self._drop_pending(path)
+                await self._upload_one(path, content, permissions)
+                self._remember(path, await self.stat(path), content)
+            return
+
+        self._drop_pending(path)
+        self._pending[path] = (content, permissions)
+        self._pending_bytes += len(content)
+        self._cache.pop(path, None)
+        if len(self._pending) >= MAX_PENDING_FILES or self._pending_bytes >= MAX_PENDING_BYTES:
+            await self.flush_and_record()
+
+    async def delete(self, path: str) -> None:
+        async with self._flush_lock:
+            self._drop_pending(path)
+        self._cache.pop(path, None)
+        await self.sandbox.fs.delete_file(path)
+
+    def _drop_pending(self, path: str) -> None:
+        pending = self._pending.pop(path, None)
+        if pending is not None:
+            self._pending_bytes -= len(pending[0])
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Forget cached contents for ``path``, or for every path."""
+        if path is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(path, None)
+
+    async def flush(self) -> None:
+        """Upload every deferred write, raising ``DeferredWriteError`` if any of them failed."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending, self._pending_bytes = self._pending, {}, 0
+            items = list(pending.items())
+            failed: Dict[str, str] = {}
+
+            try:
+                if len(items) < BATCH_MIN_FILES:
+                    for path, (content, permissions) in items:
+                        try:
+                            await self._upload_one(path, content, permissions)
+                        except Exception as upload_error:
+                            failed[path] = str(upload_error)
+                else:
+                    for start in range(0, len(items), BATCH_MAX_FILES):
+                        await self._upload_batch(items[start:start + BATCH_MAX_FILES])
+            except Exception as e:
+                logger.warning(f"Batched upload of {len(items)} files failed, uploading individually: {str(e)}")
+                for path, (content, permissions) in items:
+                    try:
+                        await self._upload_one(path, content, permissions)
+                    except Exception as upload_error:
+                        failed[path] = str(upload_error)
+
+            written = [(path, content) for path, (content, _) in items if path not in failed]
+            infos = await asyncio.gather(*(self.stat(path) for path, _ in written))
+            for (path, content), info in zip(written, infos):
+                self._remember(path, info, content)
+
+            logger.debug(f"Flushed {len(written)} of {len(items)} deferred sandbox writes")
+            if failed:
+                for path, error in failed.items():
+                    logger.error(f"Failed to write {path} to sandbox: {error}")
+                raise DeferredWriteError(failed)
+
+    async def flush_and_record(self) -> None:
+        """Flush on behalf of tools that already returned, keeping failures for the next tool result."""
+        try:
+            await self.flush()
+        except DeferredWriteError as e:
+            self._failed_writes.update(e.failed)
+
+    def take_failed_writes(self) -> Dict[str, str]:
+        """Return and forget the failures recorded by ``flush_and_record``."""
+        failed, self._failed_writes = self._failed_writes, {}
+        return failed
+
+    async def _upload_one(self, path: str, content: bytes, permissions: Optional[str]) -> None:
+        await self.sandbox.fs.upload_file(content, path)
+        if permissions:
+            await self.sandbox.fs.set_file_permissions(path, permissions)
+
+    async def _upload_batch(self, items: List[Tuple[str, Tuple[bytes, Optional[str]]]]) -> None:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:') as tar:
+            for i, (_, (content, _)) in enumerate(items):
+                info = tarfile.TarInfo(name=str(i))
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+
+        archive = f"/tmp/.sandbox-files-{uuid.uuid4().hex}.tar"
+        await self.sandbox.fs.upload_file(buffer.getvalue(), archive)
+
+        # Copy contents over existing files rather than extracting in place so
+        # that their ownership and mode are preserved.
+        lines = ['set -e', 'd=$(mktemp -d)', f'tar -xf {shlex.quote(archive)} -C "$d"']
+        for i, (path, (_, permissions)) in enumerate(items):
+            target = shlex.quote(path)
+            lines.append(f'mkdir -p {shlex.quote(os.path.dirname(path) or "/")}')
+            lines.append(f'cat "$d/{i}" > {target}')
+            if permissions:
+                lines.append(f'chmod {shlex.quote(permissions)} {target}')
+        lines.append(f'rm -rf "$d" {shlex.quote(archive)}')
+
+        response = await self.sandbox.process.exec(f"/bin/sh -c {shlex.quote(chr(10).join(lines))}", timeout=EXEC_TIMEOUT)
+        if response.exit_code != 0:
+            await self._remove_quietly(archive)
+            raise RuntimeError(f"Batch write failed: {response.result}")
+
+    async def _remove_quietly(self, path: str) -> None:
+        try:
+            await self.sandbox.fs.delete_file(path)
+        except Exception:
+            pass
+
+
+def get_file_access(sandbox, sandbox_id: str, thread_manager=None) -> SandboxFileAccess:
+    """Return the file access layer shared by all tools of a run for ``sandbox``.
+
+    Without a thread manager there is no turn boundary to flush at, so the
+    returned instance writes through immediately and is not shared.
+    """
+    if thread_manager is None:
+        return SandboxFileAccess(sandbox, allow_deferred_writes=False)
+
+    per_run = _registry.setdefault(thread_manager, {})
+    files = per_run.get(sandbox_id)
+    if files is None:
+        files = SandboxFileAccess(sandbox)
+        per_run[sandbox_id] = files
+        thread_manager.add_turn_end_hook(files.flush_and_record)
+    return files
+
+
+def peek_file_access(sandbox_id: str, thread_manager=None) -> Optional[SandboxFileAccess]:
+    """Return the run's existing file access layer for the sandbox, if any."""
+    if thread_manager is None:
+        return None
+    return _registry.get(thread_manager, {}).get(sandbox_id)
@@ -0,0 +1,194 @@
+"""
+Local stand-in for the sandbox's ``browserApi.ts`` server, for tests and
+latency benchmarks of the browser channel.
+
+Serves the routes the browser tool uses (health, init, navigate, act, extract,
+screenshot and run-actions) on a local port. Responses and per-route latencies
+are replayed from ``browser_api_recording.json``, which mirrors what
+browserApi.ts returns; the page's url and title are tracked so responses follow
+the requested navigation.
+
+The server speaks HTTP/1.1 with keep-alive and counts the TCP connections it
+accepts, so tests can assert on connection reuse. ``latency_scale`` scales the
+recorded latencies: 0 (the default) answers immediately, 1 replays them as
+recorded.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+RECORDING_PATH = Path(__file__).with_name("browser_api_recording.json")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs
+    # add ~40ms to every response on a reused connection
+    disable_nagle_algorithm = True
+    server: "_Server"
+
+    def setup(self):
+        super().setup()
+        with self.server.api.lock:
+            self.server.api.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        if self.server.api.unavailable:
+            status, content_type, payload = 502, "text/html", b"<html><body>Bad Gateway</body></html>"
+        else:
+            status, response = self.server.api.handle(method, self.path, body, dict(self.headers))
+            content_type, payload = "application/json", json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    api: "FakeBrowserAPI"
+
+
+class FakeBrowserAPI:
+    def __init__(self, latency_scale: float = 0.0, initialized: bool = False,
+                 recording_path: Path = RECORDING_PATH):
+        self.recording = json.loads(Path(recording_path).read_text())
+        self.latency_scale = latency_scale
+        self.initialized = initialized
+        # When set, every request gets the HTML error page a proxy serves for a dead upstream
+        self.unavailable = False
+        self.url = self.recording["start_url"]
+        self.connections = 0
+        # (method, path, body, headers) of every request, in arrival order
+        self.requests: List[Tuple[str, str, Any, Dict[str, str]]] = []
+        self.lock = threading.Lock()
+        self._server: Optional[_Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- lifecycle ----
+
+    def start(self) -> "FakeBrowserAPI":
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.api = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeBrowserAPI":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def crash(self) -> None:
+        """Simulate the browser going away; the next action reports it is not initialized."""
+        self.initialized = False
+
+    def paths(self) -> List[str]:
+        return [f"{method} {path}" for method, path, _, _ in self.requests]
+
+    # ---- request handling ----
+
+    def _title(self) -> str:
+        return self.recording["titles"].get(self.url, self.url)
+
+    def _replay(self, route: str, **fields) -> Dict[str, Any]:
+        entry = self.recording["routes"][route]
+        time.sleep(entry["latency_ms"] / 1000 * self.latency_scale)
+        return {
+            key: value.format(**fields) if isinstance(value, str) else value
+            for key, value in entry["response"].items()
+        }
+
+    def _page_state(self) -> Dict[str, Any]:
+        return {"url": self.url, "title": self._title(), "screenshot_base64": self.recording["screenshot_base64"]}
+
+    def _step(self, step: Dict[str, Any]) -> Dict[str, Any]:
+        step_type = step.get("type")
+        if step_type == "navigate":
+            self.url = step["url"]
+            result = self._replay("POST /api/navigate", url=step["url"])
+        elif step_type == "act":
+            result = self._replay("POST /api/act", action=step["action"])
+        elif step_type == "extract":
+            result = self._replay("POST /api/extract", instruction=step["instruction"])
+            result["extraction"] = result.pop("action")
+        elif step_type == "wait":
+            time.sleep(min(step.get("seconds") or 0, 30) * self.latency_scale)
+            result = {"success": True, "message": f"Waited {step.get('seconds') or 0} seconds"}
+        else:
+            result = {"success": False, "message": f"Unknown step type: {step_type}"}
+        result.pop("error", None)
+        return result
+
+    def handle(self, method: str, path: str, body: Any, headers: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        with self.lock:
+            self.requests.append((method, path, body, headers))
+        route = f"{method} {path}"
+
+        if route == "GET /api":
+            if not self.initialized:
+                return 500, {"status": "unhealthy", "service": "browserApi"}
+            return 200, self._replay(route)
+        if route == "POST /api/init":
+            if self.initialized:
+                return 500, {"status": "error", "message": "Browser already initialized"}
+            self.initialized = True
+            return 200, self._replay(route)
+        if route not in self.recording["routes"] and route != "POST /api/run-actions":
+            return 404, {"status": "error", "message": f"Cannot {method} {path}"}
+        if not self.initialized:
+            return 500, {"status": "error", "message": "Browser not initialized"}
+
+        if route == "POST /api/run-actions":
+            steps = []
+            success = True
+            for index, step in enumerate(body.get("steps") or []):
+                outcome = self._step(step)
+                steps.append({"index": index, "type": step.get("type"), **outcome})
+                if not outcome["success"]:
+                    success = False
+                    if body.get("stop_on_error", True):
+                        break
+            completed = sum(1 for step in steps if step["success"])
+            return (200 if success else 500), {
+                "success": success,
+                "message": f"Completed {completed} of {len(body.get('steps') or [])} steps",
+                "steps": steps,
+                **self._page_state(),
+            }
+
+        if route == "POST /api/navigate":
+            self.url = body["url"]
+        result = self._replay(route, **(body or {}))
+        return 200, {**result, **self._page_state()}
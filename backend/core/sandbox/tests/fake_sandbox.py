@@ -0,0 +1,129 @@
+"""
+In-process stand-in for a Daytona sandbox, for tests of the sandbox access layers.
+
+Sandbox paths are mapped onto a local directory: ``/workspace/a.txt`` lives at
+``<root>/workspace/a.txt``. ``fs`` implements the subset of the Daytona
+filesystem API the tools use, and ``process.exec`` runs the command with the
+local shell after rewriting ``/workspace`` and ``/tmp`` paths into the root,
+so tar based batch operations behave as they would in a real sandbox.
+``get_preview_link`` returns the URLs registered in ``preview_links``, for
+services the test runs locally.
+
+Every call is counted in ``calls`` so tests can assert on round trips.
+"""
+
+import asyncio
+import os
+import re
+import shutil
+import subprocess
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+_SANDBOX_PATH_RE = re.compile(r"(?<=[\s'\"=])/(workspace|tmp)(?=[/\s'\"]|$)")
+
+
+class FakeFileSystem:
+    def __init__(self, sandbox: "FakeSandbox"):
+        self._sandbox = sandbox
+
+    def _local(self, path: str) -> Path:
+        return self._sandbox.local_path(path)
+
+    async def get_file_info(self, path: str):
+        self._sandbox.calls['get_file_info'] += 1
+        local = self._local(path)
+        if not local.exists():
+            raise FileNotFoundError(path)
+        return self._sandbox.file_info(local)
+
+    async def list_files(self, path: str):
+        self._sandbox.calls['list_files'] += 1
+        local = self._local(path)
+        return [self._sandbox.file_info(child) for child in sorted(local.iterdir())]
+
+    async def download_file(self, path: str) -> bytes:
+        self._sandbox.calls['download_file'] += 1
+        local = self._local(path)
+        if not local.is_file():
+            raise FileNotFoundError(path)
+        return local.read_bytes()
+
+    async def upload_file(self, content: bytes, path: str) -> None:
+        self._sandbox.calls['upload_file'] += 1
+        local = self._local(path)
+        local.parent.mkdir(parents=True, exist_ok=True)
+        local.write_bytes(content)
+
+    async def set_file_permissions(self, path: str, mode: str) -> None:
+        self._sandbox.calls['set_file_permissions'] += 1
+        os.chmod(self._local(path), int(mode, 8))
+
+    async def create_folder(self, path: str, mode: str) -> None:
+        self._sandbox.calls['create_folder'] += 1
+        self._local(path).mkdir(parents=True, exist_ok=True)
+
+    async def delete_file(self, path: str) -> None:
+        self._sandbox.calls['delete_file'] += 1
+        local = self._local(path)
+        if local.is_dir():
+            shutil.rmtree(local)
+        else:
+            local.unlink()
+
+
+class FakeProcess:
+    def __init__(self, sandbox: "FakeSandbox"):
+        self._sandbox = sandbox
+
+    async def exec(self, command: str, timeout: int = None, env: dict = None):
+        self._sandbox.calls['exec'] += 1
+        local_command = _SANDBOX_PATH_RE.sub(lambda m: f"{self._sandbox.root}/{m.group(1)}", command)
+        completed = await asyncio.to_thread(
+            subprocess.run, local_command, shell=True, capture_output=True, text=True, timeout=timeout,
+            env={**os.environ, **env} if env else None,
+        )
+        return SimpleNamespace(exit_code=completed.returncode, result=completed.stdout + completed.stderr)
+
+
+class FakeSandbox:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.id = "fake-sandbox"
+        (self.root / "workspace").mkdir(parents=True, exist_ok=True)
+        (self.root / "tmp").mkdir(parents=True, exist_ok=True)
+        self.calls = Counter()
+        self.fs = FakeFileSystem(self)
+        self.process = FakeProcess(self)
+        # port -> URL the preview link for that port points at
+        self.preview_links = {}
+
+    async def get_preview_link(self, port: int):
+        self.calls['get_preview_link'] += 1
+        if port not in self.preview_links:
+            raise RuntimeError(f"No preview link for port {port}")
+        return SimpleNamespace(url=self.preview_links[port], token="fake-preview-token")
+
+    def local_path(self, path: str) -> Path:
+        return self.root / path.lstrip("/")
+
+    def file_info(self, local: Path):
+        stat = local.stat()
+        return SimpleNamespace(
+            name=local.name,
+            is_dir=local.is_dir(),
+            size=stat.st_size,
+            mod_time=str(stat.st_mtime_ns),
+            mode=oct(stat.st_mode & 0o777),
+        )
+
+    # Helpers for arranging and inspecting state directly, bypassing the counters
+
+    def put(self, path: str, content: bytes) -> None:
+        local = self.local_path(path)
+        local.parent.mkdir(parents=True, exist_ok=True)
+        local.write_bytes(content)
+
+    def get(self, path: str) -> bytes:
+        return self.local_path(path).read_bytes()
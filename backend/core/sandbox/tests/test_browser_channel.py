@@ -0,0 +1,98 @@
+import pytest
+import pytest_asyncio
+
+from core.sandbox.browser_channel import BrowserAPIError, BrowserChannel
+from core.sandbox.tests.fake_browser_api import FakeBrowserAPI
+from core.sandbox.tests.fake_sandbox import FakeSandbox
+
+
+@pytest.fixture
+def browser_api():
+    with FakeBrowserAPI() as api:
+        yield api
+
+
+@pytest.fixture
+def sandbox(tmp_path, browser_api):
+    sandbox = FakeSandbox(tmp_path)
+    sandbox.preview_links[browser_api.port] = browser_api.base_url
+    return sandbox
+
+
+@pytest_asyncio.fixture
+async def channel(sandbox, browser_api):
+    channel = BrowserChannel(sandbox, api_key="test-key", port=browser_api.port)
+    yield channel
+    await channel.close()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+class TestBrowserChannel:
+    async def test_actions_share_one_connection(self, sandbox, browser_api, channel):
+        await channel.call("navigate", {"url": "https://example.com/"})
+        await channel.call("act", {"action": "click the more information link"})
+        result = await channel.call("extract", {"instruction": "get the heading"})
+
+        assert channel.transport == "http"
+        assert result["title"] == "Example Domain"
+        assert browser_api.connections == 1
+        assert browser_api.paths() == [
+            "GET /api", "POST /api/init", "POST /api/navigate", "POST /api/act", "POST /api/extract",
+        ]
+        assert all(headers["X-Daytona-Preview-Token"] == "fake-preview-token"
+                   for _, _, _, headers in browser_api.requests)
+        assert browser_api.requests[1][2] == {"api_key": "test-key"}
+        assert sandbox.calls['exec'] == 0
+        assert sandbox.calls['get_preview_link'] == 1
+
+    async def test_run_actions_returns_every_step_and_one_screenshot(self, browser_api, channel):
+        result = await channel.call("run-actions", {"steps": [
+            {"type": "navigate", "url": "https://example.com/"},
+            {"type": "wait", "seconds": 1},
+            {"type": "extract", "instruction": "get the heading"},
+        ]})
+
+        assert result["success"]
+        assert [step["type"] for step in result["steps"]] == ["navigate", "wait", "extract"]
+        assert result["steps"][2]["extraction"].startswith("Example Domain")
+        assert result["url"] == "https://example.com/"
+        assert result["screenshot_base64"]
+        assert browser_api.paths().count("POST /api/run-actions") == 1
+
+    async def test_reinitializes_after_browser_crash(self, browser_api, channel):
+        await channel.call("screenshot", {})
+        browser_api.crash()
+
+        result = await channel.call("navigate", {"url": "https://example.com/"})
+
+        assert result["success"]
+        assert browser_api.paths()[-4:] == ["POST /api/navigate", "GET /api", "POST /api/init", "POST /api/navigate"]
+
+    async def test_falls_back_to_exec_without_preview_link(self, tmp_path, browser_api):
+        sandbox = FakeSandbox(tmp_path)
+        channel = BrowserChannel(sandbox, api_key="test-key", port=browser_api.port)
+
+        result = await channel.call("navigate", {"url": "https://example.com/?q=it's"})
+
+        assert channel.transport == "exec"
+        assert result["url"] == "https://example.com/?q=it's"
+        assert browser_api.requests[1][2] == {"api_key": "test-key"}
+        assert sandbox.calls['exec'] == 3
+
+    async def test_falls_back_to_exec_when_preview_link_is_unreachable(self, sandbox, browser_api):
+        sandbox.preview_links[browser_api.port] = "http://127.0.0.1:9"
+        channel = BrowserChannel(sandbox, api_key="test-key", port=browser_api.port)
+
+        await channel.call("screenshot", {})
+
+        assert channel.transport == "exec"
+        assert browser_api.paths()[-1] == "POST /api/screenshot"
+
+    async def test_does_not_switch_transport_once_link_has_worked(self, browser_api, channel):
+        await channel.call("screenshot", {})
+        browser_api.unavailable = True
+
+        with pytest.raises(BrowserAPIError):
+            await channel.call("act", {"action": "click the login button"})
+        assert channel.transport == "http"
@@ -0,0 +1,164 @@
+import os
+
+import pytest
+
+from core.sandbox.file_access import DeferredWriteError, SandboxFileAccess, get_file_access, peek_file_access
+from core.sandbox.tests.fake_sandbox import FakeSandbox
+
+
+class FakeThreadManager:
+    def __init__(self):
+        self.turn_end_hooks = []
+
+    def add_turn_end_hook(self, hook):
+        self.turn_end_hooks.append(hook)
+
+
+@pytest.fixture
+def sandbox(tmp_path):
+    return FakeSandbox(tmp_path)
+
+
+@pytest.fixture
+def files(sandbox):
+    return SandboxFileAccess(sandbox)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+class TestSandboxFileAccess:
+    async def test_read_is_cached_until_file_changes(self, sandbox, files):
+        sandbox.put("/workspace/a.txt", b"one")
+
+        assert await files.read("/workspace/a.txt") == b"one"
+        assert await files.read("/workspace/a.txt") == b"one"
+        assert sandbox.calls['download_file'] == 1
+
+        sandbox.put("/workspace/a.txt", b"changed")
+        assert await files.read("/workspace/a.txt") == b"changed"
+        assert sandbox.calls['download_file'] == 2
+
+    async def test_invalidate_catches_same_size_rewrite(self, sandbox, files):
+        sandbox.put("/workspace/a.txt", b"one")
+        assert await files.read("/workspace/a.txt") == b"one"
+
+        # Same size and, within the mtime resolution, the same modification time
+        info = await sandbox.fs.get_file_info("/workspace/a.txt")
+        sandbox.put("/workspace/a.txt", b"two")
+        mtime = int(info.mod_time)
+        os.utime(sandbox.local_path("/workspace/a.txt"), ns=(mtime, mtime))
+        assert await files.read("/workspace/a.txt") == b"one"
+
+        files.invalidate()
+        assert await files.read("/workspace/a.txt") == b"two"
+
+    async def test_read_many_uses_one_archive(self, sandbox, files):
+        for i in range(5):
+            sandbox.put(f"/workspace/dir/file {i}.txt", f"content {i}".encode())
+
+        paths = [f"/workspace/dir/file {i}.txt" for i in range(5)] + ["/workspace/missing.txt"]
+        contents = await files.read_many(paths)
+
+        assert contents == {f"/workspace/dir/file {i}.txt": f"content {i}".encode() for i in range(5)}
+        assert sandbox.calls['exec'] == 1
+        assert sandbox.calls['download_file'] == 1
+
+        # Everything is cached now, so a second pass downloads nothing
+        await files.read_many(paths)
+        assert sandbox.calls['download_file'] == 1
+
+    async def test_deferred_writes_are_visible_before_flush(self, sandbox, files):
+        sandbox.put("/workspace/a.txt", b"old")
+
+        await files.write("/workspace/a.txt", b"new", defer=True)
+
+        assert sandbox.get("/workspace/a.txt") == b"old"
+        assert await files.read("/workspace/a.txt") == b"new"
+        assert await files.exists("/workspace/a.txt")
+
+        await files.flush()
+        assert sandbox.get("/workspace/a.txt") == b"new"
+        assert not files.has_pending_writes
+
+    async def test_flush_batches_writes_and_preserves_mode(self, sandbox, files):
+        sandbox.put("/workspace/run.sh", b"#!/bin/sh\n")
+        os.chmod(sandbox.local_path("/workspace/run.sh"), 0o755)
+
+        await files.write("/workspace/run.sh", b"#!/bin/sh\necho hi\n", defer=True)
+        await files.write("/workspace/new/dir/b.txt", b"b", defer=True)
+        await files.write("/workspace/c.txt", b"c", permissions="600", defer=True)
+        await files.flush()
+
+        assert sandbox.calls['exec'] == 1
+        assert sandbox.calls['upload_file'] == 1
+        assert sandbox.get("/workspace/run.sh") == b"#!/bin/sh\necho hi\n"
+        assert sandbox.get("/workspace/new/dir/b.txt") == b"b"
+        assert os.stat(sandbox.local_path("/workspace/run.sh")).st_mode & 0o777 == 0o755
+        assert os.stat(sandbox.local_path("/workspace/c.txt")).st_mode & 0o777 == 0o600
+        assert not list(sandbox.local_path("/tmp").iterdir())
+
+        # Flushed contents are cached
+        assert await files.read("/workspace/c.txt") == b"c"
+        assert sandbox.calls['download_file'] == 0
+
+    async def test_delete_drops_pending_write(self, sandbox, files):
+        sandbox.put("/workspace/a.txt", b"old")
+        await files.write("/workspace/a.txt", b"new", defer=True)
+
+        await files.delete("/workspace/a.txt")
+        await files.flush()
+
+        assert not sandbox.local_path("/workspace/a.txt").exists()
+
+    async def test_shared_per_run_and_flushed_at_turn_end(self, sandbox):
+        thread_manager = FakeThreadManager()
+
+        files = get_file_access(sandbox, sandbox.id, thread_manager)
+        assert get_file_access(sandbox, sandbox.id, thread_manager) is files
+        assert peek_file_access(sandbox.id, thread_manager) is files
+        assert thread_manager.turn_end_hooks == [files.flush_and_record]
+
+        await files.write("/workspace/a.txt", b"a", defer=True)
+        for hook in thread_manager.turn_end_hooks:
+            await hook()
+        assert sandbox.get("/workspace/a.txt") == b"a"
+
+    async def test_writes_through_without_thread_manager(self, sandbox):
+        files = get_file_access(sandbox, sandbox.id)
+
+        await files.write("/workspace/a.txt", b"a", defer=True)
+
+        assert sandbox.get("/workspace/a.txt") == b"a"
+        assert not files.has_pending_writes
+
+    async def test_flush_raises_for_failed_writes(self, sandbox, files, monkeypatch):
+        upload = sandbox.fs.upload_file
+
+        async def failing_upload(content, path):
+            if path.endswith("bad.txt"):
+                raise OSError("disk full")
+            await upload(content, path)
+
+        monkeypatch.setattr(sandbox.fs, "upload_file", failing_upload)
+        await files.write("/workspace/good.txt", b"good", defer=True)
+        await files.write("/workspace/bad.txt", b"bad", defer=True)
+
+        with pytest.raises(DeferredWriteError) as error:
+            await files.flush()
+
+        assert error.value.failed == {"/workspace/bad.txt": "disk full"}
+        assert sandbox.get("/workspace/good.txt") == b"good"
+        assert not await files.exists("/workspace/bad.txt")
+
+    async def test_failures_at_turn_end_are_kept_for_the_next_tool_result(self, sandbox, monkeypatch):
+        files = get_file_access(sandbox, sandbox.id, FakeThreadManager())
+
+        async def failing_upload(content, path):
+            raise OSError("sandbox unreachable")
+
+        monkeypatch.setattr(sandbox.fs, "upload_file", failing_upload)
+        await files.write("/workspace/a.txt", b"a", defer=True)
+        await files.flush_and_record()
+
+        assert files.take_failed_writes() == {"/workspace/a.txt": "sandbox unreachable"}
+        assert files.take_failed_writes() == {}
@@ -0,0 +1,83 @@
+import html
+import os
+import re
+import sys
+
+import pytest
+
+# The sandbox image runs these modules from its own directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "docker"))
+
+import html_dom_cache  # noqa: E402
+from visual_html_editor_router import inject_editor_functionality  # noqa: E402
+
+
+def page_ids(path):
+    """Element ID -> text as the editor page numbers them when it loads the file."""
+    with open(path, encoding="utf-8") as f:
+        page = inject_editor_functionality(f.read(), os.path.basename(path))
+    return dict(re.findall(r'data-editable-id="(editable-\d+)"[^>]*>([^<]*)<', page))
+
+
+def cache_ids(path):
+    document = html_dom_cache.load_document(path)
+    return {element_id: entry["text"] for element_id, entry in document.editable.items()}
+
+
+@pytest.fixture
+def page(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_text("<html><body><p>Alpha</p><p>Beta</p><div>Gamma <b>bold</b> tail</div></body></html>")
+    return str(path)
+
+
+@pytest.mark.unit
+class TestHtmlDomCache:
+    def test_ids_match_the_editor_page(self, page):
+        assert cache_ids(page) == page_ids(page)
+
+    def test_ids_match_a_reloaded_page_after_a_delete(self, page):
+        document = html_dom_cache.load_document(page)
+        document.delete(document.editable["editable-0"]["span"])
+
+        assert cache_ids(page) == page_ids(page)
+        assert cache_ids(page)["editable-0"] == "Beta"
+
+        # An edit made from the reloaded page lands on the element it shows
+        html_dom_cache.load_document(page).replace_text("editable-0", "Delta")
+        with open(page, encoding="utf-8") as f:
+            source = f.read()
+        assert "<p>Delta</p>" in source and "Beta" not in source and "Alpha" not in source
+        assert cache_ids(page) == page_ids(page)
+
+    def test_removing_a_div_renumbers_the_rest(self, page):
+        document = html_dom_cache.load_document(page)
+        document.delete(document.removable["div-0"])
+
+        assert cache_ids(page) == page_ids(page) == {"editable-0": "Alpha", "editable-1": "Beta"}
+        assert html_dom_cache.load_document(page).removable == {}
+
+    def test_emptying_an_element_renumbers_the_rest(self, page):
+        html_dom_cache.load_document(page).replace_text("editable-0", "")
+
+        assert cache_ids(page) == page_ids(page)
+        assert cache_ids(page)["editable-0"] == "Beta"
+
+    def test_edits_keep_ids_and_move_the_spans_after_them(self, page):
+        document = html_dom_cache.load_document(page)
+        ids = cache_ids(page)
+        document.replace_text("editable-2", "  Gamma & co  ")
+        document.replace_text("editable-0", "A")
+        document.replace_text("editable-3", "tail <end>")
+
+        page_text = {element_id: html.unescape(text) for element_id, text in page_ids(page).items()}
+        assert cache_ids(page) == page_text == {
+            **ids, "editable-0": "A", "editable-2": "Gamma & co", "editable-3": "tail <end>",
+        }
+        with open(page, encoding="utf-8") as f:
+            source = f.read()
+        fresh = html_dom_cache.HtmlDocument(page, source, os.stat(page))
+        for element_id, entry in fresh.editable.items():
+            for key in ("text_span", "span"):
+                assert (document.editable[element_id][key].start, document.editable[element_id][key].end) == \
+                    (entry[key].start, entry[key].end)
@@ -3,9 +3,10 @@ import uuid
 import asyncio
 
 from core.agentpress.thread_manager import ThreadManager
-from core.agentpress.tool import Tool
+from core.agentpress.tool import Tool, ToolResult
 from daytona_sdk import AsyncSandbox
 from core.sandbox.sandbox import get_or_start_sandbox, create_sandbox, delete_sandbox
+from core.sandbox.file_access import SandboxFileAccess, get_file_access, peek_file_access
 from core.utils.logger import logger
 from core.utils.files_utils import clean_path
 from core.utils.config import config
@@ -15,6 +16,12 @@ class SandboxToolsBase(Tool):
     
     # Class variable to track if sandbox URLs have been printed
     _urls_printed = False
+    # Tools that write through ``self.files`` with defer=True set this; every
+    # other tool flushes the run's deferred writes before touching the sandbox
+    defers_file_writes = False
+    # Tools whose every file write goes through ``self.files`` set this; any
+    # other tool may change files behind the cache, so it drops the run's cached reads
+    writes_through_file_access = False
     
     def __init__(self, project_id: str, thread_manager: Optional[ThreadManager] = None):
         super().__init__()
@@ -24,6 +31,7 @@ class SandboxToolsBase(Tool):
         self._sandbox = None
         self._sandbox_id = None
         self._sandbox_pass = None
+        self._files = None
 
     async def _ensure_sandbox(self) -> AsyncSandbox:
         """Ensure we have a valid sandbox instance, retrieving it from the project if needed.
@@ -102,8 +110,30 @@ class SandboxToolsBase(Tool):
                 logger.error(f"Error retrieving/creating sandbox for project {self.project_id}: {str(e)}", exc_info=True)
                 raise e
 
+        files = peek_file_access(self._sandbox_id, self.thread_manager)
+        if files:
+            if not self.defers_file_writes and files.has_pending_writes:
+                await files.flush_and_record()
+            if not self.writes_through_file_access:
+                files.invalidate()
+
         return self._sandbox
 
+    def success_response(self, data) -> ToolResult:
+        return self._with_failed_writes(super().success_response(data))
+
+    def fail_response(self, msg: str) -> ToolResult:
+        return self._with_failed_writes(super().fail_response(msg))
+
+    def _with_failed_writes(self, result: ToolResult) -> ToolResult:
+        """Tell the model about earlier deferred writes that never reached the sandbox."""
+        files = self._files or (peek_file_access(self._sandbox_id, self.thread_manager) if self._sandbox_id else None)
+        failed = files.take_failed_writes() if files else {}
+        if failed:
+            details = "\n".join(f"- {path}: {error}" for path, error in failed.items())
+            result.output += f"\n\nWarning: these files reported as written earlier could not be saved to the sandbox and must be written again:\n{details}"
+        return result
+
     @property
     def sandbox(self) -> AsyncSandbox:
         """Get the sandbox instance, ensuring it exists."""
@@ -111,6 +141,13 @@ class SandboxToolsBase(Tool):
             raise RuntimeError("Sandbox not initialized. Call _ensure_sandbox() first.")
         return self._sandbox
 
+    @property
+    def files(self) -> SandboxFileAccess:
+        """Get the file access layer shared by the run's sandbox tools."""
+        if self._files is None:
+            self._files = get_file_access(self.sandbox, self.sandbox_id, self.thread_manager)
+        return self._files
+
     @property
     def sandbox_id(self) -> str:
         """Get the sandbox ID, ensuring it exists."""
@@ -22,6 +22,7 @@ from fastapi import HTTPException
 from core.utils.logger import logger
 from core.services.supabase import DBConnection
 from core.services import redis_client
+from core.utils.cache import Cache
 from core.utils.config import config
 
 
@@ -353,12 +354,8 @@ class APIKeyService:
             cache_key = f"api_key:{public_key}:{self._hash_secret_key(secret_key)[:8]}"
 
             try:
-                redis_client = await redis_client.get_client()
-                cached_result = await redis_client.get(cache_key)
-                if cached_result:
-                    import json
-
-                    cached_data = json.loads(cached_result)
+                cached_data = await Cache.get(cache_key)
+                if cached_data:
                     logger.debug(f"API key validation cache hit for {public_key}")
                     return APIKeyValidationResult(
                         is_valid=cached_data["is_valid"],
@@ -458,16 +455,13 @@ class APIKeyService:
     ):
         """Cache validation result in Redis"""
         try:
-            redis_client = await redis_client.get_client()
-            import json
-
             cache_data = {
                 "is_valid": result.is_valid,
                 "account_id": str(result.account_id) if result.account_id else None,
                 "key_id": str(result.key_id) if result.key_id else None,
                 "error_message": result.error_message,
             }
-            await redis_client.setex(cache_key, ttl, json.dumps(cache_data))
+            await Cache.set(cache_key, cache_data, ttl=ttl)
         except Exception as e:
             logger.warning(f"Failed to cache validation result: {e}")
 
@@ -206,6 +206,11 @@ async def keys(pattern: str):
     redis = await get_client()
     return await redis.keys(pattern)
 
+async def scan_keys(pattern: str, count: int = 500):
+    """Incremental alternative to KEYS that does not block the server."""
+    redis = await get_client()
+    return [key async for key in redis.scan_iter(match=pattern, count=count)]
+
 async def expire(key: str, time: int):
     redis = await get_client()
     return await redis.expire(key, time)
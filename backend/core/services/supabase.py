@@ -2,15 +2,131 @@
 Centralized database connection management for AgentPress using Supabase.
 """
 
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from supabase import create_async_client, AsyncClient
 from core.utils.logger import logger
 from core.utils.config import config
+from core.utils import fastjson
+import asyncio
 import base64
 import uuid
 from datetime import datetime
 import threading
 
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover - optional dependency
+    asyncpg = None
+
+
+def _record_to_dict(record) -> Dict[str, Any]:
+    """Convert an asyncpg record to the shape PostgREST returns."""
+    row = {}
+    for key, value in record.items():
+        if isinstance(value, uuid.UUID):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        row[key] = value
+    return row
+
+
+class PostgresFastPath:
+    """Direct asyncpg access for the hottest message and agent run queries.
+
+    Only a handful of fixed statements go through here; asyncpg prepares each
+    one once per connection and reuses it. Everything else keeps using the
+    Supabase client. Set ``DATABASE_STATEMENT_CACHE_SIZE=0`` when connecting
+    through a transaction-mode pooler that cannot hold prepared statements.
+    """
+
+    MESSAGE_COLUMNS = (
+        "message_id, thread_id, type, is_llm_message, content, metadata, "
+        "agent_id, agent_version_id, created_at, updated_at"
+    )
+
+    INSERT_MESSAGE = f"""
+        INSERT INTO public.messages (thread_id, type, content, is_llm_message, metadata, agent_id, agent_version_id)
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+        RETURNING {MESSAGE_COLUMNS}
+    """
+
+    SELECT_LLM_MESSAGES = """
+        SELECT message_id, type, content
+        FROM public.messages
+        WHERE thread_id = $1 AND is_llm_message = TRUE
+        ORDER BY created_at
+    """
+
+    SELECT_LATEST_MESSAGE = f"""
+        SELECT {MESSAGE_COLUMNS}
+        FROM public.messages
+        WHERE thread_id = $1 AND type = ANY($2::text[])
+        ORDER BY created_at DESC
+        LIMIT 1
+    """
+
+    UPDATE_RUN_STATUS = """
+        UPDATE public.agent_runs
+        SET status = $2,
+            error = COALESCE($3, error),
+            completed_at = CASE WHEN $4 THEN NOW() ELSE completed_at END,
+            updated_at = NOW()
+        WHERE id = $1
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    @classmethod
+    async def create(cls, dsn: str) -> 'PostgresFastPath':
+        async def init_connection(conn):
+            for type_name in ('json', 'jsonb'):
+                await conn.set_type_codec(
+                    type_name,
+                    encoder=fastjson.dumps,
+                    decoder=fastjson.loads,
+                    schema='pg_catalog',
+                )
+
+        pool = await asyncpg.create_pool(
+            dsn,
+            min_size=1,
+            max_size=int(config.DATABASE_POOL_MAX_SIZE or 10),
+            statement_cache_size=int(config.DATABASE_STATEMENT_CACHE_SIZE if config.DATABASE_STATEMENT_CACHE_SIZE is not None else 100),
+            init=init_connection,
+        )
+        return cls(pool)
+
+    async def close(self):
+        await self._pool.close()
+
+    async def insert_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        record = await self._pool.fetchrow(
+            self.INSERT_MESSAGE,
+            message['thread_id'],
+            message['type'],
+            message['content'],
+            message.get('is_llm_message', False),
+            message.get('metadata') or {},
+            message.get('agent_id'),
+            message.get('agent_version_id'),
+        )
+        return _record_to_dict(record)
+
+    async def get_llm_messages(self, thread_id: str) -> List[Dict[str, Any]]:
+        records = await self._pool.fetch(self.SELECT_LLM_MESSAGES, thread_id)
+        return [_record_to_dict(r) for r in records]
+
+    async def get_latest_message(self, thread_id: str, types: List[str]) -> Optional[Dict[str, Any]]:
+        record = await self._pool.fetchrow(self.SELECT_LATEST_MESSAGE, thread_id, types)
+        return _record_to_dict(record) if record else None
+
+    async def update_agent_run_status(self, agent_run_id: str, status: str, error: Optional[str] = None, completed: bool = False) -> bool:
+        result = await self._pool.execute(self.UPDATE_RUN_STATUS, agent_run_id, status, error, completed)
+        # asyncpg returns the command tag, e.g. "UPDATE 1"
+        return result.split()[-1] != '0'
+
 class DBConnection:
     """Thread-safe singleton database connection manager using Supabase."""
     
@@ -25,6 +141,9 @@ class DBConnection:
                     cls._instance = super().__new__(cls)
                     cls._instance._initialized = False
                     cls._instance._client = None
+                    cls._instance._pg = None
+                    cls._instance._pg_lock = None
+                    cls._instance._pg_failed = False
         return cls._instance
 
     def __init__(self):
@@ -64,6 +183,13 @@ class DBConnection:
     @classmethod
     async def disconnect(cls):
         """Disconnect from the database."""
+        if cls._instance and cls._instance._pg:
+            try:
+                await cls._instance._pg.close()
+            except Exception as e:
+                logger.warning(f"Error closing asyncpg pool: {e}")
+            finally:
+                cls._instance._pg = None
         if cls._instance and cls._instance._client:
             logger.debug("Disconnecting from Supabase database")
             try:
@@ -88,3 +214,30 @@ class DBConnection:
             logger.error("Database client is None after initialization")
             raise RuntimeError("Database not initialized")
         return self._client
+
+    @property
+    async def pg(self) -> Optional[PostgresFastPath]:
+        """Get the asyncpg fast path, or None when it is not configured.
+
+        Callers fall back to the Supabase client when this returns None.
+        """
+        if self._pg is not None:
+            return self._pg
+        if self._pg_failed or not config.DATABASE_URL:
+            return None
+        if asyncpg is None:
+            logger.warning("DATABASE_URL is set but asyncpg is not installed; using Supabase client")
+            self._pg_failed = True
+            return None
+
+        if self._pg_lock is None:
+            self._pg_lock = asyncio.Lock()
+        async with self._pg_lock:
+            if self._pg is None and not self._pg_failed:
+                try:
+                    self._pg = await PostgresFastPath.create(config.DATABASE_URL)
+                    logger.debug("asyncpg fast path initialized")
+                except Exception as e:
+                    logger.error(f"Failed to create asyncpg pool, using Supabase client: {e}")
+                    self._pg_failed = True
+        return self._pg
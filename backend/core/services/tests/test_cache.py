@@ -1,6 +1,9 @@
 import pytest
 import asyncio
+import multiprocessing
+import os
 import time
+import uuid
 from typing import Dict, Any, List
 from unittest.mock import patch, MagicMock
 
@@ -263,4 +266,135 @@ class TestCachingIntegration:
             }
         
         assert any(r["has_cache_metrics"] for r in results.values()), \
-            "No providers returned cache metrics" 
\ No newline at end of file
+            "No providers returned cache metrics" 
+
+def _redis_available() -> bool:
+    try:
+        import redis
+        url = os.getenv("REDIS_URL") or "redis://localhost:6379/0"
+        redis.Redis.from_url(url, socket_connect_timeout=1).ping()
+        return True
+    except Exception:
+        return False
+
+
+def _write_from_other_process(key: str, value: Any, invalidate: bool) -> None:
+    """Runs in a spawned process with its own Redis connection and L1."""
+    from core.utils.cache import Cache as other_cache
+
+    async def write():
+        if invalidate:
+            await other_cache.invalidate(key)
+        else:
+            await other_cache.set(key, value, ttl=60)
+
+    asyncio.run(write())
+
+
+@pytest.fixture
+async def two_tier_cache():
+    from core.services import redis_client as rc
+    from core.utils.cache import _cache
+
+    # Each test gets its own event loop, so drop the module-level client.
+    rc.client = None
+    rc._initialized = False
+
+    cache = _cache(l1_max_entries=16, l1_ttl=30)
+    cache._ensure_listener()
+    for _ in range(50):
+        if cache._subscribed:
+            break
+        await asyncio.sleep(0.05)
+    assert cache._subscribed, "invalidation listener did not subscribe"
+
+    yield cache
+
+    cache._listener.cancel()
+    rc.client = None
+    rc._initialized = False
+
+
+async def _wait_until(predicate, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.02)
+    return predicate()
+
+
+def _run_in_other_process(key: str, value: Any = None, invalidate: bool = False) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    process = ctx.Process(target=_write_from_other_process, args=(key, value, invalidate))
+    process.start()
+    process.join(timeout=30)
+    assert process.exitcode == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+@pytest.mark.skipif(not _redis_available(), reason="Requires a local Redis")
+class TestTwoTierCache:
+    async def test_hit_is_served_from_l1(self, two_tier_cache):
+        key = f"test:{uuid.uuid4()}"
+        await two_tier_cache.set(key, {"tier": "pro"}, ttl=60)
+
+        with patch.object(two_tier_cache, "_fetch", side_effect=AssertionError("went to Redis")):
+            assert await two_tier_cache.get(key) == {"tier": "pro"}
+
+    async def test_set_in_other_process_invalidates_l1(self, two_tier_cache):
+        key = f"test:{uuid.uuid4()}"
+        await two_tier_cache.set(key, "old", ttl=60)
+        assert await two_tier_cache.get(key) == "old"
+
+        await asyncio.to_thread(_run_in_other_process, key, "new")
+
+        assert await _wait_until(lambda: key not in two_tier_cache._l1)
+        assert await two_tier_cache.get(key) == "new"
+
+    async def test_invalidate_in_other_process_evicts_l1(self, two_tier_cache):
+        key = f"test:{uuid.uuid4()}"
+        await two_tier_cache.set(key, [1, 2, 3], ttl=60)
+
+        await asyncio.to_thread(_run_in_other_process, key, None, True)
+
+        assert await _wait_until(lambda: key not in two_tier_cache._l1)
+        assert await two_tier_cache.get(key) is None
+
+    async def test_stale_fill_does_not_overwrite_newer_invalidation(self, two_tier_cache):
+        key = f"test:{uuid.uuid4()}"
+        two_tier_cache._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            two_tier_cache._l1_invalidate(key, 5)
+            two_tier_cache._l1_put(key, 4, "stale", 60)
+        finally:
+            two_tier_cache._inflight.pop(key)
+
+        assert key not in two_tier_cache._l1
+
+    async def test_concurrent_misses_are_coalesced(self, two_tier_cache):
+        key = f"test:{uuid.uuid4()}"
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.1)
+            return {"allowed": ["model-a"]}
+
+        results = await asyncio.gather(*[
+            two_tier_cache.get_or_load(key, loader, ttl=60) for _ in range(20)
+        ])
+
+        assert calls == 1
+        assert all(r == {"allowed": ["model-a"]} for r in results)
+
+    async def test_lru_is_bounded(self, two_tier_cache):
+        keys = [f"test:{uuid.uuid4()}" for _ in range(20)]
+        for key in keys:
+            await two_tier_cache.set(key, key, ttl=60)
+
+        assert len(two_tier_cache._l1) == 16
+        assert keys[0] not in two_tier_cache._l1
+        assert keys[-1] in two_tier_cache._l1
@@ -1,12 +1,17 @@
+import asyncio
 import json
 import traceback
 import uuid
 from datetime import datetime, timezone
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends, Form, Query
+import hashlib
+from typing import Optional, Tuple
+from fastapi import APIRouter, HTTPException, Depends, Form, Query, Request, Response
+from fastapi.responses import JSONResponse
 
 from core.utils.auth_utils import verify_and_get_user_id_from_jwt, verify_and_authorize_thread_access, require_thread_access, AuthorizedThreadAccess
 from core.utils.logger import logger
+from core.utils.cache import Cache
+from core.utils.pagination import PaginationService
 from core.sandbox.sandbox import create_sandbox, delete_sandbox
 
 from .api_models import CreateThreadResponse, MessageCreateRequest
@@ -14,106 +19,156 @@ from . import core_utils as utils
 
 router = APIRouter()
 
+THREAD_LIST_COLUMNS = (
+    'thread_id, account_id, project_id, metadata, is_public, created_at, updated_at, '
+    'project:projects(project_id, account_id, name, description, sandbox, is_public, created_at, updated_at)'
+)
+THREAD_COUNT_CACHE_TTL = 60
+
+
+async def _get_thread_count(client, account_id: str) -> int:
+    """Return the number of threads for an account, cached briefly to keep the sidebar cheap."""
+    cache_key = f"thread_count:{account_id}"
+    try:
+        cached = await Cache.get(cache_key)
+        if cached is not None:
+            return cached
+    except Exception as cache_error:
+        logger.warning(f"Cache read failed for thread count {account_id}: {str(cache_error)}")
+
+    count_result = await client.table('threads').select('thread_id', count='exact').eq('account_id', account_id).limit(1).execute()
+    total_count = count_result.count or 0
+
+    try:
+        await Cache.set(cache_key, total_count, ttl=THREAD_COUNT_CACHE_TTL)
+    except Exception as cache_error:
+        logger.warning(f"Cache write failed for thread count {account_id}: {str(cache_error)}")
+    return total_count
+
+
+async def invalidate_thread_count(account_id: str):
+    try:
+        await Cache.invalidate(f"thread_count:{account_id}")
+    except Exception as e:
+        logger.warning(f"Failed to invalidate thread count cache for {account_id}: {str(e)}")
+
+
+def _parse_keyset_cursor(cursor: str, sort_field: str = 'created_at') -> Tuple[str, str]:
+    """Decode a (timestamp, id) keyset cursor produced by PaginationService.create_cursor."""
+    cursor_data = PaginationService.parse_cursor(cursor)
+    if not cursor_data or cursor_data.get('sort_field') != sort_field:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        # Both values end up in a PostgREST filter, so only accept well-formed ones.
+        sort_value = datetime.fromisoformat(cursor_data['sort_value']).isoformat()
+        item_id = str(uuid.UUID(cursor_data['id']))
+    except (KeyError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, item_id
+
+
+def _parse_since(since: str) -> Tuple[str, Optional[str]]:
+    """Decode ``since``: an ISO timestamp, or a ``next_since`` cursor on (updated_at, message_id)."""
+    try:
+        return datetime.fromisoformat(since).isoformat(), None
+    except ValueError:
+        pass
+    try:
+        return _parse_keyset_cursor(since, 'updated_at')
+    except HTTPException:
+        raise HTTPException(status_code=400, detail="Invalid 'since' timestamp or cursor")
+
+
+def _map_thread_for_list(thread: dict) -> dict:
+    project = thread.get('project')
+    project_data = None
+    if project:
+        project_data = {
+            "project_id": project['project_id'],
+            "account_id": project.get('account_id'),
+            "name": project.get('name', ''),
+            "description": project.get('description', ''),
+            "sandbox": project.get('sandbox', {}),
+            "is_public": project.get('is_public', False),
+            "created_at": project['created_at'],
+            "updated_at": project['updated_at']
+        }
+
+    return {
+        "thread_id": thread['thread_id'],
+        "account_id": thread.get('account_id'),
+        "project_id": thread.get('project_id'),
+        "metadata": thread.get('metadata', {}),
+        "is_public": thread.get('is_public', False),
+        "created_at": thread['created_at'],
+        "updated_at": thread['updated_at'],
+        "project": project_data
+    }
+
+
 @router.get("/threads")
 async def get_user_threads(
     user_id: str = Depends(verify_and_get_user_id_from_jwt),
     page: Optional[int] = Query(1, ge=1, description="Page number (1-based)"),
-    limit: Optional[int] = Query(1000, ge=1, le=1000, description="Number of items per page (max 1000)")
+    limit: Optional[int] = Query(1000, ge=1, le=1000, description="Number of items per page (max 1000)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from pagination.next_cursor; takes precedence over page")
 ):
-    """Get all threads for the current user with associated project data."""
-    logger.debug(f"Fetching threads with project data for user: {user_id} (page={page}, limit={limit})")
+    """Get threads for the current user with associated project data.
+
+    Threads are ordered newest first by (created_at, thread_id). Pages are cut
+    in the database: either by offset (``page``) or, preferably, by keyset
+    (``cursor``), which stays constant-time however deep the client scrolls.
+    """
+    logger.debug(f"Fetching threads with project data for user: {user_id} (page={page}, limit={limit}, cursor={bool(cursor)})")
     client = await utils.db.client
     try:
-        offset = (page - 1) * limit
-        
-        # First, get threads for the user
-        threads_result = await client.table('threads').select('*').eq('account_id', user_id).order('created_at', desc=True).execute()
-        
-        if not threads_result.data:
-            logger.debug(f"No threads found for user: {user_id}")
-            return {
-                "threads": [],
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total": 0,
-                    "pages": 0
-                }
-            }
-        
-        total_count = len(threads_result.data)
-        
-        # Apply pagination to threads
-        paginated_threads = threads_result.data[offset:offset + limit]
-        
-        # Extract unique project IDs from threads that have them
-        project_ids = [
-            thread['project_id'] for thread in paginated_threads 
-            if thread.get('project_id')
-        ]
-        unique_project_ids = list(set(project_ids)) if project_ids else []
-        
-        # Fetch projects if we have project IDs
-        projects_by_id = {}
-        if unique_project_ids:
-            from core.utils.query_utils import batch_query_in
-            
-            projects_data = await batch_query_in(
-                client=client,
-                table_name='projects',
-                select_fields='*',
-                in_field='project_id',
-                in_values=unique_project_ids
+        query = client.table('threads').select(THREAD_LIST_COLUMNS).eq('account_id', user_id)
+
+        if cursor:
+            created_at, thread_id = _parse_keyset_cursor(cursor)
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",thread_id.lt.{thread_id})'
             )
-            
-            logger.debug(f"[API] Retrieved {len(projects_data)} projects")
-            # Create a lookup map of projects by ID
-            projects_by_id = {
-                project['project_id']: project 
-                for project in projects_data
-            }
-        
-        # Map threads with their associated projects
-        mapped_threads = []
-        for thread in paginated_threads:
-            project_data = None
-            if thread.get('project_id') and thread['project_id'] in projects_by_id:
-                project = projects_by_id[thread['project_id']]
-                project_data = {
-                    "project_id": project['project_id'],
-                    "name": project.get('name', ''),
-                    "description": project.get('description', ''),
-                    "sandbox": project.get('sandbox', {}),
-                    "is_public": project.get('is_public', False),
-                    "created_at": project['created_at'],
-                    "updated_at": project['updated_at']
-                }
-            
-            mapped_thread = {
-                "thread_id": thread['thread_id'],
-                "project_id": thread.get('project_id'),
-                "metadata": thread.get('metadata', {}),
-                "is_public": thread.get('is_public', False),
-                "created_at": thread['created_at'],
-                "updated_at": thread['updated_at'],
-                "project": project_data
-            }
-            mapped_threads.append(mapped_thread)
-        
+            query = query.order('created_at', desc=True).order('thread_id', desc=True).limit(limit + 1)
+        else:
+            offset = (page - 1) * limit
+            query = query.order('created_at', desc=True).order('thread_id', desc=True).range(offset, offset + limit)
+
+        threads_result, total_count = await asyncio.gather(
+            query.execute(),
+            _get_thread_count(client, user_id)
+        )
+        rows = threads_result.data or []
+
+        # One extra row is requested to learn whether another page exists.
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        mapped_threads = [_map_thread_for_list(thread) for thread in rows]
+
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = PaginationService.create_cursor(last['thread_id'], 'created_at', last['created_at'])
+
         total_pages = (total_count + limit - 1) // limit if total_count else 0
-        
-        logger.debug(f"[API] Mapped threads for frontend: {len(mapped_threads)} threads, {len(projects_by_id)} unique projects")
-        
+
+        logger.debug(f"[API] Mapped threads for frontend: {len(mapped_threads)} threads")
+
         return {
             "threads": mapped_threads,
             "pagination": {
                 "page": page,
                 "limit": limit,
                 "total": total_count,
-                "pages": total_pages
+                "pages": total_pages,
+                "has_more": has_more,
+                "next_cursor": next_cursor
             }
         }
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching threads for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch threads: {str(e)}")
@@ -292,6 +347,7 @@ async def create_thread(
         thread = await client.table('threads').insert(thread_data).execute()
         thread_id = thread.data[0]['thread_id']
         logger.debug(f"Created new thread: {thread_id}")
+        await invalidate_thread_count(account_id)
 
         logger.debug(f"Successfully created thread {thread_id} with project {project_id}")
         return {"thread_id": thread_id, "project_id": project_id}
@@ -301,32 +357,144 @@ async def create_thread(
         # TODO: Clean up created project/thread if creation fails mid-way
         raise HTTPException(status_code=500, detail=f"Failed to create thread: {str(e)}")
 
+MESSAGE_PAGE_DEFAULT_LIMIT = 100
+
+
+async def _get_messages_etag(client, thread_id: str, variant: str) -> str:
+    """Build an ETag from the thread's message version.
+
+    A trigger bumps thread_message_versions on every insert, edit and delete
+    of the thread's messages, so the tag costs one primary-key lookup however
+    long the thread is, and is checked before any message bodies are read.
+    """
+    result = await client.table('thread_message_versions').select('version').eq('thread_id', thread_id).limit(1).execute()
+    version = result.data[0]['version'] if result.data else 0
+    fingerprint = f"{version}:{variant}"
+    return f'W/"{hashlib.sha1(fingerprint.encode()).hexdigest()}"'
+
+
 @router.get("/threads/{thread_id}/messages")
 async def get_thread_messages(
     thread_id: str,
+    request: Request,
     user_id: str = Depends(verify_and_get_user_id_from_jwt),
-    order: str = Query("desc", description="Order by created_at: 'asc' or 'desc'")
+    order: str = Query("desc", description="Order by created_at: 'asc' or 'desc'"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit (without cursors) to fetch the whole thread"),
+    before: Optional[str] = Query(None, description="Cursor: only messages older than this one"),
+    after: Optional[str] = Query(None, description="Cursor: only messages newer than this one"),
+    since: Optional[str] = Query(None, description="ISO timestamp or pagination.next_since: only messages created or updated after it"),
+    types: Optional[str] = Query(None, description="Comma-separated message types to include"),
+    exclude_types: Optional[str] = Query(None, description="Comma-separated message types to exclude"),
+    llm_only: bool = Query(False, description="Only messages that are part of the LLM context"),
 ):
-    """Get all messages for a thread, fetching in batches of 1000 from the DB to avoid large queries."""
-    logger.debug(f"Fetching all messages for thread: {thread_id}, order={order}")
+    """Get messages for a thread.
+
+    Without paging parameters the whole thread is returned, fetched in batches
+    of 1000. With ``limit`` the newest page is returned and older pages are
+    reached through ``before``; ``after`` walks forward and ``since`` returns
+    rows inserted or edited after a timestamp so clients can poll for deltas,
+    passing ``next_since`` back to continue. Deleted messages are not reported
+    to ``since`` clients; a delete still changes the ETag, so a client that
+    must drop them reloads the thread when a delta poll comes back empty with
+    a new ETag. Type filters are applied in SQL. Responses carry an ETag and
+    honour If-None-Match with 304.
+    """
+    logger.debug(f"Fetching messages for thread: {thread_id}, order={order}, limit={limit}, before={bool(before)}, after={bool(after)}, since={since}")
     client = await utils.db.client
     await verify_and_authorize_thread_access(client, thread_id, user_id)
+
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    since_key = _parse_since(since) if since else None
+
+    include_types = [t.strip() for t in types.split(',') if t.strip()] if types else []
+    skip_types = [t.strip() for t in exclude_types.split(',') if t.strip()] if exclude_types else []
+
     try:
-        batch_size = 1000
-        offset = 0
-        all_messages = []
-        while True:
+        etag = await _get_messages_etag(client, thread_id, str(sorted(request.query_params.multi_items())))
+        if etag in (request.headers.get('if-none-match') or ''):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        def build_query():
             query = client.table('messages').select('*').eq('thread_id', thread_id)
-            query = query.order('created_at', desc=(order == "desc"))
-            query = query.range(offset, offset + batch_size - 1)
-            messages_result = await query.execute()
-            batch = messages_result.data or []
-            all_messages.extend(batch)
-            logger.debug(f"Fetched batch of {len(batch)} messages (offset {offset})")
-            if len(batch) < batch_size:
-                break
-            offset += batch_size
-        return {"messages": all_messages}
+            if include_types:
+                query = query.in_('type', include_types)
+            if skip_types:
+                query = query.not_.in_('type', skip_types)
+            if llm_only:
+                query = query.eq('is_llm_message', True)
+            return query
+
+        paged = limit is not None or before or after or since
+        if not paged:
+            batch_size = 1000
+            offset = 0
+            all_messages = []
+            while True:
+                query = build_query().order('created_at', desc=(order == "desc"))
+                query = query.range(offset, offset + batch_size - 1)
+                messages_result = await query.execute()
+                batch = messages_result.data or []
+                all_messages.extend(batch)
+                logger.debug(f"Fetched batch of {len(batch)} messages (offset {offset})")
+                if len(batch) < batch_size:
+                    break
+                offset += batch_size
+            return JSONResponse({"messages": all_messages}, headers={"ETag": etag})
+
+        page_size = limit or MESSAGE_PAGE_DEFAULT_LIMIT
+        query = build_query()
+        if since_key:
+            # Delta polling follows updated_at so edited rows are picked up too,
+            # keyed on message_id as well so a page boundary inside a run of
+            # equal timestamps does not skip the rest of the run.
+            updated_at, message_id = since_key
+            if message_id:
+                query = query.or_(
+                    f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",message_id.gt.{message_id})'
+                )
+            else:
+                query = query.gt('updated_at', updated_at)
+            query = query.order('updated_at').order('message_id')
+            newest_first = False
+        elif after:
+            created_at, message_id = _parse_keyset_cursor(after)
+            query = query.or_(
+                f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",message_id.gt.{message_id})'
+            ).order('created_at').order('message_id')
+            newest_first = False
+        else:
+            if before:
+                created_at, message_id = _parse_keyset_cursor(before)
+                query = query.or_(
+                    f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",message_id.lt.{message_id})'
+                )
+            query = query.order('created_at', desc=True).order('message_id', desc=True)
+            newest_first = True
+
+        # One extra row is requested to learn whether another page exists.
+        messages_result = await query.limit(page_size + 1).execute()
+        rows = messages_result.data or []
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        oldest = rows[-1] if newest_first and rows else (rows[0] if rows else None)
+        newest = rows[0] if newest_first and rows else (rows[-1] if rows else None)
+        if newest_first != (order == "desc"):
+            rows.reverse()
+
+        pagination = {
+            "limit": page_size,
+            "has_more": has_more,
+            "before_cursor": PaginationService.create_cursor(oldest['message_id'], 'created_at', oldest['created_at']) if oldest else before,
+            "after_cursor": PaginationService.create_cursor(newest['message_id'], 'created_at', newest['created_at']) if newest else after,
+        }
+        if since_key:
+            pagination["next_since"] = PaginationService.create_cursor(newest['message_id'], 'updated_at', newest['updated_at']) if newest else since
+
+        return JSONResponse({"messages": rows, "pagination": pagination}, headers={"ETag": etag})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching messages for thread {thread_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch messages: {str(e)}")
@@ -1,16 +1,23 @@
 from core.agentpress.tool import ToolResult, openapi_schema, usage_example
 from core.agentpress.thread_manager import ThreadManager
 from core.sandbox.tool_base import SandboxToolsBase
+from core.sandbox.browser_channel import BrowserChannel, BrowserAPIError, REQUEST_TIMEOUT
 from core.utils.logger import logger
-from core.utils.s3_upload_utils import upload_base64_image
-import asyncio
+from core.utils.screenshot_pipeline import ScreenshotPipeline
 import json
-import base64
-import io
 import traceback
-from PIL import Image
 from core.utils.config import config
 
+MAX_ACTION_STEPS = 20
+# Upper bound for a whole browser_run_actions sequence
+MAX_SEQUENCE_TIMEOUT = 300
+STEP_REQUIRED_FIELDS = {
+    "navigate": ("url",),
+    "act": ("action",),
+    "extract": ("instruction",),
+    "wait": (),
+}
+
 class BrowserTool(SandboxToolsBase):
     """
     Browser Tool for browser automation using local Stagehand API.
@@ -18,85 +25,22 @@ class BrowserTool(SandboxToolsBase):
     This tool provides browser automation capabilities using a local Stagehand API server,
     replacing the sandbox browser tool functionality.
     
-    Only 4 core functions that can handle everything:
+    Core functions that can handle everything:
     - browser_navigate_to: Navigate to URLs
     - browser_act: Perform any action (click, type, scroll, dropdowns etc.)
     - browser_extract_content: Extract content from pages
     - browser_screenshot: Take screenshots
+    - browser_run_actions: Run a sequence of the above in a single call
     """
 
 
     def __init__(self, project_id: str, thread_id: str, thread_manager: ThreadManager):
         super().__init__(project_id, thread_manager)
         self.thread_id = thread_id
-    
-    def _validate_base64_image(self, base64_string: str, max_size_mb: int = 10) -> tuple[bool, str]:
-        """
-        Comprehensive validation of base64 image data.
-        
-        Args:
-            base64_string (str): The base64 encoded image data
-            max_size_mb (int): Maximum allowed image size in megabytes
-            
-        Returns:
-            tuple[bool, str]: (is_valid, error_message)
-        """
-        try:
-            # Check if data exists and has reasonable length
-            if not base64_string or len(base64_string) < 10:
-                return False, "Base64 string is empty or too short"
-            
-            # Remove data URL prefix if present (data:image/jpeg;base64,...)
-            if base64_string.startswith('data:'):
-                try:
-                    base64_string = base64_string.split(',', 1)[1]
-                except (IndexError, ValueError):
-                    return False, "Invalid data URL format"
-            
-            # Check if string contains only valid base64 characters
-            # Base64 alphabet: A-Z, a-z, 0-9, +, /, = (padding)
-            import re
-            if not re.match(r'^[A-Za-z0-9+/]*={0,2}$', base64_string):
-                return False, "Invalid base64 characters detected"
-            
-            # Check if base64 string length is valid (must be multiple of 4)
-            if len(base64_string) % 4 != 0:
-                return False, "Invalid base64 string length"
-            
-            # Attempt to decode base64
-            try:
-                image_data = base64.b64decode(base64_string, validate=True)
-            except Exception as e:
-                return False, f"Base64 decoding failed: {str(e)}"
-            
-            # Check decoded data size
-            if len(image_data) == 0:
-                return False, "Decoded image data is empty"
-            
-            # Check if decoded data size exceeds limit
-            max_size_bytes = max_size_mb * 1024 * 1024
-            if len(image_data) > max_size_bytes:
-                return False, f"Image size ({len(image_data)} bytes) exceeds limit ({max_size_bytes} bytes)"
-            
-            # Validate that decoded data is actually a valid image using PIL
-            try:
-                image_stream = io.BytesIO(image_data)
-                with Image.open(image_stream) as img:
-                    # Verify the image by attempting to load it
-                    img.verify()
-                    
-                    # Check if image format is supported
-                    supported_formats = {'JPEG', 'PNG', 'GIF', 'BMP', 'WEBP', 'TIFF'}
-                    if img.format not in supported_formats:
-                        return False, f"Unsupported image format: {img.format}"
-                    
-                    return True, "Image validation successful"
-                    
-            except Exception as e:
-                return False, f"Image validation failed: {str(e)}"
-                
-        except Exception as e:
-            return False, f"Image validation error: {str(e)}"
+        self._channel = None
+        self._screenshots = ScreenshotPipeline()
+        if thread_manager is not None:
+            thread_manager.add_run_end_hook(self.cleanup)
     
     async def _debug_sandbox_services(self) -> str:
         """Debug method to check what services are running in the sandbox"""
@@ -130,173 +74,122 @@ class BrowserTool(SandboxToolsBase):
         except Exception as e:
             return f"Error getting debug info: {e}"
 
+    async def _get_channel(self) -> BrowserChannel:
+        """Return the run's persistent channel to the sandbox browser API."""
+        await self._ensure_sandbox()
+        if self._channel is None:
+            self._channel = BrowserChannel(self.sandbox, api_key=config.GEMINI_API_KEY)
+        return self._channel
+
     async def _check_stagehand_api_health(self) -> bool:
-        """Check if the Stagehand API server is running and accessible"""
+        """Check if the Stagehand API server is running, initializing the browser if needed"""
         try:
-            await self._ensure_sandbox()
-            
-            
-            # Simple health check curl command
-            curl_cmd = "curl -s -X GET 'http://localhost:8004/api' -H 'Content-Type: application/json'"
-            
-            logger.debug(f"Checking Stagehand API health with: {curl_cmd}")
-            
-            response = await self.sandbox.process.exec(curl_cmd, timeout=10)
-            if response.exit_code == 0:
-                try:
-                    result = json.loads(response.result)
-                    if result.get("status") == "healthy":
-                        logger.debug("✅ Stagehand API server is running and healthy")
-                        return True
-                    else:
-                        # If the browser api is not healthy, we need to restart the browser api
-                        # Pass API key securely as environment variable instead of command line argument
-                        env_vars = {"GEMINI_API_KEY": config.GEMINI_API_KEY}
-
-                        response = await self.sandbox.process.exec(
-                            "curl -X POST 'http://localhost:8004/api/init' -H 'Content-Type: application/json' -d '{\"api_key\": \"'$GEMINI_API_KEY'\"}'",
-                            timeout=90,
-                            env=env_vars
-                        )
-                        if response.exit_code == 0:
-                            logger.debug("Stagehand API server restarted successfully")
-                            return True
-                        else:
-                            logger.warning(f"Stagehand API server restart failed: {response.result}")
-                            return False
-                except json.JSONDecodeError:
-                    logger.warning(f"Stagehand API server responded but with invalid JSON: {response.result}")
-                    return False
-            else:
-                logger.warning(f"Stagehand API server health check failed with exit code {response.exit_code}")
-                return False
-                
+            channel = await self._get_channel()
+            return await channel.ensure_ready()
         except Exception as e:
             logger.error(f"Error checking Stagehand API health: {e}")
             return False
 
-    async def _execute_stagehand_api(self, endpoint: str, params: dict = None, method: str = "POST") -> ToolResult:
+    async def _execute_stagehand_api(self, endpoint: str, params: dict = None, timeout: int = REQUEST_TIMEOUT) -> ToolResult:
         """Execute a Stagehand action through the sandbox API"""
         try:
-            # Ensure sandbox is initialized
-            await self._ensure_sandbox()
-            
+            channel = await self._get_channel()
+
             # Check if Stagehand API server is running
             stagehand_healthy = await self._check_stagehand_api_health()
-            
+
             if not stagehand_healthy:
-                error_msg = "Stagehand API server is not running. Please ensure the Stagehand API server is running. Error: {response}"
-                
+                error_msg = "Stagehand API server is not running. Please ensure the Stagehand API server is running."
+
                 # Add debug information
                 debug_info = await self._debug_sandbox_services()
                 error_msg += f"\n\nDebug information:\n{debug_info}"
-                
+
                 logger.error(error_msg)
                 return self.fail_response(error_msg)
-            
-            
-            # Build the curl command to call the local Stagehand API
-            url = f"http://localhost:8004/api/{endpoint}"  # Fixed localhost as curl runs inside container
-            
-            if method == "GET" and params:
-                query_params = "&".join([f"{k}={v}" for k, v in params.items()])
-                url = f"{url}?{query_params}"
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-            else:
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-                if params:
-                    json_data = json.dumps(params)
-                    curl_cmd += f" -d '{json_data}'"
-            
-            logger.debug(f"\033[95mExecuting curl command:\033[0m\n{curl_cmd}")
-            
-            response = await self.sandbox.process.exec(curl_cmd, timeout=30)  # Execute curl inside sandbox
-            
-            if response.exit_code == 0:
-                try:
-                    result = json.loads(response.result)
-                    logger.debug(f"Stagehand API result: {result}")
-
-                    logger.debug("Stagehand API request completed successfully")
-
-                    if "screenshot_base64" in result:
-                        try:
-                            screenshot_data = result["screenshot_base64"]
-                            is_valid, validation_message = self._validate_base64_image(screenshot_data)
-                            
-                            if is_valid:
-                                logger.debug(f"Screenshot validation passed: {validation_message}")
-                                image_url = await upload_base64_image(screenshot_data)
-                                result["image_url"] = image_url
-                                logger.debug(f"Uploaded screenshot to {image_url}")
-                            else:
-                                logger.warning(f"Screenshot validation failed: {validation_message}")
-                                result["image_validation_error"] = validation_message
-                                
-                            del result["screenshot_base64"]
-                            
-                        except Exception as e:
-                            logger.error(f"Failed to process screenshot: {e}")
-                            result["image_upload_error"] = str(e)
-                    
-                    result["input"] = params
-                    added_message = await self.thread_manager.add_message(
-                        thread_id=self.thread_id,
-                        type="browser_state",
-                        content=result,
-                        is_llm_message=False
-                    )
 
-                    # Prepare clean response for agent (filter out internal metadata)
-                    # Only include data that's useful for the agent's decision making
-                    clean_result = {
-                        "success": result.get("success", True),
-                        "message": result.get("message", "Stagehand action completed successfully")
-                    }
-
-                    # Include only data that actually comes from browserApi.ts
-                    if result.get("url"):
-                        clean_result["url"] = result["url"]
-                    if result.get("title"):
-                        clean_result["title"] = result["title"]
-                    if result.get("action"):
-                        clean_result["action"] = result["action"]
-                    if result.get("image_url"):  # This is screenshot_base64 converted to image_url
-                        clean_result["image_url"] = result["image_url"]
-                    
-                    # Include any error context that's useful for the agent
-                    if result.get("image_validation_error"):
-                        clean_result["screenshot_issue"] = f"Screenshot processing issue: {result['image_validation_error']}"
-                    if result.get("image_upload_error"):
-                        clean_result["screenshot_issue"] = f"Screenshot upload issue: {result['image_upload_error']}"
-                    clean_result["message_id"] = added_message.get("message_id")
-
-                    if clean_result.get("success"):
-                        return self.success_response(clean_result)
-                    else:
-                        # Handle error responses with helpful context  
-                        error_msg = result.get("error", result.get("message", "Unknown error"))
-                        clean_result["message"] = error_msg
-                        return self.fail_response(clean_result)
+            logger.debug(f"Calling Stagehand API /{endpoint} over {channel.transport}")
+            try:
+                result = await channel.call(endpoint, params, timeout=timeout)
+            except BrowserAPIError as e:
+                logger.error(f"Stagehand API request failed: {e}")
+                return self.fail_response(f"Stagehand API request failed: {e}")
 
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse response JSON: {response.result} {e}")
-                    return self.fail_response(f"Failed to parse response JSON: {response.result} {e}")
-            else:
-                # Check if it's a connection error (exit code 7)
-                if response.exit_code == 7:
-                    error_msg = f"Stagehand API server is not available on port 8004. Please ensure the Stagehand API server is running. Error: {response}"
-                    logger.error(error_msg)
-                    return self.fail_response(error_msg)
-                else:
-                    logger.error(f"Stagehand API request failed: {response}")
-                    return self.fail_response(f"Stagehand API request failed: {response}")
+            logger.debug("Stagehand API request completed successfully")
+            return await self._process_stagehand_result(result, params)
 
         except Exception as e:
             logger.error(f"Error executing Stagehand action: {e}")
             logger.debug(traceback.format_exc())
             return self.fail_response(f"Error executing Stagehand action: {e}")
 
+    async def _process_stagehand_result(self, result: dict, params: dict) -> ToolResult:
+        """Upload the screenshot, record the browser state and build the agent-facing result"""
+        if "screenshot_base64" in result:
+            try:
+                # Returns as soon as the image is validated; the upload happens
+                # in the background and the URL resolves once it lands
+                screenshot = await self._screenshots.submit(result.pop("screenshot_base64"))
+                result["image_url"] = screenshot.url
+                logger.debug(f"Screenshot {'reused' if screenshot.duplicate else 'queued'} at {screenshot.url}")
+            except ValueError as e:
+                logger.warning(f"Screenshot validation failed: {e}")
+                result["image_validation_error"] = str(e)
+            except Exception as e:
+                logger.error(f"Failed to process screenshot: {e}")
+                result["image_upload_error"] = str(e)
+
+        result["input"] = params
+        added_message = await self.thread_manager.add_message(
+            thread_id=self.thread_id,
+            type="browser_state",
+            content=result,
+            is_llm_message=False
+        )
+
+        # Prepare clean response for agent (filter out internal metadata)
+        # Only include data that's useful for the agent's decision making
+        clean_result = {
+            "success": result.get("success", True),
+            "message": result.get("message", "Stagehand action completed successfully")
+        }
+
+        # Include only data that actually comes from browserApi.ts
+        if result.get("url"):
+            clean_result["url"] = result["url"]
+        if result.get("title"):
+            clean_result["title"] = result["title"]
+        if result.get("action"):
+            clean_result["action"] = result["action"]
+        if result.get("steps"):
+            clean_result["steps"] = result["steps"]
+        if result.get("image_url"):  # This is screenshot_base64 converted to image_url
+            clean_result["image_url"] = result["image_url"]
+
+        # Include any error context that's useful for the agent
+        if result.get("image_validation_error"):
+            clean_result["screenshot_issue"] = f"Screenshot processing issue: {result['image_validation_error']}"
+        if result.get("image_upload_error"):
+            clean_result["screenshot_issue"] = f"Screenshot upload issue: {result['image_upload_error']}"
+        clean_result["message_id"] = added_message.get("message_id")
+
+        if clean_result.get("success"):
+            return self.success_response(clean_result)
+        else:
+            # Handle error responses with helpful context
+            error_msg = result.get("error", result.get("message", "Unknown error"))
+            clean_result["message"] = error_msg
+            return self.fail_response(clean_result)
+
+    async def cleanup(self):
+        """Close the persistent channel to the browser API and finish pending screenshot uploads."""
+        try:
+            await self._screenshots.drain()
+        finally:
+            if self._channel is not None:
+                await self._channel.close()
+                self._channel = None
+
     # Core Functions Only
     
     @openapi_schema({
@@ -448,3 +341,73 @@ class BrowserTool(SandboxToolsBase):
         """Take a screenshot using Stagehand."""
         logger.debug(f"Browser taking screenshot: {name}")
         return await self._execute_stagehand_api("screenshot", {"name": name})
+
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "browser_run_actions",
+            "description": "Run a sequence of browser steps (navigate, act, extract, wait) in a single call. Use this when you already know the next few steps, e.g. navigate to a page, wait for it to load, then extract content. Steps run in order and a single screenshot of the final page state is returned, along with the outcome of every step (including extracted content). By default the sequence stops at the first failing step. Do not use this for steps that need the file upload handling of browser_act unless the step includes filePath.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "steps": {
+                        "type": "array",
+                        "description": f"The steps to run, at most {MAX_ACTION_STEPS}. Each step has a 'type' and the fields for that type: navigate {{url}}, act {{action, variables, iframes, filePath}}, extract {{instruction, iframes}}, wait {{seconds (max 30), load_state ('load', 'domcontentloaded' or 'networkidle')}}.",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "type": {"type": "string", "enum": list(STEP_REQUIRED_FIELDS)},
+                                "url": {"type": "string"},
+                                "action": {"type": "string"},
+                                "variables": {"type": "object", "additionalProperties": {"type": "string"}},
+                                "iframes": {"type": "boolean"},
+                                "filePath": {"type": "string"},
+                                "instruction": {"type": "string"},
+                                "seconds": {"type": "number"},
+                                "load_state": {"type": "string", "enum": ["load", "domcontentloaded", "networkidle"]}
+                            },
+                            "required": ["type"]
+                        }
+                    },
+                    "stop_on_error": {
+                        "type": "boolean",
+                        "description": "Stop at the first failing step (default true). Set to false to run the remaining steps anyway.",
+                        "default": True
+                    }
+                },
+                "required": ["steps"]
+            }
+        }
+    })
+    @usage_example('''
+        <function_calls>
+        <invoke name="browser_run_actions">
+        <parameter name="steps">[{"type": "navigate", "url": "https://example.com/products"}, {"type": "wait", "load_state": "networkidle"}, {"type": "act", "action": "click the 'Sort by price' button"}, {"type": "extract", "instruction": "extract the names and prices of the first 10 products"}]</parameter>
+        </invoke>
+        </function_calls>
+        ''')
+    async def browser_run_actions(self, steps: list, stop_on_error: bool = True) -> ToolResult:
+        """Run a sequence of browser steps in one request to the browser API."""
+        if isinstance(steps, str):
+            try:
+                steps = json.loads(steps)
+            except json.JSONDecodeError:
+                return self.fail_response("steps must be a JSON array of step objects")
+        if not isinstance(steps, list) or not steps:
+            return self.fail_response("steps must be a non-empty array of step objects")
+        if len(steps) > MAX_ACTION_STEPS:
+            return self.fail_response(f"Too many steps ({len(steps)}); at most {MAX_ACTION_STEPS} can run in one call")
+
+        for index, step in enumerate(steps):
+            if not isinstance(step, dict) or step.get("type") not in STEP_REQUIRED_FIELDS:
+                return self.fail_response(
+                    f"Step {index} must be an object with a type of {', '.join(STEP_REQUIRED_FIELDS)}"
+                )
+            missing = [field for field in STEP_REQUIRED_FIELDS[step["type"]] if not step.get(field)]
+            if missing:
+                return self.fail_response(f"Step {index} ({step['type']}) is missing {', '.join(missing)}")
+
+        logger.debug(f"Browser running {len(steps)} steps: {[step['type'] for step in steps]}")
+        timeout = min(MAX_SEQUENCE_TIMEOUT, REQUEST_TIMEOUT * len(steps))
+        params = {"steps": steps, "stop_on_error": stop_on_error}
+        return await self._execute_stagehand_api("run-actions", params, timeout=timeout)
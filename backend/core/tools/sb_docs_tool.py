@@ -28,7 +28,7 @@ class SandboxDocsTool(SandboxToolsBase):
     async def _load_metadata(self) -> Dict[str, Any]:
         try:
             await self._ensure_sandbox()
-            content = await self.sandbox.fs.download_file(self.metadata_file)
+            content = await self.files.read(self.metadata_file)
             return json.loads(content.decode())
         except:
             return {"documents": {}}
@@ -36,7 +36,7 @@ class SandboxDocsTool(SandboxToolsBase):
     async def _save_metadata(self, metadata: Dict[str, Any]):
         await self._ensure_sandbox()
         content = json.dumps(metadata, indent=2)
-        await self.sandbox.fs.upload_file(content.encode(), self.metadata_file)
+        await self.files.write(self.metadata_file, content.encode())
         
     def _generate_doc_id(self) -> str:
         return f"doc_{uuid.uuid4().hex[:8]}"
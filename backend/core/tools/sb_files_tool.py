@@ -14,6 +14,10 @@ from typing import Optional
 class SandboxFilesTool(SandboxToolsBase):
     """Tool for executing file system operations in a Daytona sandbox. All operations are performed relative to the /workspace directory."""
 
+    # Edits are buffered in the run's file access layer and uploaded together at turn end
+    defers_file_writes = True
+    writes_through_file_access = True
+
     def __init__(self, project_id: str, thread_manager: ThreadManager):
         super().__init__(project_id, thread_manager)
         self.SNIPPET_LINES = 4  # Number of context lines to show around edits
@@ -29,47 +33,7 @@ class SandboxFilesTool(SandboxToolsBase):
 
     async def _file_exists(self, path: str) -> bool:
         """Check if a file exists in the sandbox"""
-        try:
-            await self.sandbox.fs.get_file_info(path)
-            return True
-        except Exception:
-            return False
-
-    async def get_workspace_state(self) -> dict:
-        """Get the current workspace state by reading all files"""
-        files_state = {}
-        try:
-            # Ensure sandbox is initialized
-            await self._ensure_sandbox()
-            
-            files = await self.sandbox.fs.list_files(self.workspace_path)
-            for file_info in files:
-                rel_path = file_info.name
-                
-                # Skip excluded files and directories
-                if self._should_exclude_file(rel_path) or file_info.is_dir:
-                    continue
-
-                try:
-                    full_path = f"{self.workspace_path}/{rel_path}"
-                    content = (await self.sandbox.fs.download_file(full_path)).decode()
-                    files_state[rel_path] = {
-                        "content": content,
-                        "is_dir": file_info.is_dir,
-                        "size": file_info.size,
-                        "modified": file_info.mod_time
-                    }
-                except Exception as e:
-                    print(f"Error reading file {rel_path}: {e}")
-                except UnicodeDecodeError:
-                    print(f"Skipping binary file: {rel_path}")
-
-            return files_state
-        
-        except Exception as e:
-            print(f"Error getting workspace state: {str(e)}")
-            return {}
-
+        return await self.files.exists(path)
 
     # def _get_preview_url(self, file_path: str) -> Optional[str]:
     #     """Get the preview URL for a file if it's an HTML file."""
@@ -138,8 +102,7 @@ class SandboxFilesTool(SandboxToolsBase):
                 file_contents = json.dumps(file_contents, indent=4)
             
             # Write the file content
-            await self.sandbox.fs.upload_file(file_contents.encode(), full_path)
-            await self.sandbox.fs.set_file_permissions(full_path, permissions)
+            await self.files.write(full_path, file_contents.encode(), permissions, defer=True)
             
             message = f"File '{file_path}' created successfully."
             
@@ -201,7 +164,7 @@ class SandboxFilesTool(SandboxToolsBase):
             if not await self._file_exists(full_path):
                 return self.fail_response(f"File '{file_path}' does not exist")
             
-            content = (await self.sandbox.fs.download_file(full_path)).decode()
+            content = (await self.files.read(full_path)).decode()
             old_str = old_str.expandtabs()
             new_str = new_str.expandtabs()
             
@@ -214,7 +177,7 @@ class SandboxFilesTool(SandboxToolsBase):
             
             # Perform replacement
             new_content = content.replace(old_str, new_str)
-            await self.sandbox.fs.upload_file(new_content.encode(), full_path)
+            await self.files.write(full_path, new_content.encode(), defer=True)
             
             # Show snippet around the edit
             replacement_line = content.split(old_str)[0].count('\n')
@@ -282,8 +245,7 @@ class SandboxFilesTool(SandboxToolsBase):
             if not await self._file_exists(full_path):
                 return self.fail_response(f"File '{file_path}' does not exist. Use create_file to create a new file.")
             
-            await self.sandbox.fs.upload_file(file_contents.encode(), full_path)
-            await self.sandbox.fs.set_file_permissions(full_path, permissions)
+            await self.files.write(full_path, file_contents.encode(), permissions, defer=True)
             
             message = f"File '{file_path}' completely rewritten successfully."
             
@@ -335,7 +297,7 @@ class SandboxFilesTool(SandboxToolsBase):
             if not await self._file_exists(full_path):
                 return self.fail_response(f"File '{file_path}' does not exist")
             
-            await self.sandbox.fs.delete_file(full_path)
+            await self.files.delete(full_path)
             return self.success_response(f"File '{file_path}' deleted successfully.")
         except Exception as e:
             return self.fail_response(f"Error deleting file: {str(e)}")
@@ -492,7 +454,7 @@ def authenticate_user(username, password):
                 return self.fail_response(f"File '{target_file}' does not exist")
             
             # Read current content
-            original_content = (await self.sandbox.fs.download_file(full_path)).decode()
+            original_content = (await self.files.read(full_path)).decode()
             
             # Try Morph AI editing first
             logger.debug(f"Attempting AI-powered edit for file '{target_file}' with instructions: {instructions[:100]}...")
@@ -523,7 +485,7 @@ def authenticate_user(username, password):
                 }))
 
             # AI editing successful
-            await self.sandbox.fs.upload_file(new_content.encode(), full_path)
+            await self.files.write(full_path, new_content.encode(), defer=True)
             
             # Return rich data for frontend diff view
             return ToolResult(success=True, output=json.dumps({
@@ -540,7 +502,7 @@ def authenticate_user(username, password):
             try:
                 full_path_on_error = f"{self.workspace_path}/{self.clean_path(target_file)}"
                 if await self._file_exists(full_path_on_error):
-                    original_content_on_error = (await self.sandbox.fs.download_file(full_path_on_error)).decode()
+                    original_content_on_error = (await self.files.read(full_path_on_error)).decode()
             except:
                 pass
             
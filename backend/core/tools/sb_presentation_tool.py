@@ -1,13 +1,66 @@
 from core.agentpress.tool import ToolResult, openapi_schema, usage_example
 from core.sandbox.tool_base import SandboxToolsBase
+from core.sandbox.file_access import DeferredWriteError
 from core.agentpress.thread_manager import ThreadManager
-from typing import List, Dict, Optional
+from core.utils.logger import logger
+from typing import Any, List, Dict, Optional
+import asyncio
+import inspect
 import json
 import os
+import shlex
+import weakref
 from datetime import datetime
 import re
 from .presentation_styles_config import get_style_config, get_all_styles
 
+MAX_SLIDES_PER_BATCH = 50
+
+# "<sandbox_id>:<presentation_path>" -> lock serializing metadata commits within this process
+_metadata_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def apply_metadata_journal(metadata: Dict[str, Any], entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply journal entries to presentation metadata.
+
+    Runs both here and, embedded in the commit script, inside the sandbox, so it
+    must stay self-contained.
+    """
+    metadata.setdefault("slides", {})
+    for entry in entries:
+        op = entry["op"]
+        if op == "set":
+            metadata.update(entry["fields"])
+        elif op == "put_slide":
+            metadata["slides"][str(entry["slide_number"])] = entry["slide"]
+        elif op == "delete_slide":
+            metadata["slides"].pop(str(entry["slide_number"]), None)
+    return metadata
+
+
+# Commits a journal inside the sandbox: takes an exclusive lock on the
+# presentation, re-reads metadata.json, replays the entries and atomically
+# replaces the file, so edits made concurrently by other runs are merged rather
+# than overwritten. Prints the resulting metadata.
+_METADATA_COMMIT_SCRIPT = "from typing import Any, Dict, List\n" + inspect.getsource(apply_metadata_journal) + '''
+import fcntl, json, os, sys, tempfile
+path = sys.argv[1]
+with open(os.path.join(os.path.dirname(path), ".metadata.lock"), "a") as lock:
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    try:
+        with open(path) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        metadata = json.loads(sys.argv[3])
+    apply_metadata_journal(metadata, json.loads(sys.argv[2]))
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".metadata-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+print(json.dumps(metadata))
+'''
+
 class SandboxPresentationTool(SandboxToolsBase):
     """
     Per-slide HTML presentation tool for creating professional presentations.
@@ -42,6 +95,16 @@ class SandboxPresentationTool(SandboxToolsBase):
         """Convert presentation name to safe filename"""
         return "".join(c for c in name if c.isalnum() or c in "-_").lower()
 
+    def _validate_slide(self, slide_number: int, slide_title: str, content: str) -> Optional[str]:
+        """Return the validation error for a slide, or None if it is valid"""
+        if not isinstance(slide_number, int) or slide_number < 1:
+            return "Slide number must be 1 or greater."
+        if not slide_title:
+            return "Slide title is required."
+        if not content:
+            return "Slide content is required."
+        return None
+
     def _get_style_config(self, style_name: str) -> Dict:
         """Get style configuration for a given style name"""
         return get_style_config(style_name)
@@ -202,28 +265,75 @@ class SandboxPresentationTool(SandboxToolsBase):
 </html>"""
         return html_template
 
+    def _default_metadata(self) -> Dict:
+        return {
+            "presentation_name": "",
+            "title": "Presentation",
+            "description": "",
+            "slides": {},
+            "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat()
+        }
+
     async def _load_presentation_metadata(self, presentation_path: str):
         """Load presentation metadata, create if doesn't exist"""
         metadata_path = f"{presentation_path}/metadata.json"
         try:
-            metadata_content = await self.sandbox.fs.download_file(metadata_path)
+            metadata_content = await self.files.read(metadata_path)
             return json.loads(metadata_content.decode())
         except:
-            # Create default metadata
-            return {
-                "presentation_name": "",
-                "title": "Presentation", 
-                "description": "",
-                "slides": {},
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
-            }
+            return self._default_metadata()
+
+    async def _commit_metadata(self, presentation_path: str, entries: List[Dict[str, Any]]) -> Dict:
+        """Apply a journal of metadata edits as one atomic update and return the result.
 
-    async def _save_presentation_metadata(self, presentation_path: str, metadata: Dict):
-        """Save presentation metadata"""
-        metadata["updated_at"] = datetime.now().isoformat()
+        The entries are replayed onto the current metadata.json inside the
+        sandbox under a file lock. If the sandbox cannot run the commit script
+        they are replayed here instead, serialized by a process-local lock.
+        """
+        entries = entries + [{"op": "set", "fields": {"updated_at": datetime.now().isoformat()}}]
         metadata_path = f"{presentation_path}/metadata.json"
-        await self.sandbox.fs.upload_file(json.dumps(metadata, indent=2).encode(), metadata_path)
+        lock_key = f"{self.sandbox_id}:{presentation_path}"
+        lock = _metadata_locks.get(lock_key)
+        if lock is None:
+            lock = _metadata_locks[lock_key] = asyncio.Lock()
+
+        async with lock:
+            command = " ".join([
+                "python3", "-c", shlex.quote(_METADATA_COMMIT_SCRIPT),
+                shlex.quote(metadata_path),
+                shlex.quote(json.dumps(entries)),
+                shlex.quote(json.dumps(self._default_metadata())),
+            ])
+            try:
+                response = await self.sandbox.process.exec(command, timeout=60)
+                if response.exit_code == 0:
+                    self.files.invalidate(metadata_path)
+                    return json.loads(response.result.strip().splitlines()[-1])
+                logger.warning(f"Metadata commit script failed for {presentation_path}: {response.result}")
+            except Exception as e:
+                logger.warning(f"Metadata commit script failed for {presentation_path}: {str(e)}")
+
+            metadata = apply_metadata_journal(await self._load_presentation_metadata(presentation_path), entries)
+            await self.files.write(metadata_path, json.dumps(metadata, indent=2).encode())
+            return metadata
+
+    def _slide_metadata(self, safe_name: str, slide_number: int, slide_title: str, style: str) -> Dict[str, Any]:
+        slide_filename = f"slide_{slide_number:02d}.html"
+        return {
+            "title": slide_title,
+            "filename": slide_filename,
+            "file_path": f"{self.presentations_dir}/{safe_name}/{slide_filename}",
+            "preview_url": f"/workspace/{self.presentations_dir}/{safe_name}/{slide_filename}",
+            "style": style,
+            "created_at": datetime.now().isoformat()
+        }
+
+    def _presentation_fields(self, presentation_name: str, presentation_title: str) -> Dict[str, Any]:
+        fields = {"presentation_name": presentation_name}
+        if presentation_title != "Presentation":  # Only update if explicitly provided
+            fields["title"] = presentation_title
+        return fields
 
     @openapi_schema({
         "type": "function",
@@ -314,24 +424,13 @@ This approach allows you to:
             if not presentation_name:
                 return self.fail_response("Presentation name is required.")
             
-            if slide_number < 1:
-                return self.fail_response("Slide number must be 1 or greater.")
-            
-            if not slide_title:
-                return self.fail_response("Slide title is required.")
-            
-            if not content:
-                return self.fail_response("Slide content is required.")
+            error = self._validate_slide(slide_number, slide_title, content)
+            if error:
+                return self.fail_response(error)
             
             # Ensure presentation directory exists
             safe_name, presentation_path = await self._ensure_presentation_dir(presentation_name)
             
-            # Load or create metadata
-            metadata = await self._load_presentation_metadata(presentation_path)
-            metadata["presentation_name"] = presentation_name
-            if presentation_title != "Presentation":  # Only update if explicitly provided
-                metadata["title"] = presentation_title
-            
             # Create slide HTML
             slide_html = self._create_slide_html(
                 slide_content=content,
@@ -343,24 +442,14 @@ This approach allows you to:
             
             # Save slide file
             slide_filename = f"slide_{slide_number:02d}.html"
-            slide_path = f"{presentation_path}/{slide_filename}"
-            await self.sandbox.fs.upload_file(slide_html.encode(), slide_path)
+            await self.files.write(f"{presentation_path}/{slide_filename}", slide_html.encode())
             
             # Update metadata
-            if "slides" not in metadata:
-                metadata["slides"] = {}
-            
-            metadata["slides"][str(slide_number)] = {
-                "title": slide_title,
-                "filename": slide_filename,
-                "file_path": f"{self.presentations_dir}/{safe_name}/{slide_filename}",
-                "preview_url": f"/workspace/{self.presentations_dir}/{safe_name}/{slide_filename}",
-                "style": style,
-                "created_at": datetime.now().isoformat()
-            }
-            
-            # Save updated metadata
-            await self._save_presentation_metadata(presentation_path, metadata)
+            metadata = await self._commit_metadata(presentation_path, [
+                {"op": "set", "fields": self._presentation_fields(presentation_name, presentation_title)},
+                {"op": "put_slide", "slide_number": slide_number,
+                 "slide": self._slide_metadata(safe_name, slide_number, slide_title, style)},
+            ])
             
             return self.success_response({
                 "message": f"Slide {slide_number} '{slide_title}' created/updated successfully with '{style}' style",
@@ -378,6 +467,174 @@ This approach allows you to:
         except Exception as e:
             return self.fail_response(f"Failed to create slide: {str(e)}")
 
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "create_slides",
+            "description": f"Create or update several slides of a presentation in one call (up to {MAX_SLIDES_PER_BATCH}). Prefer this over repeated create_slide calls when writing a whole deck or many slides at once. Every slide is validated before anything is written; the slide files are uploaded together and the presentation metadata is updated once. Slides take the same fields as create_slide.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "presentation_name": {
+                        "type": "string",
+                        "description": "Name of the presentation (creates folder if doesn't exist)"
+                    },
+                    "slides": {
+                        "type": "array",
+                        "description": "Slides to create or update",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "slide_number": {
+                                    "type": "integer",
+                                    "description": "Slide number (1-based). If slide exists, it will be updated."
+                                },
+                                "slide_title": {
+                                    "type": "string",
+                                    "description": "Title of this specific slide (for reference and navigation)"
+                                },
+                                "content": {
+                                    "type": "string",
+                                    "description": "HTML content for the slide body, as for create_slide"
+                                },
+                                "style": {
+                                    "type": "string",
+                                    "description": "Optional per-slide style, overrides the batch style"
+                                }
+                            },
+                            "required": ["slide_number", "slide_title", "content"]
+                        }
+                    },
+                    "presentation_title": {
+                        "type": "string",
+                        "description": "Main title of the presentation (used in HTML title and navigation)",
+                        "default": "Presentation"
+                    },
+                    "style": {
+                        "type": "string",
+                        "description": "Visual style theme applied to every slide that does not set its own. Use 'presentation_styles' tool to see all available options.",
+                        "default": "default"
+                    }
+                },
+                "required": ["presentation_name", "slides"]
+            }
+        }
+    })
+    @usage_example('''
+<function_calls>
+<invoke name="create_slides">
+<parameter name="presentation_name">modern_web_development</parameter>
+<parameter name="presentation_title">Modern Web Development Trends 2024</parameter>
+<parameter name="style">glacier</parameter>
+<parameter name="slides">[
+  {"slide_number": 1, "slide_title": "Title Slide", "content": "<div style='height: 100%; display: flex; align-items: center; justify-content: center;'><h1 style='font-size: 72px;'>Modern Web Development</h1></div>"},
+  {"slide_number": 2, "slide_title": "Frontend Frameworks", "content": "<div style='padding: 80px;'><h1 style='font-size: 48px;'>Frontend Frameworks</h1><p style='font-size: 24px;'>React, Vue.js and Svelte</p></div>"},
+  {"slide_number": 3, "slide_title": "Thank You", "content": "<div style='height: 100%; display: flex; align-items: center; justify-content: center;'><h1 style='font-size: 64px;'>Thank You</h1></div>"}
+]</parameter>
+</invoke>
+</function_calls>
+    ''')
+    async def create_slides(
+        self,
+        presentation_name: str,
+        slides: List[Dict[str, Any]],
+        presentation_title: str = "Presentation",
+        style: str = "default"
+    ) -> ToolResult:
+        """Create or update many slides with one batched upload and one metadata update"""
+        try:
+            await self._ensure_sandbox()
+            await self._ensure_presentations_dir()
+
+            if not presentation_name:
+                return self.fail_response("Presentation name is required.")
+            if isinstance(slides, str):
+                try:
+                    slides = json.loads(slides)
+                except json.JSONDecodeError:
+                    return self.fail_response("slides must be a JSON array of slide objects.")
+            if not isinstance(slides, list) or not slides:
+                return self.fail_response("At least one slide is required.")
+            if len(slides) > MAX_SLIDES_PER_BATCH:
+                return self.fail_response(f"At most {MAX_SLIDES_PER_BATCH} slides can be created per call.")
+
+            # Validate every slide before writing anything, reporting all problems at once.
+            # Validated slides are copies, the caller's dicts are left as they were
+            errors = []
+            seen_numbers = set()
+            validated = []
+            for i, slide in enumerate(slides, start=1):
+                if not isinstance(slide, dict):
+                    errors.append(f"Slide entry {i}: must be an object.")
+                    continue
+                try:
+                    slide_number = int(slide.get("slide_number"))
+                except (TypeError, ValueError):
+                    errors.append(f"Slide entry {i}: slide_number must be an integer.")
+                    continue
+                error = self._validate_slide(slide_number, slide.get("slide_title"), slide.get("content"))
+                if error:
+                    errors.append(f"Slide {slide_number}: {error}")
+                elif slide_number in seen_numbers:
+                    errors.append(f"Slide {slide_number}: slide number appears more than once.")
+                seen_numbers.add(slide_number)
+                validated.append({**slide, "slide_number": slide_number})
+            if errors:
+                return self.fail_response("Invalid slides, nothing was written:\n" + "\n".join(errors))
+
+            safe_name, presentation_path = await self._ensure_presentation_dir(presentation_name)
+
+            # Buffer every slide file and upload them as a single batch
+            entries = [{"op": "set", "fields": self._presentation_fields(presentation_name, presentation_title)}]
+            created = []
+            for slide in sorted(validated, key=lambda s: s["slide_number"]):
+                slide_number = slide["slide_number"]
+                slide_style = slide.get("style") or style
+                slide_html = self._create_slide_html(
+                    slide_content=slide["content"],
+                    slide_number=slide_number,
+                    total_slides=0,
+                    presentation_title=presentation_title,
+                    style=slide_style
+                )
+                slide_filename = f"slide_{slide_number:02d}.html"
+                await self.files.write(f"{presentation_path}/{slide_filename}", slide_html.encode(), defer=True)
+                entries.append({
+                    "op": "put_slide",
+                    "slide_number": slide_number,
+                    "slide": self._slide_metadata(safe_name, slide_number, slide["slide_title"], slide_style)
+                })
+                created.append({
+                    "slide_number": slide_number,
+                    "slide_title": slide["slide_title"],
+                    "slide_file": f"{self.presentations_dir}/{safe_name}/{slide_filename}",
+                    "preview_url": f"/workspace/{self.presentations_dir}/{safe_name}/{slide_filename}",
+                    "style": slide_style
+                })
+            # The metadata only changes once every slide file is in the sandbox
+            try:
+                await self.files.flush()
+            except DeferredWriteError as e:
+                failed = "\n".join(f"- {path}: {error}" for path, error in e.failed.items())
+                return self.fail_response(
+                    "Failed to upload some slide files, so none of the slides were added to the presentation; "
+                    f"call create_slides again:\n{failed}"
+                )
+
+            metadata = await self._commit_metadata(presentation_path, entries)
+
+            return self.success_response({
+                "message": f"{len(created)} slides created/updated successfully",
+                "presentation_name": presentation_name,
+                "presentation_path": f"{self.presentations_dir}/{safe_name}",
+                "slides": created,
+                "total_slides": len(metadata["slides"]),
+                "note": "Slides saved as standalone HTML files with 1920x1080 dimensions"
+            })
+
+        except Exception as e:
+            return self.fail_response(f"Failed to create slides: {str(e)}")
+
     @openapi_schema({
         "type": "function",
         "function": {
@@ -490,15 +747,14 @@ This approach allows you to:
             # Delete slide file
             slide_path = f"{presentation_path}/{slide_filename}"
             try:
-                await self.sandbox.fs.delete_file(slide_path)
+                await self.files.delete(slide_path)
             except:
                 pass  # File might not exist
             
             # Remove from metadata
-            del metadata["slides"][str(slide_number)]
-            
-            # Save updated metadata
-            await self._save_presentation_metadata(presentation_path, metadata)
+            metadata = await self._commit_metadata(presentation_path, [
+                {"op": "delete_slide", "slide_number": slide_number}
+            ])
             
             return self.success_response({
                 "message": f"Slide {slide_number} '{slide_info['title']}' deleted successfully",
@@ -1,24 +1,17 @@
 from __future__ import annotations
 
-import csv
-import io
-import json
+import asyncio
 from dataclasses import dataclass
 from io import BytesIO
-from statistics import mean
 from typing import Any, Dict, List, Optional, Tuple
 
-import chardet
 from core.agentpress.tool import ToolResult, openapi_schema, usage_example
 from core.sandbox.tool_base import SandboxToolsBase
+from core.tools.utils import sheets_engine
 from core.utils.logger import logger
 
 try:
     import openpyxl
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
-    from openpyxl.chart import BarChart, LineChart, PieChart, Reference, Series, ScatterChart
-    from openpyxl.formatting.rule import ColorScaleRule
 except Exception:
     openpyxl = None
 
@@ -30,103 +23,64 @@ class SheetData:
 
 
 class SandboxSheetsTool(SandboxToolsBase):
+    """Spreadsheet tools. Parsing, statistics and serialization run in
+    ``core.tools.utils.sheets_engine`` on a worker thread."""
+
+    writes_through_file_access = True
+
     def __init__(self, project_id: str, thread_manager):
         super().__init__(project_id, thread_manager)
 
     async def _file_exists(self, full_path: str) -> bool:
-        try:
-            await self.sandbox.fs.get_file_info(full_path)
-            return True
-        except Exception:
-            return False
+        return await self.files.exists(full_path)
 
     async def _download_bytes(self, full_path: str) -> bytes:
-        return await self.sandbox.fs.download_file(full_path)
+        return await self.files.read(full_path)
 
     async def _upload_bytes(self, full_path: str, data: bytes, permissions: str = "644") -> None:
-        await self.sandbox.fs.upload_file(data, full_path)
-        await self.sandbox.fs.set_file_permissions(full_path, permissions)
+        await self.files.write(full_path, data, permissions)
 
-    def _detect_encoding(self, data: bytes) -> str:
-        try:
-            result = chardet.detect(data)
-            return result.get("encoding") or "utf-8"
-        except Exception:
-            return "utf-8"
-
-    def _read_csv_bytes(self, data: bytes) -> SheetData:
-        encoding = self._detect_encoding(data)
-        text = data.decode(encoding, errors="replace")
-        reader = csv.reader(io.StringIO(text))
-        rows = [list(r) for r in reader]
-        if not rows:
-            return SheetData(headers=[], rows=[])
-        headers = [str(h) for h in rows[0]]
-        data_rows = rows[1:] if len(rows) > 1 else []
-        return SheetData(headers=headers, rows=data_rows)
-
-    def _write_csv_bytes(self, sheet: SheetData) -> bytes:
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        if sheet.headers:
-            writer.writerow(sheet.headers)
-        for r in sheet.rows:
-            writer.writerow(["" if v is None else v for v in r])
-        return buf.getvalue().encode("utf-8")
-
-    def _read_xlsx_bytes(self, data: bytes, sheet_name: Optional[str]) -> SheetData:
-        if not openpyxl:
-            raise RuntimeError("openpyxl not available; cannot read XLSX")
-        wb = openpyxl.load_workbook(BytesIO(data), data_only=False)
-        ws = wb[sheet_name] if sheet_name else wb.active
-        rows = [list(row) for row in ws.iter_rows(values_only=True)]
-        if not rows:
-            return SheetData(headers=[], rows=[])
-        headers = ["" if h is None else str(h) for h in rows[0]]
-        data_rows = [[c for c in r] for r in rows[1:]] if len(rows) > 1 else []
-        return SheetData(headers=headers, rows=data_rows)
-
-    def _write_xlsx_bytes(self, sheet: SheetData, sheet_name: Optional[str]) -> bytes:
-        if not openpyxl:
-            raise RuntimeError("openpyxl not available; cannot write XLSX")
-        wb = Workbook()
-        ws = wb.active
-        if sheet_name:
-            ws.title = sheet_name
-        if sheet.headers:
-            ws.append(sheet.headers)
-        for r in sheet.rows:
-            ws.append([v for v in r])
-        out = BytesIO()
-        wb.save(out)
-        return out.getvalue()
+    def _sheet_ext(self, file_path: str) -> str:
+        ext = file_path.lower().rsplit(".", 1)[-1]
+        if ext not in ("csv", "xlsx"):
+            raise ValueError("Unsupported file extension. Use .csv or .xlsx")
+        return ext
+
+    def _read_sheet_bytes(self, data: bytes, ext: str, sheet_name: Optional[str]) -> SheetData:
+        rows = sheets_engine.iter_rows(data, ext, sheet_name)
+        headers = ["" if h is None else str(h) for h in (next(rows, None) or [])]
+        return SheetData(headers=headers, rows=[list(r) for r in rows])
 
     async def _load_sheet(self, file_path: str, sheet_name: Optional[str]) -> Tuple[str, SheetData]:
         file_path = self.clean_path(file_path)
         full_path = f"{self.workspace_path}/{file_path}"
+        ext = self._sheet_ext(file_path)
         data = await self._download_bytes(full_path)
-        if file_path.lower().endswith(".csv"):
-            return full_path, self._read_csv_bytes(data)
-        if file_path.lower().endswith(".xlsx"):
-            return full_path, self._read_xlsx_bytes(data, sheet_name)
-        raise ValueError("Unsupported file extension. Use .csv or .xlsx")
+        return full_path, await asyncio.to_thread(self._read_sheet_bytes, data, ext, sheet_name)
 
     async def _save_sheet(self, file_path: str, sheet: SheetData, sheet_name: Optional[str]) -> str:
         file_path = self.clean_path(file_path)
         full_path = f"{self.workspace_path}/{file_path}"
-        if file_path.lower().endswith(".csv"):
-            await self._upload_bytes(full_path, self._write_csv_bytes(sheet))
-        elif file_path.lower().endswith(".xlsx"):
-            await self._upload_bytes(full_path, self._write_xlsx_bytes(sheet, sheet_name))
+        ext = self._sheet_ext(file_path)
+        csv_bytes = await asyncio.to_thread(sheets_engine.write_csv, sheet.headers, sheet.rows)
+        if ext == "csv":
+            await self._upload_bytes(full_path, csv_bytes)
+        else:
+            xlsx_bytes = await asyncio.to_thread(sheets_engine.write_xlsx, sheet.headers, sheet.rows, sheet_name)
+            await self._upload_bytes(full_path, xlsx_bytes)
             try:
                 csv_full = f"{full_path.rsplit('.', 1)[0]}.csv"
-                await self._upload_bytes(csv_full, self._write_csv_bytes(sheet))
+                await self._upload_bytes(csv_full, csv_bytes)
             except Exception as e:
                 logger.warning(f"Failed to write CSV mirror for {full_path}: {e}")
-        else:
-            raise ValueError("Unsupported file extension. Use .csv or .xlsx")
         return full_path
 
+    def _serialize_workbook(self, wb, ws) -> Tuple[bytes, bytes]:
+        """Save an edited workbook and render its active sheet as the CSV mirror."""
+        out = BytesIO()
+        wb.save(out)
+        return out.getvalue(), sheets_engine.write_csv([], ws.iter_rows(values_only=True))
+
     def _infer_column_types(self, rows: List[List[Any]], headers: List[str]) -> Dict[str, str]:
         types: Dict[str, str] = {}
         if not headers:
@@ -218,7 +172,7 @@ class SandboxSheetsTool(SandboxToolsBase):
                     return self.fail_response("openpyxl not available to update .xlsx")
 
                 data = await self._download_bytes(full_path)
-                wb = openpyxl.load_workbook(BytesIO(data))
+                wb = await asyncio.to_thread(openpyxl.load_workbook, BytesIO(data))
                 ws = wb[sheet_name] if sheet_name and sheet_name in wb.sheetnames else wb.active
 
                 header_map: Dict[str, int] = {}
@@ -310,17 +264,11 @@ class SandboxSheetsTool(SandboxToolsBase):
                     else:
                         return self.fail_response(f"Unsupported operation type: {t}")
 
-                out = BytesIO()
-                wb.save(out)
-                await self._upload_bytes(full_path if not save_as else f"{self.workspace_path}/{self.clean_path(save_as)}", out.getvalue())
+                target_full = full_path if not save_as else f"{self.workspace_path}/{self.clean_path(save_as)}"
+                xlsx_bytes, csv_bytes = await asyncio.to_thread(self._serialize_workbook, wb, ws)
+                await self._upload_bytes(target_full, xlsx_bytes)
                 try:
-                    csv_full = f"{(full_path if not save_as else f'{self.workspace_path}/{self.clean_path(save_as)}').rsplit('.', 1)[0]}.csv"
-                    from csv import writer as csv_writer
-                    csv_buf = io.StringIO()
-                    w = csv_writer(csv_buf)
-                    for r in ws.iter_rows(values_only=True):
-                        w.writerow(list(r))
-                    await self._upload_bytes(csv_full, csv_buf.getvalue().encode('utf-8'))
+                    await self._upload_bytes(f"{target_full.rsplit('.', 1)[0]}.csv", csv_bytes)
                 except Exception:
                     pass
 
@@ -460,21 +408,26 @@ class SandboxSheetsTool(SandboxToolsBase):
     async def view_sheet(self, file_path: str, sheet_name: Optional[str] = None, max_rows: int = 100, export_csv_path: Optional[str] = None) -> ToolResult:
         try:
             await self._ensure_sandbox()
-            full_path, sheet = await self._load_sheet(file_path, sheet_name)
+            rel = self.clean_path(file_path)
+            full_path = f"{self.workspace_path}/{rel}"
+            ext = self._sheet_ext(rel)
+            data = await self._download_bytes(full_path)
+            preview = await asyncio.to_thread(
+                sheets_engine.preview, data, ext, sheet_name, max_rows, bool(export_csv_path)
+            )
             exported_to = None
             if export_csv_path:
                 rel = self.clean_path(export_csv_path)
                 if not rel.lower().endswith(".csv"):
                     rel += ".csv"
                 export_full = f"{self.workspace_path}/{rel}"
-                await self._upload_bytes(export_full, self._write_csv_bytes(sheet))
+                await self._upload_bytes(export_full, preview["csv"])
                 exported_to = export_full
-            sample_rows = sheet.rows[: max(0, max_rows)]
             return self.success_response({
                 "file_path": full_path,
-                "headers": sheet.headers,
-                "row_count": len(sheet.rows),
-                "sample_rows": sample_rows,
+                "headers": preview["headers"],
+                "row_count": preview["row_count"],
+                "sample_rows": preview["sample_rows"],
                 "exported_csv": exported_to
             })
         except Exception as e:
@@ -517,20 +470,11 @@ class SandboxSheetsTool(SandboxToolsBase):
             exists = await self._file_exists(full)
             if exists and not overwrite:
                 return self.fail_response("File already exists. Set overwrite=true to replace.")
-            if rel.lower().endswith(".csv"):
-                await self._upload_bytes(full, self._write_csv_bytes(SheetData(headers or [], rows or [])))
-            elif rel.lower().endswith(".xlsx"):
-                if not openpyxl:
-                    return self.fail_response("openpyxl not available to create .xlsx")
-                sheet = SheetData(headers or [], rows or [])
-                await self._upload_bytes(full, self._write_xlsx_bytes(sheet, sheet_name))
-                try:
-                    csv_full = f"{full.rsplit('.', 1)[0]}.csv"
-                    await self._upload_bytes(csv_full, self._write_csv_bytes(sheet))
-                except Exception as e:
-                    logger.warning(f"Failed to write CSV mirror for {full}: {e}")
-            else:
+            if rel.lower().endswith(".xlsx") and not openpyxl:
+                return self.fail_response("openpyxl not available to create .xlsx")
+            if not rel.lower().endswith((".csv", ".xlsx")):
                 return self.fail_response("Unsupported extension. Use .csv or .xlsx")
+            await self._save_sheet(rel, SheetData(headers or [], rows or []), sheet_name)
             return self.success_response({"created": full, "rows": len(rows or []), "headers": headers or []})
         except Exception as e:
             logger.exception("create_sheet failed")
@@ -568,93 +512,14 @@ class SandboxSheetsTool(SandboxToolsBase):
     async def analyze_sheet(self, file_path: str, sheet_name: Optional[str] = None, target_columns: Optional[List[str]] = None, group_by: Optional[str] = None, aggregations: Optional[List[str]] = None, export_csv_path: Optional[str] = None) -> ToolResult:
         try:
             await self._ensure_sandbox()
-            full_path, sheet = await self._load_sheet(file_path, sheet_name)
-            headers = sheet.headers
-            idx_map = self._to_index_map(headers)
-
-            def to_float(v: Any) -> Optional[float]:
-                if v is None:
-                    return None
-                if isinstance(v, (int, float)):
-                    return float(v)
-                try:
-                    return float(str(v).strip())
-                except Exception:
-                    return None
-
-            numeric_cols = [c for c in (target_columns or headers) if c in idx_map]
-            if group_by and group_by in idx_map:
-                g_idx = idx_map[group_by]
-                groups: Dict[Any, List[List[Any]]] = {}
-                for row in sheet.rows:
-                    key = row[g_idx] if len(row) > g_idx else None
-                    groups.setdefault(key, []).append(row)
-                out_headers = [group_by]
-                aggs = aggregations or ["count", "sum", "avg", "min", "max"]
-                for col in numeric_cols:
-                    for agg in aggs:
-                        out_headers.append(f"{col}_{agg}")
-                summary_rows: List[List[Any]] = []
-                for key, rows in groups.items():
-                    row_out = [key]
-                    for col in numeric_cols:
-                        c_idx = idx_map[col]
-                        vals = [to_float(r[c_idx]) for r in rows if len(r) > c_idx]
-                        vals = [v for v in vals if v is not None]
-                        count_v = len(vals)
-                        sum_v = sum(vals) if vals else None
-                        avg_v = mean(vals) if vals else None
-                        min_v = min(vals) if vals else None
-                        max_v = max(vals) if vals else None
-                        for agg in aggs:
-                            row_out.append({
-                                "count": count_v,
-                                "sum": sum_v,
-                                "avg": avg_v,
-                                "min": min_v,
-                                "max": max_v
-                            }[agg])
-                    summary_rows.append(row_out)
-                result_sheet = SheetData(headers=out_headers, rows=summary_rows)
-            else:
-                out_headers = ["metric"] + numeric_cols
-                rows_out: List[List[Any]] = []
-                counts = []
-                for col in numeric_cols:
-                    c_idx = idx_map[col]
-                    vals = [to_float(r[c_idx]) for r in sheet.rows if len(r) > c_idx]
-                    vals = [v for v in vals if v is not None]
-                    counts.append(len(vals))
-                rows_out.append(["count", *counts])
-                sums = []
-                for col in numeric_cols:
-                    c_idx = idx_map[col]
-                    vals = [to_float(r[c_idx]) for r in sheet.rows if len(r) > c_idx]
-                    vals = [v for v in vals if v is not None]
-                    sums.append(sum(vals) if vals else None)
-                rows_out.append(["sum", *sums])
-                avgs = []
-                for col in numeric_cols:
-                    c_idx = idx_map[col]
-                    vals = [to_float(r[c_idx]) for r in sheet.rows if len(r) > c_idx]
-                    vals = [v for v in vals if v is not None]
-                    avgs.append(mean(vals) if vals else None)
-                rows_out.append(["avg", *avgs])
-                mins = []
-                for col in numeric_cols:
-                    c_idx = idx_map[col]
-                    vals = [to_float(r[c_idx]) for r in sheet.rows if len(r) > c_idx]
-                    vals = [v for v in vals if v is not None]
-                    mins.append(min(vals) if vals else None)
-                rows_out.append(["min", *mins])
-                maxs = []
-                for col in numeric_cols:
-                    c_idx = idx_map[col]
-                    vals = [to_float(r[c_idx]) for r in sheet.rows if len(r) > c_idx]
-                    vals = [v for v in vals if v is not None]
-                    maxs.append(max(vals) if vals else None)
-                rows_out.append(["max", *maxs])
-                result_sheet = SheetData(headers=out_headers, rows=rows_out)
+            rel = self.clean_path(file_path)
+            full_path = f"{self.workspace_path}/{rel}"
+            ext = self._sheet_ext(rel)
+            data = await self._download_bytes(full_path)
+            out_headers, out_rows = await asyncio.to_thread(
+                sheets_engine.analyze, data, ext, sheet_name, target_columns, group_by, aggregations
+            )
+            result_sheet = SheetData(headers=out_headers, rows=out_rows)
 
             exported = None
             if export_csv_path:
@@ -662,7 +527,7 @@ class SandboxSheetsTool(SandboxToolsBase):
                 if not rel.lower().endswith(".csv"):
                     rel += ".csv"
                 export_full = f"{self.workspace_path}/{rel}"
-                await self._upload_bytes(export_full, self._write_csv_bytes(result_sheet))
+                await self._upload_bytes(export_full, await asyncio.to_thread(sheets_engine.write_csv, result_sheet.headers, result_sheet.rows))
                 exported = export_full
 
             return self.success_response({
@@ -711,15 +576,6 @@ class SandboxSheetsTool(SandboxToolsBase):
             await self._ensure_sandbox()
             rel = self.clean_path(file_path)
             full = f"{self.workspace_path}/{rel}"
-            _, sheet = await self._load_sheet(file_path, sheet_name)
-            headers = sheet.headers
-            idx_map = self._to_index_map(headers)
-            if x_column not in idx_map:
-                return self.fail_response(f"x_column '{x_column}' not found")
-            for yc in y_columns:
-                if yc not in idx_map:
-                    return self.fail_response(f"y_column '{yc}' not found")
-
             target = save_as or (rel.rsplit(".", 1)[0] + "_chart.xlsx")
             if not target.lower().endswith(".xlsx"):
                 target += ".xlsx"
@@ -727,64 +583,15 @@ class SandboxSheetsTool(SandboxToolsBase):
             if not openpyxl:
                 return self.fail_response("openpyxl not available to build charts")
 
-            wb = Workbook()
-            ws = wb.active
-            ws.title = sheet_name or "Data"
-            if headers:
-                ws.append(headers)
-            for r in sheet.rows:
-                ws.append(r)
-
-            if chart_type == "bar":
-                chart = BarChart()
-            elif chart_type == "line":
-                chart = LineChart()
-            elif chart_type == "pie":
-                chart = PieChart()
-            else:
-                chart = ScatterChart()
-
-            x_col_idx = idx_map[x_column] + 1
-            y_col_indices = [idx_map[c] + 1 for c in y_columns]
-            min_row = 2
-            max_row = len(sheet.rows) + 1
-            x_ref = Reference(ws, min_col=x_col_idx, min_row=min_row, max_row=max_row)
-
-            if chart_type == "pie" and len(y_col_indices) == 1:
-                data_ref = Reference(ws, min_col=y_col_indices[0], min_row=1, max_row=max_row)
-                chart.add_data(data_ref, titles_from_data=True)
-                chart.set_categories(x_ref)
-            else:
-                for yci in y_col_indices:
-                    data_ref = Reference(ws, min_col=yci, min_row=min_row - 1, max_row=max_row)
-                    series = Series(data_ref, title_from_data=True)
-                    series.category = x_ref
-                    if isinstance(chart, ScatterChart):
-                        series.xvalues = x_ref
-                    chart.series.append(series)
-
-            chart_ws = wb.create_sheet(title=f"Chart_{chart_type}")
-            chart_ws.add_chart(chart, "A1")
-            out = BytesIO()
-            wb.save(out)
-            await self._upload_bytes(target_full, out.getvalue())
-
-            dataset_headers = [x_column] + y_columns
-            dataset_rows: List[List[Any]] = []
-            x_idx = idx_map[x_column]
-            y_idx_list = [idx_map[y] for y in y_columns]
-            for row in sheet.rows:
-                if len(row) <= x_idx:
-                    continue
-                vals = [row[x_idx]]
-                ok = True
-                for yi in y_idx_list:
-                    if len(row) <= yi:
-                        ok = False
-                        break
-                    vals.append(row[yi])
-                if ok:
-                    dataset_rows.append(vals)
+            ext = self._sheet_ext(rel)
+            data = await self._download_bytes(full)
+            try:
+                chart_bytes, dataset_csv = await asyncio.to_thread(
+                    sheets_engine.build_chart, data, ext, sheet_name, x_column, y_columns, chart_type
+                )
+            except ValueError as e:
+                return self.fail_response(str(e))
+            await self._upload_bytes(target_full, chart_bytes)
 
             csv_rel = None
             if export_csv_path:
@@ -795,7 +602,7 @@ class SandboxSheetsTool(SandboxToolsBase):
                 base = self.clean_path(target).rsplit(".", 1)[0]
                 csv_rel = f"{base}_data.csv"
             csv_full = f"{self.workspace_path}/{csv_rel}"
-            await self._upload_bytes(csv_full, self._write_csv_bytes(SheetData(headers=dataset_headers, rows=dataset_rows)))
+            await self._upload_bytes(csv_full, dataset_csv)
 
             return self.success_response({
                 "source": full,
@@ -851,50 +658,11 @@ class SandboxSheetsTool(SandboxToolsBase):
             data = await self._download_bytes(full)
             if not openpyxl:
                 return self.fail_response("openpyxl not available")
-            wb = openpyxl.load_workbook(BytesIO(data))
-            ws = wb[sheet_name] if sheet_name else wb.active
-
-            max_col = ws.max_column
-            max_row = ws.max_row
-
-            if bold_headers and max_row >= 1:
-                for c in range(1, max_col + 1):
-                    cell = ws.cell(row=1, column=c)
-                    cell.font = Font(bold=True)
-                    cell.alignment = Alignment(vertical="center")
-
-            if apply_banding and max_row > 2:
-                for r in range(2, max_row + 1):
-                    if r % 2 == 0:
-                        for c in range(1, max_col + 1):
-                            ws.cell(row=r, column=c).fill = PatternFill(start_color="FFF9F9", end_color="FFF9F9", fill_type="solid")
-
-            if auto_width:
-                for c in range(1, max_col + 1):
-                    max_len = 0
-                    for r in range(1, max_row + 1):
-                        v = ws.cell(row=r, column=c).value
-                        max_len = max(max_len, len(str(v)) if v is not None else 0)
-                    ws.column_dimensions[openpyxl.utils.get_column_letter(c)].width = min(60, max(10, max_len + 2))
-
-            if conditional_format and max_row > 1:
-                column_name = conditional_format.get("column")
-                if column_name:
-                    headers = [ws.cell(row=1, column=c).value for c in range(1, max_col + 1)]
-                    if column_name in headers:
-                        c_idx = headers.index(column_name) + 1
-                        rng = f"{openpyxl.utils.get_column_letter(c_idx)}2:{openpyxl.utils.get_column_letter(c_idx)}{max_row}"
-                        ws.conditional_formatting.add(
-                            rng,
-                            ColorScaleRule(start_type='min', start_color=conditional_format.get("min_color", "FFEFEB"),
-                                           mid_type='percentile', mid_value=50, mid_color=conditional_format.get("mid_color", "FFD7D2"),
-                                           end_type='max', end_color=conditional_format.get("max_color", "FFA39E"))
-                        )
-
-            out = BytesIO()
-            wb.save(out)
-            await self._upload_bytes(full, out.getvalue())
-            return self.success_response({"formatted": full, "sheet": ws.title})
+            formatted, title = await asyncio.to_thread(
+                sheets_engine.format_xlsx, data, sheet_name, bold_headers, auto_width, apply_banding, conditional_format
+            )
+            await self._upload_bytes(full, formatted)
+            return self.success_response({"formatted": full, "sheet": title})
         except Exception as e:
             logger.exception("format_sheet failed")
             return self.fail_response(f"Error formatting sheet: {e}") 
\ No newline at end of file
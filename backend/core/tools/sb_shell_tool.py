@@ -1,12 +1,27 @@
 import asyncio
-from typing import Optional, Dict, Any
+import re
+import shlex
+from typing import Optional, Dict, Any, Tuple
 import time
-import asyncio
 from uuid import uuid4
 from core.agentpress.tool import ToolResult, openapi_schema, usage_example
 from core.sandbox.tool_base import SandboxToolsBase
 from core.agentpress.thread_manager import ThreadManager
 
+# Every tmux session's pane output is appended to <SHELL_LOG_DIR>/<session>.log;
+# <session>.cursor holds the offset up to which output was already returned.
+SHELL_LOG_DIR = "/tmp/shell_logs"
+# Output returned per call is capped; beyond that only the head and tail are
+# kept and the rest stays in the log file.
+MAX_OUTPUT_BYTES = 16 * 1024
+OUTPUT_HEAD_BYTES = 4 * 1024
+# How often a blocking command publishes its new output as a progress event
+PROGRESS_INTERVAL = 5
+
+_ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07]*(?:\x07|\x1b\\)|\x1b[()=>][0-9A-Za-z]?')
+_TRUNCATED_MARKER = "__SHELL_OUTPUT_TRUNCATED__"
+_SESSION_ENDED_MARKER = "__SHELL_SESSION_ENDED__"
+
 class SandboxShellTool(SandboxToolsBase):
     """Tool for executing tasks in a Daytona sandbox with browser-use capabilities. 
     Uses sessions for maintaining state between commands and provides comprehensive process management."""
@@ -128,57 +143,66 @@ class SandboxShellTool(SandboxToolsBase):
             if not session_exists:
                 # Create a new tmux session with the specified working directory
                 await self._execute_raw_command(f"tmux new-session -d -s {session_name} -c {cwd}")
-            
-            # Escape double quotes for the command
-            wrapped_command = command.replace('"', '\\"')
+            await self._ensure_output_log(session_name, reset=not session_exists)
             
             if blocking:
-                # For blocking execution, use a more reliable approach
-                # Add a unique marker to detect command completion
-                marker = f"COMMAND_DONE_{str(uuid4())[:8]}"
-                completion_command = self._format_completion_command(command, marker)
-                wrapped_completion_command = completion_command.replace('"', '\\"')
+                # Record the exit code and signal a tmux channel when the command
+                # finishes, so completion is awaited instead of polled for
+                channel = f"done_{str(uuid4())[:8]}"
+                exit_file = f"{SHELL_LOG_DIR}/{channel}.exit"
+                completion_command = self._format_completion_command(
+                    command, f"echo $? > {exit_file}; tmux wait-for -S {channel}"
+                )
+                start_offset = await self._current_output_size(session_name)
                 
-                # Send the command with completion marker
-                await self._execute_raw_command(f'tmux send-keys -t {session_name} "{wrapped_completion_command}" Enter')
+                # Send the command with completion signal
+                await self._execute_raw_command(f"tmux send-keys -t {session_name} {shlex.quote(completion_command)} Enter")
                 
-                start_time = time.time()
-                final_output = ""
-                
-                while (time.time() - start_time) < timeout:
-                    # Wait a shorter interval for more responsive checking
-                    await asyncio.sleep(0.5)
-                    
-                    # Check if session still exists (command might have exited)
-                    check_result = await self._execute_raw_command(f"tmux has-session -t {session_name} 2>/dev/null || echo 'ended'")
-                    if "ended" in check_result.get("output", ""):
+                deadline = time.time() + timeout
+                exit_code = None
+                while True:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
                         break
-                        
-                    # Get current output and check for our completion marker
-                    output_result = await self._execute_raw_command(f"tmux capture-pane -t {session_name} -p -S - -E -")
-                    current_output = output_result.get("output", "")
-
-                    if self._is_command_completed(current_output, marker):
-                        final_output = current_output
+                    exit_code, session_ended = await self._wait_for_exit(
+                        session_name, channel, exit_file, min(PROGRESS_INTERVAL, remaining)
+                    )
+                    if exit_code is not None or session_ended:
                         break
+                    
+                    # Still running: stream what it printed since the last check
+                    progress, _ = await self._read_output(session_name)
+                    if progress.strip():
+                        await self.thread_manager.emit_progress({
+                            "status_type": "tool_output",
+                            "function_name": "execute_command",
+                            "session_name": session_name,
+                            "output": progress
+                        })
                 
-                # If we didn't get the marker, capture whatever output we have
-                if not final_output:
-                    output_result = await self._execute_raw_command(f"tmux capture-pane -t {session_name} -p -S - -E -")
-                    final_output = output_result.get("output", "")
+                final_output, truncated = await self._read_output(session_name, start_offset=start_offset)
                 
                 # Kill the session after capture
-                await self._execute_raw_command(f"tmux kill-session -t {session_name}")
+                await self._execute_raw_command(
+                    f"tmux kill-session -t {session_name} 2>/dev/null; rm -f {exit_file}"
+                )
                 
-                return self.success_response({
+                response = {
                     "output": final_output,
                     "session_name": session_name,
                     "cwd": cwd,
-                    "completed": True
-                })
+                    "completed": exit_code is not None
+                }
+                if exit_code is not None:
+                    response["exit_code"] = exit_code
+                else:
+                    response["message"] = f"Command did not finish within {timeout} seconds and its session was terminated."
+                if truncated:
+                    response["full_output_file"] = self._log_path(session_name)
+                return self.success_response(response)
             else:
                 # Send command to tmux session for non-blocking execution
-                await self._execute_raw_command(f'tmux send-keys -t {session_name} "{wrapped_command}" Enter')
+                await self._execute_raw_command(f"tmux send-keys -t {session_name} {shlex.quote(command)} Enter")
                 
                 # For non-blocking, just return immediately
                 return self.success_response({
@@ -197,7 +221,7 @@ class SandboxShellTool(SandboxToolsBase):
                     pass
             return self.fail_response(f"Error executing command: {str(e)}")
 
-    async def _execute_raw_command(self, command: str) -> Dict[str, Any]:
+    async def _execute_raw_command(self, command: str, timeout: int = 30) -> Dict[str, Any]:
         """Execute a raw command directly in the sandbox."""
         # Ensure session exists for raw commands
         session_id = await self._ensure_session("raw_commands")
@@ -213,7 +237,7 @@ class SandboxShellTool(SandboxToolsBase):
         response = await self.sandbox.process.execute_session_command(
             session_id=session_id,
             req=req,
-            timeout=30  # Short timeout for utility commands
+            timeout=timeout  # Short by default, utility commands should return quickly
         )
         
         logs = await self.sandbox.process.get_session_command_logs(
@@ -226,11 +250,108 @@ class SandboxShellTool(SandboxToolsBase):
             "exit_code": response.exit_code
         }
 
+    def _log_path(self, session_name: str) -> str:
+        return f"{SHELL_LOG_DIR}/{session_name}.log"
+
+    async def _ensure_output_log(self, session_name: str, reset: bool = False) -> None:
+        """Pipe the session's pane output into its log file.
+
+        Sessions created before logging existed, or whose log was removed, get
+        a fresh pipe; an existing pipe is replaced, never toggled off.
+        """
+        log = shlex.quote(self._log_path(session_name))
+        cursor = shlex.quote(f"{SHELL_LOG_DIR}/{session_name}.cursor")
+        pipe = f"tmux pipe-pane -t {session_name} {shlex.quote(f'cat >> {self._log_path(session_name)}')}"
+        # No early exit: this runs in the persistent raw_commands shell, which an exit would end
+        if reset:
+            script = f"mkdir -p {SHELL_LOG_DIR}; : > {log}; rm -f {cursor}; {pipe}"
+        else:
+            script = f"mkdir -p {SHELL_LOG_DIR}; if [ ! -f {log} ]; then {pipe}; fi"
+        await self._execute_raw_command(script)
+
+    async def _current_output_size(self, session_name: str) -> int:
+        result = await self._execute_raw_command(f"stat -c %s {shlex.quote(self._log_path(session_name))} 2>/dev/null || echo 0")
+        try:
+            return int(result.get("output", "0").strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            return 0
+
+    async def _read_output(self, session_name: str, start_offset: Optional[int] = None) -> Tuple[str, bool]:
+        """Return the output written since the session's cursor and advance it.
+
+        With ``start_offset`` the output is read from that byte offset instead.
+        At most MAX_OUTPUT_BYTES are returned: beyond that the first
+        OUTPUT_HEAD_BYTES and the last bytes are kept around a note pointing at
+        the full log. Returns the output and whether it was truncated.
+        """
+        log = shlex.quote(self._log_path(session_name))
+        cursor_file = shlex.quote(f"{SHELL_LOG_DIR}/{session_name}.cursor")
+        start = str(start_offset) if start_offset is not None else f"$(cat {cursor_file} 2>/dev/null || echo 0)"
+        tail_bytes = MAX_OUTPUT_BYTES - OUTPUT_HEAD_BYTES
+        script = (
+            f"s=$(stat -c %s {log} 2>/dev/null || echo 0); c={start}; "
+            f'[ "$c" -gt "$s" ] && c=0; n=$((s-c)); echo "$s $n"; '
+            f'if [ "$n" -le {MAX_OUTPUT_BYTES} ]; then tail -c +$((c+1)) {log} | head -c "$n"; '
+            f'else tail -c +$((c+1)) {log} | head -c {OUTPUT_HEAD_BYTES}; echo; echo {_TRUNCATED_MARKER}; '
+            f'head -c "$s" {log} | tail -c {tail_bytes}; fi; '
+            f'echo "$s" > {cursor_file}'
+        )
+        result = await self._execute_raw_command(f"/bin/sh -c {shlex.quote(script)}")
+        raw = result.get("output", "")
+        header, _, body = raw.partition("\n")
+        try:
+            _, new_bytes = (int(v) for v in header.split())
+        except ValueError:
+            return "", False
+
+        truncated = _TRUNCATED_MARKER in body
+        if truncated:
+            head, _, tail = body.partition(f"\n{_TRUNCATED_MARKER}\n")
+            omitted = new_bytes - OUTPUT_HEAD_BYTES - tail_bytes
+            body = (
+                f"{head}\n[... {omitted} bytes of output omitted, "
+                f"full output in {self._log_path(session_name)} ...]\n{tail}"
+            )
+        return self._clean_terminal_output(body), truncated
+
+    def _clean_terminal_output(self, output: str) -> str:
+        """Strip escape sequences and collapse carriage-return progress redraws."""
+        output = _ANSI_ESCAPE_RE.sub("", output)
+        lines = []
+        for line in output.split("\n"):
+            line = line.rstrip("\r")
+            if "\r" in line:
+                line = line.rsplit("\r", 1)[-1]
+            lines.append(line)
+        return "\n".join(lines)
+
+    async def _wait_for_exit(self, session_name: str, channel: str, exit_file: str, wait_seconds: float) -> Tuple[Optional[int], bool]:
+        """Block inside the sandbox until the command signals completion or wait_seconds pass.
+
+        Returns the exit code (None if still running) and whether the session is gone.
+        """
+        wait_seconds = max(1, int(wait_seconds))
+        result = await self._execute_raw_command(
+            f"if [ ! -f {exit_file} ] && tmux has-session -t {session_name} 2>/dev/null; "
+            f"then timeout {wait_seconds} tmux wait-for {channel}; fi; "
+            f"cat {exit_file} 2>/dev/null; "
+            f"tmux has-session -t {session_name} 2>/dev/null || echo {_SESSION_ENDED_MARKER}",
+            timeout=wait_seconds + 30
+        )
+        output = result.get("output", "")
+        session_ended = _SESSION_ENDED_MARKER in output
+        exit_code = None
+        for line in output.splitlines():
+            if line.strip().lstrip("-").isdigit():
+                exit_code = int(line.strip())
+                break
+        return exit_code, session_ended
+
     @openapi_schema({
         "type": "function",
         "function": {
             "name": "check_command_output",
-            "description": "Check the output of a previously executed command in a tmux session. Use this to monitor the progress or results of non-blocking commands.",
+            "description": "Check the output of a previously executed command in a tmux session. Use this to monitor the progress or results of non-blocking commands. Each check returns only the output produced since the previous check; long output is truncated to its beginning and end, with the full log kept in the file named by full_output_file.",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -277,9 +398,9 @@ class SandboxShellTool(SandboxToolsBase):
             if "not_exists" in check_result.get("output", ""):
                 return self.fail_response(f"Tmux session '{session_name}' does not exist.")
             
-            # Get output from tmux pane
-            output_result = await self._execute_raw_command(f"tmux capture-pane -t {session_name} -p -S - -E -")
-            output = output_result.get("output", "")
+            # Get the output produced since the previous check
+            await self._ensure_output_log(session_name)
+            output, truncated = await self._read_output(session_name)
             
             # Kill session if requested
             if kill_session:
@@ -288,11 +409,14 @@ class SandboxShellTool(SandboxToolsBase):
             else:
                 termination_status = "Session still running."
             
-            return self.success_response({
+            response = {
                 "output": output,
                 "session_name": session_name,
                 "status": termination_status
-            })
+            }
+            if truncated:
+                response["full_output_file"] = self._log_path(session_name)
+            return self.success_response(response)
                 
         except Exception as e:
             return self.fail_response(f"Error checking command output: {str(e)}")
@@ -393,97 +517,19 @@ class SandboxShellTool(SandboxToolsBase):
         except Exception as e:
             return self.fail_response(f"Error listing commands: {str(e)}")
 
-    def _format_completion_command(self, command: str, marker: str) -> str:
-        """Format command with completion marker, handling heredocs properly."""
-        import re
-        
+    def _format_completion_command(self, command: str, completion: str) -> str:
+        """Append a completion command to run after the command, handling heredocs properly."""
         # Check if command contains heredoc syntax
         # Look for patterns like: << EOF, << 'EOF', << "EOF", <<EOF
         heredoc_pattern = r'<<\s*[\'"]?\w+[\'"]?'
         
         if re.search(heredoc_pattern, command):
-            # For heredoc commands, add the completion marker on a new line
+            # For heredoc commands, add the completion on a new line
             # This ensures it executes after the heredoc completes
-            return f"{command}\necho {marker}"
+            return f"{command}\n{completion}"
         else:
             # For regular commands, use semicolon separator
-            return f"{command} ; echo {marker}"
-
-    def _is_command_completed(self, current_output: str, marker: str) -> bool:
-        """
-        Check if command execution is completed by comparing marker from end to start.
-        
-        Args:
-            current_output: Current output content
-            marker: Completion marker
-            
-        Returns:
-            bool: True if command completed, False otherwise
-        """
-        if not current_output or not marker:
-            return False
-
-        # Find the last complete marker match position to start comparison
-        # Avoid terminal prompt output at the end
-        marker_end_pos = -1
-        for i in range(len(current_output) - len(marker), -1, -1):
-            if current_output[i:i+len(marker)] == marker:
-                marker_end_pos = i + len(marker) - 1
-                break
-        
-        # Start comparison from found marker position or end of output
-        if marker_end_pos != -1:
-            output_idx = marker_end_pos
-            marker_idx = len(marker) - 1
-        else:
-            output_idx = len(current_output) - 1
-            marker_idx = len(marker) - 1
-        
-        # Compare characters from end to start
-        while marker_idx >= 0 and output_idx >= 0:
-            # Skip newlines in current_output
-            if current_output[output_idx] == '\n':
-                output_idx -= 1
-                continue
-                
-            # Compare characters
-            if current_output[output_idx] != marker[marker_idx]:
-                return False
-                
-            # Continue comparison
-            output_idx -= 1
-            marker_idx -= 1
-        
-        # If marker not fully matched
-        if marker_idx >= 0:
-            return False
-            
-        # Check if preceded by "echo " (command just started)
-        check_count = 0
-        echo_chars = "echo "
-        echo_idx = len(echo_chars) - 1
-        
-        while output_idx >= 0 and check_count < 5:
-            # Skip newlines
-            if current_output[output_idx] == '\n':
-                output_idx -= 1
-                continue
-                
-            check_count += 1
-            
-            # Check for "echo " pattern
-            if echo_idx >= 0 and current_output[output_idx] == echo_chars[echo_idx]:
-                echo_idx -= 1
-            else:
-                echo_idx = len(echo_chars) - 1
-                
-            output_idx -= 1
-            
-        # If "echo " found, command just started
-        if echo_idx < 0:
-            return False
-            
-        return True
+            return f"{command} ; {completion}"
 
     async def cleanup(self):
         """Clean up all sessions."""
@@ -1,15 +1,17 @@
 import os
+import asyncio
 import base64
 import mimetypes
 from typing import Optional, Tuple
 from io import BytesIO
 from PIL import Image
 from urllib.parse import urlparse
+import aiohttp
 from core.agentpress.tool import ToolResult, openapi_schema, usage_example
 from core.sandbox.tool_base import SandboxToolsBase
 from core.agentpress.thread_manager import ThreadManager
-import json
-import requests
+from core.utils import image_artifacts
+from core.utils.logger import logger
 
 # Add common image MIME types if mimetypes module is limited
 mimetypes.add_type("image/webp", ".webp")
@@ -28,6 +30,76 @@ DEFAULT_MAX_HEIGHT = 1080
 DEFAULT_JPEG_QUALITY = 85
 DEFAULT_PNG_COMPRESS_LEVEL = 6
 
+DOWNLOAD_TIMEOUT = 30
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def compress_image(image_bytes: bytes, mime_type: str) -> Tuple[bytes, str]:
+    """Compress an image to reduce its size while maintaining reasonable quality.
+
+    CPU bound; callers run it in a worker thread.
+
+    Args:
+        image_bytes: Original image bytes
+        mime_type: MIME type of the image
+
+    Returns:
+        Tuple of (compressed_bytes, new_mime_type)
+    """
+    try:
+        # Open image from bytes
+        img = Image.open(BytesIO(image_bytes))
+
+        # Convert RGBA to RGB if necessary (for JPEG)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Create a white background
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            img = background
+
+        # Calculate new dimensions while maintaining aspect ratio
+        width, height = img.size
+        if width > DEFAULT_MAX_WIDTH or height > DEFAULT_MAX_HEIGHT:
+            ratio = min(DEFAULT_MAX_WIDTH / width, DEFAULT_MAX_HEIGHT / height)
+            new_width = int(width * ratio)
+            new_height = int(height * ratio)
+            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            logger.debug(f"[SeeImage] Resized image from {width}x{height} to {new_width}x{new_height}")
+
+        # Save to bytes with compression
+        output = BytesIO()
+
+        # Determine output format based on original mime type
+        if mime_type == 'image/gif':
+            # Keep GIFs as GIFs to preserve animation
+            img.save(output, format='GIF', optimize=True)
+            output_mime = 'image/gif'
+        elif mime_type == 'image/png':
+            # Compress PNG
+            img.save(output, format='PNG', optimize=True, compress_level=DEFAULT_PNG_COMPRESS_LEVEL)
+            output_mime = 'image/png'
+        else:
+            # Convert everything else to JPEG for better compression
+            img.save(output, format='JPEG', quality=DEFAULT_JPEG_QUALITY, optimize=True)
+            output_mime = 'image/jpeg'
+
+        compressed_bytes = output.getvalue()
+
+        # Log compression results
+        original_size = len(image_bytes)
+        compressed_size = len(compressed_bytes)
+        compression_ratio = (1 - compressed_size / original_size) * 100
+        logger.debug(f"[SeeImage] Compressed image from {original_size / 1024:.1f}KB to {compressed_size / 1024:.1f}KB ({compression_ratio:.1f}% reduction)")
+
+        return compressed_bytes, output_mime
+
+    except Exception as e:
+        logger.warning(f"[SeeImage] Failed to compress image: {str(e)}. Using original.")
+        return image_bytes, mime_type
+
+
 class SandboxVisionTool(SandboxToolsBase):
     """Tool for allowing the agent to 'see' images within the sandbox."""
 
@@ -37,108 +109,39 @@ class SandboxVisionTool(SandboxToolsBase):
         # Make thread_manager accessible within the tool instance
         self.thread_manager = thread_manager
 
-    def compress_image(self, image_bytes: bytes, mime_type: str, file_path: str) -> Tuple[bytes, str]:
-        """Compress an image to reduce its size while maintaining reasonable quality.
-        
-        Args:
-            image_bytes: Original image bytes
-            mime_type: MIME type of the image
-            file_path: Path to the image file (for logging)
-            
-        Returns:
-            Tuple of (compressed_bytes, new_mime_type)
-        """
-        try:
-            # Open image from bytes
-            img = Image.open(BytesIO(image_bytes))
-            
-            # Convert RGBA to RGB if necessary (for JPEG)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                # Create a white background
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            
-            # Calculate new dimensions while maintaining aspect ratio
-            width, height = img.size
-            if width > DEFAULT_MAX_WIDTH or height > DEFAULT_MAX_HEIGHT:
-                ratio = min(DEFAULT_MAX_WIDTH / width, DEFAULT_MAX_HEIGHT / height)
-                new_width = int(width * ratio)
-                new_height = int(height * ratio)
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                print(f"[SeeImage] Resized image from {width}x{height} to {new_width}x{new_height}")
-            
-            # Save to bytes with compression
-            output = BytesIO()
-            
-            # Determine output format based on original mime type
-            if mime_type == 'image/gif':
-                # Keep GIFs as GIFs to preserve animation
-                img.save(output, format='GIF', optimize=True)
-                output_mime = 'image/gif'
-            elif mime_type == 'image/png':
-                # Compress PNG
-                img.save(output, format='PNG', optimize=True, compress_level=DEFAULT_PNG_COMPRESS_LEVEL)
-                output_mime = 'image/png'
-            else:
-                # Convert everything else to JPEG for better compression
-                img.save(output, format='JPEG', quality=DEFAULT_JPEG_QUALITY, optimize=True)
-                output_mime = 'image/jpeg'
-            
-            compressed_bytes = output.getvalue()
-            
-            # Log compression results
-            original_size = len(image_bytes)
-            compressed_size = len(compressed_bytes)
-            compression_ratio = (1 - compressed_size / original_size) * 100
-            print(f"[SeeImage] Compressed '{file_path}' from {original_size / 1024:.1f}KB to {compressed_size / 1024:.1f}KB ({compression_ratio:.1f}% reduction)")
-            
-            return compressed_bytes, output_mime
-            
-        except Exception as e:
-            print(f"[SeeImage] Failed to compress image: {str(e)}. Using original.")
-            return image_bytes, mime_type
-
     def is_url(self, file_path: str) -> bool:
         """check if the file path is url"""
         parsed_url = urlparse(file_path)
         return parsed_url.scheme in ('http', 'https')
     
-    def download_image_from_url(self, url: str) -> Tuple[bytes, str]:
-        """Download image from a URL"""
-        try:
-            headers = {
-                "User-Agent": "Mozilla/5.0"  # Some servers block default Python
-            }
+    async def download_image_from_url(self, url: str) -> Tuple[bytes, str]:
+        """Stream an image from a URL, giving up as soon as it exceeds MAX_IMAGE_SIZE"""
+        headers = {
+            "User-Agent": "Mozilla/5.0"  # Some servers block default Python
+        }
+        timeout = aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+            async with session.get(url) as response:
+                response.raise_for_status()
+
+                # Get MIME type
+                mime_type = (response.headers.get('Content-Type') or '').split(';')[0].strip()
+                if not mime_type.startswith('image/'):
+                    raise Exception(f"URL does not point to an image (Content-Type: {mime_type or None}): {url}")
+
+                if response.content_length and response.content_length > MAX_IMAGE_SIZE:
+                    raise Exception(f"Image is too large ({response.content_length / (1024*1024):.2f}MB) for the maximum allowed size of {MAX_IMAGE_SIZE / (1024*1024):.2f}MB")
+
+                chunks = []
+                received = 0
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    received += len(chunk)
+                    if received > MAX_IMAGE_SIZE:
+                        raise Exception(f"Downloaded image is too large (over {MAX_IMAGE_SIZE / (1024*1024):.2f}MB)")
+                    chunks.append(chunk)
+
+        return b"".join(chunks), mime_type
 
-            # HEAD request to get the image size
-            head_response = requests.head(url, timeout=10, headers=headers, stream=True)
-            head_response.raise_for_status()
-            
-            # Check content length
-            content_length = int(head_response.headers.get('Content-Length'))
-            if content_length and content_length > MAX_IMAGE_SIZE:
-                raise Exception(f"Image is too large ({(content_length)/(1024*1024):.2f}MB) for the maximum allowed size of {MAX_IMAGE_SIZE/(1024*1024):.2f}MB")
-            
-            # Download the image
-            response = requests.get(url, timeout=10, headers=headers, stream=True)
-            response.raise_for_status()
-
-            image_bytes = response.content
-            if len(image_bytes) > MAX_IMAGE_SIZE:
-                raise Exception(f"Downloaded image is too large ({(len(image_bytes))/(1024*1024):.2f}MB). Maximum allowed size of {MAX_IMAGE_SIZE/(1024*1024):.2f}MB")
-
-            # Get MIME type
-            mime_type = response.headers.get('Content-Type')
-            if not mime_type or not mime_type.startswith('image/'):
-                raise Exception(f"URL does not point to an image (Content-Type: {mime_type}): {url}")
-            
-            return image_bytes, mime_type
-        except Exception as e:
-            return self.fail_response(f"Failed to download image from URL: {str(e)}")
-    
     @openapi_schema({
         "type": "function",
         "function": {
@@ -177,7 +180,7 @@ class SandboxVisionTool(SandboxToolsBase):
             is_url = self.is_url(file_path)
             if is_url:
                 try:
-                    image_bytes, mime_type = self.download_image_from_url(file_path)
+                    image_bytes, mime_type = await self.download_image_from_url(file_path)
                     original_size = len(image_bytes)
                     cleaned_path = file_path
                 except Exception as e:
@@ -191,20 +194,19 @@ class SandboxVisionTool(SandboxToolsBase):
                 full_path = f"{self.workspace_path}/{cleaned_path}"
 
                 # Check if file exists and get info
-                try:
-                    file_info = await self.sandbox.fs.get_file_info(full_path)
-                    if file_info.is_dir:
-                        return self.fail_response(f"Path '{cleaned_path}' is a directory, not an image file.")
-                except Exception as e:
+                file_info = await self.files.stat(full_path)
+                if file_info is None:
                     return self.fail_response(f"Image file not found at path: '{cleaned_path}'")
+                if file_info.is_dir:
+                    return self.fail_response(f"Path '{cleaned_path}' is a directory, not an image file.")
 
                 # Check file size
                 if file_info.size > MAX_IMAGE_SIZE:
                     return self.fail_response(f"Image file '{cleaned_path}' is too large ({file_info.size / (1024*1024):.2f}MB). Maximum size is {MAX_IMAGE_SIZE / (1024*1024)}MB.")
 
-                # Read image file content
+                # Read image file content (cached per run while the file is unchanged)
                 try:
-                    image_bytes = await self.sandbox.fs.download_file(full_path)
+                    image_bytes = await self.files.read(full_path)
                 except Exception as e:
                     return self.fail_response(f"Could not read image file: {cleaned_path}")
 
@@ -223,24 +225,31 @@ class SandboxVisionTool(SandboxToolsBase):
                 original_size = file_info.size
             
 
-            # Compress the image
-            compressed_bytes, compressed_mime_type = self.compress_image(image_bytes, mime_type, cleaned_path)
-            
+            # Reuse the project's compressed copy if this image was loaded before,
+            # otherwise compress it off the event loop and store it
+            try:
+                artifact = await image_artifacts.get_or_create(self.project_id, image_bytes, mime_type, compress_image)
+            except Exception as e:
+                logger.warning(f"[SeeImage] Image artifact store unavailable, embedding image in message: {e}")
+                artifact = None
+
+            if artifact is not None:
+                compressed_size = artifact["compressed_size"]
+                image_context_data = image_artifacts.message_content(artifact, cleaned_path, original_size)
+            else:
+                compressed_bytes, compressed_mime_type = await asyncio.to_thread(compress_image, image_bytes, mime_type)
+                compressed_size = len(compressed_bytes)
+                image_context_data = {
+                    "mime_type": compressed_mime_type,
+                    "base64": base64.b64encode(compressed_bytes).decode('utf-8'),
+                    "file_path": cleaned_path, # Include path for context
+                    "original_size": original_size,
+                    "compressed_size": compressed_size
+                }
+
             # Check if compressed image is still too large
-            if len(compressed_bytes) > MAX_COMPRESSED_SIZE:
-                return self.fail_response(f"Image file '{cleaned_path}' is still too large after compression ({len(compressed_bytes) / (1024*1024):.2f}MB). Maximum compressed size is {MAX_COMPRESSED_SIZE / (1024*1024)}MB.")
-
-            # Convert to base64
-            base64_image = base64.b64encode(compressed_bytes).decode('utf-8')
-
-            # Prepare the temporary message content
-            image_context_data = {
-                "mime_type": compressed_mime_type,
-                "base64": base64_image,
-                "file_path": cleaned_path, # Include path for context
-                "original_size": original_size,
-                "compressed_size": len(compressed_bytes)
-            }
+            if compressed_size > MAX_COMPRESSED_SIZE:
+                return self.fail_response(f"Image file '{cleaned_path}' is still too large after compression ({compressed_size / (1024*1024):.2f}MB). Maximum compressed size is {MAX_COMPRESSED_SIZE / (1024*1024)}MB.")
 
             # Add the image context message to the database
             # Use a distinct type like 'image_context'
@@ -252,7 +261,7 @@ class SandboxVisionTool(SandboxToolsBase):
             )
 
             # Inform the agent the image will be available next turn
-            return self.success_response(f"Successfully loaded and compressed the image '{cleaned_path}' (reduced from {original_size / 1024:.1f}KB to {len(compressed_bytes) / 1024:.1f}KB).")
+            return self.success_response(f"Successfully loaded and compressed the image '{cleaned_path}' (reduced from {original_size / 1024:.1f}KB to {compressed_size / 1024:.1f}KB).")
 
         except Exception as e:
             return self.fail_response(f"An unexpected error occurred while trying to see the image: {str(e)}")
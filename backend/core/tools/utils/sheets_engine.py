@@ -0,0 +1,374 @@
+"""
+Spreadsheet engine behind SandboxSheetsTool.
+
+Every function here is synchronous and CPU bound; the tool runs them through
+``asyncio.to_thread`` so that large workbooks never block the event loop.
+
+- XLSX files are streamed with openpyxl's ``read_only`` / ``write_only`` modes
+  unless a workbook has to be edited in place (formatting).
+- Column statistics, grouping and chart source data are computed with pandas
+  over whole columns instead of Python loops over cells. CSV parsing uses the
+  pyarrow engine when pyarrow is installed.
+- Previews are bounded: callers get at most ``MAX_PREVIEW_ROWS`` sample rows,
+  never the full dataset.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import math
+from datetime import date, datetime, time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import chardet
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+try:
+    import openpyxl
+    from openpyxl import Workbook
+    from openpyxl.chart import BarChart, LineChart, PieChart, Reference, Series, ScatterChart
+    from openpyxl.formatting.rule import ColorScaleRule, FormulaRule
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+except Exception:
+    openpyxl = None
+
+MAX_PREVIEW_ROWS = 1000
+# Rows sampled per column when sizing columns in format_xlsx
+WIDTH_SAMPLE_ROWS = 1000
+# Bytes fed to chardet; detection on the full file is slower than parsing it
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+AGGREGATIONS = ("count", "sum", "avg", "min", "max")
+
+
+def _require_openpyxl() -> None:
+    if not openpyxl:
+        raise RuntimeError("openpyxl not available")
+
+
+def detect_encoding(data: bytes) -> str:
+    try:
+        return chardet.detect(data[:ENCODING_SAMPLE_BYTES]).get("encoding") or "utf-8"
+    except Exception:
+        return "utf-8"
+
+
+def json_safe(value: Any) -> Any:
+    """Convert pandas/numpy/openpyxl cell values into JSON-serializable ones."""
+    if value is None:
+        return None
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        # numpy scalars
+        value = value.item()
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if value is pd.NaT:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return str(value)
+
+
+def _headers(raw: Optional[Sequence[Any]]) -> List[str]:
+    return ["" if h is None else str(h) for h in (raw or [])]
+
+
+# ---- reading ----
+
+def _iter_xlsx_rows(data: bytes, sheet_name: Optional[str]) -> Iterator[Tuple[Any, ...]]:
+    _require_openpyxl()
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=False)
+    try:
+        ws = wb[sheet_name] if sheet_name and sheet_name in wb.sheetnames else wb.active
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _iter_csv_rows(data: bytes) -> Iterator[List[str]]:
+    text = io.TextIOWrapper(io.BytesIO(data), encoding=detect_encoding(data), errors="replace", newline="")
+    yield from csv.reader(text)
+
+
+def iter_rows(data: bytes, ext: str, sheet_name: Optional[str] = None) -> Iterator[Sequence[Any]]:
+    """Stream a sheet row by row (header row first) without materializing it."""
+    if ext == "csv":
+        return _iter_csv_rows(data)
+    if ext == "xlsx":
+        return _iter_xlsx_rows(data, sheet_name)
+    raise ValueError("Unsupported file extension. Use .csv or .xlsx")
+
+
+def _frame_from_rows(rows: Iterable[Sequence[Any]]) -> pd.DataFrame:
+    rows = iter(rows)
+    headers = _headers(next(rows, None))
+    records = [list(r) for r in rows]
+    width = max([len(headers)] + [len(r) for r in records])
+    headers += [f"col_{i + 1}" for i in range(len(headers), width)]
+    for r in records:
+        if len(r) < width:
+            r.extend([None] * (width - len(r)))
+    return pd.DataFrame.from_records(records, columns=headers) if records else pd.DataFrame(columns=headers)
+
+
+def read_frame(data: bytes, ext: str, sheet_name: Optional[str] = None) -> pd.DataFrame:
+    """Load a whole sheet into a DataFrame.
+
+    CSV column types are inferred by the parser, so numeric columns arrive as
+    numbers and empty cells as NaN.
+    """
+    if ext == "csv":
+        if not data.strip():
+            return pd.DataFrame()
+        try:
+            return pd.read_csv(io.BytesIO(data), encoding=detect_encoding(data), engine=CSV_ENGINE)
+        except Exception:
+            # Ragged rows or unusual dialects; fall back to the tolerant csv module
+            return _frame_from_rows(_iter_csv_rows(data))
+    return _frame_from_rows(iter_rows(data, ext, sheet_name))
+
+
+# ---- writing ----
+
+def write_csv(headers: Sequence[Any], rows: Iterable[Sequence[Any]]) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if headers:
+        writer.writerow(headers)
+    for r in rows:
+        writer.writerow(["" if v is None else v for v in r])
+    return buf.getvalue().encode("utf-8")
+
+
+def write_xlsx(headers: Sequence[Any], rows: Iterable[Sequence[Any]], sheet_name: Optional[str] = None) -> bytes:
+    """Write a single-sheet workbook in openpyxl's streaming write-only mode."""
+    _require_openpyxl()
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name or "Sheet")
+    if headers:
+        ws.append(list(headers))
+    for r in rows:
+        ws.append(list(r))
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def frame_rows(df: pd.DataFrame) -> Iterator[List[Any]]:
+    """Yield DataFrame rows as lists of JSON-safe cell values."""
+    for row in df.itertuples(index=False, name=None):
+        yield [json_safe(v) for v in row]
+
+
+# ---- operations ----
+
+def preview(data: bytes, ext: str, sheet_name: Optional[str], max_rows: int, with_csv: bool = False) -> Dict[str, Any]:
+    """Return headers, the total row count and at most ``max_rows`` sample rows.
+
+    Rows are streamed, so memory stays bounded by the sample unless a CSV
+    export is requested.
+    """
+    limit = max(0, min(max_rows, MAX_PREVIEW_ROWS))
+    rows = iter_rows(data, ext, sheet_name)
+    headers = _headers(next(rows, None))
+
+    sample: List[List[Any]] = []
+    row_count = 0
+    csv_buf = io.StringIO() if with_csv else None
+    writer = csv.writer(csv_buf) if with_csv else None
+    if writer and headers:
+        writer.writerow(headers)
+
+    for row in rows:
+        if row_count < limit:
+            sample.append([json_safe(v) for v in row])
+        if writer:
+            writer.writerow(["" if v is None else v for v in row])
+        row_count += 1
+
+    return {
+        "headers": headers,
+        "row_count": row_count,
+        "sample_rows": sample,
+        "csv": csv_buf.getvalue().encode("utf-8") if with_csv else None,
+    }
+
+
+def analyze(
+    data: bytes,
+    ext: str,
+    sheet_name: Optional[str],
+    target_columns: Optional[List[str]],
+    group_by: Optional[str],
+    aggregations: Optional[List[str]],
+) -> Tuple[List[str], List[List[Any]]]:
+    """Compute count/sum/avg/min/max per column, optionally per group.
+
+    Non-numeric cells are ignored, so a text column reports a count of 0.
+    """
+    df = read_frame(data, ext, sheet_name)
+    numeric_cols = [c for c in (target_columns or list(df.columns)) if c in df.columns]
+    numeric = df[numeric_cols].apply(pd.to_numeric, errors="coerce") if numeric_cols else pd.DataFrame(index=df.index)
+
+    if group_by and group_by in df.columns:
+        aggs = [a for a in (aggregations or AGGREGATIONS) if a in AGGREGATIONS]
+        grouped = numeric.groupby(df[group_by], sort=False, dropna=False)
+        stats = {
+            "count": grouped.count(),
+            "sum": grouped.sum(min_count=1),
+            "avg": grouped.mean(),
+            "min": grouped.min(),
+            "max": grouped.max(),
+        }
+        out_headers = [group_by] + [f"{col}_{agg}" for col in numeric_cols for agg in aggs]
+        out_rows = []
+        for key in stats["count"].index:
+            row = [json_safe(key)]
+            for col in numeric_cols:
+                row.extend(json_safe(stats[agg].at[key, col]) for agg in aggs)
+            out_rows.append(row)
+        return out_headers, out_rows
+
+    summary = {
+        "count": numeric.count(),
+        "sum": numeric.sum(min_count=1),
+        "avg": numeric.mean(),
+        "min": numeric.min(),
+        "max": numeric.max(),
+    }
+    out_rows = [[metric] + [json_safe(values[col]) for col in numeric_cols] for metric, values in summary.items()]
+    return ["metric"] + numeric_cols, out_rows
+
+
+def build_chart(
+    data: bytes,
+    ext: str,
+    sheet_name: Optional[str],
+    x_column: str,
+    y_columns: List[str],
+    chart_type: str,
+) -> Tuple[bytes, bytes]:
+    """Build a workbook holding the data plus a native chart, and the chart's source CSV."""
+    _require_openpyxl()
+    df = read_frame(data, ext, sheet_name)
+    if x_column not in df.columns:
+        raise ValueError(f"x_column '{x_column}' not found")
+    for yc in y_columns:
+        if yc not in df.columns:
+            raise ValueError(f"y_column '{yc}' not found")
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name or "Data")
+    headers = list(df.columns)
+    ws.append(headers)
+    for row in frame_rows(df):
+        ws.append(row)
+
+    if chart_type == "bar":
+        chart = BarChart()
+    elif chart_type == "line":
+        chart = LineChart()
+    elif chart_type == "pie":
+        chart = PieChart()
+    else:
+        chart = ScatterChart()
+
+    x_col_idx = headers.index(x_column) + 1
+    y_col_indices = [headers.index(c) + 1 for c in y_columns]
+    max_row = len(df) + 1
+    x_ref = Reference(ws, min_col=x_col_idx, min_row=2, max_row=max_row)
+
+    if chart_type == "pie" and len(y_col_indices) == 1:
+        chart.add_data(Reference(ws, min_col=y_col_indices[0], min_row=1, max_row=max_row), titles_from_data=True)
+        chart.set_categories(x_ref)
+    else:
+        for yci in y_col_indices:
+            series = Series(Reference(ws, min_col=yci, min_row=1, max_row=max_row), title_from_data=True)
+            series.category = x_ref
+            if isinstance(chart, ScatterChart):
+                series.xvalues = x_ref
+            chart.series.append(series)
+
+    chart_ws = wb.create_sheet(title=f"Chart_{chart_type}")
+    chart_ws.add_chart(chart, "A1")
+    out = io.BytesIO()
+    wb.save(out)
+
+    dataset = df[[x_column] + y_columns]
+    dataset = dataset[dataset[x_column].notna()]
+    return out.getvalue(), write_csv([x_column] + y_columns, frame_rows(dataset))
+
+
+def format_xlsx(
+    data: bytes,
+    sheet_name: Optional[str],
+    bold_headers: bool,
+    auto_width: bool,
+    apply_banding: bool,
+    conditional_format: Optional[Dict[str, Any]],
+) -> Tuple[bytes, str]:
+    """Style a workbook in place.
+
+    Banding is applied as a single conditional-formatting rule rather than a
+    fill per cell, and column widths are sized from the first
+    ``WIDTH_SAMPLE_ROWS`` rows, so the cost no longer grows with the sheet.
+    """
+    _require_openpyxl()
+    wb = openpyxl.load_workbook(io.BytesIO(data))
+    ws = wb[sheet_name] if sheet_name else wb.active
+
+    max_col = ws.max_column
+    max_row = ws.max_row
+    last_col = get_column_letter(max_col)
+
+    if bold_headers and max_row >= 1:
+        for cell in ws[1]:
+            cell.font = Font(bold=True)
+            cell.alignment = Alignment(vertical="center")
+
+    if apply_banding and max_row > 2:
+        ws.conditional_formatting.add(
+            f"A2:{last_col}{max_row}",
+            FormulaRule(formula=["MOD(ROW(),2)=0"], fill=PatternFill(start_color="FFF9F9", end_color="FFF9F9", fill_type="solid"))
+        )
+
+    if auto_width:
+        widths = [0] * max_col
+        for row in ws.iter_rows(min_row=1, max_row=min(max_row, WIDTH_SAMPLE_ROWS), values_only=True):
+            for i, v in enumerate(row[:max_col]):
+                if v is not None:
+                    widths[i] = max(widths[i], len(str(v)))
+        for i, width in enumerate(widths, start=1):
+            ws.column_dimensions[get_column_letter(i)].width = min(60, max(10, width + 2))
+
+    if conditional_format and max_row > 1:
+        column_name = conditional_format.get("column")
+        if column_name:
+            headers = [cell.value for cell in ws[1]]
+            if column_name in headers:
+                col_letter = get_column_letter(headers.index(column_name) + 1)
+                ws.conditional_formatting.add(
+                    f"{col_letter}2:{col_letter}{max_row}",
+                    ColorScaleRule(start_type='min', start_color=conditional_format.get("min_color", "FFEFEB"),
+                                   mid_type='percentile', mid_value=50, mid_color=conditional_format.get("mid_color", "FFD7D2"),
+                                   end_type='max', end_color=conditional_format.get("max_color", "FFA39E"))
+                )
+
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue(), ws.title
@@ -4,6 +4,7 @@ from .trigger_service import (
     TriggerEvent, 
     TriggerResult, 
     TriggerType,
+    ExecutionPolicy,
     get_trigger_service
 )
 from .provider_service import (
@@ -20,6 +21,7 @@ __all__ = [
     'TriggerEvent', 
     'TriggerResult',
     'TriggerType',
+    'ExecutionPolicy',
     'TriggerProvider',
     
     # Service factories
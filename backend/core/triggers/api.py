@@ -12,6 +12,7 @@ from core.services.supabase import DBConnection
 from core.utils.auth_utils import verify_and_get_user_id_from_jwt
 from core.utils.logger import logger
 from core.utils.config import config
+from core.utils import trigger_delivery
 from core.services.billing import can_use_model
 # Import billing integration conditionally
 try:
@@ -656,18 +657,23 @@ async def trigger_webhook(
                 logger.debug(f"Executing agent {trigger.agent_id} for trigger {trigger_id}")
                 
                 from .trigger_service import TriggerEvent
+                delivery_id = trigger_delivery.delivery_id_from_headers(request.headers)
+                if not delivery_id and trigger.trigger_type == TriggerType.SCHEDULE:
+                    delivery_id = trigger_delivery.schedule_delivery_id(datetime.now(timezone.utc))
                 event = TriggerEvent(
                     trigger_id=trigger_id,
                     agent_id=trigger.agent_id,
                     trigger_type=trigger.trigger_type,
-                    raw_data=raw_data
+                    raw_data=raw_data,
+                    delivery_id=delivery_id
                 )
                 
                 execution_service = get_execution_service(db)
                 execution_result = await execution_service.execute_trigger_result(
                     agent_id=trigger.agent_id,
                     trigger_result=result,
-                    trigger_event=event
+                    trigger_event=event,
+                    trigger=trigger
                 )
                 
                 logger.debug(f"Agent execution result: {execution_result}")
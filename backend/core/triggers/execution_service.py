@@ -1,14 +1,15 @@
 import json
 import uuid
+from dataclasses import asdict
 from datetime import datetime, timezone
 from typing import Dict, Any, Tuple, Optional
 
 from core.services.supabase import DBConnection
-from core.services import redis_client
 from core.utils.logger import logger, structlog
 from core.utils.config import config
-from run_agent_background import run_agent_background
-from .trigger_service import TriggerEvent, TriggerResult
+from core.utils import run_slots, active_runs, run_lanes, agent_config_store, trigger_delivery
+from run_agent_background import enqueue_run, flush_trigger_batch
+from .trigger_service import Trigger, TriggerEvent, TriggerResult, ExecutionPolicy
 from .utils import format_workflow_for_llm
 
 
@@ -24,33 +25,138 @@ class ExecutionService:
         self,
         agent_id: str,
         trigger_result: TriggerResult,
-        trigger_event: TriggerEvent
+        trigger_event: TriggerEvent,
+        trigger: Optional[Trigger] = None
     ) -> Dict[str, Any]:
+        # Without a trigger (manual runs) the execution is immediate and fresh
+        if not await trigger_delivery.claim(trigger_event.trigger_id, trigger_event.delivery_id):
+            logger.info(f"Skipping duplicate delivery {trigger_event.delivery_id} of trigger {trigger_event.trigger_id}")
+            return {
+                "success": True,
+                "duplicate": True,
+                "message": "Delivery already processed"
+            }
+        
         try:
-            logger.debug(f"Executing trigger for agent {agent_id}: workflow={trigger_result.should_execute_workflow}, agent={trigger_result.should_execute_agent}")
-            
-            if trigger_result.should_execute_workflow:
-                return await self._workflow_executor.execute_workflow(
-                    agent_id=agent_id,
-                    workflow_id=trigger_result.workflow_id,
-                    workflow_input=trigger_result.workflow_input or {},
-                    trigger_result=trigger_result,
-                    trigger_event=trigger_event
-                )
+            if trigger is not None and trigger.debounce_seconds:
+                result = await self._add_to_batch(agent_id, trigger, trigger_result, trigger_event)
             else:
-                return await self._agent_executor.execute_agent(
-                    agent_id=agent_id,
-                    trigger_result=trigger_result,
-                    trigger_event=trigger_event
-                )
-                
+                result = await self._execute(agent_id, trigger_result, trigger_event, trigger)
         except Exception as e:
             logger.error(f"Failed to execute trigger result: {e}")
-            return {
+            result = {
                 "success": False,
                 "error": str(e),
                 "message": "Failed to execute trigger"
             }
+        
+        if not result.get("success"):
+            # Let the sender's retry of this delivery through
+            await trigger_delivery.release(trigger_event.trigger_id, trigger_event.delivery_id)
+        return result
+    
+    async def execute_scheduled(self, trigger_id: str, fired_at: datetime) -> Dict[str, Any]:
+        """Run a cron trigger fire dispatched by the backend scheduler."""
+        from .trigger_service import get_trigger_service
+        from .provider_service import ScheduleProvider
+        trigger_service = get_trigger_service(self._db)
+        trigger = await trigger_service.get_trigger(trigger_id)
+        if not trigger or not trigger.is_active:
+            logger.info(f"Skipping fire of missing or inactive trigger {trigger_id}")
+            return {"success": False, "error": "Trigger not found or inactive"}
+
+        raw_data = ScheduleProvider.event_payload(trigger, fired_at)
+        trigger_result = await trigger_service.process_trigger_event(trigger_id, raw_data)
+        if not trigger_result.success:
+            return {"success": False, "error": trigger_result.error_message}
+
+        trigger_event = TriggerEvent(
+            trigger_id=trigger_id,
+            agent_id=trigger.agent_id,
+            trigger_type=trigger.trigger_type,
+            raw_data=raw_data,
+            delivery_id=trigger_delivery.schedule_delivery_id(fired_at)
+        )
+        return await self.execute_trigger_result(trigger.agent_id, trigger_result, trigger_event, trigger)
+
+    async def execute_batch(self, trigger_id: str) -> Dict[str, Any]:
+        """Run the events a debounced trigger collected during its window, as one execution."""
+        received, items = await trigger_delivery.take_batch(trigger_id)
+        if not items:
+            return {"success": True, "message": "No events to execute"}
+        
+        from .trigger_service import get_trigger_service
+        trigger = await get_trigger_service(self._db).get_trigger(trigger_id)
+        if not trigger or not trigger.is_active:
+            logger.info(f"Dropping {received} batched events of missing or inactive trigger {trigger_id}")
+            return {"success": False, "error": "Trigger not found or inactive"}
+        
+        latest = items[-1]
+        trigger_result = TriggerResult(**latest['trigger_result'])
+        trigger_result.execution_variables = {**(trigger_result.execution_variables or {}), 'batched_events': received}
+        
+        payloads = []
+        for item in items:
+            event = item['trigger_event']
+            payloads.append((event.get('context') or {}).get('payload', event.get('raw_data')))
+        latest_event = latest['trigger_event']
+        trigger_event = TriggerEvent(
+            trigger_id=trigger_id,
+            agent_id=trigger.agent_id,
+            trigger_type=trigger.trigger_type,
+            raw_data=latest_event.get('raw_data') or {},
+            context={**(latest_event.get('context') or {}), 'payload': payloads, 'batched_events': received}
+        )
+        
+        logger.debug(f"Executing batch of {received} events for trigger {trigger_id}")
+        return await self._execute(trigger.agent_id, trigger_result, trigger_event, trigger)
+    
+    async def _add_to_batch(
+        self,
+        agent_id: str,
+        trigger: Trigger,
+        trigger_result: TriggerResult,
+        trigger_event: TriggerEvent
+    ) -> Dict[str, Any]:
+        opened = await trigger_delivery.add_to_batch(trigger.trigger_id, {
+            'agent_id': agent_id,
+            'trigger_result': asdict(trigger_result),
+            'trigger_event': asdict(trigger_event),
+        }, trigger.debounce_seconds)
+        if opened:
+            flush_trigger_batch.send_with_options(args=(trigger.trigger_id,), delay=trigger.debounce_seconds * 1000)
+        
+        return {
+            "success": True,
+            "batched": True,
+            "message": f"Event queued to run with the events of the next {trigger.debounce_seconds} seconds"
+        }
+    
+    async def _execute(
+        self,
+        agent_id: str,
+        trigger_result: TriggerResult,
+        trigger_event: TriggerEvent,
+        trigger: Optional[Trigger]
+    ) -> Dict[str, Any]:
+        logger.debug(f"Executing trigger for agent {agent_id}: workflow={trigger_result.should_execute_workflow}, agent={trigger_result.should_execute_agent}")
+        
+        if trigger_result.should_execute_workflow:
+            return await self._workflow_executor.execute_workflow(
+                agent_id=agent_id,
+                workflow_id=trigger_result.workflow_id,
+                workflow_input=trigger_result.workflow_input or {},
+                trigger_result=trigger_result,
+                trigger_event=trigger_event,
+                trigger=trigger
+            )
+        else:
+            return await self._agent_executor.execute_agent(
+                agent_id=agent_id,
+                trigger_result=trigger_result,
+                trigger_event=trigger_event,
+                trigger=trigger
+            )
 
 
 class SessionManager:
@@ -61,31 +167,17 @@ class SessionManager:
         self,
         agent_id: str,
         agent_config: Dict[str, Any],
-        trigger_event: TriggerEvent
+        trigger_event: TriggerEvent,
+        trigger: Optional[Trigger] = None
     ) -> Tuple[str, str]:
-        client = await self._db.client
-        
-        project_id = str(uuid.uuid4())
-        thread_id = str(uuid.uuid4())
         account_id = agent_config.get('account_id')
-        
         placeholder_name = f"Trigger: {agent_config.get('name', 'Agent')} - {trigger_event.trigger_id[:8]}"
         
-        await client.table('projects').insert({
-            "project_id": project_id,
-            "account_id": account_id,
-            "name": placeholder_name,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }).execute()
+        if trigger is not None and trigger.execution_policy != ExecutionPolicy.FRESH:
+            return await self._open_trigger_session(trigger, account_id, placeholder_name)
         
-        await self._create_sandbox_for_project(project_id)
-        
-        await client.table('threads').insert({
-            "thread_id": thread_id,
-            "project_id": project_id,
-            "account_id": account_id,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }).execute()
+        project_id = await self._create_project(account_id, placeholder_name)
+        thread_id = await self._create_thread(project_id, account_id)
         
         logger.debug(f"Created agent session: project={project_id}, thread={thread_id}")
         return thread_id, project_id
@@ -94,36 +186,112 @@ class SessionManager:
         self,
         account_id: str,
         workflow_id: str,
-        workflow_name: str
+        workflow_name: str,
+        trigger: Optional[Trigger] = None
+    ) -> Tuple[str, str]:
+        project_name = f"Workflow: {workflow_name}"
+        thread_metadata = {
+            "workflow_execution": True,
+            "workflow_id": workflow_id,
+            "workflow_name": workflow_name
+        }
+        
+        if trigger is not None and trigger.execution_policy != ExecutionPolicy.FRESH:
+            return await self._open_trigger_session(trigger, account_id, project_name, thread_metadata)
+        
+        project_id = await self._create_project(account_id, project_name)
+        thread_id = await self._create_thread(project_id, account_id, thread_metadata)
+        
+        logger.debug(f"Created workflow session: project={project_id}, thread={thread_id}")
+        return thread_id, project_id
+    
+    async def _open_trigger_session(
+        self,
+        trigger: Trigger,
+        account_id: str,
+        project_name: str,
+        thread_metadata: Optional[Dict[str, Any]] = None
     ) -> Tuple[str, str]:
+        """Return the thread and project of the trigger's session, creating what is missing.
+        
+        The project and its sandbox are shared by every firing. The rolling policy
+        also continues the last thread unless a run is still going on it.
+        """
         client = await self._db.client
         
+        async with trigger_delivery.session_lock(trigger.trigger_id):
+            result = await client.table('trigger_sessions').select('project_id, thread_id').eq('trigger_id', trigger.trigger_id).execute()
+            session = result.data[0] if result.data else {}
+            
+            project_id = session.get('project_id')
+            if project_id and not await self._project_has_sandbox(project_id):
+                project_id = None
+            
+            thread_id = None
+            if project_id and trigger.execution_policy == ExecutionPolicy.ROLLING:
+                thread_id = await self._idle_thread(session.get('thread_id'))
+            
+            if not project_id:
+                project_id = await self._create_project(account_id, project_name)
+            if not thread_id:
+                thread_id = await self._create_thread(project_id, account_id, thread_metadata)
+            
+            await client.table('trigger_sessions').upsert({
+                "trigger_id": trigger.trigger_id,
+                "project_id": project_id,
+                "thread_id": thread_id,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }).execute()
+        
+        logger.debug(f"Opened {trigger.execution_policy.value} session for trigger {trigger.trigger_id}: project={project_id}, thread={thread_id}")
+        return thread_id, project_id
+    
+    async def _project_has_sandbox(self, project_id: str) -> bool:
+        client = await self._db.client
+        result = await client.table('projects').select('sandbox').eq('project_id', project_id).execute()
+        return bool(result.data and (result.data[0].get('sandbox') or {}).get('id'))
+    
+    async def _idle_thread(self, thread_id: Optional[str]) -> Optional[str]:
+        if not thread_id:
+            return None
+        client = await self._db.client
+        result = await client.table('agent_runs').select('id').eq('thread_id', thread_id).eq('status', 'running').limit(1).execute()
+        return None if result.data else thread_id
+    
+    async def _create_project(self, account_id: str, name: str) -> str:
+        client = await self._db.client
         project_id = str(uuid.uuid4())
-        thread_id = str(uuid.uuid4())
         
         await client.table('projects').insert({
             "project_id": project_id,
             "account_id": account_id,
-            "name": f"Workflow: {workflow_name}",
+            "name": name,
             "created_at": datetime.now(timezone.utc).isoformat()
         }).execute()
         
         await self._create_sandbox_for_project(project_id)
+        return project_id
+    
+    async def _create_thread(
+        self,
+        project_id: str,
+        account_id: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> str:
+        client = await self._db.client
+        thread_id = str(uuid.uuid4())
         
-        await client.table('threads').insert({
+        thread_data = {
             "thread_id": thread_id,
             "project_id": project_id,
             "account_id": account_id,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "metadata": {
-                "workflow_execution": True,
-                "workflow_id": workflow_id,
-                "workflow_name": workflow_name
-            }
-        }).execute()
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        if metadata:
+            thread_data["metadata"] = metadata
         
-        logger.debug(f"Created workflow session: project={project_id}, thread={thread_id}")
-        return thread_id, project_id
+        await client.table('threads').insert(thread_data).execute()
+        return thread_id
     
     async def _create_sandbox_for_project(self, project_id: str) -> None:
         client = await self._db.client
@@ -181,7 +349,8 @@ class AgentExecutor:
         self,
         agent_id: str,
         trigger_result: TriggerResult,
-        trigger_event: TriggerEvent
+        trigger_event: TriggerEvent,
+        trigger: Optional[Trigger] = None
     ) -> Dict[str, Any]:
         try:
             agent_config = await self._get_agent_config(agent_id)
@@ -189,7 +358,7 @@ class AgentExecutor:
                 raise ValueError(f"Agent {agent_id} not found")
             
             thread_id, project_id = await self._session_manager.create_agent_session(
-                agent_id, agent_config, trigger_event
+                agent_id, agent_config, trigger_event, trigger
             )
             
             merged_variables = dict(trigger_result.execution_variables or {})
@@ -409,6 +578,8 @@ class AgentExecutor:
         if not can_run:
             raise ValueError(f"Billing check failed: {message}")
         
+        defer = await run_lanes.admit(run_lanes.TRIGGER)
+        
         agent_run = await client.table('agent_runs').insert({
             "thread_id": thread_id,
             "status": "running",
@@ -427,9 +598,11 @@ class AgentExecutor:
         
         agent_run_id = agent_run.data[0]['id']
         
+        await run_slots.acquire(agent_run_id, account_id, project_id, thread_id)
         await self._register_agent_run(agent_run_id)
         
-        run_agent_background.send(
+        await enqueue_run(
+            run_lanes.TRIGGER, account_id, defer=defer,
             agent_run_id=agent_run_id,
             thread_id=thread_id,
             instance_id="trigger_executor",
@@ -439,7 +612,7 @@ class AgentExecutor:
             reasoning_effort="low",
             stream=False,
             enable_context_manager=True,
-            agent_config=agent_config,
+            agent_config_ref=await agent_config_store.put(agent_config),
             request_id=structlog.contextvars.get_contextvars().get('request_id'),
         )
         
@@ -448,8 +621,7 @@ class AgentExecutor:
     
     async def _register_agent_run(self, agent_run_id: str) -> None:
         try:
-            instance_key = f"active_run:trigger_executor:{agent_run_id}"
-            await redis_client.set(instance_key, "running", ex=redis_client.REDIS_KEY_TTL)
+            await active_runs.register("trigger_executor", agent_run_id)
         except Exception as e:
             logger.warning(f"Failed to register agent run in Redis: {e}")
 
@@ -465,18 +637,21 @@ class WorkflowExecutor:
         workflow_id: str,
         workflow_input: Dict[str, Any],
         trigger_result: TriggerResult,
-        trigger_event: TriggerEvent
+        trigger_event: TriggerEvent,
+        trigger: Optional[Trigger] = None
     ) -> Dict[str, Any]:
         try:
             workflow_config, steps_json = await self._get_workflow_data(workflow_id, agent_id)
             agent_config, account_id = await self._get_agent_data(agent_id)
+            # Rejected before any session is created for it
+            await run_lanes.admit(run_lanes.BATCH)
             
             enhanced_agent_config = await self._enhance_agent_config_for_workflow(
                 agent_config, workflow_config, steps_json, workflow_input, account_id, trigger_result
             )
             
             thread_id, project_id = await self._session_manager.create_workflow_session(
-                account_id, workflow_id, workflow_config['name']
+                account_id, workflow_id, workflow_config['name'], trigger
             )
             
             await self._validate_workflow_execution(account_id)
@@ -742,9 +917,11 @@ class WorkflowExecutor:
         
         agent_run_id = agent_run.data[0]['id']
         
+        await run_slots.acquire(agent_run_id, account_id, project_id, thread_id)
         await self._register_workflow_run(agent_run_id)
         
-        run_agent_background.send(
+        await enqueue_run(
+            run_lanes.BATCH, account_id,
             agent_run_id=agent_run_id,
             thread_id=thread_id,
             instance_id=getattr(config, 'INSTANCE_ID', 'default'),
@@ -754,7 +931,7 @@ class WorkflowExecutor:
             reasoning_effort='medium',
             stream=False,
             enable_context_manager=True,
-            agent_config=agent_config,
+            agent_config_ref=await agent_config_store.put(agent_config),
             request_id=None,
         )
         
@@ -763,9 +940,7 @@ class WorkflowExecutor:
     
     async def _register_workflow_run(self, agent_run_id: str) -> None:
         try:
-            instance_id = getattr(config, 'INSTANCE_ID', 'default')
-            instance_key = f"active_run:{instance_id}:{agent_run_id}"
-            await redis_client.set(instance_key, "running", ex=redis_client.REDIS_KEY_TTL)
+            await active_runs.register(getattr(config, 'INSTANCE_ID', 'default'), agent_run_id)
         except Exception as e:
             logger.warning(f"Failed to register workflow run in Redis: {e}")
 
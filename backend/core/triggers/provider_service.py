@@ -13,7 +13,8 @@ from core.services.supabase import DBConnection
 from core.services.supabase import DBConnection
 from core.utils.logger import logger
 from core.utils.config import config, EnvMode
-from .trigger_service import Trigger, TriggerEvent, TriggerResult, TriggerType
+from core.utils import trigger_delivery, trigger_scheduler
+from .trigger_service import Trigger, TriggerEvent, TriggerResult, TriggerType, ExecutionPolicy
 
 
 class TriggerProvider(ABC):
@@ -77,25 +78,37 @@ class ScheduleProvider(TriggerProvider):
         
         return config
     
+    @staticmethod
+    def event_payload(trigger: Trigger, fired_at: datetime) -> Dict[str, Any]:
+        return {
+            "trigger_id": trigger.trigger_id,
+            "agent_id": trigger.agent_id,
+            "execution_type": trigger.config.get('execution_type', 'agent'),
+            "agent_prompt": trigger.config.get('agent_prompt'),
+            "workflow_id": trigger.config.get('workflow_id'),
+            "workflow_input": trigger.config.get('workflow_input', {}),
+            "timestamp": fired_at.isoformat()
+        }
+    
     async def setup_trigger(self, trigger: Trigger) -> bool:
+        if trigger_scheduler.ENABLED:
+            # Fired by the backend scheduler; drop a Supabase Cron job created before it
+            if trigger.config.get('cron_job_name'):
+                await self.teardown_trigger(trigger)
+                trigger.config.pop('cron_job_name', None)
+                trigger.config.pop('cron_job_id', None)
+            await self._notify_scheduler()
+            return True
+        
         try:
             webhook_url = f"{self._webhook_base_url}/api/triggers/{trigger.trigger_id}/webhook"
             cron_expression = trigger.config['cron_expression']
-            execution_type = trigger.config.get('execution_type', 'agent')
             user_timezone = trigger.config.get('timezone', 'UTC')
 
             if user_timezone != 'UTC':
                 cron_expression = self._convert_cron_to_utc(cron_expression, user_timezone)
             
-            payload = {
-                "trigger_id": trigger.trigger_id,
-                "agent_id": trigger.agent_id,
-                "execution_type": execution_type,
-                "agent_prompt": trigger.config.get('agent_prompt'),
-                "workflow_id": trigger.config.get('workflow_id'),
-                "workflow_input": trigger.config.get('workflow_input', {}),
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            }
+            payload = self.event_payload(trigger, datetime.now(timezone.utc))
             
             headers: Dict[str, Any] = {
                 "Content-Type": "application/json",
@@ -145,6 +158,11 @@ class ScheduleProvider(TriggerProvider):
             return False
     
     async def teardown_trigger(self, trigger: Trigger) -> bool:
+        if trigger_scheduler.ENABLED:
+            await self._notify_scheduler()
+            if not trigger.config.get('cron_job_name'):
+                return True
+        
         try:
             job_name = trigger.config.get('cron_job_name') or f"trigger_{trigger.trigger_id}"
             client = await self._db.client
@@ -164,6 +182,12 @@ class ScheduleProvider(TriggerProvider):
             logger.error(f"Failed to teardown Supabase Cron schedule for trigger {trigger.trigger_id}: {e}")
             return False
     
+    async def _notify_scheduler(self) -> None:
+        try:
+            await trigger_scheduler.notify_changed()
+        except Exception as e:
+            logger.warning(f"Failed to notify the trigger scheduler: {e}")
+    
     async def process_event(self, trigger: Trigger, event: TriggerEvent) -> TriggerResult:
         try:
             raw_data = event.raw_data
@@ -303,12 +327,28 @@ class ProviderService:
                 "description": f"{provider_id.title()} trigger provider",
                 "trigger_type": provider.trigger_type.value,
                 "webhook_enabled": True,
-                "config_schema": self._get_provider_schema(provider_id)
+                "config_schema": self._with_delivery_schema(self._get_provider_schema(provider_id))
             }
             providers.append(provider_info)
         
         return providers
     
+    def _with_delivery_schema(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        schema["properties"].update({
+            "execution_policy": {
+                "type": "string",
+                "enum": [p.value for p in ExecutionPolicy],
+                "description": "Reuse one project and sandbox across runs, continue one rolling thread, or start fresh each run (defaults to reuse for schedules, fresh otherwise)"
+            },
+            "debounce_seconds": {
+                "type": "integer",
+                "minimum": 0,
+                "maximum": trigger_delivery.MAX_DEBOUNCE_SECONDS,
+                "description": "Collect events arriving within this many seconds into a single run"
+            }
+        })
+        return schema
+    
     def _get_provider_schema(self, provider_id: str) -> Dict[str, Any]:
         if provider_id == "schedule":
             return {
@@ -395,7 +435,22 @@ class ProviderService:
         if not provider:
             raise ValueError(f"Unknown provider: {provider_id}")
         
-        return await provider.validate_config(config)
+        validated_config = await provider.validate_config(config)
+        return self._validate_delivery_config(validated_config)
+    
+    def _validate_delivery_config(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        policy = config.get('execution_policy')
+        if policy is not None and policy not in [p.value for p in ExecutionPolicy]:
+            raise ValueError(f"execution_policy must be one of: {', '.join(p.value for p in ExecutionPolicy)}")
+        
+        debounce_seconds = config.get('debounce_seconds')
+        if debounce_seconds is not None:
+            if isinstance(debounce_seconds, bool) or not isinstance(debounce_seconds, int):
+                raise ValueError("debounce_seconds must be an integer")
+            if not 0 <= debounce_seconds <= trigger_delivery.MAX_DEBOUNCE_SECONDS:
+                raise ValueError(f"debounce_seconds must be between 0 and {trigger_delivery.MAX_DEBOUNCE_SECONDS}")
+        
+        return config
     
     async def get_provider_trigger_type(self, provider_id: str) -> TriggerType:
         provider = self._providers.get(provider_id)
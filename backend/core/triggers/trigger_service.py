@@ -14,6 +14,15 @@ class TriggerType(str, Enum):
     EVENT = "event"
 
 
+class ExecutionPolicy(str, Enum):
+    # One project and sandbox for all firings, a new thread per firing
+    REUSE = "reuse"
+    # One project, sandbox and thread; the context manager compacts its history
+    ROLLING = "rolling"
+    # A new project, sandbox and thread per firing
+    FRESH = "fresh"
+
+
 @dataclass
 class TriggerEvent:
     trigger_id: str
@@ -22,6 +31,7 @@ class TriggerEvent:
     raw_data: Dict[str, Any]
     timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     context: Dict[str, Any] = field(default_factory=dict)
+    delivery_id: Optional[str] = None
 
 
 @dataclass
@@ -49,6 +59,17 @@ class Trigger:
     created_at: datetime
     updated_at: datetime
 
+    @property
+    def execution_policy(self) -> ExecutionPolicy:
+        policy = self.config.get('execution_policy')
+        if policy:
+            return ExecutionPolicy(policy)
+        return ExecutionPolicy.REUSE if self.trigger_type == TriggerType.SCHEDULE else ExecutionPolicy.FRESH
+
+    @property
+    def debounce_seconds(self) -> int:
+        return int(self.config.get('debounce_seconds') or 0)
+
 
 class TriggerService:
     def __init__(self, db_connection: DBConnection):
@@ -110,6 +131,12 @@ class TriggerService:
         
         return [self._map_to_trigger(data) for data in result.data]
     
+    async def get_active_schedule_triggers(self) -> List[Trigger]:
+        client = await self._db.client
+        result = await client.table('agent_triggers').select('*').eq('trigger_type', TriggerType.SCHEDULE.value).eq('is_active', True).execute()
+        
+        return [self._map_to_trigger(data) for data in result.data]
+    
     async def update_trigger(
         self,
         trigger_id: str,
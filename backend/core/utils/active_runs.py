@@ -0,0 +1,97 @@
+"""
+Index of which API instances are handling which agent runs.
+
+Each registration writes the legacy ``active_run:{instance_id}:{agent_run_id}``
+marker plus two sets so lookups never need KEYS:
+
+- ``active_runs:instance:{instance_id}`` holds the runs an instance started
+- ``active_runs:run:{agent_run_id}`` holds the instances handling a run
+
+All three keys share ``REDIS_KEY_TTL`` and are refreshed by the worker
+heartbeat. Markers written before the index existed are still found through a
+SCAN fallback; set ``ACTIVE_RUN_SCAN_FALLBACK=false`` once they have expired.
+"""
+
+import os
+from typing import List
+
+from core.services import redis_client as rc
+from core.utils.logger import logger
+
+SCAN_FALLBACK = os.getenv("ACTIVE_RUN_SCAN_FALLBACK", "true").lower() in ('true', 't', 'yes', 'y', '1')
+
+
+def _marker_key(instance_id: str, agent_run_id: str) -> str:
+    return f"active_run:{instance_id}:{agent_run_id}"
+
+
+def _instance_key(instance_id: str) -> str:
+    return f"active_runs:instance:{instance_id}"
+
+
+def _run_key(agent_run_id: str) -> str:
+    return f"active_runs:run:{agent_run_id}"
+
+
+async def register(instance_id: str, agent_run_id: str) -> None:
+    """Record that ``instance_id`` is handling ``agent_run_id``."""
+    redis = await rc.get_client()
+    pipe = redis.pipeline(transaction=True)
+    pipe.set(_marker_key(instance_id, agent_run_id), "running", ex=rc.REDIS_KEY_TTL)
+    pipe.sadd(_instance_key(instance_id), agent_run_id)
+    pipe.expire(_instance_key(instance_id), rc.REDIS_KEY_TTL)
+    pipe.sadd(_run_key(agent_run_id), instance_id)
+    pipe.expire(_run_key(agent_run_id), rc.REDIS_KEY_TTL)
+    await pipe.execute()
+
+
+async def refresh(instance_id: str, agent_run_id: str) -> None:
+    """Extend the TTLs of a registration while the run is still alive."""
+    try:
+        redis = await rc.get_client()
+        pipe = redis.pipeline(transaction=False)
+        pipe.expire(_marker_key(instance_id, agent_run_id), rc.REDIS_KEY_TTL)
+        pipe.expire(_instance_key(instance_id), rc.REDIS_KEY_TTL)
+        pipe.expire(_run_key(agent_run_id), rc.REDIS_KEY_TTL)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to refresh active run index for {agent_run_id}: {str(e)}")
+
+
+async def unregister(instance_id: str, agent_run_id: str) -> None:
+    """Drop a registration once the run has finished on ``instance_id``."""
+    try:
+        redis = await rc.get_client()
+        pipe = redis.pipeline(transaction=True)
+        pipe.delete(_marker_key(instance_id, agent_run_id))
+        pipe.srem(_instance_key(instance_id), agent_run_id)
+        pipe.srem(_run_key(agent_run_id), instance_id)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to unregister active run {agent_run_id}: {str(e)}")
+
+
+async def get_instance_runs(instance_id: str) -> List[str]:
+    """Return the agent_run_ids registered by ``instance_id``."""
+    run_ids = set(await (await rc.get_client()).smembers(_instance_key(instance_id)))
+    if SCAN_FALLBACK:
+        for key in await rc.scan_keys(f"active_run:{instance_id}:*"):
+            parts = key.split(":")
+            if len(parts) == 3:
+                run_ids.add(parts[2])
+            else:
+                logger.warning(f"Unexpected key format found: {key}")
+    return list(run_ids)
+
+
+async def get_run_instances(agent_run_id: str) -> List[str]:
+    """Return the instance ids handling ``agent_run_id``."""
+    instance_ids = set(await (await rc.get_client()).smembers(_run_key(agent_run_id)))
+    if SCAN_FALLBACK and not instance_ids:
+        for key in await rc.scan_keys(f"active_run:*:{agent_run_id}"):
+            parts = key.split(":")
+            if len(parts) == 3:
+                instance_ids.add(parts[1])
+            else:
+                logger.warning(f"Unexpected key format found: {key}")
+    return list(instance_ids)
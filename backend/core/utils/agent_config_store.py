@@ -0,0 +1,119 @@
+"""
+Agent configurations passed to workers by reference.
+
+A run's ``agent_config`` (system prompt, MCP configs, tool settings) is often
+tens of KB. Rather than carrying it in the queued run, the checkpoint and the
+Dramatiq message, the API stores it once under
+``agent_config:{agent_id}:{version_id}:{digest}`` and sends the reference
+``{agent_id, version_id, digest}``. The digest is a hash of the configuration
+itself, so an entry never changes once written: it needs no invalidation, and
+a run always gets the configuration it was started with even if the version
+is edited in place while the run waits in the queue.
+
+- ``put`` stores a configuration and returns its reference; storing the same
+  configuration again only refreshes its TTL.
+- ``resolve`` reads it back through a bounded per-process LRU, so a worker
+  fetches each configuration from Redis once.
+- If the entry has expired, ``resolve`` rebuilds the configuration from the
+  agent's row and version in the database and logs that it may differ from
+  the one the run was started with.
+
+Values come back shared with the LRU, so callers must not mutate them.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from core.services import redis_client as rc
+from core.utils import fastjson
+from core.utils.logger import logger
+
+CONFIG_TTL = rc.REDIS_KEY_TTL
+LRU_MAX_ENTRIES = int(os.getenv("AGENT_CONFIG_LRU_ENTRIES", "256"))
+
+# redis key -> configuration
+_lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def _lru_get(key: str) -> Optional[Dict[str, Any]]:
+    config = _lru.get(key)
+    if config is not None:
+        _lru.move_to_end(key)
+    return config
+
+
+def _lru_put(key: str, config: Dict[str, Any]) -> None:
+    _lru[key] = config
+    _lru.move_to_end(key)
+    while len(_lru) > LRU_MAX_ENTRIES:
+        _lru.popitem(last=False)
+
+
+def _key(ref: Dict[str, Any]) -> str:
+    return f"agent_config:{ref['agent_id']}:{ref['version_id'] or 'none'}:{ref['digest']}"
+
+
+def config_ref(agent_config: Dict[str, Any]) -> Dict[str, Any]:
+    digest = hashlib.sha256(json.dumps(agent_config, sort_keys=True, default=str).encode()).hexdigest()[:32]
+    return {
+        'agent_id': agent_config.get('agent_id'),
+        'version_id': agent_config.get('current_version_id'),
+        'digest': digest,
+    }
+
+
+async def put(agent_config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Store ``agent_config`` and return the reference to send in its place (None for no config)."""
+    if not agent_config:
+        return None
+    ref = config_ref(agent_config)
+    key = _key(ref)
+    redis = await rc.get_client()
+    if not await redis.set(key, fastjson.dumps(agent_config), ex=CONFIG_TTL, nx=True):
+        await redis.expire(key, CONFIG_TTL)
+    _lru_put(key, agent_config)
+    return ref
+
+
+async def resolve(ref: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the configuration ``ref`` points to."""
+    key = _key(ref)
+    config = _lru_get(key)
+    if config is not None:
+        return config
+
+    redis = await rc.get_client()
+    pipe = redis.pipeline(transaction=False)
+    pipe.get(key)
+    pipe.expire(key, CONFIG_TTL)
+    raw, _ = await pipe.execute()
+    if raw:
+        config = fastjson.loads(raw)
+    else:
+        logger.warning(f"Agent config {key} has expired, loading agent {ref['agent_id']} "
+                       f"version {ref['version_id']} from the database; it may have changed since the run started")
+        config = await _load_from_db(ref)
+    _lru_put(key, config)
+    return config
+
+
+async def _load_from_db(ref: Dict[str, Any]) -> Dict[str, Any]:
+    from core.config_helper import extract_agent_config
+    from core.services.supabase import DBConnection
+    from core.versioning.version_service import get_version_service
+
+    client = await DBConnection().client
+    result = await client.table('agents').select('*').eq('agent_id', ref['agent_id']).execute()
+    if not result.data:
+        raise ValueError(f"Agent {ref['agent_id']} not found")
+    agent_data = result.data[0]
+
+    version_data = None
+    if ref['version_id']:
+        version_service = await get_version_service()
+        version = await version_service.get_version(ref['agent_id'], ref['version_id'], agent_data['account_id'])
+        version_data = version.to_dict()
+    return extract_agent_config(agent_data, version_data)
@@ -1,6 +1,8 @@
 import sentry
+import time
+from collections import OrderedDict
 from fastapi import HTTPException, Request, Header
-from typing import Optional
+from typing import Optional, Tuple
 import jwt
 from jwt.exceptions import PyJWTError
 from core.utils.logger import structlog
@@ -10,7 +12,7 @@ import base64
 import hashlib
 import hmac
 from core.services.supabase import DBConnection
-from core.services import redis_client as rc
+from core.utils.cache import Cache
 
 async def verify_admin_api_key(x_admin_api_key: Optional[str] = Header(None)):
     if not config.KORTIX_ADMIN_API_KEY:
@@ -33,8 +35,27 @@ async def verify_admin_api_key(x_admin_api_key: Optional[str] = Header(None)):
     
     return True
 
+JWT_CACHE_MAX_ENTRIES = 4096
+JWT_CACHE_MAX_TTL = 300
+# Sharing, visibility and account membership are edited by the frontend
+# directly in Supabase, so grants are keyed on a stamp that database triggers
+# change whenever any of them does (see thread_access_stamp). A revoked grant
+# stops matching on the next request; the TTL only expires unused entries.
+ACCESS_CACHE_TTL = 300
+
+# sha256(token) -> (cached_until, payload). Decoded payloads are reused until
+# the token expires so repeated requests with the same token skip decoding.
+_jwt_cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+
 def _decode_jwt_safely(token: str) -> dict:
-    return jwt.decode(
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    now = time.time()
+    cached = _jwt_cache.get(cache_key)
+    if cached and cached[0] > now:
+        _jwt_cache.move_to_end(cache_key)
+        return cached[1]
+
+    payload = jwt.decode(
         token, 
         options={
             "verify_signature": False,
@@ -44,14 +65,48 @@ def _decode_jwt_safely(token: str) -> dict:
         }
     )
 
+    exp = payload.get('exp')
+    cached_until = min(float(exp), now + JWT_CACHE_MAX_TTL) if isinstance(exp, (int, float)) else now + JWT_CACHE_MAX_TTL
+    _jwt_cache[cache_key] = (cached_until, payload)
+    _jwt_cache.move_to_end(cache_key)
+    while len(_jwt_cache) > JWT_CACHE_MAX_ENTRIES:
+        _jwt_cache.popitem(last=False)
+    return payload
+
+def _access_key(user_id: str, resource_type: str, resource_id: str, stamp: str) -> str:
+    return f"access:{user_id}:{resource_type}:{resource_id}:{stamp}"
+
+async def _thread_access_stamp(client, thread_id: str) -> Optional[str]:
+    """The versions a thread access decision depends on, or None if the thread is missing or the lookup failed."""
+    try:
+        result = await client.rpc('thread_access_stamp', {'p_thread_id': thread_id}).execute()
+        return result.data or None
+    except Exception as e:
+        structlog.get_logger().warning(f"Access stamp lookup failed for thread {thread_id}: {e}")
+        return None
+
+async def _has_cached_access(user_id: str, resource_type: str, resource_id: str, stamp: str) -> bool:
+    try:
+        return bool(await Cache.get(_access_key(user_id, resource_type, resource_id, stamp)))
+    except Exception as e:
+        structlog.get_logger().warning(f"Access cache lookup failed for {resource_type} {resource_id}: {e}")
+        return False
+
+async def _cache_access(user_id: str, resource_type: str, resource_id: str, stamp: Optional[str]) -> None:
+    if stamp is None:
+        return
+    try:
+        await Cache.set(_access_key(user_id, resource_type, resource_id, stamp), True, ttl=ACCESS_CACHE_TTL)
+    except Exception as e:
+        structlog.get_logger().warning(f"Failed to cache access grant for {resource_type} {resource_id}: {e}")
+
 async def _get_user_id_from_account_cached(account_id: str) -> Optional[str]:
     cache_key = f"account_user:{account_id}"
     
     try:
-        rc = await rc.get_client()
-        cached_user_id = await rc.get(cache_key)
+        cached_user_id = await Cache.get(cache_key)
         if cached_user_id:
-            return cached_user_id.decode('utf-8') if isinstance(cached_user_id, bytes) else cached_user_id
+            return cached_user_id
     except Exception as e:
         structlog.get_logger().warning(f"Redis cache lookup failed for account {account_id}: {e}")
     
@@ -68,7 +123,7 @@ async def _get_user_id_from_account_cached(account_id: str) -> Optional[str]:
             user_id = user_result.data[0]['primary_owner_user_id']
             
             try:
-                await rc.setex(cache_key, 300, user_id)
+                await Cache.set(cache_key, user_id, ttl=300)
             except Exception as e:
                 structlog.get_logger().warning(f"Failed to cache user lookup: {e}")
                 
@@ -256,15 +311,20 @@ async def verify_and_get_agent_authorization(client, agent_id: str, user_id: str
         raise HTTPException(status_code=500, detail="Failed to verify agent access")
 
 async def verify_and_authorize_thread_access(client, thread_id: str, user_id: str):
+    # Read before the checks, so a change made while they run leaves the grant under an outdated stamp
+    stamp = await _thread_access_stamp(client, thread_id)
+    if stamp and await _has_cached_access(user_id, 'thread', thread_id, stamp):
+        return True
+
     try:
-        thread_result = await client.table('threads').select('*').eq('thread_id', thread_id).execute()
+        thread_result = await client.table('threads').select('account_id, project_id').eq('thread_id', thread_id).execute()
 
         if not thread_result.data or len(thread_result.data) == 0:
             raise HTTPException(status_code=404, detail="Thread not found")
         
         thread_data = thread_result.data[0]
-
         if thread_data['account_id'] == user_id:
+            await _cache_access(user_id, 'thread', thread_id, stamp)
             return True
         
         project_id = thread_data.get('project_id')
@@ -272,12 +332,14 @@ async def verify_and_authorize_thread_access(client, thread_id: str, user_id: st
             project_result = await client.table('projects').select('is_public').eq('project_id', project_id).execute()
             if project_result.data and len(project_result.data) > 0:
                 if project_result.data[0].get('is_public'):
+                    await _cache_access(user_id, 'thread', thread_id, stamp)
                     return True
             
         account_id = thread_data.get('account_id')
         if account_id:
             account_user_result = await client.schema('basejump').from_('account_user').select('account_role').eq('user_id', user_id).eq('account_id', account_id).execute()
             if account_user_result.data and len(account_user_result.data) > 0:
+                await _cache_access(user_id, 'thread', thread_id, stamp)
                 return True
         raise HTTPException(status_code=403, detail="Not authorized to access this thread")
     except HTTPException:
@@ -1,26 +1,238 @@
-import json
-from typing import Any
+"""
+Redis-backed cache with an optional in-process L1.
+
+Every value lives in Redis under ``cache:{key}`` next to a version counter
+``cache_version:{key}`` that is bumped on each write or invalidation. When the
+L1 is enabled (``CACHE_L1_MAX_ENTRIES`` > 0), hits are additionally kept in a
+bounded per-process LRU for at most ``CACHE_L1_TTL`` seconds (never longer
+than the remaining Redis TTL).
+
+Writes publish ``{key, version}`` on ``cache:invalidate``; every API and
+worker process that uses the L1 subscribes and evicts its copy. Versions are
+compared so that a slow fill can never overwrite a newer invalidation, and the
+L1 is bypassed and flushed whenever the subscription is down, since
+invalidations may have been missed.
+
+Concurrent misses for the same key are coalesced into a single Redis fetch,
+and ``get_or_load`` extends that to the loader behind the cache.
+
+L1 hits return the cached object itself, so callers must not mutate values
+they get back from the cache.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.services import redis_client
 from core.services.redis_client import get_client
+from core.utils import fastjson
+from core.utils.logger import logger
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "2048"))
+L1_TTL = float(os.getenv("CACHE_L1_TTL", "30"))
+
+_MISSING = object()
 
 
 class _cache:
-    async def get(self, key: str):
+    def __init__(self, l1_max_entries: int = L1_MAX_ENTRIES, l1_ttl: float = L1_TTL):
+        self.l1_max_entries = l1_max_entries
+        self.l1_ttl = l1_ttl
+        self.origin = uuid.uuid4().hex
+        # key -> (expires_at, version, value)
+        self._l1: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        # Highest version seen per key, so late fills cannot resurrect stale data.
+        self._versions: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed = False
+
+    @property
+    def l1_enabled(self) -> bool:
+        return self.l1_max_entries > 0
+
+    # ---- L1 bookkeeping ----
+
+    def _l1_get(self, key: str) -> Any:
+        if not self._subscribed:
+            return _MISSING
+        entry = self._l1.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._l1.pop(key, None)
+            return _MISSING
+        self._l1.move_to_end(key)
+        return value
+
+    def _l1_put(self, key: str, version: int, value: Any, ttl: float) -> None:
+        if not self._subscribed or ttl <= 0:
+            return
+        if version < self._versions.get(key, 0):
+            return
+        self._versions[key] = version
+        self._l1[key] = (time.monotonic() + min(ttl, self.l1_ttl), version, value)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_max_entries:
+            evicted, _ = self._l1.popitem(last=False)
+            if evicted not in self._inflight:
+                self._versions.pop(evicted, None)
+
+    def _l1_invalidate(self, key: str, version: int) -> None:
+        if version < self._versions.get(key, 0):
+            return
+        # Only track versions for keys we hold or are filling, to stay bounded.
+        if key in self._l1 or key in self._inflight:
+            self._versions[key] = version
+        entry = self._l1.get(key)
+        if entry is not None and entry[1] < version:
+            self._l1.pop(key, None)
+
+    def _l1_clear(self) -> None:
+        self._l1.clear()
+        self._versions.clear()
+
+    # ---- invalidation subscription ----
+
+    def _ensure_listener(self) -> None:
+        if not self.l1_enabled:
+            return
+        loop = asyncio.get_running_loop()
+        if self._listener is None or self._listener.done() or self._listener.get_loop() is not loop:
+            self._subscribed = False
+            self._l1_clear()
+            self._listener = loop.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        delay = 0.5
+        while True:
+            pubsub = None
+            try:
+                pubsub = await redis_client.create_dedicated_pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                self._subscribed = True
+                delay = 0.5
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        payload = fastjson.loads(message["data"])
+                        self._l1_invalidate(payload["key"], int(payload["version"]))
+                    except (fastjson.JSONDecodeError, KeyError, TypeError, ValueError):
+                        logger.warning(f"Ignoring malformed cache invalidation: {message.get('data')}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener disconnected: {e}")
+            finally:
+                self._subscribed = False
+                self._l1_clear()
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 10.0)
+
+    async def _publish(self, redis, key: str, version: int) -> None:
+        try:
+            await redis.publish(INVALIDATION_CHANNEL, fastjson.dumps({"key": key, "version": version, "origin": self.origin}))
+        except Exception as e:
+            logger.warning(f"Failed to publish cache invalidation for {key}: {e}")
+
+    # ---- public API ----
+
+    async def _fetch(self, key: str) -> Any:
         redis = await get_client()
-        key = f"cache:{key}"
-        result = await redis.get(key)
-        if result:
-            return json.loads(result)
-        return None
+        pipe = redis.pipeline(transaction=False)
+        pipe.get(f"cache:{key}")
+        pipe.get(f"cache_version:{key}")
+        pipe.pttl(f"cache:{key}")
+        raw, version, pttl = await pipe.execute()
+        if not raw:
+            return None
+        value = fastjson.loads(raw)
+        if self.l1_enabled and pttl and pttl > 0:
+            self._l1_put(key, int(version or 0), value, pttl / 1000)
+        return value
+
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get(self, key: str):
+        if self.l1_enabled:
+            self._ensure_listener()
+            value = self._l1_get(key)
+            if value is not _MISSING:
+                return value
+        return await self._single_flight(key, lambda: self._fetch(key))
 
     async def set(self, key: str, value: Any, ttl: int = 15 * 60):
         redis = await get_client()
-        key = f"cache:{key}"
-        await redis.set(key, json.dumps(value), ex=ttl)
+        pipe = redis.pipeline(transaction=True)
+        pipe.set(f"cache:{key}", fastjson.dumps(value), ex=ttl)
+        pipe.incr(f"cache_version:{key}")
+        pipe.expire(f"cache_version:{key}", max(ttl, redis_client.REDIS_KEY_TTL))
+        _, version, _ = await pipe.execute()
+        self._l1_invalidate(key, version)
+        self._l1.pop(key, None)
+        if self.l1_enabled:
+            self._l1_put(key, version, value, ttl)
+        await self._publish(redis, key, version)
 
     async def invalidate(self, key: str):
         redis = await get_client()
-        key = f"cache:{key}"
-        await redis.delete(key)
+        pipe = redis.pipeline(transaction=True)
+        pipe.delete(f"cache:{key}")
+        pipe.incr(f"cache_version:{key}")
+        pipe.expire(f"cache_version:{key}", redis_client.REDIS_KEY_TTL)
+        _, version, _ = await pipe.execute()
+        self._l1_invalidate(key, version)
+        await self._publish(redis, key, version)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int = 15 * 60):
+        """Return the cached value, calling ``loader`` once per key on a miss.
+
+        Concurrent callers that miss on the same key wait for the first
+        caller's load instead of hitting the backing store themselves.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        async def load():
+            loaded = await loader()
+            if loaded is not None:
+                await self.set(key, loaded, ttl=ttl)
+            return loaded
 
+        return await self._single_flight(f"load:{key}", load)
 
 Cache = _cache()
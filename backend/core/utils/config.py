@@ -280,6 +280,10 @@ class Configuration:
     SUPABASE_ANON_KEY: str
     SUPABASE_SERVICE_ROLE_KEY: str
     SUPABASE_JWT_SECRET: str
+    # Optional direct Postgres connection for the asyncpg fast path
+    DATABASE_URL: Optional[str] = None
+    DATABASE_POOL_MAX_SIZE: Optional[int] = 10
+    DATABASE_STATEMENT_CACHE_SIZE: Optional[int] = 100
     
     # Redis configuration
     REDIS_HOST: str
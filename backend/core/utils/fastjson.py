@@ -0,0 +1,78 @@
+"""
+Fast JSON serialization for the streaming and persistence hot paths.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Both backends produce compact output and understand the
+datetime/UUID/Decimal values that show up in database rows and billing
+payloads, so callers no longer need to special-case them.
+"""
+
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Union
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can keep
+# catching the stdlib exception regardless of the backend in use.
+JSONDecodeError = json.JSONDecodeError
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    """Convert values that neither backend serializes natively."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(value: Any) -> str:
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def dumps_bytes(value: Any) -> bytes:
+    """Serialize ``value`` to UTF-8 encoded JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # orjson rejects a few things the stdlib accepts (e.g. integers
+            # wider than 64 bits); keep the old behaviour for those.
+            pass
+    return _stdlib_dumps(value).encode("utf-8")
+
+
+def dumps(value: Any) -> str:
+    """Serialize ``value`` to a JSON string."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS).decode("utf-8")
+        except TypeError:
+            pass
+    return _stdlib_dumps(value)
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Parse JSON from a string or bytes.
+
+    Raises:
+        JSONDecodeError: If ``data`` is not valid JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
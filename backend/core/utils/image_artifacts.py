@@ -0,0 +1,136 @@
+"""
+Content-addressed store for images loaded into the model's context.
+
+Compressed images are stored once per project in the private
+``image-artifacts`` bucket under ``{project_id}/{key}``. The key is the SHA-256
+of the original bytes plus the compression settings version, so the same
+source image always maps to the same artifact.
+
+- ``Cache`` maps keys to artifact metadata. Loading an image the project has
+  seen before, in this run or an earlier one, skips compression and upload,
+  and concurrent loads of the same image share one compression.
+- A bounded per-process LRU keeps recently used compressed bytes, so building
+  the LLM messages each turn rarely needs to download from storage.
+- ``image_context`` messages store the artifact reference instead of the
+  base64 image (see ``message_content``), and ``resolve_data_url`` turns it
+  back into a data URL when the LLM messages are built. Messages written
+  before artifacts existed still carry ``base64`` and resolve as before.
+"""
+
+import asyncio
+import base64
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.utils.cache import Cache
+from core.utils.logger import logger
+
+BUCKET_NAME = "image-artifacts"
+# Bump whenever the compression settings change so old outputs are not reused
+COMPRESSION_VERSION = "v1"
+INDEX_TTL = 30 * 24 * 3600
+LRU_MAX_BYTES = int(os.getenv("IMAGE_ARTIFACT_LRU_BYTES", str(64 * 1024 * 1024)))
+
+# path -> compressed bytes
+_lru: "OrderedDict[str, bytes]" = OrderedDict()
+_lru_bytes = 0
+
+
+def _lru_get(path: str) -> Optional[bytes]:
+    data = _lru.get(path)
+    if data is not None:
+        _lru.move_to_end(path)
+    return data
+
+
+def _lru_put(path: str, data: bytes) -> None:
+    global _lru_bytes
+    if len(data) > LRU_MAX_BYTES:
+        return
+    previous = _lru.pop(path, None)
+    if previous is not None:
+        _lru_bytes -= len(previous)
+    _lru[path] = data
+    _lru_bytes += len(data)
+    while _lru_bytes > LRU_MAX_BYTES:
+        _, evicted = _lru.popitem(last=False)
+        _lru_bytes -= len(evicted)
+
+
+async def _bucket():
+    from core.services.supabase import DBConnection
+    client = await DBConnection().client
+    return client.storage.from_(BUCKET_NAME)
+
+
+def artifact_key(image_bytes: bytes) -> str:
+    return f"{hashlib.sha256(image_bytes).hexdigest()}-{COMPRESSION_VERSION}"
+
+
+async def get_or_create(
+    project_id: str,
+    image_bytes: bytes,
+    mime_type: str,
+    compress: Callable[[bytes, str], Tuple[bytes, str]],
+) -> Dict[str, Any]:
+    """Return metadata for the project's compressed copy of ``image_bytes``, creating it if needed.
+
+    ``compress(image_bytes, mime_type)`` runs in a worker thread and returns the
+    compressed bytes and their MIME type. The result has ``key``, ``path``,
+    ``mime_type``, ``compressed_size`` and ``reused`` (True when no compression
+    was needed).
+    """
+    key = await asyncio.to_thread(artifact_key, image_bytes)
+    path = f"{project_id}/{key}"
+    created = False
+
+    async def create() -> Dict[str, Any]:
+        nonlocal created
+        compressed, compressed_mime = await asyncio.to_thread(compress, image_bytes, mime_type)
+        bucket = await _bucket()
+        await bucket.upload(path, compressed, {"content-type": compressed_mime, "upsert": "true"})
+        _lru_put(path, compressed)
+        created = True
+        logger.debug(f"Stored image artifact {path} ({len(compressed)} bytes)")
+        return {"key": key, "path": path, "mime_type": compressed_mime, "compressed_size": len(compressed)}
+
+    meta = await Cache.get_or_load(f"image_artifact:{path}", create, ttl=INDEX_TTL)
+    return {**meta, "reused": not created}
+
+
+async def load_bytes(path: str) -> bytes:
+    data = _lru_get(path)
+    if data is None:
+        data = await (await _bucket()).download(path)
+        _lru_put(path, data)
+    return data
+
+
+def message_content(meta: Dict[str, Any], file_path: str, original_size: int) -> Dict[str, Any]:
+    """Content of an ``image_context`` message that references an artifact."""
+    return {
+        "mime_type": meta["mime_type"],
+        "artifact_key": meta["key"],
+        "artifact_path": meta["path"],
+        "file_path": file_path,
+        "original_size": original_size,
+        "compressed_size": meta["compressed_size"],
+    }
+
+
+async def resolve_data_url(content: Dict[str, Any]) -> Optional[str]:
+    """Return the data URL for an ``image_context`` message, or None if the image is unavailable."""
+    mime_type = content.get('mime_type', 'image/jpeg')
+    if content.get('base64'):
+        return f"data:{mime_type};base64,{content['base64']}"
+    path = content.get('artifact_path')
+    if not path:
+        return None
+    try:
+        data = await load_bytes(path)
+    except Exception as e:
+        logger.error(f"Failed to load image artifact {path}: {e}")
+        return None
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
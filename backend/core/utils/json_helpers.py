@@ -5,9 +5,10 @@ These utilities help with the transition from storing JSON as strings to storing
 them as proper JSONB objects in the database.
 """
 
-import json
 from typing import Any, Union, Dict, List
 
+from core.utils import fastjson
+
 
 def ensure_dict(value: Union[str, Dict[str, Any], None], default: Dict[str, Any] = None) -> Dict[str, Any]:
     """
@@ -37,11 +38,11 @@ def ensure_dict(value: Union[str, Dict[str, Any], None], default: Dict[str, Any]
         
     if isinstance(value, str):
         try:
-            parsed = json.loads(value)
+            parsed = fastjson.loads(value)
             if isinstance(parsed, dict):
                 return parsed
             return default
-        except (json.JSONDecodeError, TypeError):
+        except (fastjson.JSONDecodeError, TypeError):
             return default
             
     return default
@@ -75,11 +76,11 @@ def ensure_list(value: Union[str, List[Any], None], default: List[Any] = None) -
         
     if isinstance(value, str):
         try:
-            parsed = json.loads(value)
+            parsed = fastjson.loads(value)
             if isinstance(parsed, list):
                 return parsed
             return default
-        except (json.JSONDecodeError, TypeError):
+        except (fastjson.JSONDecodeError, TypeError):
             return default
             
     return default
@@ -109,8 +110,8 @@ def safe_json_parse(value: Union[str, Dict, List, Any], default: Any = None) ->
     # If it's a string, try to parse it
     if isinstance(value, str):
         try:
-            return json.loads(value)
-        except (json.JSONDecodeError, TypeError):
+            return fastjson.loads(value)
+        except (fastjson.JSONDecodeError, TypeError):
             # If it's not valid JSON, return the string itself
             return value
             
@@ -134,14 +135,14 @@ def to_json_string(value: Any) -> str:
     if isinstance(value, str):
         # If it's already a string, check if it's valid JSON
         try:
-            json.loads(value)
+            fastjson.loads(value)
             return value  # It's already a JSON string
-        except (json.JSONDecodeError, TypeError):
+        except (fastjson.JSONDecodeError, TypeError):
             # It's a plain string, encode it as JSON
-            return json.dumps(value)
+            return fastjson.dumps(value)
     
     # For all other types, convert to JSON
-    return json.dumps(value)
+    return fastjson.dumps(value)
 
 
 def format_for_yield(message_object: Dict[str, Any]) -> Dict[str, Any]:
@@ -165,10 +166,10 @@ def format_for_yield(message_object: Dict[str, Any]) -> Dict[str, Any]:
     
     # Ensure content is a JSON string
     if 'content' in formatted and not isinstance(formatted['content'], str):
-        formatted['content'] = json.dumps(formatted['content'])
+        formatted['content'] = fastjson.dumps(formatted['content'])
         
     # Ensure metadata is a JSON string
     if 'metadata' in formatted and not isinstance(formatted['metadata'], str):
-        formatted['metadata'] = json.dumps(formatted['metadata'])
+        formatted['metadata'] = fastjson.dumps(formatted['metadata'])
         
     return formatted 
\ No newline at end of file
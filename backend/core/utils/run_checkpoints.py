@@ -0,0 +1,251 @@
+"""
+Checkpoints and leases that let an agent run survive the loss of its worker.
+
+The worker processing ``run_agent_background`` holds a short lease on the run,
+the ``agent_run_lock:{agent_run_id}`` key, and renews it from a heartbeat task.
+Every lease is also kept in the ``run_leases`` sorted set, scored by the time
+it expires. A worker that dies stops renewing, so its run shows up there as
+stale within ``LEASE_SECONDS`` rather than holding the lock for a day.
+
+After every completed turn the worker saves ``run_checkpoint:{agent_run_id}``:
+
+- ``run``: the actor arguments, so any worker can enqueue the run again
+- ``iteration_count`` and ``auto_continue``, whether another turn follows
+- ``last_message_id`` and ``last_message_at``, the last assistant or tool
+  message the run persisted
+- ``pending_tool_calls``: calls of the turn's assistant message that have no
+  recorded result
+- ``resume_count``: how many times the run has been picked up again
+
+``sweep_stale_runs`` runs in every worker process. Each stale run is claimed
+by exactly one sweeper and enqueued again; Dramatiq redelivering the lost
+message ends up in the same place. The worker that picks it up finds the
+checkpoint and continues from the last completed turn. Tool results are
+messages in the thread, so a resumed run executes only the tool calls of the
+interrupted turn that have no recorded result (see
+``ResponseProcessor.resume_tool_calls``) and never repeats a saved LLM turn.
+Tools that ran during a turn the worker never got to save can run again.
+
+A run that finishes leaves a short-lived marker in place of its checkpoint so
+a late redelivery of its message does not start it over.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from core.services import redis_client as rc
+from core.utils.logger import logger
+
+LEASE_SECONDS = 60
+HEARTBEAT_INTERVAL = 15
+SWEEP_INTERVAL = 30
+# Resumes allowed before the run is marked failed instead of picked up again
+MAX_RESUMES = 3
+FINISHED_TTL = 3600
+LEASES_KEY = "run_leases"
+
+# KEYS: lease, leases set. ARGV: token, lease ms, expires at, run id
+_ACQUIRE_SCRIPT = """
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    redis.call('zadd', KEYS[2], ARGV[3], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+# KEYS: lease, leases set. ARGV: token, lease ms, expires at, run id
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    redis.call('pexpire', KEYS[1], ARGV[2])
+    redis.call('zadd', KEYS[2], ARGV[3], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+# KEYS: lease, leases set. ARGV: token, run id
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    redis.call('del', KEYS[1])
+    redis.call('zrem', KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Removes a run from the leases set only if its lease has run out, so that
+# exactly one sweeper claims it. KEYS: leases set. ARGV: run id, now
+_CLAIM_SCRIPT = """
+local expires_at = redis.call('zscore', KEYS[1], ARGV[1])
+if expires_at and tonumber(expires_at) <= tonumber(ARGV[2]) then
+    redis.call('zrem', KEYS[1], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+def _lease_key(agent_run_id: str) -> str:
+    return f"agent_run_lock:{agent_run_id}"
+
+
+def _checkpoint_key(agent_run_id: str) -> str:
+    return f"run_checkpoint:{agent_run_id}"
+
+
+class RunLease:
+    """A worker's lease on an agent run, renewed by a heartbeat task while it runs."""
+
+    def __init__(self, agent_run_id: str, instance_id: str):
+        self.agent_run_id = agent_run_id
+        self.token = f"{instance_id}:{uuid.uuid4().hex[:8]}"
+        # Set when a renewal finds the lease held by someone else; the run must stop
+        self.lost = False
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def _args(self) -> List[Any]:
+        return [self.token, int(LEASE_SECONDS * 1000), time.time() + LEASE_SECONDS, self.agent_run_id]
+
+    async def acquire(self) -> bool:
+        redis = await rc.get_client()
+        return bool(await redis.eval(_ACQUIRE_SCRIPT, 2, _lease_key(self.agent_run_id), LEASES_KEY, *self._args()))
+
+    async def renew(self) -> bool:
+        redis = await rc.get_client()
+        return bool(await redis.eval(_RENEW_SCRIPT, 2, _lease_key(self.agent_run_id), LEASES_KEY, *self._args()))
+
+    def start_heartbeat(self) -> None:
+        self._heartbeat = asyncio.create_task(self._beat())
+
+    async def _beat(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                if not await self.renew():
+                    logger.warning(f"Lost the lease on agent run {self.agent_run_id}")
+                    self.lost = True
+                    return
+            except Exception as e:
+                # Keep trying; the lease only goes to another worker once it runs out
+                logger.warning(f"Failed to renew lease on agent run {self.agent_run_id}: {str(e)}")
+
+    async def release(self) -> None:
+        """Stop the heartbeat and give up the lease if this worker still holds it."""
+        if self._heartbeat:
+            self._heartbeat.cancel()
+        try:
+            redis = await rc.get_client()
+            await redis.eval(_RELEASE_SCRIPT, 2, _lease_key(self.agent_run_id), LEASES_KEY, self.token, self.agent_run_id)
+        except Exception as e:
+            logger.warning(f"Failed to release lease on agent run {self.agent_run_id}: {str(e)}")
+
+
+def new_checkpoint(run: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'run': run,
+        'iteration_count': 0,
+        'auto_continue': True,
+        'last_message_id': None,
+        'last_message_at': None,
+        'pending_tool_calls': [],
+        'resume_count': 0,
+    }
+
+
+async def load(agent_run_id: str) -> Optional[Dict[str, Any]]:
+    redis = await rc.get_client()
+    data = await redis.get(_checkpoint_key(agent_run_id))
+    return json.loads(data) if data else None
+
+
+async def save(agent_run_id: str, checkpoint: Dict[str, Any]) -> None:
+    checkpoint['updated_at'] = datetime.now(timezone.utc).isoformat()
+    redis = await rc.get_client()
+    await redis.set(_checkpoint_key(agent_run_id), json.dumps(checkpoint, default=str), ex=rc.REDIS_KEY_TTL)
+
+
+async def finish(agent_run_id: str) -> None:
+    """Replace the checkpoint with a marker that the run is over."""
+    redis = await rc.get_client()
+    await redis.set(_checkpoint_key(agent_run_id), json.dumps({'finished': True}), ex=FINISHED_TTL)
+
+
+async def sweep_stale_runs(enqueue: Callable[[Dict[str, Any]], Any]) -> int:
+    """Enqueue every run whose lease has run out again, returning how many were enqueued.
+
+    ``enqueue`` receives the run's actor arguments from its checkpoint.
+    """
+    redis = await rc.get_client()
+    now = time.time()
+    stale = await redis.zrangebyscore(LEASES_KEY, '-inf', now)
+    enqueued = 0
+    for agent_run_id in stale:
+        if not await redis.eval(_CLAIM_SCRIPT, 1, LEASES_KEY, agent_run_id, now):
+            continue
+        if await redis.exists(_lease_key(agent_run_id)):
+            # Renewed between the scan and the claim; the next heartbeat adds it back
+            continue
+        checkpoint = await load(agent_run_id)
+        if not checkpoint or checkpoint.get('finished'):
+            continue
+        logger.info(f"Lease on agent run {agent_run_id} expired at iteration {checkpoint.get('iteration_count', 0)}, enqueueing it again")
+        enqueue(checkpoint['run'])
+        enqueued += 1
+    return enqueued
+
+
+class TurnTracker:
+    """Follows the messages a run persists so each completed turn can be checkpointed.
+
+    ``observe`` takes the chunks the run yields; ``end_turn`` returns the
+    checkpoint fields for the turn that just completed and starts a new one.
+    """
+
+    def __init__(self, last_message: Optional[Dict[str, Any]] = None):
+        last_message = last_message or {}
+        self.last_message_id = last_message.get('message_id')
+        self.last_message_at = last_message.get('created_at')
+        self.terminated = False
+        self._assistant: Optional[Dict[str, Any]] = None
+        self._tool_results: List[Dict[str, Any]] = []
+
+    def observe(self, chunk: Dict[str, Any]) -> None:
+        if not isinstance(chunk, dict) or not chunk.get('message_id'):
+            return
+        chunk_type = chunk.get('type')
+        if chunk_type == 'status':
+            metadata = chunk.get('metadata') or {}
+            if isinstance(metadata, str):
+                metadata = json.loads(metadata)
+            if metadata.get('agent_should_terminate'):
+                self.terminated = True
+            return
+        if chunk_type == 'assistant':
+            self._assistant = chunk
+            self._tool_results = []
+        elif chunk_type == 'tool':
+            self._tool_results.append(chunk)
+        else:
+            return
+        self.last_message_id = chunk['message_id']
+        self.last_message_at = chunk.get('created_at') or self.last_message_at
+
+    def end_turn(self, response_processor, processor_config) -> Dict[str, Any]:
+        pending = []
+        if self._assistant:
+            pending = [
+                {'tool_index': tool_index, 'tool_call': tool_call}
+                for tool_index, tool_call, _ in response_processor.pending_tool_calls(
+                    self._assistant, self._tool_results, processor_config
+                )
+            ]
+        self._assistant, self._tool_results = None, []
+        return {
+            'last_message_id': self.last_message_id,
+            'last_message_at': self.last_message_at,
+            'pending_tool_calls': pending,
+        }
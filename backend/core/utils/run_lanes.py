@@ -0,0 +1,322 @@
+"""
+Priority lanes for agent runs, with per-account fair share and admission control.
+
+Runs are queued on one of three lanes: ``interactive`` (chat turns started by
+a user), ``trigger`` (scheduled and event triggers) and ``batch`` (workflows).
+Each lane is its own Dramatiq queue consumed by its own actor, so a burst of
+triggers never sits in front of a live chat turn, and workers can be pointed
+at a subset of lanes with ``--queues``.
+
+Within a lane runs are not dequeued first-in first-out. Every account has its
+own list, ``run_lane:{lane}:account:{account_id}``, and the lane keeps a ring
+of the accounts with waiting runs. A dequeue takes the account at the head of
+the ring, pops its oldest run and puts the account back at the tail if it has
+more, so an account that queues a thousand runs delays everyone else by at
+most one run per turn of the ring.
+
+The Dramatiq message is only a token that says "start the next run of this
+lane"; the run itself is chosen by ``pop`` when a worker is free. Tokens are
+sent when a run is queued, when a run frees a lane slot while others wait, and
+by the periodic sweep in every worker (``lanes_needing_workers``), so a token
+that finds nothing to do is simply dropped.
+
+- Concurrency: ``RUN_LANE_<LANE>_CONCURRENCY`` caps how many runs of a lane
+  execute at once across all workers (0 for no cap). Slots are leases in
+  ``run_lane:{lane}:running``, renewed while the run executes, so a lost
+  worker's slot frees itself within ``SLOT_SECONDS``.
+- Admission: when a lane's depth reaches ``RUN_LANE_<LANE>_MAX_DEPTH`` or the
+  p95 queue wait of its recent runs reaches ``RUN_LANE_<LANE>_MAX_P95_WAIT``
+  seconds, ``admit`` defers trigger runs by ``DEFER_SECONDS`` and rejects
+  batch runs with ``LaneOverloaded``. Interactive runs are always admitted.
+- Metrics: every dequeue records how long the run waited; ``lane_stats``
+  reports depth, running slots and wait percentiles per lane.
+"""
+
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from core.services import redis_client as rc
+from core.utils.logger import logger
+
+INTERACTIVE = 'interactive'
+TRIGGER = 'trigger'
+BATCH = 'batch'
+LANES = (INTERACTIVE, TRIGGER, BATCH)
+PREFIX = "run_lane"
+
+# How long a run may hold a lane slot without renewing it
+SLOT_SECONDS = 60
+SLOT_RENEW_INTERVAL = 15
+DEFER_SECONDS = 60
+# Queue waits kept per lane for the percentiles, and how recent they must be
+WAIT_SAMPLES = 500
+WAIT_WINDOW = 300
+KICK_INTERVAL = 30
+
+_DEFAULTS = {
+    INTERACTIVE: {'concurrency': 0, 'max_depth': 0, 'max_p95_wait': 0, 'overload': None},
+    TRIGGER: {'concurrency': 8, 'max_depth': 500, 'max_p95_wait': 120, 'overload': 'defer'},
+    BATCH: {'concurrency': 4, 'max_depth': 200, 'max_p95_wait': 300, 'overload': 'reject'},
+}
+
+
+def _setting(lane: str, name: str) -> float:
+    return float(os.getenv(f"RUN_LANE_{lane.upper()}_{name.upper()}", str(_DEFAULTS[lane][name])))
+
+
+LANE_CONFIG: Dict[str, Dict[str, Any]] = {
+    lane: {
+        'concurrency': int(_setting(lane, 'concurrency')),
+        'max_depth': int(_setting(lane, 'max_depth')),
+        'max_p95_wait': _setting(lane, 'max_p95_wait'),
+        'overload': _DEFAULTS[lane]['overload'],
+    }
+    for lane in LANES
+}
+
+
+class LaneOverloaded(Exception):
+    """Raised by ``admit`` when a lane that rejects work is over its limits."""
+
+    def __init__(self, lane: str, reason: str):
+        super().__init__(f"The {lane} run queue is overloaded ({reason}), try again later")
+        self.lane = lane
+        self.reason = reason
+
+
+# Queues a run for its account and adds the account to the ring if its list
+# was empty. KEYS: account list, ring. ARGV: item, account id
+_PUSH_SCRIPT = """
+if redis.call('rpush', KEYS[1], ARGV[1]) == 1 then
+    redis.call('rpush', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+# Moves deferred runs that are due onto their accounts' lists, then takes a
+# lane slot and the next run of the account at the head of the ring.
+# KEYS: ring, running set, deferred set, waits list.
+# ARGV: now, concurrency, account list prefix, slot expiry, wait samples
+_POP_SCRIPT = """
+local now = tonumber(ARGV[1])
+for _, item in ipairs(redis.call('zrangebyscore', KEYS[3], '-inf', now)) do
+    local account_id = cjson.decode(item)['account_id']
+    if redis.call('rpush', ARGV[3] .. account_id, item) == 1 then
+        redis.call('rpush', KEYS[1], account_id)
+    end
+    redis.call('zrem', KEYS[3], item)
+end
+redis.call('zremrangebyscore', KEYS[2], '-inf', now)
+local concurrency = tonumber(ARGV[2])
+if concurrency > 0 and redis.call('zcard', KEYS[2]) >= concurrency then
+    return {'full'}
+end
+while true do
+    local account_id = redis.call('lpop', KEYS[1])
+    if not account_id then
+        return {'empty'}
+    end
+    local account_key = ARGV[3] .. account_id
+    local item = redis.call('lpop', account_key)
+    if item then
+        if redis.call('llen', account_key) > 0 then
+            redis.call('rpush', KEYS[1], account_id)
+        end
+        local run = cjson.decode(item)
+        redis.call('zadd', KEYS[2], ARGV[4], run['agent_run_id'])
+        redis.call('lpush', KEYS[4], now .. ':' .. (now - tonumber(run['enqueued_at'])))
+        redis.call('ltrim', KEYS[4], 0, tonumber(ARGV[5]) - 1)
+        return {'run', item}
+    end
+end
+"""
+
+
+def _ring_key(lane: str) -> str:
+    return f"{PREFIX}:{lane}:accounts"
+
+
+def _account_prefix(lane: str) -> str:
+    return f"{PREFIX}:{lane}:account:"
+
+
+def _running_key(lane: str) -> str:
+    return f"{PREFIX}:{lane}:running"
+
+
+def _deferred_key(lane: str) -> str:
+    return f"{PREFIX}:{lane}:deferred"
+
+
+def _waits_key(lane: str) -> str:
+    return f"{PREFIX}:{lane}:waits"
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+async def _depth(redis, lane: str) -> int:
+    accounts = await redis.lrange(_ring_key(lane), 0, -1)
+    pipe = redis.pipeline(transaction=False)
+    for account_id in accounts:
+        pipe.llen(_account_prefix(lane) + account_id)
+    pipe.zcard(_deferred_key(lane))
+    return sum(await pipe.execute())
+
+
+async def _recent_waits(redis, lane: str) -> List[float]:
+    since = time.time() - WAIT_WINDOW
+    waits = []
+    for sample in await redis.lrange(_waits_key(lane), 0, -1):
+        popped_at, wait = sample.split(':')
+        if float(popped_at) >= since:
+            waits.append(float(wait))
+    return waits
+
+
+async def admit(lane: str) -> float:
+    """Decide whether a new run may be queued on ``lane``.
+
+    Returns how many seconds the run should be deferred by (0 to start it as
+    soon as a worker is free). Raises ``LaneOverloaded`` for lanes that reject
+    work when they are over their depth or p95 wait limit. Admits the run if
+    Redis cannot be read.
+    """
+    settings = LANE_CONFIG[lane]
+    if not settings['overload']:
+        return 0
+    try:
+        redis = await rc.get_client()
+        reason = None
+        depth = await _depth(redis, lane)
+        if settings['max_depth'] and depth >= settings['max_depth']:
+            reason = f"{depth} runs waiting"
+        elif settings['max_p95_wait']:
+            p95 = _percentile(await _recent_waits(redis, lane), 0.95)
+            if p95 >= settings['max_p95_wait']:
+                reason = f"p95 queue wait {p95:.0f}s"
+    except Exception as e:
+        logger.warning(f"Failed to check admission for the {lane} lane: {str(e)}")
+        return 0
+    if not reason:
+        return 0
+    if settings['overload'] == 'reject':
+        logger.warning(f"Rejecting {lane} run: {reason}")
+        raise LaneOverloaded(lane, reason)
+    logger.info(f"Deferring {lane} run by {DEFER_SECONDS}s: {reason}")
+    return DEFER_SECONDS
+
+
+async def push(lane: str, account_id: str, run: Dict[str, Any], defer: float = 0) -> None:
+    """Queue a run on ``lane`` for ``account_id``.
+
+    ``run`` holds the ``run_agent_background`` arguments. A deferred run only
+    becomes eligible once ``defer`` seconds have passed.
+    """
+    now = time.time()
+    item = json.dumps({
+        'id': uuid.uuid4().hex,
+        'agent_run_id': run['agent_run_id'],
+        'account_id': account_id,
+        'enqueued_at': now,
+        'run': run,
+    }, default=str)
+    redis = await rc.get_client()
+    if defer:
+        await redis.zadd(_deferred_key(lane), {item: now + defer})
+        return
+    await redis.eval(_PUSH_SCRIPT, 2, _account_prefix(lane) + account_id, _ring_key(lane), item, account_id)
+
+
+async def pop(lane: str) -> Optional[Dict[str, Any]]:
+    """Take a lane slot and the fairest next run of ``lane``.
+
+    Returns the run's ``run_agent_background`` arguments, or None when the
+    lane is empty or all of its slots are taken.
+    """
+    now = time.time()
+    redis = await rc.get_client()
+    result = await redis.eval(
+        _POP_SCRIPT, 4, _ring_key(lane), _running_key(lane), _deferred_key(lane), _waits_key(lane),
+        now, LANE_CONFIG[lane]['concurrency'], _account_prefix(lane), now + SLOT_SECONDS, WAIT_SAMPLES,
+    )
+    if result[0] != 'run':
+        return None
+    item = json.loads(result[1])
+    logger.debug(f"Dequeued agent run {item['agent_run_id']} from the {lane} lane "
+                 f"after {now - item['enqueued_at']:.2f}s")
+    return item['run']
+
+
+async def renew(lane: str, agent_run_id: str) -> None:
+    try:
+        redis = await rc.get_client()
+        await redis.zadd(_running_key(lane), {agent_run_id: time.time() + SLOT_SECONDS}, xx=True)
+    except Exception as e:
+        logger.warning(f"Failed to renew {lane} lane slot for {agent_run_id}: {str(e)}")
+
+
+async def release(lane: str, agent_run_id: str) -> bool:
+    """Free the run's lane slot, returning whether runs are waiting for one."""
+    try:
+        redis = await rc.get_client()
+        await redis.zrem(_running_key(lane), agent_run_id)
+        return bool(await redis.llen(_ring_key(lane)))
+    except Exception as e:
+        logger.warning(f"Failed to release {lane} lane slot for {agent_run_id}: {str(e)}")
+        return False
+
+
+async def lanes_needing_workers() -> Dict[str, int]:
+    """Return, per lane with runs waiting, how many more could start now.
+
+    Only one caller across all workers gets an answer per ``KICK_INTERVAL``;
+    the others get an empty dict, so the tokens are not sent once per worker.
+    """
+    redis = await rc.get_client()
+    if not await redis.set(f"{PREFIX}:kicked", "1", ex=KICK_INTERVAL, nx=True):
+        return {}
+    now = time.time()
+    needed = {}
+    for lane in LANES:
+        pipe = redis.pipeline(transaction=False)
+        pipe.llen(_ring_key(lane))
+        pipe.zcount(_deferred_key(lane), '-inf', now)
+        pipe.zcount(_running_key(lane), now, '+inf')
+        accounts, due, running = await pipe.execute()
+        if not accounts and not due:
+            continue
+        concurrency = LANE_CONFIG[lane]['concurrency']
+        waiting = await _depth(redis, lane)
+        free = min(concurrency - running, waiting) if concurrency else waiting
+        if free > 0:
+            needed[lane] = free
+    return needed
+
+
+async def lane_stats() -> Dict[str, Dict[str, Any]]:
+    """Queue depth, running slots and queue-wait percentiles for every lane."""
+    redis = await rc.get_client()
+    now = time.time()
+    stats = {}
+    for lane in LANES:
+        waits = await _recent_waits(redis, lane)
+        stats[lane] = {
+            'depth': await _depth(redis, lane),
+            'deferred': await redis.zcard(_deferred_key(lane)),
+            'waiting_accounts': await redis.llen(_ring_key(lane)),
+            'running': await redis.zcount(_running_key(lane), now, '+inf'),
+            'concurrency': LANE_CONFIG[lane]['concurrency'],
+            'wait_p50': _percentile(waits, 0.5),
+            'wait_p95': _percentile(waits, 0.95),
+            'wait_max': max(waits, default=0.0),
+            'wait_samples': len(waits),
+        }
+    return stats
@@ -0,0 +1,210 @@
+"""
+Redis-backed accounting of running agent runs.
+
+Every agent run holds a slot in two sorted sets, one per account and one per
+project. The member is the agent_run_id and the score is the time its lease
+expires, so limit checks are a prune plus ZCARD regardless of how many threads
+an account owns. Workers renew the lease while a run is streaming; a crashed
+worker simply stops renewing and its slot is reaped once the lease runs out.
+
+The database stays the source of truth. ``reconcile_account`` drops slots
+whose run is no longer running in ``agent_runs`` and adopts running rows that
+a worker is still processing, and ``get_running_runs`` schedules it at most
+once per ``RECONCILE_INTERVAL`` per account.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional
+
+from core.services import redis_client as rc
+from core.utils.logger import logger
+
+RUN_LEASE_SECONDS = 30 * 60
+LEASE_RENEW_INTERVAL = 60
+RECONCILE_INTERVAL = 5 * 60
+RUN_WINDOW = timedelta(hours=24)
+
+
+def _account_key(account_id: str) -> str:
+    return f"run_slots:account:{account_id}"
+
+
+def _project_key(project_id: str) -> str:
+    return f"run_slots:project:{project_id}"
+
+
+def _run_key(agent_run_id: str) -> str:
+    return f"run_slots:run:{agent_run_id}"
+
+
+def _reconciled_key(account_id: str) -> str:
+    return f"run_slots:reconciled:{account_id}"
+
+
+async def acquire(agent_run_id: str, account_id: str, project_id: Optional[str], thread_id: str) -> bool:
+    """Record a newly created agent run against its account and project.
+
+    Must be called after the ``agent_runs`` row is inserted so that a
+    concurrent reconcile never mistakes the slot for a stale one.
+    """
+    try:
+        redis = await rc.get_client()
+        expires_at = time.time() + RUN_LEASE_SECONDS
+        meta = {'account_id': account_id, 'thread_id': thread_id}
+        if project_id:
+            meta['project_id'] = project_id
+
+        pipe = redis.pipeline(transaction=True)
+        pipe.zadd(_account_key(account_id), {agent_run_id: expires_at})
+        pipe.expire(_account_key(account_id), rc.REDIS_KEY_TTL)
+        if project_id:
+            pipe.zadd(_project_key(project_id), {agent_run_id: expires_at})
+            pipe.expire(_project_key(project_id), rc.REDIS_KEY_TTL)
+        pipe.hset(_run_key(agent_run_id), mapping=meta)
+        pipe.expire(_run_key(agent_run_id), rc.REDIS_KEY_TTL)
+        await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to acquire run slot for {agent_run_id}: {str(e)}")
+        return False
+
+
+async def renew(agent_run_id: str) -> bool:
+    """Extend the lease of a run that is still executing."""
+    try:
+        redis = await rc.get_client()
+        meta = await redis.hgetall(_run_key(agent_run_id))
+        if not meta:
+            return False
+
+        expires_at = time.time() + RUN_LEASE_SECONDS
+        pipe = redis.pipeline(transaction=False)
+        pipe.zadd(_account_key(meta['account_id']), {agent_run_id: expires_at}, xx=True)
+        if meta.get('project_id'):
+            pipe.zadd(_project_key(meta['project_id']), {agent_run_id: expires_at}, xx=True)
+        pipe.expire(_run_key(agent_run_id), rc.REDIS_KEY_TTL)
+        await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to renew run slot for {agent_run_id}: {str(e)}")
+        return False
+
+
+async def release(agent_run_id: str) -> bool:
+    """Free the slot held by a run. Safe to call more than once."""
+    try:
+        redis = await rc.get_client()
+        meta = await redis.hgetall(_run_key(agent_run_id))
+        if not meta:
+            return False
+
+        pipe = redis.pipeline(transaction=True)
+        pipe.zrem(_account_key(meta['account_id']), agent_run_id)
+        if meta.get('project_id'):
+            pipe.zrem(_project_key(meta['project_id']), agent_run_id)
+        pipe.delete(_run_key(agent_run_id))
+        await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to release run slot for {agent_run_id}: {str(e)}")
+        return False
+
+
+async def _live_members(redis, key: str) -> List[str]:
+    pipe = redis.pipeline(transaction=True)
+    pipe.zremrangebyscore(key, '-inf', time.time())
+    pipe.zrange(key, 0, -1)
+    _, members = await pipe.execute()
+    return members
+
+
+async def get_running_runs(account_id: str) -> List[Dict[str, Any]]:
+    """Return ``{'id', 'thread_id'}`` for every live slot of the account.
+
+    Raises on Redis errors so callers can fall back to the database.
+    """
+    redis = await rc.get_client()
+    members = await _live_members(redis, _account_key(account_id))
+
+    if await redis.set(_reconciled_key(account_id), "1", ex=RECONCILE_INTERVAL, nx=True):
+        asyncio.create_task(reconcile_account(account_id))
+
+    if not members:
+        return []
+
+    pipe = redis.pipeline(transaction=False)
+    for agent_run_id in members:
+        pipe.hget(_run_key(agent_run_id), 'thread_id')
+    thread_ids = await pipe.execute()
+    return [{'id': run_id, 'thread_id': thread_id} for run_id, thread_id in zip(members, thread_ids)]
+
+
+async def get_project_running_run(project_id: str) -> Optional[str]:
+    """Return the id of a live run in the project, if any.
+
+    Raises on Redis errors so callers can fall back to the database.
+    """
+    redis = await rc.get_client()
+    members = await _live_members(redis, _project_key(project_id))
+    return members[0] if members else None
+
+
+async def is_running(agent_run_id: str) -> bool:
+    """Return whether the run still holds a live slot.
+
+    Raises on Redis errors so callers can fall back to the database.
+    """
+    redis = await rc.get_client()
+    account_id = await redis.hget(_run_key(agent_run_id), 'account_id')
+    if not account_id:
+        return False
+    expires_at = await redis.zscore(_account_key(account_id), agent_run_id)
+    return expires_at is not None and expires_at > time.time()
+
+
+async def reconcile_account(account_id: str) -> None:
+    """Bring the account's slots back in line with ``agent_runs``.
+
+    Slots whose run is no longer running in the database are released. Runs
+    the database still considers running are adopted only while a worker holds
+    their ``agent_run_lock``, since the worker does not write a terminal
+    status for runs that finish normally.
+    """
+    try:
+        from core.services.supabase import DBConnection
+
+        client = await DBConnection().client
+        since = (datetime.now(timezone.utc) - RUN_WINDOW).isoformat()
+        result = await client.table('agent_runs').select(
+            'id, thread_id, threads!inner(account_id, project_id)'
+        ).eq('threads.account_id', account_id).eq('status', 'running').gte('started_at', since).execute()
+        db_running = {row['id']: row for row in (result.data or [])}
+
+        redis = await rc.get_client()
+        members = set(await _live_members(redis, _account_key(account_id)))
+
+        stale = [run_id for run_id in members if run_id not in db_running]
+        for run_id in stale:
+            await release(run_id)
+
+        missing = [run_id for run_id in db_running if run_id not in members]
+        adopted = 0
+        if missing:
+            pipe = redis.pipeline(transaction=False)
+            for run_id in missing:
+                pipe.exists(f"agent_run_lock:{run_id}")
+            locked = await pipe.execute()
+            for run_id, is_locked in zip(missing, locked):
+                if not is_locked:
+                    continue
+                row = db_running[run_id]
+                thread = row.get('threads') or {}
+                await acquire(run_id, account_id, thread.get('project_id'), row['thread_id'])
+                adopted += 1
+
+        if stale or adopted:
+            logger.info(f"Reconciled run slots for account {account_id}: released {len(stale)}, adopted {adopted}")
+    except Exception as e:
+        logger.warning(f"Failed to reconcile run slots for account {account_id}: {str(e)}")
@@ -0,0 +1,197 @@
+"""
+Off-critical-path processing for browser screenshots.
+
+Every browser action returns a full-size PNG screenshot. Uploading it before
+the tool result goes back to the model costs a storage round trip per action,
+so ``ScreenshotPipeline.submit`` only does the cheap part inline, in a worker
+thread: decode and validate the image and compute a perceptual hash.
+
+- A frame that looks the same as the previous one reuses the previous URL and
+  is not uploaded again.
+- Any other frame gets its storage path and public URL immediately. It is
+  downscaled, re-encoded to WebP (JPEG where Pillow lacks WebP) and uploaded by
+  a background task with retries, so the URL starts resolving shortly after
+  the tool result has been returned.
+"""
+
+import asyncio
+import base64
+import binascii
+import io
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Set
+
+from PIL import Image, ImageChops, features
+
+from core.utils.logger import logger
+from core.utils.retry import retry
+
+MAX_SCREENSHOT_BYTES = 10 * 1024 * 1024
+SUPPORTED_FORMATS = {'JPEG', 'PNG', 'GIF', 'BMP', 'WEBP', 'TIFF'}
+# Longest side of the stored image; the sandbox browser viewport is 1024x768
+MAX_DIMENSION = 1280
+ENCODE_FORMAT, CONTENT_TYPE, EXTENSION = (
+    ("WEBP", "image/webp", "webp") if features.check("webp") else ("JPEG", "image/jpeg", "jpg")
+)
+ENCODE_QUALITY = 80
+# libwebp effort (0-6): 2 encodes ~3x faster than the default 4 for a few percent larger files
+WEBP_METHOD = 2
+# dHash grid: HASH_SIZE x HASH_SIZE bits
+HASH_SIZE = 16
+# Frames whose hashes differ in at most this many bits are compared pixel by pixel
+HASH_DISTANCE = 6
+# Box-downscale factor of the grayscale thumbnail that is hashed and, for
+# near-duplicates, compared pixel by pixel (1024x768 -> 256x192)
+THUMBNAIL_REDUCTION = 4
+# A thumbnail pixel changing by more than this makes the frame distinct; low
+# enough that typing a few characters into a field counts as a change
+PIXEL_TOLERANCE = 12
+UPLOAD_ATTEMPTS = 3
+UPLOAD_RETRY_DELAY = 1
+
+
+class SupabaseScreenshotStorage:
+    def __init__(self, bucket_name: str = "browser-screenshots"):
+        self.bucket_name = bucket_name
+
+    async def _bucket(self):
+        from core.services.supabase import DBConnection
+        client = await DBConnection().client
+        return client.storage.from_(self.bucket_name)
+
+    async def public_url(self, path: str) -> str:
+        # Public URLs are derived from the path alone, so this works before the upload
+        return await (await self._bucket()).get_public_url(path)
+
+    async def upload(self, path: str, data: bytes, content_type: str) -> None:
+        await (await self._bucket()).upload(path, data, {"content-type": content_type})
+
+
+@dataclass
+class _Frame:
+    image: Image.Image
+    hash: int
+    thumbnail: Image.Image
+
+
+@dataclass
+class ScreenshotResult:
+    url: str
+    # True when the frame matched the previous one and its URL was reused
+    duplicate: bool = False
+
+
+def _decode(base64_data: str) -> Image.Image:
+    """Decode and validate a base64 screenshot, raising ValueError if it is not a usable image."""
+    if base64_data.startswith('data:'):
+        base64_data = base64_data.split(',', 1)[-1]
+    if len(base64_data) < 10:
+        raise ValueError("Base64 string is empty or too short")
+    try:
+        image_data = base64.b64decode(base64_data, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Base64 decoding failed: {e}")
+    if len(image_data) > MAX_SCREENSHOT_BYTES:
+        raise ValueError(f"Image size ({len(image_data)} bytes) exceeds limit ({MAX_SCREENSHOT_BYTES} bytes)")
+
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        if image.format not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported image format: {image.format}")
+        image.load()
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Image validation failed: {e}")
+    return image
+
+
+def _dhash(thumbnail: Image.Image) -> int:
+    small = thumbnail.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _analyze(base64_data: str) -> _Frame:
+    image = _decode(base64_data)
+    thumbnail = image.convert("L").reduce(THUMBNAIL_REDUCTION)
+    return _Frame(image=image, hash=_dhash(thumbnail), thumbnail=thumbnail)
+
+
+def _same_frame(a: _Frame, b: _Frame) -> bool:
+    if bin(a.hash ^ b.hash).count("1") > HASH_DISTANCE or a.thumbnail.size != b.thumbnail.size:
+        return False
+    low, high = ImageChops.difference(a.thumbnail, b.thumbnail).getextrema()
+    return high <= PIXEL_TOLERANCE
+
+
+def _encode(image: Image.Image) -> bytes:
+    image = image.convert("RGB")
+    if max(image.size) > MAX_DIMENSION:
+        image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+    out = io.BytesIO()
+    options = {"method": WEBP_METHOD} if ENCODE_FORMAT == "WEBP" else {"optimize": True}
+    image.save(out, ENCODE_FORMAT, quality=ENCODE_QUALITY, **options)
+    return out.getvalue()
+
+
+class ScreenshotPipeline:
+    def __init__(self, storage=None):
+        self.storage = storage or SupabaseScreenshotStorage()
+        self._previous: Optional[_Frame] = None
+        self._previous_url: Optional[str] = None
+        self._previous_path: Optional[str] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def pending_uploads(self) -> int:
+        return len(self._tasks)
+
+    async def submit(self, base64_data: str) -> ScreenshotResult:
+        """Return the URL the screenshot will be served from, uploading it in the background.
+
+        Raises ValueError when the data is not a valid image.
+        """
+        frame = await asyncio.to_thread(_analyze, base64_data)
+
+        if self._previous is not None and _same_frame(frame, self._previous):
+            logger.debug(f"Screenshot matches the previous frame, reusing {self._previous_url}")
+            return ScreenshotResult(url=self._previous_url, duplicate=True)
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = f"image_{timestamp}_{str(uuid.uuid4())[:8]}.{EXTENSION}"
+        url = await self.storage.public_url(path)
+
+        task = asyncio.create_task(self._upload(path, frame.image))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        self._previous, self._previous_url, self._previous_path = frame, url, path
+        return ScreenshotResult(url=url)
+
+    async def _upload(self, path: str, image: Image.Image) -> None:
+        try:
+            data = await asyncio.to_thread(_encode, image)
+            await retry(
+                lambda: self.storage.upload(path, data, CONTENT_TYPE),
+                max_attempts=UPLOAD_ATTEMPTS,
+                delay_seconds=UPLOAD_RETRY_DELAY,
+            )
+            logger.debug(f"Uploaded screenshot {path} ({len(data)} bytes)")
+        except Exception as e:
+            logger.error(f"Failed to upload screenshot {path} after {UPLOAD_ATTEMPTS} attempts: {e}")
+            if self._previous_path == path:
+                # Don't hand out a URL that will never resolve for the next identical frame
+                self._previous = self._previous_url = self._previous_path = None
+
+    async def drain(self) -> None:
+        """Wait for every background upload started so far."""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark browser API round trips: curl through process.exec versus the
+persistent browser channel.
+
+Runs a sequence of browser actions against the local fake browser API server
+(core/sandbox/tests/fake_browser_api.py) three ways:
+
+- legacy:  what the browser tool did before the channel, a curl health check
+           plus a curl call through ``process.exec`` for every action
+- channel: one ``BrowserChannel.call`` per action over a keep-alive connection
+- batch:   all actions in a single ``run-actions`` request
+
+``--rtt-ms`` adds a simulated network round trip to every exec call and every
+request that arrives over the preview link, and ``--latency-scale`` replays the
+recorded browser latencies (0 measures transport overhead only).
+
+Usage:
+    python -m core.utils.scripts.benchmark_browser_channel [--actions 20] [--rtt-ms 40] [--latency-scale 0]
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from core.sandbox.browser_channel import BrowserChannel
+from core.sandbox.tests.fake_browser_api import FakeBrowserAPI
+from core.sandbox.tests.fake_sandbox import FakeSandbox
+
+
+class RemoteBrowserAPI(FakeBrowserAPI):
+    """Fake browser API that charges a network round trip for preview link requests."""
+
+    def __init__(self, rtt: float, **kwargs):
+        super().__init__(**kwargs)
+        self.rtt = rtt
+
+    def handle(self, method, path, body, headers):
+        if "X-Daytona-Preview-Token" in headers:
+            time.sleep(self.rtt)
+        return super().handle(method, path, body, headers)
+
+
+class RemoteSandbox(FakeSandbox):
+    """Fake sandbox whose exec calls pay a network round trip to the sandbox API."""
+
+    def __init__(self, root, rtt: float):
+        super().__init__(root)
+        local_exec = self.process.exec
+
+        async def exec(command, timeout=None, env=None):
+            await asyncio.sleep(rtt)
+            return await local_exec(command, timeout=timeout, env=env)
+
+        self.process.exec = exec
+
+
+def actions(count):
+    steps = [
+        {"type": "navigate", "url": "https://example.com/"},
+        {"type": "act", "action": "click the more information link"},
+        {"type": "extract", "instruction": "get the main heading"},
+    ]
+    return [steps[i % len(steps)] for i in range(count)]
+
+
+def endpoint_payload(step):
+    payload = {key: value for key, value in step.items() if key != "type"}
+    return step["type"], payload
+
+
+async def run_legacy(sandbox, port, steps):
+    for step in steps:
+        health = await sandbox.process.exec(
+            f"curl -s -X GET 'http://localhost:{port}/api' -H 'Content-Type: application/json'", timeout=10
+        )
+        json.loads(health.result)
+        endpoint, payload = endpoint_payload(step)
+        response = await sandbox.process.exec(
+            f"curl -s -X POST 'http://localhost:{port}/api/{endpoint}' -H 'Content-Type: application/json' "
+            f"-d '{json.dumps(payload)}'",
+            timeout=30,
+        )
+        json.loads(response.result)
+
+
+async def run_channel(channel, steps):
+    for step in steps:
+        await channel.call(*endpoint_payload(step))
+
+
+async def run_batch(channel, steps):
+    await channel.call("run-actions", {"steps": steps})
+
+
+async def measure(label, api, fn, *args):
+    api.connections = 0
+    start = time.perf_counter()
+    await fn(*args)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<8} {elapsed * 1000:9.1f} ms   {api.connections:3d} connections")
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actions", type=int, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="Simulated backend to sandbox round trip")
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="Scale for recorded browser latencies")
+    args = parser.parse_args()
+
+    rtt = args.rtt_ms / 1000
+    steps = actions(args.actions)
+    with tempfile.TemporaryDirectory() as root, \
+            RemoteBrowserAPI(rtt, latency_scale=args.latency_scale, initialized=True) as api:
+        sandbox = RemoteSandbox(root, rtt)
+        sandbox.preview_links[api.port] = api.base_url
+        channel = BrowserChannel(sandbox, port=api.port)
+        # Resolve the preview link and health check up front, as the first action of a run would
+        await channel.ensure_ready()
+
+        print(f"{args.actions} actions, {args.rtt_ms:.0f} ms round trip, latency scale {args.latency_scale}\n")
+        legacy = await measure("legacy", api, run_legacy, sandbox, api.port, steps)
+        persistent = await measure("channel", api, run_channel, channel, steps)
+        batch = await measure("batch", api, run_batch, channel, steps)
+        print(f"\n  channel speedup {legacy / persistent:6.1f}x")
+        print(f"  batch speedup   {legacy / batch:6.1f}x")
+        await channel.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON serialization on agent run payloads.
+
+Compares the stdlib ``json`` module with ``core.utils.fastjson`` on the
+operations the streaming path performs per chunk: formatting a message for
+yield, serializing it into the Redis response list and decoding it again for
+SSE framing.
+
+Recorded payloads can be exported from Redis with:
+
+    redis-cli --raw LRANGE agent_run:<agent_run_id>:responses 0 -1 > run.jsonl
+
+Usage:
+    python -m core.utils.scripts.benchmark_fastjson [--payloads run.jsonl] [--rounds 20]
+"""
+
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+from core.utils import fastjson
+
+
+def load_payloads(path):
+    """Load one recorded response per line, skipping anything that isn't JSON."""
+    payloads = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                payloads.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return payloads
+
+
+def synthesize_payloads(count=2000):
+    """Build payloads shaped like the ones response_processor yields."""
+    thread_id = str(uuid.uuid4())
+    thread_run_id = str(uuid.uuid4())
+    payloads = []
+    for i in range(count):
+        if i % 50 == 0:
+            content = {
+                "role": "assistant",
+                "content": "Let me look into that. " * 40,
+                "tool_calls": [{
+                    "id": f"call_{i}",
+                    "type": "function",
+                    "function": {"name": "web_search", "arguments": json.dumps({"query": "latest results", "num_results": 10})},
+                }],
+            }
+            message_type = "assistant"
+        else:
+            content = {"role": "assistant", "content": f"chunk {i} "}
+            message_type = "assistant"
+        payloads.append({
+            "message_id": str(uuid.uuid4()),
+            "thread_id": thread_id,
+            "type": message_type,
+            "is_llm_message": True,
+            "content": content,
+            "metadata": {"stream_status": "chunk", "thread_run_id": thread_run_id},
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+    return payloads
+
+
+def format_for_yield_stdlib(message):
+    formatted = message.copy()
+    if not isinstance(formatted.get("content"), str):
+        formatted["content"] = json.dumps(formatted["content"])
+    if not isinstance(formatted.get("metadata"), str):
+        formatted["metadata"] = json.dumps(formatted["metadata"])
+    return formatted
+
+
+def format_for_yield_fast(message):
+    formatted = message.copy()
+    if not isinstance(formatted.get("content"), str):
+        formatted["content"] = fastjson.dumps(formatted["content"])
+    if not isinstance(formatted.get("metadata"), str):
+        formatted["metadata"] = fastjson.dumps(formatted["metadata"])
+    return formatted
+
+
+def run_stdlib(payloads):
+    for message in payloads:
+        encoded = json.dumps(format_for_yield_stdlib(message))
+        f"data: {json.dumps(json.loads(encoded))}\n\n"
+
+
+def run_fast(payloads):
+    for message in payloads:
+        encoded = fastjson.dumps(format_for_yield_fast(message))
+        fastjson.loads(encoded)
+        f"data: {encoded}\n\n"
+
+
+def measure(fn, payloads, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(payloads)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization on agent run payloads")
+    parser.add_argument("--payloads", help="JSONL file with recorded run responses")
+    parser.add_argument("--rounds", type=int, default=20, help="Number of timed rounds (best is reported)")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.payloads) if args.payloads else synthesize_payloads()
+    if not payloads:
+        print("No payloads to benchmark")
+        return
+
+    total_bytes = sum(len(json.dumps(p)) for p in payloads)
+    print(f"Payloads: {len(payloads)} ({total_bytes / 1024:.1f} KiB), fastjson backend: {fastjson.BACKEND}")
+
+    stdlib_time = measure(run_stdlib, payloads, args.rounds)
+    fast_time = measure(run_fast, payloads, args.rounds)
+
+    print(f"stdlib json : {stdlib_time * 1000:8.2f} ms ({stdlib_time / len(payloads) * 1e6:.2f} us/payload)")
+    print(f"fastjson    : {fast_time * 1000:8.2f} ms ({fast_time / len(payloads) * 1e6:.2f} us/payload)")
+    print(f"speedup     : {stdlib_time / fast_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-action screenshot handling: inline validate-and-upload versus
+the background screenshot pipeline.
+
+Generates a sequence of browser-sized PNG screenshots, a share of which repeat
+the previous frame (as after a failed click or a wait), and hands each to:
+
+- legacy:   what the browser tool did before the pipeline, base64 decode and
+            PIL validation on the event loop followed by an awaited upload
+- pipeline: ``ScreenshotPipeline.submit``, which returns once the frame is
+            validated and hashed, uploading in the background
+
+Uploads go to a local storage stub that sleeps ``--upload-ms`` per upload, and
+``--browser-ms`` of idle time separates actions, as the browser and the model
+do in a real run (not counted in per-action latency).
+Alongside per-action latency, the script reports the longest stall of the event
+loop, which is what other runs sharing the worker feel.
+
+Usage:
+    python -m core.utils.scripts.benchmark_screenshot_pipeline [--actions 30] [--upload-ms 250] [--browser-ms 500]
+        [--duplicate-ratio 0.3]
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import random
+import time
+from statistics import mean
+
+from PIL import Image, ImageDraw
+
+from core.utils.screenshot_pipeline import ScreenshotPipeline
+
+
+class LocalStorageStub:
+    def __init__(self, upload_seconds: float):
+        self.upload_seconds = upload_seconds
+        self.uploads = 0
+        self.bytes = 0
+
+    async def public_url(self, path):
+        return f"http://localhost/storage/v1/object/public/browser-screenshots/{path}"
+
+    async def upload(self, path, data, content_type):
+        await asyncio.sleep(self.upload_seconds)
+        self.uploads += 1
+        self.bytes += len(data)
+
+
+WORDS = "the quick brown fox jumps over lazy dog search results price cart sign in account settings".split()
+
+
+def make_screenshot(rng):
+    image = Image.new("RGB", (1024, 768), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, 1024, 64], fill=(rng.randint(0, 80), rng.randint(0, 80), rng.randint(80, 200)))
+    # Photo-like regions compress poorly, as real page imagery does
+    for _ in range(3):
+        x, y = rng.randint(0, 800), rng.randint(80, 560)
+        photo = Image.effect_noise((200, 150), rng.randint(20, 80)).convert("RGB")
+        image.paste(photo, (x, y))
+    for y in range(80, 750, 16):
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 18)))
+        draw.text((rng.choice([24, 40, 520]), y), line, fill=(rng.randint(0, 90),) * 3)
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return base64.b64encode(out.getvalue()).decode()
+
+
+def make_sequence(count, duplicate_ratio):
+    rng = random.Random(7)
+    frames = [make_screenshot(rng)]
+    while len(frames) < count:
+        frames.append(frames[-1] if rng.random() < duplicate_ratio else make_screenshot(rng))
+    return frames
+
+
+async def legacy_submit(storage, base64_data):
+    image_data = base64.b64decode(base64_data, validate=True)
+    with Image.open(io.BytesIO(image_data)) as img:
+        img.verify()
+    await storage.upload("image.png", image_data, "image/png")
+
+
+class LoopMonitor:
+    """Tracks the longest gap between ticks of a task that wants to run every millisecond."""
+
+    def __init__(self):
+        self.max_stall = 0.0
+        self._task = None
+
+    async def _tick(self):
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            self.max_stall = max(self.max_stall, now - last)
+            last = now
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def run(label, frames, submit, storage, gap, finish=None):
+    latencies = []
+    with LoopMonitor() as monitor:
+        start = time.perf_counter()
+        for frame in frames:
+            await asyncio.sleep(gap)
+            action_start = time.perf_counter()
+            await submit(frame)
+            latencies.append(time.perf_counter() - action_start)
+        actions_done = time.perf_counter() - start
+        if finish:
+            await finish()
+        total = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label}")
+    print(f"  per action  mean {mean(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms")
+    print(f"  all actions {actions_done * 1000:7.1f} ms   incl. pending uploads {total * 1000:7.1f} ms "
+          f"({len(frames) * gap * 1000:.0f} ms of it browser time)")
+    print(f"  uploads {storage.uploads:4d}   {storage.bytes / 1024:8.0f} KiB   "
+          f"longest loop stall {monitor.max_stall * 1000:6.1f} ms\n")
+    return mean(latencies)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actions", type=int, default=30)
+    parser.add_argument("--upload-ms", type=float, default=250.0, help="Simulated storage upload time")
+    parser.add_argument("--browser-ms", type=float, default=500.0, help="Idle time before each action's screenshot")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="Share of frames repeating the previous one")
+    args = parser.parse_args()
+
+    frames = make_sequence(args.actions, args.duplicate_ratio)
+    print(f"{args.actions} actions, {len(set(frames))} distinct frames, "
+          f"{mean(len(f) for f in frames) * 3 / 4 / 1024:.0f} KiB average PNG, {args.upload_ms:.0f} ms uploads, "
+          f"{args.browser_ms:.0f} ms between actions\n")
+
+    legacy_storage = LocalStorageStub(args.upload_ms / 1000)
+    gap = args.browser_ms / 1000
+    legacy = await run("legacy", frames, lambda frame: legacy_submit(legacy_storage, frame), legacy_storage, gap)
+
+    storage = LocalStorageStub(args.upload_ms / 1000)
+    pipeline = ScreenshotPipeline(storage=storage)
+    current = await run("pipeline", frames, pipeline.submit, storage, gap, finish=pipeline.drain)
+
+    print(f"per-action speedup {legacy / current:6.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark the sheets engine against the previous cell-by-cell implementation.
+
+Generates a workbook (500k rows by default) and times the operations the
+sheets tool performs on it: previewing, computing grouped statistics and
+formatting. The "legacy" variants reproduce what the tool did before the
+engine: a full ``load_workbook`` into memory, Python loops over every cell and
+a fill per banded cell.
+
+Usage:
+    python -m core.utils.scripts.benchmark_sheets_engine [--rows 500000] [--skip-legacy-format]
+"""
+
+import argparse
+import csv
+import io
+import random
+import time
+import tracemalloc
+from statistics import mean
+
+import openpyxl
+from openpyxl.styles import PatternFill
+
+from core.tools.utils import sheets_engine
+
+HEADERS = ["order_id", "region", "product", "quantity", "unit_price", "revenue"]
+REGIONS = ["NA", "EU", "APAC", "LATAM", "MEA"]
+PRODUCTS = [f"SKU-{i:03d}" for i in range(50)]
+
+
+def generate_rows(count):
+    rng = random.Random(42)
+    for i in range(count):
+        quantity = rng.randint(1, 20)
+        price = round(rng.uniform(5, 500), 2)
+        yield [i, rng.choice(REGIONS), rng.choice(PRODUCTS), quantity, price, round(quantity * price, 2)]
+
+
+def legacy_load(data):
+    wb = openpyxl.load_workbook(io.BytesIO(data), data_only=False)
+    rows = [list(row) for row in wb.active.iter_rows(values_only=True)]
+    return [str(h) for h in rows[0]], rows[1:]
+
+
+def legacy_preview(data, max_rows):
+    headers, rows = legacy_load(data)
+    return headers, len(rows), rows[:max_rows]
+
+
+def legacy_load_csv(data):
+    rows = list(csv.reader(io.StringIO(data.decode("utf-8"))))
+    return rows[0], rows[1:]
+
+
+def legacy_analyze(data, columns, group_by, loader=legacy_load):
+    headers, rows = loader(data)
+    idx = {h: i for i, h in enumerate(headers)}
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[idx[group_by]], []).append(row)
+    out = []
+    for key, group_rows in groups.items():
+        row_out = [key]
+        for col in columns:
+            vals = [float(r[idx[col]]) for r in group_rows if r[idx[col]] not in (None, "")]
+            row_out.extend([len(vals), sum(vals), mean(vals), min(vals), max(vals)])
+        out.append(row_out)
+    return out
+
+
+def legacy_format(data):
+    wb = openpyxl.load_workbook(io.BytesIO(data))
+    ws = wb.active
+    fill = PatternFill(start_color="FFF9F9", end_color="FFF9F9", fill_type="solid")
+    for r in range(2, ws.max_row + 1, 2):
+        for c in range(1, ws.max_column + 1):
+            ws.cell(row=r, column=c).fill = fill
+    for c in range(1, ws.max_column + 1):
+        width = max(len(str(ws.cell(row=r, column=c).value or "")) for r in range(1, ws.max_row + 1))
+        ws.column_dimensions[openpyxl.utils.get_column_letter(c)].width = min(60, max(10, width + 2))
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def measure(label, fn, *args, trace_memory=False):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    line = f"  {label:<8} {elapsed:8.2f}s"
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        line += f"   peak {peak / 1024 / 1024:8.1f} MiB"
+    print(line)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--skip-legacy-format", action="store_true", help="Skip the slowest legacy run")
+    parser.add_argument("--memory", action="store_true", help="Report peak Python allocations (slows every run down)")
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows:,} row workbook ...")
+    data = sheets_engine.write_xlsx(HEADERS, generate_rows(args.rows), "Data")
+    csv_data = sheets_engine.write_csv(HEADERS, generate_rows(args.rows))
+    print(f"  {len(data) / 1024 / 1024:.1f} MiB xlsx, {len(csv_data) / 1024 / 1024:.1f} MiB csv, "
+          f"pandas csv engine: {sheets_engine.CSV_ENGINE}\n")
+
+    cases = [
+        ("preview (100 rows)",
+         (legacy_preview, data, 100),
+         (sheets_engine.preview, data, "xlsx", None, 100)),
+        ("analyze (group by region)",
+         (legacy_analyze, data, ["quantity", "revenue"], "region"),
+         (sheets_engine.analyze, data, "xlsx", None, ["quantity", "revenue"], "region", None)),
+        ("analyze csv (group by region)",
+         (legacy_analyze, csv_data, ["quantity", "revenue"], "region", legacy_load_csv),
+         (sheets_engine.analyze, csv_data, "csv", None, ["quantity", "revenue"], "region", None)),
+        ("format (banding + widths)",
+         None if args.skip_legacy_format else (legacy_format, data),
+         (sheets_engine.format_xlsx, data, None, True, True, True, None)),
+    ]
+
+    for name, legacy, engine in cases:
+        print(name)
+        legacy_time = measure("legacy", *legacy, trace_memory=args.memory) if legacy else None
+        engine_time = measure("engine", *engine, trace_memory=args.memory)
+        if legacy_time:
+            print(f"  speedup  {legacy_time / engine_time:8.1f}x")
+        print()
+
+
+if __name__ == "__main__":
+    main()
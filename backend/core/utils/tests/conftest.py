@@ -0,0 +1,41 @@
+import asyncio
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from core.services import redis_client as rc
+
+
+@pytest.fixture
+def redis_prefix():
+    """``(module, attribute)`` of the key prefix a test module gives each test its own copy of.
+
+    Test modules override this; the default leaves every key where it is.
+    """
+    return None
+
+
+@pytest_asyncio.fixture
+async def redis(monkeypatch, redis_prefix):
+    """A Redis client for the test, skipping it when Redis is not reachable.
+
+    Keys under the patched prefix are deleted afterwards.
+    """
+    monkeypatch.setattr(rc, "_initialized", False)
+    prefix = None
+    if redis_prefix:
+        module, attribute = redis_prefix
+        prefix = f"{getattr(module, attribute)}:test:{uuid.uuid4()}"
+        monkeypatch.setattr(module, attribute, prefix)
+    try:
+        client = await rc.get_client()
+        await asyncio.wait_for(client.ping(), timeout=2)
+    except Exception:
+        pytest.skip("Redis is not reachable")
+    yield client
+    if prefix:
+        keys = [key async for key in client.scan_iter(f"{prefix}*")]
+        if keys:
+            await client.delete(*keys)
+    await client.aclose()
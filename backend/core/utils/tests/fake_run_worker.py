@@ -0,0 +1,209 @@
+"""
+A stand-in for ``run_agent_background`` that runs in its own process, so tests
+can kill it mid-run.
+
+It drives the real lease, checkpoint and response-processing code the way the
+worker and ``AgentRunner`` do, against a scripted LLM. Messages go to a
+JSON-lines file so a worker started later sees everything an earlier one
+persisted, like the ``messages`` table. Each LLM call and each tool side effect
+is appended to a log in the same directory.
+
+The scripted LLM asks for ``record_step`` once per turn for steps 1 to
+``STEPS`` and then answers without a tool call. Like a real model it works out
+where it is from the thread: the next step is one past the recorded results.
+"""
+
+import asyncio
+import dataclasses
+import json
+import os
+import signal
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from core.agentpress.response_processor import ProcessorConfig, ResponseProcessor
+from core.agentpress.tool import Tool, openapi_schema
+from core.agentpress.tool_registry import ToolRegistry
+from core.utils import run_checkpoints
+
+STEPS = 3
+THREAD_ID = "thread-1"
+# What AgentRunner passes to run_thread
+PROCESSOR_CONFIG = ProcessorConfig(
+    xml_tool_calling=True,
+    native_tool_calling=False,
+    execute_tools=True,
+    execute_on_stream=True,
+    tool_execution_strategy="parallel",
+    xml_adding_strategy="user_message",
+    max_xml_tool_calls=1,
+)
+
+
+def append_log(workdir: str, name: str, value: Any) -> None:
+    with open(os.path.join(workdir, name), "a") as f:
+        f.write(f"{value}\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_log(workdir: str, name: str) -> List[str]:
+    path = os.path.join(workdir, name)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return f.read().split()
+
+
+class FileMessageStore:
+    """Thread messages in a JSON-lines file.
+
+    ``crash_at`` of ``"<type>:<n>"`` kills the process with SIGKILL right after
+    the n-th message of that type is saved.
+    """
+
+    def __init__(self, workdir: str, crash_at: Optional[str] = None):
+        self.path = os.path.join(workdir, "messages.jsonl")
+        self.crash_at = crash_at
+
+    async def add_message(self, thread_id, type, content, is_llm_message=False, metadata=None,
+                          agent_id=None, agent_version_id=None):
+        message = {
+            "message_id": str(uuid.uuid4()),
+            "thread_id": thread_id,
+            "type": type,
+            "content": content,
+            "is_llm_message": is_llm_message,
+            "metadata": metadata or {},
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with open(self.path, "a") as f:
+            f.write(json.dumps(message) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if self.crash_at == f"{type}:{self.count(type)}":
+            os.kill(os.getpid(), signal.SIGKILL)
+        return message
+
+    def messages(self, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            messages = [json.loads(line) for line in f]
+        return [m for m in messages if since is None or m["created_at"] >= since]
+
+    def count(self, type: str) -> int:
+        return sum(1 for m in self.messages() if m["type"] == type)
+
+
+class RecordStepTool(Tool):
+    def __init__(self, workdir: str, slow_step: Optional[int] = None):
+        super().__init__()
+        self.workdir = workdir
+        self.slow_step = slow_step
+
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "record_step",
+            "description": "Record that a step of the task is done",
+            "parameters": {"type": "object", "properties": {"step": {"type": "integer"}}, "required": ["step"]},
+        },
+    })
+    async def record_step(self, step: int):
+        if int(step) == self.slow_step:
+            append_log(self.workdir, "slow_tool_started", step)
+            await asyncio.sleep(30)
+        append_log(self.workdir, "side_effects", step)
+        return self.success_response(f"Recorded step {step}")
+
+
+def _chunk(content: Optional[str], finish_reason: Optional[str] = None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)])
+
+
+async def fake_llm(workdir: str, store: FileMessageStore):
+    step = store.count("tool") + 1
+    append_log(workdir, "llm_calls", step)
+    if step <= STEPS:
+        text = (f"Recording step {step}.\n<function_calls>\n<invoke name=\"record_step\">\n"
+                f"<parameter name=\"step\">{step}</parameter>\n</invoke>\n</function_calls>")
+    else:
+        text = "All steps are recorded."
+    for start in range(0, len(text), 24):
+        yield _chunk(text[start:start + 24])
+        await asyncio.sleep(0)
+    yield _chunk(None, "stop")
+
+
+async def work(workdir: str, agent_run_id: str, crash_at: Optional[str] = None, slow_step: Optional[int] = None,
+               processor_config: Optional[Dict[str, Any]] = None):
+    config = dataclasses.replace(PROCESSOR_CONFIG, **(processor_config or {}))
+    store = FileMessageStore(workdir, crash_at)
+    registry = ToolRegistry()
+    registry.register_tool(RecordStepTool, workdir=workdir, slow_step=slow_step)
+    processor = ResponseProcessor(registry, store.add_message)
+
+    lease = run_checkpoints.RunLease(agent_run_id, "test")
+    if not await lease.acquire():
+        raise RuntimeError(f"Agent run {agent_run_id} is leased by another worker")
+    checkpoint = await run_checkpoints.load(agent_run_id)
+    if checkpoint:
+        checkpoint["resume_count"] += 1
+    else:
+        checkpoint = run_checkpoints.new_checkpoint({"agent_run_id": agent_run_id})
+    await run_checkpoints.save(agent_run_id, checkpoint)
+    lease.start_heartbeat()
+
+    user_message = next(m for m in store.messages() if m["type"] == "user")
+    tracker = run_checkpoints.TurnTracker(
+        {"message_id": checkpoint["last_message_id"], "created_at": checkpoint["last_message_at"]}
+        if checkpoint["resume_count"] else user_message
+    )
+    iteration_count = checkpoint["iteration_count"]
+    continue_execution = checkpoint["auto_continue"]
+
+    async def checkpoint_turn():
+        state = tracker.end_turn(processor, config)
+        state.update(iteration_count=iteration_count, auto_continue=continue_execution and not tracker.terminated)
+        checkpoint.update(state)
+        await run_checkpoints.save(agent_run_id, checkpoint)
+
+    processor.turn_end_hooks.append(checkpoint_turn)
+
+    if checkpoint["resume_count"] and continue_execution:
+        messages = [m for m in store.messages(checkpoint["last_message_at"] or user_message["created_at"])
+                    if m["type"] in ("assistant", "tool")]
+        assistant_message = next((m for m in reversed(messages) if m["type"] == "assistant"), None)
+        if assistant_message:
+            if assistant_message["message_id"] != checkpoint["last_message_id"]:
+                iteration_count += 1
+            tool_messages = [m for m in messages if m["type"] == "tool"]
+            for message in [assistant_message, *tool_messages]:
+                tracker.observe(message)
+            async for chunk in processor.resume_tool_calls(THREAD_ID, assistant_message, tool_messages, config):
+                tracker.observe(chunk)
+
+    while continue_execution:
+        latest = [m for m in store.messages() if m["type"] in ("assistant", "tool", "user")][-1]
+        if latest["type"] == "assistant":
+            break
+        iteration_count += 1
+        async for chunk in processor.process_streaming_response(
+            fake_llm(workdir, store), THREAD_ID, [], "fake-model", config
+        ):
+            tracker.observe(chunk)
+
+    await run_checkpoints.finish(agent_run_id)
+    await lease.release()
+
+
+def main(workdir: str, agent_run_id: str, leases_key: str, lease_seconds: float = 2, heartbeat_interval: float = 0.5,
+         **kwargs):
+    """Process entry point; ``kwargs`` go to ``work``."""
+    run_checkpoints.LEASES_KEY = leases_key
+    run_checkpoints.LEASE_SECONDS = lease_seconds
+    run_checkpoints.HEARTBEAT_INTERVAL = heartbeat_interval
+    asyncio.run(work(workdir, agent_run_id, **kwargs))
@@ -0,0 +1,62 @@
+import uuid
+
+import pytest
+
+from core.services import redis_client as rc
+from core.utils import agent_config_store
+
+
+@pytest.fixture(autouse=True)
+def empty_lru(monkeypatch):
+    monkeypatch.setattr(agent_config_store, "_lru", agent_config_store.OrderedDict())
+
+
+def make_config(system_prompt="You are a careful researcher."):
+    return {
+        "agent_id": str(uuid.uuid4()),
+        "current_version_id": str(uuid.uuid4()),
+        "name": "Researcher",
+        "system_prompt": system_prompt,
+        "configured_mcps": [{"name": "search", "config": {"limit": 5}}],
+        "agentpress_tools": {"web_search_tool": True},
+    }
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+class TestAgentConfigStore:
+    async def test_worker_resolves_the_reference_from_redis(self, redis):
+        config = make_config()
+        ref = await agent_config_store.put(config)
+        assert ref["agent_id"] == config["agent_id"]
+        assert ref["version_id"] == config["current_version_id"]
+
+        # A worker process starts with an empty LRU
+        agent_config_store._lru.clear()
+        assert await agent_config_store.resolve(ref) == config
+        assert 0 < await redis.ttl(agent_config_store._key(ref)) <= agent_config_store.CONFIG_TTL
+
+    async def test_version_edited_while_queued_keeps_the_started_config(self, redis):
+        config = make_config()
+        ref = await agent_config_store.put(config)
+        edited = {**config, "system_prompt": "You are terse."}
+        edited_ref = await agent_config_store.put(edited)
+
+        assert edited_ref["version_id"] == ref["version_id"]
+        assert edited_ref["digest"] != ref["digest"]
+        agent_config_store._lru.clear()
+        assert (await agent_config_store.resolve(ref))["system_prompt"] == config["system_prompt"]
+        assert (await agent_config_store.resolve(edited_ref))["system_prompt"] == "You are terse."
+
+    async def test_repeat_resolves_are_served_in_process(self, redis, monkeypatch):
+        config = make_config()
+        ref = await agent_config_store.put(config)
+        agent_config_store._lru.clear()
+        await agent_config_store.resolve(ref)
+
+        async def unavailable():
+            raise ConnectionError("Redis is down")
+
+        monkeypatch.setattr(rc, "get_client", unavailable)
+        assert await agent_config_store.resolve(ref) == config
+        assert await agent_config_store.put(None) is None
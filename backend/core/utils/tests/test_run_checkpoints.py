@@ -0,0 +1,138 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import time
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from core.utils import run_checkpoints
+from core.utils.tests import fake_run_worker
+from core.utils.tests.fake_run_worker import FileMessageStore, read_log
+
+# Worker processes are started fresh so they share nothing with the test but Redis and the files
+mp = multiprocessing.get_context("spawn")
+# Tools run once the stream ends; without a limit, since XML calls past the limit are dropped after the stream
+AFTER_STREAM = {"execute_on_stream": False, "max_xml_tool_calls": 0}
+
+
+@pytest.fixture
+def redis_prefix():
+    # Sweeps only see this test's runs
+    return run_checkpoints, "LEASES_KEY"
+
+
+@pytest_asyncio.fixture
+async def workdir(tmp_path):
+    FileMessageStore(str(tmp_path)).messages()
+    await FileMessageStore(str(tmp_path)).add_message(
+        fake_run_worker.THREAD_ID, "user", {"role": "user", "content": "Record every step"}, is_llm_message=True
+    )
+    return str(tmp_path)
+
+
+def start_worker(workdir, agent_run_id, **kwargs):
+    process = mp.Process(target=fake_run_worker.main, args=(workdir, agent_run_id, run_checkpoints.LEASES_KEY),
+                         kwargs=kwargs)
+    process.start()
+    return process
+
+
+async def resume_stale_run(agent_run_id, timeout=15):
+    """Sweep until the run's lease has expired and it is enqueued again; return its actor arguments."""
+    enqueued = []
+    deadline = time.monotonic() + timeout
+    while not enqueued:
+        assert time.monotonic() < deadline, "stale run was never enqueued"
+        await asyncio.sleep(0.2)
+        await run_checkpoints.sweep_stale_runs(enqueued.append)
+    assert enqueued == [{"agent_run_id": agent_run_id}]
+    return enqueued[0]
+
+
+async def finish_run(workdir, agent_run_id, **kwargs):
+    run = await resume_stale_run(agent_run_id)
+    worker = start_worker(workdir, **run, **kwargs)
+    await asyncio.to_thread(worker.join, 30)
+    assert worker.exitcode == 0
+
+
+def tool_results(workdir):
+    return [m for m in FileMessageStore(workdir).messages() if m["type"] == "tool"]
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+class TestRunResume:
+    async def test_resume_skips_turns_recorded_before_the_crash(self, redis, workdir):
+        agent_run_id = str(uuid.uuid4())
+        # Dies once turn 2's tool result is saved but before the turn is checkpointed
+        worker = start_worker(workdir, agent_run_id, crash_at="tool:2")
+        await asyncio.to_thread(worker.join, 30)
+        assert worker.exitcode == -signal.SIGKILL
+        assert (await run_checkpoints.load(agent_run_id))["iteration_count"] == 1
+
+        await finish_run(workdir, agent_run_id)
+
+        assert read_log(workdir, "side_effects") == ["1", "2", "3"]
+        assert read_log(workdir, "llm_calls") == ["1", "2", "3", "4"]
+        assert len(tool_results(workdir)) == 3
+        assert await run_checkpoints.load(agent_run_id) == {"finished": True}
+
+    async def test_resume_executes_only_unrecorded_tool_calls(self, redis, workdir):
+        agent_run_id = str(uuid.uuid4())
+        # With tools executed after the stream, dies between saving turn 2's
+        # assistant message and running its tool call
+        worker = start_worker(workdir, agent_run_id, crash_at="assistant:2", processor_config=AFTER_STREAM)
+        await asyncio.to_thread(worker.join, 30)
+        assert worker.exitcode == -signal.SIGKILL
+        assert read_log(workdir, "side_effects") == ["1"]
+
+        await finish_run(workdir, agent_run_id, processor_config=AFTER_STREAM)
+
+        # The LLM is not asked for turn 2 again; its pending call runs once
+        assert read_log(workdir, "llm_calls") == ["1", "2", "3", "4"]
+        assert read_log(workdir, "side_effects") == ["1", "2", "3"]
+        step_2 = [m for m in tool_results(workdir) if "Recorded step 2" in json.dumps(m["content"])]
+        assert len(step_2) == 1
+
+    async def test_killed_worker_is_resumed_from_its_checkpoint(self, redis, workdir):
+        agent_run_id = str(uuid.uuid4())
+        worker = start_worker(workdir, agent_run_id, slow_step=3)
+        deadline = time.monotonic() + 30
+        while not read_log(workdir, "slow_tool_started"):
+            assert time.monotonic() < deadline and worker.is_alive()
+            await asyncio.sleep(0.05)
+        os.kill(worker.pid, signal.SIGKILL)
+        await asyncio.to_thread(worker.join, 30)
+
+        checkpoint = await run_checkpoints.load(agent_run_id)
+        assert checkpoint["iteration_count"] == 2
+        assert checkpoint["auto_continue"] is True
+        assert checkpoint["pending_tool_calls"] == []
+        assert checkpoint["last_message_id"] == tool_results(workdir)[-1]["message_id"]
+
+        await finish_run(workdir, agent_run_id)
+
+        # Only turn 3, which never reached the thread, is asked for again
+        assert read_log(workdir, "llm_calls") == ["1", "2", "3", "3", "4"]
+        assert read_log(workdir, "side_effects") == ["1", "2", "3"]
+
+    async def test_live_lease_is_not_swept(self, redis, workdir):
+        agent_run_id = str(uuid.uuid4())
+        worker = start_worker(workdir, agent_run_id, slow_step=1)
+        while not read_log(workdir, "slow_tool_started"):
+            await asyncio.sleep(0.05)
+
+        # Longer than the lease; the heartbeat keeps renewing it
+        await asyncio.sleep(3)
+        enqueued = []
+        await run_checkpoints.sweep_stale_runs(enqueued.append)
+        assert enqueued == []
+        assert not await run_checkpoints.RunLease(agent_run_id, "other").acquire()
+
+        os.kill(worker.pid, signal.SIGKILL)
+        await asyncio.to_thread(worker.join, 30)
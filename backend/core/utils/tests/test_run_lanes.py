@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+
+from core.utils import run_lanes
+
+
+@pytest.fixture
+def redis_prefix():
+    # Queues only hold this test's runs
+    return run_lanes, "PREFIX"
+
+
+def set_lane(monkeypatch, lane, **settings):
+    monkeypatch.setitem(run_lanes.LANE_CONFIG, lane, {**run_lanes.LANE_CONFIG[lane], **settings})
+
+
+async def queue_runs(lane, account_id, count):
+    for i in range(count):
+        await run_lanes.push(lane, account_id, {"agent_run_id": f"{account_id}-{i}"})
+
+
+class FakeRuns:
+    """Workers that take runs off a lane and hold their slot for ``duration`` seconds."""
+
+    def __init__(self, lane, workers, duration=0.01):
+        self.lane = lane
+        self.duration = duration
+        self.started = []
+        self.running = 0
+        self.max_running = 0
+        self._stopped = False
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(workers)]
+
+    async def _work(self):
+        while not self._stopped:
+            run = await run_lanes.pop(self.lane)
+            if not run:
+                await asyncio.sleep(0.005)
+                continue
+            self.started.append(run["agent_run_id"])
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            await asyncio.sleep(self.duration)
+            self.running -= 1
+            await run_lanes.release(self.lane, run["agent_run_id"])
+
+    async def wait_for(self, count, timeout=10):
+        deadline = time.monotonic() + timeout
+        while len(self.started) < count:
+            assert time.monotonic() < deadline, f"only {len(self.started)} of {count} runs started"
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        # Cancelling a worker in the middle of a Redis command can leave it running
+        self._stopped = True
+        await asyncio.gather(*self._tasks)
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+class TestRunLanes:
+    async def test_burst_from_one_account_does_not_starve_others(self, redis, monkeypatch):
+        set_lane(monkeypatch, run_lanes.TRIGGER, concurrency=2)
+        await queue_runs(run_lanes.TRIGGER, "busy", 60)
+        await queue_runs(run_lanes.TRIGGER, "quiet", 2)
+
+        runs = FakeRuns(run_lanes.TRIGGER, workers=4)
+        try:
+            await runs.wait_for(62)
+        finally:
+            await runs.stop()
+
+        # Queued behind 60 runs, the quiet account still starts within one turn of the ring each time
+        assert runs.started.index("quiet-0") <= 1
+        assert runs.started.index("quiet-1") <= 3
+        assert sorted(runs.started) == sorted([f"busy-{i}" for i in range(60)] + ["quiet-0", "quiet-1"])
+        assert runs.max_running <= 2
+
+    async def test_accounts_take_turns(self, redis, monkeypatch):
+        set_lane(monkeypatch, run_lanes.BATCH, concurrency=0)
+        for account_id in ("a", "b", "c"):
+            await queue_runs(run_lanes.BATCH, account_id, 3)
+        started = [(await run_lanes.pop(run_lanes.BATCH))["agent_run_id"] for _ in range(9)]
+        assert started == ["a-0", "b-0", "c-0", "a-1", "b-1", "c-1", "a-2", "b-2", "c-2"]
+        assert await run_lanes.pop(run_lanes.BATCH) is None
+
+    async def test_full_trigger_lane_does_not_hold_up_interactive_runs(self, redis, monkeypatch):
+        set_lane(monkeypatch, run_lanes.TRIGGER, concurrency=1)
+        await queue_runs(run_lanes.TRIGGER, "cron", 2)
+        await queue_runs(run_lanes.INTERACTIVE, "user", 1)
+
+        assert (await run_lanes.pop(run_lanes.TRIGGER))["agent_run_id"] == "cron-0"
+        assert await run_lanes.pop(run_lanes.TRIGGER) is None
+        assert (await run_lanes.pop(run_lanes.INTERACTIVE))["agent_run_id"] == "user-0"
+
+        # Freeing the slot reports that a run is waiting for it
+        assert await run_lanes.release(run_lanes.TRIGGER, "cron-0")
+        assert (await run_lanes.pop(run_lanes.TRIGGER))["agent_run_id"] == "cron-1"
+
+    async def test_slot_of_a_lost_worker_expires(self, redis, monkeypatch):
+        set_lane(monkeypatch, run_lanes.TRIGGER, concurrency=1)
+        monkeypatch.setattr(run_lanes, "SLOT_SECONDS", 0.2)
+        await queue_runs(run_lanes.TRIGGER, "cron", 2)
+
+        assert await run_lanes.pop(run_lanes.TRIGGER)
+        assert await run_lanes.pop(run_lanes.TRIGGER) is None
+        await asyncio.sleep(0.3)
+        assert (await run_lanes.pop(run_lanes.TRIGGER))["agent_run_id"] == "cron-1"
+
+    async def test_deferred_runs_wait_until_due(self, redis):
+        await run_lanes.push(run_lanes.TRIGGER, "cron", {"agent_run_id": "later"}, defer=0.3)
+        assert await run_lanes.pop(run_lanes.TRIGGER) is None
+        assert (await run_lanes.lane_stats())[run_lanes.TRIGGER]["deferred"] == 1
+
+        await asyncio.sleep(0.35)
+        assert (await run_lanes.pop(run_lanes.TRIGGER))["agent_run_id"] == "later"
+
+    async def test_admission_rejects_batch_and_defers_trigger_work(self, redis, monkeypatch):
+        set_lane(monkeypatch, run_lanes.BATCH, max_depth=3)
+        set_lane(monkeypatch, run_lanes.TRIGGER, max_depth=0, max_p95_wait=0.2)
+        await queue_runs(run_lanes.INTERACTIVE, "user", 10)
+        assert await run_lanes.admit(run_lanes.INTERACTIVE) == 0
+
+        await queue_runs(run_lanes.BATCH, "a", 2)
+        assert await run_lanes.admit(run_lanes.BATCH) == 0
+        await queue_runs(run_lanes.BATCH, "b", 1)
+        with pytest.raises(run_lanes.LaneOverloaded):
+            await run_lanes.admit(run_lanes.BATCH)
+
+        await queue_runs(run_lanes.TRIGGER, "cron", 5)
+        assert await run_lanes.admit(run_lanes.TRIGGER) == 0
+        await asyncio.sleep(0.3)
+        for _ in range(5):
+            await run_lanes.pop(run_lanes.TRIGGER)
+        assert await run_lanes.admit(run_lanes.TRIGGER) == run_lanes.DEFER_SECONDS
+
+    async def test_stats_report_queue_waits(self, redis):
+        await queue_runs(run_lanes.INTERACTIVE, "user", 4)
+        await asyncio.sleep(0.1)
+        for _ in range(2):
+            await run_lanes.pop(run_lanes.INTERACTIVE)
+
+        stats = (await run_lanes.lane_stats())[run_lanes.INTERACTIVE]
+        assert stats["depth"] == 2
+        assert stats["running"] == 2
+        assert stats["wait_samples"] == 2
+        assert 0.1 <= stats["wait_p50"] <= stats["wait_p95"] < 5
+        assert await run_lanes.lanes_needing_workers() == {run_lanes.INTERACTIVE: 2}
+        # Another worker sweeping in the same interval sends nothing more
+        assert await run_lanes.lanes_needing_workers() == {}
@@ -0,0 +1,115 @@
+import asyncio
+import base64
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from core.utils import screenshot_pipeline
+from core.utils.screenshot_pipeline import ScreenshotPipeline
+
+
+class FakeStorage:
+    def __init__(self, failures=0, delay=0):
+        self.failures = failures
+        self.delay = delay
+        self.attempts = []
+        self.uploaded = {}
+
+    async def public_url(self, path):
+        return f"https://storage.test/browser-screenshots/{path}"
+
+    async def upload(self, path, data, content_type):
+        self.attempts.append(path)
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("storage unavailable")
+        self.uploaded[path] = (data, content_type)
+
+
+def screenshot(text="", offset=0):
+    image = Image.new("RGB", (1024, 768), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((100 + offset, 100, 600 + offset, 400), fill="navy")
+    draw.text((120, 500), text, fill="black")
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return base64.b64encode(out.getvalue()).decode()
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(screenshot_pipeline, "UPLOAD_RETRY_DELAY", 0)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+class TestScreenshotPipeline:
+    async def test_duplicate_frame_reuses_the_url(self):
+        storage = FakeStorage()
+        pipeline = ScreenshotPipeline(storage=storage)
+
+        first = await pipeline.submit(screenshot())
+        second = await pipeline.submit(screenshot())
+        await pipeline.drain()
+
+        assert not first.duplicate
+        assert second.duplicate and second.url == first.url
+        assert len(storage.attempts) == 1
+
+    async def test_changed_frame_is_uploaded(self):
+        storage = FakeStorage()
+        pipeline = ScreenshotPipeline(storage=storage)
+
+        first = await pipeline.submit(screenshot())
+        moved = await pipeline.submit(screenshot(offset=200))
+        typed = await pipeline.submit(screenshot(text="hello world", offset=200))
+        await pipeline.drain()
+
+        assert not moved.duplicate and not typed.duplicate
+        assert len({first.url, moved.url, typed.url}) == 3
+        assert len(storage.uploaded) == 3
+
+    async def test_failed_upload_is_not_reused(self):
+        storage = FakeStorage(failures=screenshot_pipeline.UPLOAD_ATTEMPTS)
+        pipeline = ScreenshotPipeline(storage=storage)
+
+        failed = await pipeline.submit(screenshot())
+        await pipeline.drain()
+        assert storage.uploaded == {}
+        assert len(storage.attempts) == screenshot_pipeline.UPLOAD_ATTEMPTS
+
+        # The identical frame gets a fresh upload instead of the URL that never resolved
+        retried = await pipeline.submit(screenshot())
+        await pipeline.drain()
+        assert not retried.duplicate and retried.url != failed.url
+        assert list(storage.uploaded) == [retried.url.rsplit("/", 1)[-1]]
+
+    async def test_upload_is_retried(self):
+        storage = FakeStorage(failures=screenshot_pipeline.UPLOAD_ATTEMPTS - 1)
+        pipeline = ScreenshotPipeline(storage=storage)
+
+        await pipeline.submit(screenshot())
+        await pipeline.drain()
+
+        assert len(storage.uploaded) == 1
+        assert (await pipeline.submit(screenshot())).duplicate
+
+    async def test_drain_waits_for_uploads(self):
+        storage = FakeStorage(delay=0.05)
+        pipeline = ScreenshotPipeline(storage=storage)
+
+        await pipeline.submit(screenshot())
+        await pipeline.submit(screenshot(offset=200))
+        assert pipeline.pending_uploads == 2
+
+        await pipeline.drain()
+        assert pipeline.pending_uploads == 0
+        assert len(storage.uploaded) == 2
+
+    async def test_invalid_data_is_rejected(self):
+        pipeline = ScreenshotPipeline(storage=FakeStorage())
+
+        with pytest.raises(ValueError):
+            await pipeline.submit(base64.b64encode(b"not an image at all").decode())
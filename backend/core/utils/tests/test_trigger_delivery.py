@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from core.utils import trigger_delivery
+
+
+@pytest.fixture
+def redis_prefix():
+    return trigger_delivery, "PREFIX"
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+class TestTriggerDelivery:
+    async def test_retried_delivery_is_claimed_once(self, redis):
+        assert await trigger_delivery.claim("t1", "evt-1")
+        assert not await trigger_delivery.claim("t1", "evt-1")
+        # Ids are scoped to the trigger, and deliveries without one always run
+        assert await trigger_delivery.claim("t2", "evt-1")
+        assert await trigger_delivery.claim("t1", None)
+        assert await trigger_delivery.claim("t1", None)
+
+        # A failed execution lets the sender's retry through
+        await trigger_delivery.release("t1", "evt-1")
+        assert await trigger_delivery.claim("t1", "evt-1")
+
+    async def test_schedule_firings_are_identified_by_minute(self, redis):
+        fired_at = datetime(2025, 9, 13, 9, 30, 5, tzinfo=timezone.utc)
+        retried_at = datetime(2025, 9, 13, 9, 30, 40, tzinfo=timezone.utc)
+        assert trigger_delivery.schedule_delivery_id(fired_at) == trigger_delivery.schedule_delivery_id(retried_at)
+        assert trigger_delivery.delivery_id_from_headers({"webhook-id": "msg_1", "idempotency-key": "key-1"}) == "key-1"
+        assert trigger_delivery.delivery_id_from_headers({}) is None
+
+    async def test_burst_of_events_is_taken_as_one_batch(self, redis, monkeypatch):
+        monkeypatch.setattr(trigger_delivery, "MAX_BATCH_EVENTS", 3)
+        opened = [await trigger_delivery.add_to_batch("t1", {"n": n}, 30) for n in range(5)]
+        assert opened == [True, False, False, False, False]
+
+        received, events = await trigger_delivery.take_batch("t1")
+        assert received == 5
+        assert events == [{"n": 2}, {"n": 3}, {"n": 4}]
+
+        # The next event opens a new window
+        assert await trigger_delivery.take_batch("t1") == (0, [])
+        assert await trigger_delivery.add_to_batch("t1", {"n": 5}, 30)
+
+    async def test_session_lock_serialises_firings(self, redis):
+        order = []
+
+        async def fire(n):
+            async with trigger_delivery.session_lock("t1"):
+                order.append(("start", n))
+                await asyncio.sleep(0.05)
+                order.append(("end", n))
+
+        await asyncio.gather(fire(1), fire(2))
+        assert [event for event, _ in order] == ["start", "end", "start", "end"]
@@ -0,0 +1,155 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from core.utils import run_slots, trigger_scheduler
+from core.utils.trigger_scheduler import ScheduledTrigger, TriggerScheduler
+
+
+@pytest.fixture
+def redis_prefix():
+    return trigger_scheduler, "PREFIX"
+
+
+def at(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class Harness:
+    """A scheduler over a fixed set of triggers, recording what it dispatches."""
+
+    def __init__(self, triggers, now):
+        self.triggers = list(triggers)
+        self.clock = FakeClock(now)
+        self.dispatched = []
+        self.scheduler = TriggerScheduler(self._load, self._dispatch, clock=self.clock)
+
+    async def _load(self):
+        return self.triggers
+
+    async def _dispatch(self, trigger_id, fire_time, delay):
+        self.dispatched.append((trigger_id, fire_time, delay))
+
+    async def start(self):
+        assert await self.scheduler.elect()
+        await self.scheduler.reload()
+
+    async def advance(self, seconds):
+        self.clock.advance(seconds)
+        return await self.scheduler.tick()
+
+    async def finish_runs(self):
+        for trigger_id, _, _ in self.dispatched:
+            await trigger_scheduler.record_run(trigger_id, None)
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+class TestTriggerScheduler:
+    async def test_fires_on_schedule(self, redis):
+        h = Harness([ScheduledTrigger("every-5", "*/5 * * * *")], at(2025, 9, 13, 9, 2))
+        await h.start()
+
+        assert await h.advance(0) == 180
+        assert h.dispatched == []
+        await h.advance(180)
+        assert h.dispatched == [("every-5", at(2025, 9, 13, 9, 5), 0)]
+
+        await h.finish_runs()
+        assert await h.advance(299) == 1
+        await h.advance(1)
+        assert [fire for _, fire, _ in h.dispatched] == [at(2025, 9, 13, 9, 5), at(2025, 9, 13, 9, 10)]
+
+    async def test_cron_is_evaluated_in_the_trigger_timezone(self, redis):
+        h = Harness([ScheduledTrigger("berlin", "0 9 * * *", "Europe/Berlin")], at(2025, 9, 13, 6, 0))
+        await h.start()
+        # 09:00 in Berlin is 07:00 UTC in summer
+        assert await h.advance(0) == 3600
+
+    async def test_missed_fires_are_coalesced(self, redis):
+        h = Harness([ScheduledTrigger("every-5", "*/5 * * * *")], at(2025, 9, 13, 9, 2))
+        await h.start()
+
+        # No tick for an hour, e.g. while the leader was paused
+        wait = await h.advance(3600)
+        assert [fire for _, fire, _ in h.dispatched] == [at(2025, 9, 13, 9, 5)]
+        assert wait == 180
+
+    async def test_fire_is_skipped_while_the_previous_run_is_active(self, redis):
+        h = Harness([ScheduledTrigger("every-min", "* * * * *")], at(2025, 9, 13, 9, 0, 30))
+        await h.start()
+
+        await h.advance(30)
+        assert len(h.dispatched) == 1
+        # Dispatched but not started yet
+        await h.advance(60)
+        assert len(h.dispatched) == 1
+
+        agent_run_id = str(uuid.uuid4())
+        await run_slots.acquire(agent_run_id, str(uuid.uuid4()), None, str(uuid.uuid4()))
+        try:
+            await trigger_scheduler.record_run("every-min", agent_run_id)
+            await h.advance(60)
+            assert len(h.dispatched) == 1
+        finally:
+            await run_slots.release(agent_run_id)
+
+        await h.advance(60)
+        assert [fire for _, fire, _ in h.dispatched] == [at(2025, 9, 13, 9, 1), at(2025, 9, 13, 9, 4)]
+
+    async def test_due_triggers_are_dispatched_in_batches_with_spread_delays(self, redis, monkeypatch):
+        monkeypatch.setattr(trigger_scheduler, "BATCH_SIZE", 50)
+        triggers = [ScheduledTrigger(f"hourly-{i}", "0 * * * *") for i in range(120)]
+        h = Harness(triggers, at(2025, 9, 13, 9, 59))
+        await h.start()
+
+        assert await h.advance(60) == 0
+        assert len(h.dispatched) == 50
+        while await h.advance(0) == 0:
+            pass
+        assert sorted(trigger_id for trigger_id, _, _ in h.dispatched) == sorted(t.trigger_id for t in triggers)
+
+        delays = [delay for _, _, delay in h.dispatched[:50]]
+        assert delays == sorted(delays)
+        assert delays[0] == 0 and delays[-1] < trigger_scheduler.MAX_JITTER
+        assert len(set(delays)) == 50
+
+    async def test_only_the_leader_schedules(self, redis):
+        leader = Harness([ScheduledTrigger("every-min", "* * * * *")], at(2025, 9, 13, 9, 0, 30))
+        follower = Harness(leader.triggers, leader.clock.now)
+        await leader.start()
+        assert not await follower.scheduler.elect()
+        assert await leader.scheduler.elect()
+
+        # The leader stops renewing and its key expires
+        await redis.delete(f"{trigger_scheduler.PREFIX}:leader")
+        await follower.start()
+        assert not await leader.scheduler.elect()
+        await leader.advance(30)
+        assert leader.dispatched == []
+        await follower.advance(30)
+        assert len(follower.dispatched) == 1
+
+    async def test_reload_picks_up_changed_and_removed_triggers(self, redis):
+        h = Harness([ScheduledTrigger("a", "0 * * * *"), ScheduledTrigger("b", "0 * * * *")], at(2025, 9, 13, 9, 50))
+        await h.start()
+
+        h.triggers = [ScheduledTrigger("a", "55 * * * *")]
+        await h.scheduler.reload()
+        assert await h.advance(300) == 3600
+        assert h.dispatched == [("a", at(2025, 9, 13, 9, 55), 0)]
+        await h.advance(300)
+        assert len(h.dispatched) == 1
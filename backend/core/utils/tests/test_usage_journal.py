@@ -0,0 +1,217 @@
+import asyncio
+import os
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+
+from core.utils import usage_journal
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+MIGRATION = Path(__file__).parents[3] / "supabase" / "migrations" / "20250914090000_atomic_deduct_credits.sql"
+
+# The Supabase API roles the migration grants to, and the columns of
+# credit_accounts and credit_ledger that deduct_credits touches
+SCHEMA = """
+DO $$
+DECLARE
+    role_name TEXT;
+BEGIN
+    FOREACH role_name IN ARRAY ARRAY['anon', 'authenticated', 'service_role'] LOOP
+        IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = role_name) THEN
+            EXECUTE format('CREATE ROLE %I NOLOGIN', role_name);
+        END IF;
+    END LOOP;
+END
+$$;
+CREATE TABLE credit_accounts (
+    account_id UUID PRIMARY KEY,
+    balance DECIMAL(12, 4) NOT NULL DEFAULT 0 CHECK (balance >= 0),
+    expiring_credits DECIMAL(12, 4) NOT NULL DEFAULT 0 CHECK (expiring_credits >= 0),
+    non_expiring_credits DECIMAL(12, 4) NOT NULL DEFAULT 0 CHECK (non_expiring_credits >= 0),
+    lifetime_used DECIMAL(12, 4) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE credit_ledger (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    account_id UUID NOT NULL REFERENCES credit_accounts(account_id),
+    amount DECIMAL(12, 4) NOT NULL,
+    balance_after DECIMAL(12, 4) NOT NULL,
+    type TEXT NOT NULL,
+    description TEXT,
+    reference_id UUID,
+    reference_type TEXT,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    is_expiring BOOLEAN,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+"""
+
+
+@pytest.fixture
+def redis_prefix(monkeypatch):
+    monkeypatch.setattr(usage_journal, "_last_flush", {})
+    return usage_journal, "PREFIX"
+
+
+@pytest_asyncio.fixture
+async def pg():
+    """A connection pool whose search_path is a throwaway schema holding deduct_credits."""
+    url = os.getenv("DATABASE_URL")
+    if asyncpg is None or not url:
+        pytest.skip("DATABASE_URL is not set or asyncpg is not installed")
+    schema = f"deduct_test_{uuid.uuid4().hex[:12]}"
+    try:
+        conn = await asyncio.wait_for(asyncpg.connect(url), timeout=5)
+    except Exception:
+        pytest.skip("Postgres is not reachable")
+    await conn.execute(f"CREATE SCHEMA {schema}; SET search_path TO {schema}, public;")
+    await conn.execute(SCHEMA)
+    await conn.execute(MIGRATION.read_text())
+    pool = await asyncpg.create_pool(url, min_size=1, max_size=10, server_settings={"search_path": f"{schema},public"})
+    yield pool
+    await pool.close()
+    await conn.execute(f"DROP SCHEMA {schema} CASCADE")
+    await conn.close()
+
+
+async def create_account(pool, expiring="0", non_expiring="0"):
+    account_id = uuid.uuid4()
+    await pool.execute(
+        "INSERT INTO credit_accounts (account_id, balance, expiring_credits, non_expiring_credits) VALUES ($1, $2, $3, $4)",
+        account_id, Decimal(expiring) + Decimal(non_expiring), Decimal(expiring), Decimal(non_expiring),
+    )
+    return account_id
+
+
+async def deduct(pool, account_id, amount, reference_id=None, allow_partial=False):
+    return await pool.fetchrow(
+        "SELECT * FROM deduct_credits($1, $2, 'usage', $3, 'test', '{}'::jsonb, $4)",
+        account_id, Decimal(amount), reference_id, allow_partial,
+    )
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+class TestDeductCredits:
+    async def test_concurrent_deductions_are_serialised(self, pg):
+        account_id = await create_account(pg, expiring="1.5", non_expiring="1")
+
+        results = await asyncio.gather(*(deduct(pg, account_id, "0.1") for _ in range(30)))
+
+        assert sum(r["success"] for r in results) == 25
+        row = await pg.fetchrow("SELECT * FROM credit_accounts WHERE account_id = $1", account_id)
+        assert row["balance"] == 0 and row["expiring_credits"] == 0 and row["non_expiring_credits"] == 0
+        assert row["lifetime_used"] == Decimal("2.5")
+        balances = await pg.fetch(
+            "SELECT balance_after FROM credit_ledger WHERE account_id = $1 ORDER BY balance_after DESC", account_id,
+        )
+        assert [b["balance_after"] for b in balances] == [Decimal("2.4") - Decimal("0.1") * i for i in range(25)]
+
+    async def test_expiring_credits_are_used_first(self, pg):
+        account_id = await create_account(pg, expiring="1", non_expiring="5")
+
+        result = await deduct(pg, account_id, "1.25")
+
+        assert result["from_expiring"] == 1 and result["from_non_expiring"] == Decimal("0.25")
+        assert result["new_expiring"] == 0 and result["new_total"] == Decimal("4.75")
+
+    async def test_a_reference_is_charged_once(self, pg):
+        account_id = await create_account(pg, non_expiring="10")
+        reference_id = uuid.uuid4()
+
+        results = await asyncio.gather(*(deduct(pg, account_id, "2", reference_id) for _ in range(10)))
+
+        assert [r["duplicate"] for r in results].count(False) == 1
+        assert all(r["amount_deducted"] == 2 for r in results)
+        assert await pg.fetchval("SELECT balance FROM credit_accounts WHERE account_id = $1", account_id) == 8
+        assert await pg.fetchval("SELECT COUNT(*) FROM credit_ledger WHERE account_id = $1", account_id) == 1
+
+    async def test_partial_deduction_records_the_shortfall(self, pg):
+        account_id = await create_account(pg, non_expiring="1")
+
+        refused = await deduct(pg, account_id, "3")
+        assert not refused["success"] and refused["new_total"] == 1
+
+        result = await deduct(pg, account_id, "3", allow_partial=True)
+        assert result["success"] and result["amount_deducted"] == 1 and result["new_total"] == 0
+        metadata = await pg.fetchval("SELECT metadata FROM credit_ledger WHERE account_id = $1", account_id)
+        assert '"shortfall": 2' in metadata
+
+
+class RecordingDeduct:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, account_id, amount, flush_id, usage):
+        self.calls.append((account_id, amount, flush_id, usage))
+        return not self.fail
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+class TestUsageJournal:
+    async def test_usage_is_charged_once_per_flush(self, redis):
+        deduct = RecordingDeduct()
+        for _ in range(3):
+            await usage_journal.record("thread", "account", Decimal("0.0000125"), 100, 10)
+
+        assert await usage_journal.finish("thread", deduct) == Decimal("0.0000375")
+        assert deduct.calls[0][3] == {"prompt_tokens": 300, "completion_tokens": 30, "calls": 3}
+        assert await usage_journal.flush("thread", deduct) is None
+        assert len(deduct.calls) == 1
+
+    async def test_flush_is_due_every_interval(self, redis, monkeypatch):
+        monkeypatch.setattr(usage_journal, "FLUSH_INTERVAL", 0)
+        assert await usage_journal.record("thread", "account", Decimal("1"))
+
+        monkeypatch.setattr(usage_journal, "FLUSH_INTERVAL", 3600)
+        await usage_journal.flush("thread", RecordingDeduct())
+        assert not await usage_journal.record("thread", "account", Decimal("1"))
+
+    async def test_failed_flush_is_retried_under_the_same_reference(self, redis):
+        await usage_journal.record("thread", "account", Decimal("0.5"))
+        failing = RecordingDeduct(fail=True)
+        assert await usage_journal.flush("thread", failing) is None
+
+        # Usage recorded meanwhile waits for the next flush
+        await usage_journal.record("thread", "account", Decimal("0.25"))
+        deduct = RecordingDeduct()
+        assert await usage_journal.flush("thread", deduct) == Decimal("0.5")
+        assert deduct.calls[0][2] == failing.calls[0][2]
+        assert await usage_journal.flush("thread", deduct) == Decimal("0.25")
+        assert deduct.calls[1][2] != failing.calls[0][2]
+
+    async def test_stale_journals_are_recovered(self, redis, monkeypatch):
+        await usage_journal.record("crashed", "account", Decimal("1"))
+        assert await usage_journal.recover(RecordingDeduct()) == 0
+
+        monkeypatch.setattr(usage_journal, "STALE_SECONDS", -1)
+        deduct = RecordingDeduct()
+        assert await usage_journal.recover(deduct) == 1
+        assert deduct.calls[0][:2] == ("account", Decimal("1"))
+        assert await redis.zcard(f"{usage_journal.PREFIX}:threads") == 0
+
+    async def test_journal_flushes_into_the_ledger(self, redis, pg):
+        account_id = await create_account(pg, non_expiring="1")
+
+        async def deduct(account_id, amount, flush_id, usage):
+            result = await pg.fetchrow(
+                "SELECT * FROM deduct_credits($1, $2, 'usage', $3, 'usage_flush', '{}'::jsonb, TRUE)",
+                uuid.UUID(account_id), amount, uuid.UUID(flush_id),
+            )
+            return result["success"]
+
+        # Each call costs less than the ledger's precision; only the total is rounded
+        for _ in range(40):
+            await usage_journal.record("thread", str(account_id), Decimal("0.0000125"))
+        await usage_journal.finish("thread", deduct)
+
+        assert await pg.fetchval("SELECT balance FROM credit_accounts WHERE account_id = $1", account_id) == Decimal("0.9995")
@@ -0,0 +1,95 @@
+import asyncio
+import time
+import uuid
+
+import dramatiq
+import pytest
+from dramatiq.brokers.stub import StubBroker
+from dramatiq.middleware import AsyncIO
+
+from core.services import redis_client as rc
+from core.utils import trigger_scheduler, worker_boot
+from core.utils.trigger_scheduler import ScheduledTrigger, TriggerScheduler
+from core.utils.worker_boot import StartOnBoot
+
+
+@pytest.fixture
+def prefix(monkeypatch):
+    monkeypatch.setattr(rc, "_initialized", False)
+    monkeypatch.setattr(trigger_scheduler, "PREFIX", f"trigger_scheduler:test:{uuid.uuid4()}")
+    monkeypatch.setattr(worker_boot, "RETRY_INTERVAL", 0.05)
+    return trigger_scheduler.PREFIX
+
+
+def redis_reachable():
+    async def ping():
+        client = rc.build_async_client()
+        try:
+            await asyncio.wait_for(client.ping(), timeout=2)
+            return True
+        except Exception:
+            return False
+        finally:
+            await client.aclose()
+
+    return asyncio.run(ping())
+
+
+def boot_worker(start):
+    broker = StubBroker()
+    broker.add_middleware(AsyncIO())
+    boot = StartOnBoot(start)
+    broker.add_middleware(boot)
+    worker = dramatiq.Worker(broker, worker_threads=1)
+    worker.start()
+    return broker, worker, boot
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+@pytest.mark.integration
+class TestStartOnBoot:
+    def test_scheduler_runs_without_any_message(self, prefix):
+        # The scheduler retries Redis for longer than the test waits
+        if not redis_reachable():
+            pytest.skip("Redis is not reachable")
+        dispatched = []
+
+        async def load():
+            return [ScheduledTrigger("every-second", "* * * * * *")]
+
+        async def dispatch(trigger_id, fire_time, delay):
+            dispatched.append(trigger_id)
+
+        async def start():
+            asyncio.create_task(TriggerScheduler(load, dispatch).run())
+
+        broker, worker, boot = boot_worker(start)
+        try:
+            wait_for(lambda: dispatched)
+            assert broker.queues == {}
+        finally:
+            worker.stop()
+            broker.close()
+
+    def test_start_is_retried_until_it_succeeds(self, prefix):
+        attempts = []
+
+        async def start():
+            attempts.append(time.time())
+            if len(attempts) < 3:
+                raise ConnectionError("database not ready")
+
+        broker, worker, boot = boot_worker(start)
+        try:
+            wait_for(lambda: boot.future.done())
+            assert boot.future.exception() is None
+            assert len(attempts) == 3
+        finally:
+            worker.stop()
+            broker.close()
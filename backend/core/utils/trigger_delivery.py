@@ -0,0 +1,147 @@
+"""
+Idempotent, debounced delivery of trigger events.
+
+Webhook senders retry a delivery they did not see acknowledged, and event
+sources such as a busy repository or inbox fire in bursts. Without this module
+every request starts its own agent run.
+
+- Idempotency: a delivery carries an id (the sender's ``Idempotency-Key`` or
+  webhook id, or the minute a schedule fired). ``claim`` records it for
+  ``DELIVERY_TTL`` seconds and reports whether it is new, so a retried delivery
+  is acknowledged without running again. ``release`` forgets a delivery whose
+  execution failed, so the sender's retry gets processed.
+- Debounce: a trigger with ``debounce_seconds`` in its config does not run per
+  event. ``add_to_batch`` appends the event to ``trigger_delivery:{trigger_id}:batch``
+  and returns True for the first event of a window; the caller then schedules
+  ``take_batch`` for when the window closes, which returns every event of the
+  window at once and starts a new one. A batch keeps its latest
+  ``MAX_BATCH_EVENTS`` events and counts the rest.
+- ``session_lock`` serialises the firings of one trigger while they look up or
+  create the project and thread they share.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from core.services import redis_client as rc
+from core.utils import fastjson
+from core.utils.logger import logger
+
+PREFIX = "trigger_delivery"
+
+DELIVERY_TTL = int(os.getenv("TRIGGER_DELIVERY_TTL", str(24 * 3600)))
+MAX_DEBOUNCE_SECONDS = 3600
+MAX_BATCH_EVENTS = int(os.getenv("TRIGGER_MAX_BATCH_EVENTS", "100"))
+# How long an unflushed batch outlives its window, in case the flush is lost
+BATCH_GRACE_SECONDS = 600
+# Creating a sandbox for a new session can take a minute
+SESSION_LOCK_SECONDS = 120
+
+# Headers senders use to identify a delivery, most specific first
+DELIVERY_ID_HEADERS = ("idempotency-key", "x-idempotency-key", "webhook-id", "x-github-delivery")
+
+# KEYS: batch list, event counter. ARGV: event, max events, ttl
+_ADD_SCRIPT = """
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+local count = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return count
+"""
+
+# KEYS: batch list, event counter
+_TAKE_SCRIPT = """
+local events = redis.call('LRANGE', KEYS[1], 0, -1)
+local count = tonumber(redis.call('GET', KEYS[2]) or '0')
+redis.call('DEL', KEYS[1], KEYS[2])
+return {count, events}
+"""
+
+_UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _key(trigger_id: str, suffix: str) -> str:
+    return f"{PREFIX}:{trigger_id}:{suffix}"
+
+
+def delivery_id_from_headers(headers: Mapping[str, str]) -> Optional[str]:
+    for name in DELIVERY_ID_HEADERS:
+        value = headers.get(name)
+        if value:
+            return value
+    return None
+
+
+def schedule_delivery_id(fired_at: datetime) -> str:
+    """Delivery id of a cron firing; a retry within the same minute is the same firing."""
+    return f"schedule:{fired_at.strftime('%Y%m%d%H%M')}"
+
+
+async def claim(trigger_id: str, delivery_id: Optional[str]) -> bool:
+    """Record ``delivery_id`` and return whether it has not been seen before.
+
+    Deliveries without an id are always new. If Redis is unavailable the
+    delivery is processed rather than dropped.
+    """
+    if not delivery_id:
+        return True
+    try:
+        redis = await rc.get_client()
+        return bool(await redis.set(_key(trigger_id, f"seen:{delivery_id}"), "1", ex=DELIVERY_TTL, nx=True))
+    except Exception as e:
+        logger.warning(f"Failed to check delivery {delivery_id} of trigger {trigger_id}: {e}")
+        return True
+
+
+async def release(trigger_id: str, delivery_id: Optional[str]) -> None:
+    if not delivery_id:
+        return
+    try:
+        redis = await rc.get_client()
+        await redis.delete(_key(trigger_id, f"seen:{delivery_id}"))
+    except Exception as e:
+        logger.warning(f"Failed to release delivery {delivery_id} of trigger {trigger_id}: {e}")
+
+
+async def add_to_batch(trigger_id: str, event: Dict[str, Any], debounce_seconds: float) -> bool:
+    """Add ``event`` to the trigger's open batch; True if it opened the batch."""
+    redis = await rc.get_client()
+    count = await redis.eval(
+        _ADD_SCRIPT, 2, _key(trigger_id, "batch"), _key(trigger_id, "batch_count"),
+        fastjson.dumps(event), MAX_BATCH_EVENTS, int(debounce_seconds) + BATCH_GRACE_SECONDS,
+    )
+    return int(count) == 1
+
+
+async def take_batch(trigger_id: str) -> Tuple[int, List[Dict[str, Any]]]:
+    """Close the trigger's batch and return how many events it received and the ones it kept."""
+    redis = await rc.get_client()
+    count, events = await redis.eval(_TAKE_SCRIPT, 2, _key(trigger_id, "batch"), _key(trigger_id, "batch_count"))
+    return int(count), [fastjson.loads(event) for event in events]
+
+
+@asynccontextmanager
+async def session_lock(trigger_id: str, timeout: float = SESSION_LOCK_SECONDS):
+    redis = await rc.get_client()
+    key = _key(trigger_id, "session_lock")
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+    while not await redis.set(key, token, ex=int(timeout), nx=True):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for the session of trigger {trigger_id}")
+        await asyncio.sleep(0.2)
+    try:
+        yield
+    finally:
+        await redis.eval(_UNLOCK_SCRIPT, 1, key, token)
@@ -0,0 +1,204 @@
+"""
+In-process scheduler for cron triggers.
+
+Scheduled triggers used to be Supabase Cron jobs that POSTed to the trigger
+webhook on every tick. Instead, every worker runs ``TriggerScheduler.run`` and
+the one holding ``trigger_scheduler:leader`` schedules all of them:
+
+- Leadership is a Redis key the leader renews every ``LEADER_TTL / 3``
+  seconds. If the leader dies, another worker takes over within
+  ``LEADER_TTL`` and reloads the schedule.
+- The leader loads the active schedule triggers every ``RELOAD_INTERVAL``
+  seconds, or as soon as ``notify_changed`` is called, and keeps their next
+  fire times in a min-heap. Cron expressions are evaluated in the trigger's
+  own timezone.
+- Due triggers are taken from the heap in batches of ``BATCH_SIZE`` and sent
+  to Dramatiq with delays spread over up to ``MAX_JITTER`` seconds, so
+  triggers sharing a cron expression do not all start in the same instant.
+  Fires missed while no leader was running are coalesced into one.
+- A trigger whose previous run is still active is skipped for that fire.
+  ``record_run`` notes the run each fire started; until then the fire counts
+  as running for ``DISPATCH_GRACE`` seconds.
+
+The clock and sleep function are injectable so tests can drive the scheduler
+through time without waiting for it.
+"""
+
+import asyncio
+import heapq
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import croniter
+import pytz
+
+from core.services import redis_client as rc
+from core.utils import run_slots
+from core.utils.logger import logger
+
+ENABLED = os.getenv("TRIGGER_SCHEDULER", "backend") == "backend"
+
+PREFIX = "trigger_scheduler"
+LEADER_TTL = 30
+RELOAD_INTERVAL = 60
+BATCH_SIZE = 50
+MAX_JITTER = float(os.getenv("TRIGGER_SCHEDULER_MAX_JITTER", "10"))
+# Jitter given to each trigger of a batch, up to MAX_JITTER for the whole batch
+JITTER_PER_TRIGGER = 0.2
+# How long a dispatched fire counts as running before its run is recorded
+DISPATCH_GRACE = 300
+
+# KEYS: leader key. ARGV: token, ttl
+_ELECT_SCRIPT = """
+local leader = redis.call('GET', KEYS[1])
+if leader and leader ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+@dataclass(frozen=True)
+class ScheduledTrigger:
+    trigger_id: str
+    cron_expression: str
+    timezone: str = 'UTC'
+
+
+def next_fire_time(trigger: ScheduledTrigger, after: float) -> float:
+    """First fire time of ``trigger`` strictly after the timestamp ``after``."""
+    tz = pytz.timezone(trigger.timezone or 'UTC')
+    cron = croniter.croniter(trigger.cron_expression, datetime.fromtimestamp(after, tz))
+    return cron.get_next(datetime).timestamp()
+
+
+def _active_key(trigger_id: str) -> str:
+    return f"{PREFIX}:active:{trigger_id}"
+
+
+async def notify_changed() -> None:
+    """Make the leader reload the schedule on its next tick."""
+    redis = await rc.get_client()
+    await redis.set(f"{PREFIX}:changed", "1", ex=RELOAD_INTERVAL)
+
+
+async def record_run(trigger_id: str, agent_run_id: Optional[str]) -> None:
+    """Note the run a fire started, or that it started none."""
+    redis = await rc.get_client()
+    if agent_run_id:
+        await redis.set(_active_key(trigger_id), agent_run_id, ex=run_slots.RUN_LEASE_SECONDS)
+    else:
+        await redis.delete(_active_key(trigger_id))
+
+
+class TriggerScheduler:
+    def __init__(
+        self,
+        load_triggers: Callable[[], Awaitable[List[ScheduledTrigger]]],
+        dispatch: Callable[[str, float, float], Awaitable[None]],
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        """``dispatch(trigger_id, fire_time, delay)`` sends one fire to the queue."""
+        self._load_triggers = load_triggers
+        self._dispatch = dispatch
+        self._clock = clock
+        self._sleep = sleep
+        self._token = uuid.uuid4().hex
+        self._triggers: Dict[str, ScheduledTrigger] = {}
+        # Heap entries are (fire time, trigger_id); an entry is stale unless it
+        # matches _next_fire, which saves removing entries from the heap
+        self._heap: List[Tuple[float, str]] = []
+        self._next_fire: Dict[str, float] = {}
+        self._loaded_at: Optional[float] = None
+
+    async def elect(self) -> bool:
+        """Become or stay the leader; False if another worker is."""
+        redis = await rc.get_client()
+        if await redis.eval(_ELECT_SCRIPT, 1, f"{PREFIX}:leader", self._token, LEADER_TTL):
+            return True
+        self._reset()
+        return False
+
+    async def reload(self) -> None:
+        triggers = {t.trigger_id: t for t in await self._load_triggers()}
+        now = self._clock()
+        for trigger_id, trigger in triggers.items():
+            if self._triggers.get(trigger_id) == trigger:
+                continue
+            try:
+                fire_at = next_fire_time(trigger, now)
+            except Exception as e:
+                logger.warning(f"Skipping trigger {trigger_id} with invalid schedule {trigger.cron_expression!r}: {e}")
+                continue
+            self._next_fire[trigger_id] = fire_at
+            heapq.heappush(self._heap, (fire_at, trigger_id))
+        for trigger_id in set(self._next_fire) - set(triggers):
+            del self._next_fire[trigger_id]
+        self._triggers = triggers
+        self._loaded_at = now
+
+    async def tick(self) -> float:
+        """Dispatch the triggers that are due and return the seconds until the next one."""
+        now = self._clock()
+        due: List[Tuple[str, float]] = []
+        while self._heap and self._heap[0][0] <= now and len(due) < BATCH_SIZE:
+            fire_at, trigger_id = heapq.heappop(self._heap)
+            if self._next_fire.get(trigger_id) != fire_at:
+                continue
+            next_fire = next_fire_time(self._triggers[trigger_id], max(fire_at, now))
+            self._next_fire[trigger_id] = next_fire
+            heapq.heappush(self._heap, (next_fire, trigger_id))
+            due.append((trigger_id, fire_at))
+
+        if due:
+            await self._dispatch_due(due)
+        while self._heap and self._next_fire.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return RELOAD_INTERVAL
+        return max(0, self._heap[0][0] - now)
+
+    async def run(self) -> None:
+        while True:
+            wait = LEADER_TTL / 3
+            try:
+                if await self.elect():
+                    redis = await rc.get_client()
+                    changed = await redis.delete(f"{PREFIX}:changed")
+                    if changed or self._loaded_at is None or self._clock() - self._loaded_at >= RELOAD_INTERVAL:
+                        await self.reload()
+                    wait = min(wait, await self.tick())
+            except Exception as e:
+                logger.warning(f"Trigger scheduler tick failed: {e}")
+            await self._sleep(wait)
+
+    async def _dispatch_due(self, due: List[Tuple[str, float]]) -> None:
+        redis = await rc.get_client()
+        pipe = redis.pipeline(transaction=False)
+        for trigger_id, _ in due:
+            pipe.get(_active_key(trigger_id))
+        previous = await pipe.execute()
+
+        ready = []
+        for (trigger_id, fire_at), active in zip(due, previous):
+            if active and (active == "dispatched" or await run_slots.is_running(active)):
+                logger.info(f"Skipping fire of trigger {trigger_id} at {fire_at}: its previous run is still active")
+                continue
+            ready.append((trigger_id, fire_at))
+
+        window = min(MAX_JITTER, JITTER_PER_TRIGGER * len(ready))
+        for i, (trigger_id, fire_at) in enumerate(ready):
+            await redis.set(_active_key(trigger_id), "dispatched", ex=int(MAX_JITTER) + DISPATCH_GRACE)
+            await self._dispatch(trigger_id, fire_at, window * i / len(ready))
+
+    def _reset(self) -> None:
+        self._triggers = {}
+        self._heap = []
+        self._next_fire = {}
+        self._loaded_at = None
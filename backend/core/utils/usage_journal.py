@@ -0,0 +1,174 @@
+"""
+Redis journal of LLM usage waiting to be charged.
+
+Charging every LLM call as it happens costs a database transaction per call.
+Instead, each call's cost is added to a per-thread journal and charged in one
+deduction per flush:
+
+- ``record`` adds a call to ``usage_journal:{thread_id}`` in one Redis call.
+  Costs are kept as integer nanodollars, so nothing is rounded until the
+  flush hands the total to the ledger.
+- ``flush`` runs when the run finishes, and during a run whenever
+  ``FLUSH_INTERVAL`` seconds have passed since the thread's last flush.
+- A flush first moves the pending totals aside under a new ``flush_id`` and
+  only clears them once the deduction succeeded. The flush_id is the
+  deduction's reference, so a flush that is retried after a crash, or run by
+  two workers at once, is charged once.
+- Journals whose worker died before flushing are picked up by ``recover``
+  once nothing has been recorded for ``STALE_SECONDS``.
+
+The deduction itself is passed in as ``deduct(account_id, amount, flush_id,
+usage)``, returning whether it was applied, so the journal has no dependency
+on the billing package.
+"""
+
+import os
+import time
+import uuid
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, Optional
+
+from core.services import redis_client as rc
+from core.utils.logger import logger
+
+PREFIX = "usage_journal"
+FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "30"))
+STALE_SECONDS = 10 * 60
+# Kept well past STALE_SECONDS so a journal is never lost before recover sees it
+JOURNAL_TTL = 7 * 24 * 3600
+NANOS = 10 ** 9
+
+Deduct = Callable[[str, Decimal, str, Dict[str, int]], Awaitable[bool]]
+
+# KEYS: journal, index. ARGV: thread_id, account_id, nanos, prompt tokens, completion tokens, now, ttl
+_RECORD_SCRIPT = """
+redis.call('HSET', KEYS[1], 'account_id', ARGV[2])
+redis.call('HINCRBY', KEYS[1], 'nanos', ARGV[3])
+redis.call('HINCRBY', KEYS[1], 'prompt_tokens', ARGV[4])
+redis.call('HINCRBY', KEYS[1], 'completion_tokens', ARGV[5])
+redis.call('HINCRBY', KEYS[1], 'calls', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+redis.call('ZADD', KEYS[2], ARGV[6], ARGV[1])
+return 1
+"""
+
+# KEYS: journal, index. ARGV: thread_id, new flush_id
+# Returns the flush in progress, starting one from the pending totals if there
+# is none, or nil when there is nothing to charge.
+_BEGIN_FLUSH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return nil
+end
+if not redis.call('HGET', KEYS[1], 'flush_id') then
+    local calls = tonumber(redis.call('HGET', KEYS[1], 'calls') or '0')
+    if calls == 0 then
+        return nil
+    end
+    for _, field in ipairs({'nanos', 'prompt_tokens', 'completion_tokens', 'calls'}) do
+        redis.call('HSET', KEYS[1], 'flush_' .. field, redis.call('HGET', KEYS[1], field) or '0')
+        redis.call('HDEL', KEYS[1], field)
+    end
+    redis.call('HSET', KEYS[1], 'flush_id', ARGV[2])
+end
+return redis.call('HMGET', KEYS[1], 'flush_id', 'account_id', 'flush_nanos',
+    'flush_prompt_tokens', 'flush_completion_tokens', 'flush_calls')
+"""
+
+# KEYS: journal, index. ARGV: thread_id, flush_id
+_END_FLUSH_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'flush_id') ~= ARGV[2] then
+    return 0
+end
+redis.call('HDEL', KEYS[1], 'flush_id', 'flush_nanos', 'flush_prompt_tokens',
+    'flush_completion_tokens', 'flush_calls')
+if tonumber(redis.call('HGET', KEYS[1], 'calls') or '0') == 0 then
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+end
+return 1
+"""
+
+# Time of each thread's last flush in this process, so a long run is charged
+# every FLUSH_INTERVAL rather than only when it finishes
+_last_flush: Dict[str, float] = {}
+
+
+def _journal_key(thread_id: str) -> str:
+    return f"{PREFIX}:{thread_id}"
+
+
+def _index_key() -> str:
+    return f"{PREFIX}:threads"
+
+
+def to_nanos(amount: Decimal) -> int:
+    return int((Decimal(str(amount)) * NANOS).to_integral_value())
+
+
+async def record(
+    thread_id: str,
+    account_id: str,
+    cost: Decimal,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+) -> bool:
+    """Add one call's usage to the thread's journal; True when the thread is due a flush."""
+    redis = await rc.get_client()
+    now = time.time()
+    await redis.eval(
+        _RECORD_SCRIPT, 2, _journal_key(thread_id), _index_key(),
+        thread_id, account_id, to_nanos(cost), int(prompt_tokens), int(completion_tokens),
+        int(now), JOURNAL_TTL,
+    )
+    last = _last_flush.setdefault(thread_id, now)
+    return now - last >= FLUSH_INTERVAL
+
+
+async def flush(thread_id: str, deduct: Deduct) -> Optional[Decimal]:
+    """Charge the thread's pending usage; the amount charged, or None if nothing was."""
+    _last_flush[thread_id] = time.time()
+    redis = await rc.get_client()
+    keys = (_journal_key(thread_id), _index_key())
+    pending = await redis.eval(_BEGIN_FLUSH_SCRIPT, 2, *keys, thread_id, str(uuid.uuid4()))
+    if not pending:
+        return None
+
+    flush_id, account_id, nanos, prompt_tokens, completion_tokens, calls = pending
+    amount = Decimal(int(nanos)) / NANOS
+    usage = {
+        'prompt_tokens': int(prompt_tokens),
+        'completion_tokens': int(completion_tokens),
+        'calls': int(calls),
+    }
+    # Left in the journal on failure; the next flush retries it under the same flush_id
+    if not await deduct(account_id, amount, flush_id, usage):
+        logger.warning(f"Usage flush {flush_id} for thread {thread_id} was not applied, will retry")
+        return None
+
+    await redis.eval(_END_FLUSH_SCRIPT, 2, *keys, thread_id, flush_id)
+    return amount
+
+
+async def finish(thread_id: str, deduct: Deduct) -> Optional[Decimal]:
+    """Flush the thread's usage at the end of a run."""
+    try:
+        return await flush(thread_id, deduct)
+    finally:
+        _last_flush.pop(thread_id, None)
+
+
+async def recover(deduct: Deduct) -> int:
+    """Flush journals nothing has been recorded to for STALE_SECONDS; returns how many were charged."""
+    redis = await rc.get_client()
+    stale = await redis.zrangebyscore(_index_key(), "-inf", time.time() - STALE_SECONDS)
+    flushed = 0
+    for thread_id in stale:
+        try:
+            if await flush(thread_id, deduct) is not None:
+                flushed += 1
+        except Exception as e:
+            logger.warning(f"Failed to recover usage journal for thread {thread_id}: {e}")
+        finally:
+            _last_flush.pop(thread_id, None)
+    return flushed
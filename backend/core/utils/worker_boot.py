@@ -0,0 +1,45 @@
+"""
+Start a worker's background tasks as soon as it boots.
+
+Dramatiq only runs a worker's code when a message arrives, so tasks started
+from an actor, such as the stale-run sweeper and the trigger scheduler, did not
+run on a worker that had not received one yet. After a deploy, cron triggers
+stopped until some message happened to come in.
+
+``StartOnBoot`` runs a coroutine on the worker's event loop from the
+``after_worker_boot`` hook. It needs the ``AsyncIO`` middleware, which starts
+that loop, and retries every ``RETRY_INTERVAL`` seconds until the coroutine
+succeeds, so a database or Redis outage at boot only delays it.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from dramatiq import Middleware
+from dramatiq.asyncio import get_event_loop_thread
+
+from core.utils.logger import logger
+
+RETRY_INTERVAL = 5
+
+
+class StartOnBoot(Middleware):
+    def __init__(self, start: Callable[[], Awaitable[None]]):
+        self._start = start
+        self.future: Optional["asyncio.Future[None]"] = None
+
+    def after_worker_boot(self, broker, worker):
+        event_loop_thread = get_event_loop_thread()
+        if event_loop_thread is None:
+            logger.warning("StartOnBoot needs the AsyncIO middleware; background tasks start with the first message")
+            return
+        self.future = asyncio.run_coroutine_threadsafe(self._run(), event_loop_thread.loop)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._start()
+                return
+            except Exception as e:
+                logger.warning(f"Failed to start worker background tasks, retrying in {RETRY_INTERVAL}s: {e}")
+                await asyncio.sleep(RETRY_INTERVAL)
@@ -9,6 +9,7 @@ import sentry
 import asyncio
 import json
 import traceback
+from contextlib import aclosing
 from datetime import datetime, timezone
 from typing import Optional
 from core.services import redis_client as rc
@@ -22,7 +23,11 @@ from dramatiq.brokers.redis import RedisBroker
 from dramatiq.middleware import AsyncIO
 import os
 from core.services.langfuse import langfuse
+from core.settings import settings
 from core.utils.retry import retry
+from core.utils import fastjson
+from core.utils import run_slots, active_runs, run_checkpoints, run_lanes, agent_config_store, trigger_scheduler
+from core.utils.worker_boot import StartOnBoot
 
 import sentry_sdk
 from typing import Dict, Any
@@ -35,6 +40,8 @@ broker = RedisBroker(client=_sync_client)
 middleware = []
 # Use AsyncIO middleware only if you have async actors; it's fine to keep.
 middleware.append(AsyncIO())
+# Starts the stale-run sweeper and trigger scheduler without waiting for a message
+middleware.append(StartOnBoot(lambda: initialize()))
 for m in middleware:
     broker.add_middleware(m)
 
@@ -45,10 +52,45 @@ _initialized = False
 db = DBConnection()
 instance_id = "single"
 _ASYNC_REDIS = None
+_stale_run_sweeper: Optional[asyncio.Task] = None
+_scheduler_task: Optional[asyncio.Task] = None
+
+async def _sweep_stale_runs():
+    """Enqueue runs whose worker stopped renewing its lease so another worker resumes them,
+    and wake lanes whose runs are waiting without a worker on the way."""
+    while True:
+        await asyncio.sleep(run_checkpoints.SWEEP_INTERVAL)
+        try:
+            await run_checkpoints.sweep_stale_runs(lambda run: run_agent_background.send(**run))
+        except Exception as e:
+            logger.warning(f"Failed to sweep stale agent runs: {e}")
+        try:
+            for lane, count in (await run_lanes.lanes_needing_workers()).items():
+                for _ in range(count):
+                    _LANE_ACTORS[lane].send()
+        except Exception as e:
+            logger.warning(f"Failed to wake run lanes: {e}")
+        if settings.BILLING_ENABLED:
+            try:
+                from billing.billing_integration import billing_integration
+                await billing_integration.recover_usage()
+            except Exception as e:
+                logger.warning(f"Failed to recover usage journals: {e}")
+
+async def _load_scheduled_triggers():
+    from core.triggers.trigger_service import get_trigger_service
+    triggers = await get_trigger_service(db).get_active_schedule_triggers()
+    return [
+        trigger_scheduler.ScheduledTrigger(t.trigger_id, t.config['cron_expression'], t.config.get('timezone') or 'UTC')
+        for t in triggers if t.config.get('cron_expression')
+    ]
+
+async def _dispatch_scheduled_trigger(trigger_id: str, fire_time: float, delay: float):
+    run_scheduled_trigger.send_with_options(args=(trigger_id, fire_time), delay=int(delay * 1000))
 
 async def initialize():
     """Initialize the agent API with resources from the main API."""
-    global db, instance_id, _initialized, _ASYNC_REDIS
+    global db, instance_id, _initialized, _ASYNC_REDIS, _stale_run_sweeper, _scheduler_task
 
     if not instance_id:
         instance_id = str(uuid.uuid4())[:8]
@@ -59,6 +101,13 @@ async def initialize():
     
     await db.initialize()
 
+    if _stale_run_sweeper is None:
+        _stale_run_sweeper = asyncio.create_task(_sweep_stale_runs())
+
+    if trigger_scheduler.ENABLED and _scheduler_task is None:
+        scheduler = trigger_scheduler.TriggerScheduler(_load_scheduled_triggers, _dispatch_scheduled_trigger)
+        _scheduler_task = asyncio.create_task(scheduler.run())
+
     _initialized = True
     logger.debug(f"Initialized agent API with instance ID: {instance_id}")
 
@@ -80,8 +129,7 @@ async def test_worker_task(key: str):
         await _ASYNC_REDIS.set(key, "processed", ex=rc.REDIS_KEY_TTL)
         logger.info(f"Test worker task processed key: {key}")
 
-@dramatiq.actor
-async def run_agent_background(
+async def _run_agent(
     agent_run_id: str,
     thread_id: str,
     instance_id: str,
@@ -93,8 +141,14 @@ async def run_agent_background(
     enable_context_manager: bool = False,
     agent_config: Optional[Dict[str, Any]] = None,
     request_id: Optional[str] = None,
+    agent_config_ref: Optional[Dict[str, Any]] = None,
 ):
-    """Run the agent in the background using Redis for state."""
+    """Run the agent in the background using Redis for state.
+
+    The agent configuration normally arrives as ``agent_config_ref`` (see
+    ``core.utils.agent_config_store``); ``agent_config`` is still accepted
+    for messages queued before that.
+    """
     structlog.contextvars.clear_contextvars()
     
     try:
@@ -113,22 +167,36 @@ async def run_agent_background(
         response_channel = f"agent_responses:{agent_run_id}"
         global_control_channel = f"agent_control:{agent_run_id}"
         
-        # Try to acquire lock
-        lock_acquired = await redis.set(run_lock_key, instance_id, nx=True, ex=rc.REDIS_KEY_TTL)
-        
-        if not lock_acquired:
+        # Try to acquire the run's lease (the lock key, kept alive by a heartbeat)
+        lease = run_checkpoints.RunLease(agent_run_id, instance_id)
+        if not await lease.acquire():
             existing_instance = await redis.get(run_lock_key)
             logger.warning(f"Agent run {agent_run_id} is already being processed by instance {existing_instance}")
             return
-        
-        # Double-check lock acquisition
-        if not lock_acquired:
-            lock_acquired = await redis.set(run_lock_key, instance_id, nx=True, ex=rc.REDIS_KEY_TTL)
-            if not lock_acquired:
-                logger.warning(f"Failed to acquire lock for agent run {agent_run_id}")
+
+        checkpoint = await run_checkpoints.load(agent_run_id)
+        if checkpoint and checkpoint.get('finished'):
+            logger.info(f"Agent run {agent_run_id} already finished, ignoring redelivered message")
+            await lease.release()
+            return
+        if checkpoint:
+            checkpoint['resume_count'] = checkpoint.get('resume_count', 0) + 1
+            if not await _can_resume(agent_run_id, checkpoint):
+                await run_checkpoints.finish(agent_run_id)
+                await lease.release()
                 return
-        
-        logger.info(f"Starting agent run {agent_run_id} with instance {instance_id}")
+            logger.info(f"Resuming agent run {agent_run_id} from iteration {checkpoint['iteration_count']} "
+                        f"(resume {checkpoint['resume_count']}/{run_checkpoints.MAX_RESUMES})")
+        else:
+            checkpoint = run_checkpoints.new_checkpoint(dict(
+                agent_run_id=agent_run_id, thread_id=thread_id, instance_id=instance_id, project_id=project_id,
+                model_name=model_name, enable_thinking=enable_thinking, reasoning_effort=reasoning_effort,
+                stream=stream, enable_context_manager=enable_context_manager, agent_config=agent_config,
+                request_id=request_id, agent_config_ref=agent_config_ref,
+            ))
+            logger.info(f"Starting agent run {agent_run_id} with instance {instance_id}")
+        await run_checkpoints.save(agent_run_id, checkpoint)
+        lease.start_heartbeat()
         
         # Set instance as active
         try:
@@ -145,14 +213,30 @@ async def run_agent_background(
         
         # Run the agent
         try:
+            if agent_config_ref:
+                agent_config = await agent_config_store.resolve(agent_config_ref)
+
             # Create thread manager
             thread_manager = ThreadManager()
             
             # Run the agent and collect responses
             responses = []
             pending_redis_operations = []
+            last_lease_renewal = asyncio.get_event_loop().time()
+
+            async def publish_progress(event: Dict[str, Any]):
+                # Transient tool progress: streamed to clients, not counted as a response
+                await redis.rpush(response_list_key, fastjson.dumps(event))
+                await rc.publish_to_channel(response_channel, "new")
+
+            async def save_checkpoint(state: Dict[str, Any]):
+                if lease.lost:
+                    return
+                checkpoint.update(state)
+                await run_checkpoints.save(agent_run_id, checkpoint)
             
-            async for response in run_agent(
+            # aclosing ends the run, and its run-end hooks, as soon as the loop exits
+            async with aclosing(run_agent(
                 thread_id=thread_id,
                 project_id=project_id,
                 stream=stream,
@@ -161,18 +245,37 @@ async def run_agent_background(
                 reasoning_effort=reasoning_effort,
                 enable_context_manager=enable_context_manager,
                 agent_config=agent_config,
-            ):
-                responses.append(response)
-                response_json = json.dumps(response)
+                progress_callback=publish_progress,
+                checkpoint_callback=save_checkpoint,
+                resume_state=checkpoint if checkpoint['resume_count'] else None,
+            )) as agent_gen:
+                async for response in agent_gen:
+                    if lease.lost:
+                        # Another worker has taken the run over; stop before causing more side effects
+                        break
+                    responses.append(response)
+                    response_json = fastjson.dumps(response)
                 
-                # Store response in Redis list and publish notification
-                pending_redis_operations.append(asyncio.create_task(redis.rpush(response_list_key, response_json)))
-                # Use dedicated publisher for immediate streaming
-                pending_redis_operations.append(asyncio.create_task(rc.publish_to_channel(response_channel, "new")))
+                    # Store response in Redis list and publish notification
+                    pending_redis_operations.append(asyncio.create_task(redis.rpush(response_list_key, response_json)))
+                    # Use dedicated publisher for immediate streaming
+                    pending_redis_operations.append(asyncio.create_task(rc.publish_to_channel(response_channel, "new")))
+
+                    now = asyncio.get_event_loop().time()
+                    if now - last_lease_renewal >= run_slots.LEASE_RENEW_INTERVAL:
+                        last_lease_renewal = now
+                        pending_redis_operations.append(asyncio.create_task(run_slots.renew(agent_run_id)))
+                        pending_redis_operations.append(asyncio.create_task(active_runs.refresh(instance_id, agent_run_id)))
             
             # Wait for all Redis operations to complete
             if pending_redis_operations:
                 await asyncio.gather(*pending_redis_operations, return_exceptions=True)
+
+            if lease.lost:
+                logger.warning(f"Agent run {agent_run_id} lost its lease, leaving it to the worker that took it over")
+                return
+
+            await run_checkpoints.finish(agent_run_id)
             
             # Send completion message
             completion_message = {
@@ -230,11 +333,21 @@ async def run_agent_background(
             except Exception as e:
                 logger.warning(f"Error closing pubsub: {e}")
             
-            # Clean up Redis keys
-            try:
-                await redis.delete(run_lock_key)
-            except Exception as e:
-                logger.warning(f"Error deleting run lock key: {e}")
+            # Clean up Redis keys. The checkpoint is kept after an error so a
+            # retry resumes the run rather than starting it over
+            await lease.release()
+            if not lease.lost:
+                # After losing the lease these belong to the worker that took the run over
+                await run_slots.release(agent_run_id)
+                await active_runs.unregister(instance_id, agent_run_id)
+
+            if settings.BILLING_ENABLED:
+                try:
+                    from billing.billing_integration import billing_integration
+                    await billing_integration.flush_usage(thread_id)
+                except Exception as e:
+                    # Left in the usage journal for the sweeper to charge
+                    logger.warning(f"Failed to flush usage for thread {thread_id}: {e}")
             
             # Set response list to expire
             REDIS_RESPONSE_LIST_TTL = 3600 * 24  # 24 hours
@@ -248,6 +361,103 @@ async def run_agent_background(
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise e
 
+# Runs resumed after losing their worker are sent here directly rather than
+# through a lane; see core.utils.run_checkpoints
+run_agent_background = dramatiq.actor(_run_agent, actor_name="run_agent_background")
+
+async def enqueue_run(lane: str, account_id: str, defer: float = 0, **run):
+    """Queue a run on a priority lane; ``run`` holds the ``run_agent_background`` arguments.
+
+    ``defer`` is the delay returned by ``run_lanes.admit``.
+    """
+    await run_lanes.push(lane, account_id, run, defer=defer)
+    _LANE_ACTORS[lane].send_with_options(delay=int(defer * 1000))
+
+async def _renew_lane_slot(lane: str, agent_run_id: str):
+    while True:
+        await asyncio.sleep(run_lanes.SLOT_RENEW_INTERVAL)
+        await run_lanes.renew(lane, agent_run_id)
+
+async def _run_next_in_lane(lane: str):
+    """Start the fairest waiting run of the lane, if a lane slot is free."""
+    structlog.contextvars.clear_contextvars()
+    await initialize()
+    run = await run_lanes.pop(lane)
+    if not run:
+        return
+    renewal = asyncio.create_task(_renew_lane_slot(lane, run['agent_run_id']))
+    try:
+        await _run_agent(**run)
+    finally:
+        renewal.cancel()
+        if await run_lanes.release(lane, run['agent_run_id']):
+            _LANE_ACTORS[lane].send()
+
+# A message on a lane is a token for "the next run", so it is never retried: a
+# retry would start some other run. Priority orders the lanes within a worker
+# that consumes several of them.
+@dramatiq.actor(queue_name="agent_runs_interactive", priority=0, max_retries=0)
+async def run_interactive_lane():
+    await _run_next_in_lane(run_lanes.INTERACTIVE)
+
+@dramatiq.actor(queue_name="agent_runs_trigger", priority=10, max_retries=0)
+async def run_trigger_lane():
+    await _run_next_in_lane(run_lanes.TRIGGER)
+
+@dramatiq.actor(queue_name="agent_runs_batch", priority=20, max_retries=0)
+async def run_batch_lane():
+    await _run_next_in_lane(run_lanes.BATCH)
+
+_LANE_ACTORS = {
+    run_lanes.INTERACTIVE: run_interactive_lane,
+    run_lanes.TRIGGER: run_trigger_lane,
+    run_lanes.BATCH: run_batch_lane,
+}
+
+@dramatiq.actor(max_retries=0)
+async def run_scheduled_trigger(trigger_id: str, fire_time: float):
+    """Start one fire of a cron trigger, sent by the trigger scheduler."""
+    structlog.contextvars.clear_contextvars()
+    structlog.contextvars.bind_contextvars(trigger_id=trigger_id)
+    await initialize()
+    from core.triggers.execution_service import get_execution_service
+    result = {}
+    try:
+        result = await get_execution_service(db).execute_scheduled(
+            trigger_id, datetime.fromtimestamp(fire_time, timezone.utc)
+        )
+        logger.debug(f"Scheduled fire of trigger {trigger_id}: {result}")
+    finally:
+        await trigger_scheduler.record_run(trigger_id, result.get('agent_run_id'))
+
+# Sent with a delay by the first event of a debounced trigger's window. The
+# batch is taken before it runs, so a retry would find it empty.
+@dramatiq.actor(max_retries=0)
+async def flush_trigger_batch(trigger_id: str):
+    structlog.contextvars.clear_contextvars()
+    structlog.contextvars.bind_contextvars(trigger_id=trigger_id)
+    await initialize()
+    from core.triggers.execution_service import get_execution_service
+    result = await get_execution_service(db).execute_batch(trigger_id)
+    logger.debug(f"Flushed event batch of trigger {trigger_id}: {result}")
+
+async def _can_resume(agent_run_id: str, checkpoint: Dict[str, Any]) -> bool:
+    """Whether a run picked up again after losing its worker should continue."""
+    # Imported here because core.agent_runs imports this module
+    from core.agent_runs import update_agent_run_status as set_run_status
+
+    client = await db.client
+    result = await client.table('agent_runs').select('status').eq('id', agent_run_id).execute()
+    status = result.data[0]['status'] if result.data else None
+    if status != 'running':
+        logger.info(f"Not resuming agent run {agent_run_id}, its status is {status}")
+        return False
+    if checkpoint['resume_count'] > run_checkpoints.MAX_RESUMES:
+        logger.error(f"Agent run {agent_run_id} lost its worker {checkpoint['resume_count']} times, marking it failed")
+        await set_run_status(client, agent_run_id, 'failed', error_message="Worker lost too many times")
+        return False
+    return True
+
 def update_agent_run_status(agent_run_id: str, status: str, error_message: Optional[str] = None):
     """Update the status of an agent run."""
     try:
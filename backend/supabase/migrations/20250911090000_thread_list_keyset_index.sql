@@ -0,0 +1,5 @@
+-- Supports keyset pagination of GET /threads on (created_at, thread_id) per account.
+CREATE INDEX IF NOT EXISTS idx_threads_account_created_thread
+    ON public.threads (account_id, created_at DESC, thread_id DESC);
+
+ANALYZE public.threads;
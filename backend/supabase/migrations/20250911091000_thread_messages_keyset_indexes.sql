@@ -0,0 +1,9 @@
+-- Keyset pagination of GET /threads/{thread_id}/messages on (created_at, message_id).
+CREATE INDEX IF NOT EXISTS idx_messages_thread_created_message
+    ON public.messages (thread_id, created_at, message_id);
+
+-- `since` delta polling pages on (updated_at, message_id) within a thread.
+CREATE INDEX IF NOT EXISTS idx_messages_thread_updated_message
+    ON public.messages (thread_id, updated_at, message_id);
+
+ANALYZE public.messages;
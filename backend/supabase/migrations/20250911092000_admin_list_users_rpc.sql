@@ -0,0 +1,136 @@
+BEGIN;
+
+-- Resolve a page of admin user rows (identity, credits, subscription and
+-- activity) in a single query instead of one get_user_email call per row.
+-- Filtering, sorting and pagination all happen here so the admin endpoints
+-- stay flat in latency as the number of accounts grows.
+CREATE OR REPLACE FUNCTION public.admin_list_users(
+    p_email_contains TEXT DEFAULT NULL,
+    p_name_contains TEXT DEFAULT NULL,
+    p_account_ids UUID[] DEFAULT NULL,
+    p_tiers TEXT[] DEFAULT NULL,
+    p_subscription_statuses TEXT[] DEFAULT NULL,
+    p_trial_statuses TEXT[] DEFAULT NULL,
+    p_balance_min NUMERIC DEFAULT NULL,
+    p_balance_max NUMERIC DEFAULT NULL,
+    p_created_after TIMESTAMPTZ DEFAULT NULL,
+    p_created_before TIMESTAMPTZ DEFAULT NULL,
+    p_activity_since TIMESTAMPTZ DEFAULT NULL,
+    p_sort_by TEXT DEFAULT 'created_at',
+    p_sort_order TEXT DEFAULT 'desc',
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    email TEXT,
+    created_at TIMESTAMPTZ,
+    tier TEXT,
+    credit_balance NUMERIC,
+    total_purchased NUMERIC,
+    total_used NUMERIC,
+    subscription_status TEXT,
+    trial_status TEXT,
+    last_activity TIMESTAMPTZ,
+    total_count BIGINT
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH users AS (
+        SELECT
+            a.id,
+            a.name,
+            COALESCE(
+                NULLIF(bc.email, ''),
+                u.email,
+                u.raw_user_meta_data->>'email',
+                u.raw_user_meta_data->>'user_email'
+            ) AS email,
+            a.created_at,
+            COALESCE(ca.tier, 'free')::TEXT AS tier,
+            COALESCE(ca.balance, 0) AS credit_balance,
+            COALESCE(ca.lifetime_purchased, 0) AS total_purchased,
+            COALESCE(ca.lifetime_used, 0) AS total_used,
+            bs.status::TEXT AS subscription_status,
+            ca.trial_status::TEXT AS trial_status,
+            activity.last_activity
+        FROM basejump.accounts a
+        LEFT JOIN auth.users u ON u.id = a.primary_owner_user_id
+        LEFT JOIN public.credit_accounts ca ON ca.account_id = a.id
+        LEFT JOIN LATERAL (
+            SELECT c.email
+            FROM basejump.billing_customers c
+            WHERE c.account_id = a.id
+            ORDER BY (c.email IS NULL OR c.email = ''), c.active DESC NULLS LAST
+            LIMIT 1
+        ) bc ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT s.status
+            FROM basejump.billing_subscriptions s
+            WHERE s.account_id = a.id
+            ORDER BY s.created DESC
+            LIMIT 1
+        ) bs ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT MAX(r.created_at) AS last_activity
+            FROM public.threads t
+            JOIN public.agent_runs r ON r.thread_id = t.thread_id
+            WHERE p_activity_since IS NOT NULL
+              AND t.account_id = a.id
+              AND r.created_at >= p_activity_since
+        ) activity ON TRUE
+        WHERE (p_account_ids IS NULL OR a.id = ANY(p_account_ids))
+          AND (p_name_contains IS NULL OR a.name ILIKE '%' || p_name_contains || '%')
+          AND (p_created_after IS NULL OR a.created_at >= p_created_after)
+          AND (p_created_before IS NULL OR a.created_at <= p_created_before)
+    )
+    SELECT users.*, COUNT(*) OVER () AS total_count
+    FROM users
+    WHERE (p_email_contains IS NULL OR lower(users.email) LIKE '%' || lower(p_email_contains) || '%')
+      AND (p_tiers IS NULL OR users.tier = ANY(p_tiers))
+      AND (p_subscription_statuses IS NULL OR users.subscription_status = ANY(p_subscription_statuses))
+      AND (p_trial_statuses IS NULL OR users.trial_status = ANY(p_trial_statuses))
+      AND (p_balance_min IS NULL OR users.credit_balance >= p_balance_min)
+      AND (p_balance_max IS NULL OR users.credit_balance <= p_balance_max)
+      AND (p_activity_since IS NULL OR users.last_activity IS NOT NULL)
+    ORDER BY
+        CASE WHEN lower(p_sort_order) = 'asc' THEN
+            CASE p_sort_by
+                WHEN 'email' THEN users.email
+                WHEN 'tier' THEN users.tier
+            END
+        END ASC NULLS LAST,
+        CASE WHEN lower(p_sort_order) <> 'asc' THEN
+            CASE p_sort_by
+                WHEN 'email' THEN users.email
+                WHEN 'tier' THEN users.tier
+            END
+        END DESC NULLS LAST,
+        CASE WHEN lower(p_sort_order) = 'asc' AND p_sort_by = 'balance' THEN users.credit_balance END ASC NULLS LAST,
+        CASE WHEN lower(p_sort_order) <> 'asc' AND p_sort_by = 'balance' THEN users.credit_balance END DESC NULLS LAST,
+        CASE WHEN lower(p_sort_order) = 'asc' AND p_sort_by = 'last_activity' THEN users.last_activity END ASC NULLS LAST,
+        CASE WHEN lower(p_sort_order) <> 'asc' AND p_sort_by = 'last_activity' THEN users.last_activity END DESC NULLS LAST,
+        CASE WHEN lower(p_sort_order) = 'asc' THEN users.created_at END ASC,
+        CASE WHEN lower(p_sort_order) <> 'asc' THEN users.created_at END DESC,
+        users.id
+    LIMIT p_limit
+    OFFSET p_offset;
+$$;
+
+REVOKE ALL ON FUNCTION public.admin_list_users(TEXT, TEXT, UUID[], TEXT[], TEXT[], TEXT[], NUMERIC, NUMERIC, TIMESTAMPTZ, TIMESTAMPTZ, TIMESTAMPTZ, TEXT, TEXT, INTEGER, INTEGER) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.admin_list_users(TEXT, TEXT, UUID[], TEXT[], TEXT[], TEXT[], NUMERIC, NUMERIC, TIMESTAMPTZ, TIMESTAMPTZ, TIMESTAMPTZ, TEXT, TEXT, INTEGER, INTEGER) TO service_role;
+
+CREATE INDEX IF NOT EXISTS idx_credit_accounts_balance
+    ON public.credit_accounts (balance);
+
+CREATE INDEX IF NOT EXISTS idx_billing_subscriptions_account_created
+    ON basejump.billing_subscriptions (account_id, created DESC);
+
+ANALYZE public.credit_accounts;
+ANALYZE basejump.billing_subscriptions;
+
+COMMIT;
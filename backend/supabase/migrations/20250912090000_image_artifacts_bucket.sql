@@ -0,0 +1,18 @@
+BEGIN;
+
+-- Compressed images loaded into the model's context by the vision tool,
+-- stored once per project under {project_id}/{content hash}. image_context
+-- messages reference these objects instead of embedding base64 images.
+-- Only the backend (service role) reads and writes this bucket, so no
+-- storage.objects policies are granted.
+INSERT INTO storage.buckets (id, name, public, allowed_mime_types, file_size_limit)
+VALUES (
+    'image-artifacts',
+    'image-artifacts',
+    false,
+    ARRAY['image/jpeg', 'image/png', 'image/gif', 'image/webp']::text[],
+    10485760
+)
+ON CONFLICT (id) DO NOTHING;
+
+COMMIT;
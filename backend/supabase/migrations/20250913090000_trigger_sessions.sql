@@ -0,0 +1,21 @@
+BEGIN;
+
+-- The project (and its sandbox) and the latest thread a trigger runs in when
+-- its execution_policy is 'reuse' or 'rolling'. Triggers with the 'fresh'
+-- policy have no row and get a new project for every firing.
+CREATE TABLE IF NOT EXISTS trigger_sessions (
+    trigger_id UUID PRIMARY KEY REFERENCES agent_triggers(trigger_id) ON DELETE CASCADE,
+    project_id UUID NOT NULL REFERENCES projects(project_id) ON DELETE CASCADE,
+    thread_id UUID REFERENCES threads(thread_id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_trigger_sessions_project_id ON trigger_sessions(project_id);
+
+ALTER TABLE trigger_sessions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role manages trigger sessions" ON trigger_sessions
+    FOR ALL USING (auth.role() = 'service_role');
+
+COMMIT;
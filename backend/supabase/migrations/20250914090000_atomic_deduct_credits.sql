@@ -0,0 +1,122 @@
+BEGIN;
+
+-- Deducts usage from an account in one transaction: the account row is locked,
+-- expiring credits are used before non-expiring ones, and the balance update
+-- and its ledger entry commit together.
+--
+-- p_reference_id makes a deduction idempotent: a second call with the same
+-- reference is answered from the ledger entry of the first, so a usage flush
+-- replayed after a worker crash is charged once.
+--
+-- With p_allow_partial, usage larger than the balance takes the balance to
+-- zero and records the shortfall in the ledger metadata (usage that already
+-- happened cannot be refused). Without it the call fails and changes nothing.
+DROP FUNCTION IF EXISTS deduct_credits(UUID, DECIMAL, TEXT, UUID, TEXT);
+
+CREATE OR REPLACE FUNCTION deduct_credits(
+    p_account_id UUID,
+    p_amount DECIMAL,
+    p_description TEXT DEFAULT NULL,
+    p_reference_id UUID DEFAULT NULL,
+    p_reference_type TEXT DEFAULT NULL,
+    p_metadata JSONB DEFAULT '{}'::jsonb,
+    p_allow_partial BOOLEAN DEFAULT FALSE
+) RETURNS TABLE (
+    success BOOLEAN,
+    duplicate BOOLEAN,
+    amount_deducted DECIMAL,
+    from_expiring DECIMAL,
+    from_non_expiring DECIMAL,
+    new_expiring DECIMAL,
+    new_non_expiring DECIMAL,
+    new_total DECIMAL,
+    transaction_id UUID
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_expiring DECIMAL;
+    v_non_expiring DECIMAL;
+    v_balance DECIMAL;
+    v_amount DECIMAL;
+    v_from_expiring DECIMAL;
+    v_from_non_expiring DECIMAL;
+    v_new_total DECIMAL;
+    v_metadata JSONB := COALESCE(p_metadata, '{}'::jsonb);
+    v_existing credit_ledger%ROWTYPE;
+    v_transaction_id UUID;
+BEGIN
+    SELECT expiring_credits, non_expiring_credits, balance
+    INTO v_expiring, v_non_expiring, v_balance
+    FROM credit_accounts
+    WHERE account_id = p_account_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT FALSE, FALSE, 0::DECIMAL, 0::DECIMAL, 0::DECIMAL,
+            0::DECIMAL, 0::DECIMAL, 0::DECIMAL, NULL::UUID;
+        RETURN;
+    END IF;
+
+    -- Checked under the row lock, so concurrent replays of one reference serialise here
+    IF p_reference_id IS NOT NULL THEN
+        SELECT * INTO v_existing
+        FROM credit_ledger
+        WHERE account_id = p_account_id
+          AND reference_id = p_reference_id
+          AND reference_type IS NOT DISTINCT FROM p_reference_type
+          AND type = 'usage'
+        LIMIT 1;
+
+        IF FOUND THEN
+            RETURN QUERY SELECT TRUE, TRUE, -v_existing.amount, 0::DECIMAL, 0::DECIMAL,
+                v_expiring, v_non_expiring, v_balance, v_existing.id;
+            RETURN;
+        END IF;
+    END IF;
+
+    v_amount := p_amount;
+    IF v_amount > v_balance THEN
+        IF NOT p_allow_partial THEN
+            RETURN QUERY SELECT FALSE, FALSE, 0::DECIMAL, 0::DECIMAL, 0::DECIMAL,
+                v_expiring, v_non_expiring, v_balance, NULL::UUID;
+            RETURN;
+        END IF;
+        v_metadata := v_metadata || jsonb_build_object('requested', p_amount, 'shortfall', p_amount - v_balance);
+        v_amount := v_balance;
+    END IF;
+
+    v_from_expiring := LEAST(v_expiring, v_amount);
+    v_from_non_expiring := LEAST(v_non_expiring, v_amount - v_from_expiring);
+    v_expiring := v_expiring - v_from_expiring;
+    v_non_expiring := v_non_expiring - v_from_non_expiring;
+    v_new_total := v_balance - v_amount;
+
+    UPDATE credit_accounts
+    SET expiring_credits = v_expiring,
+        non_expiring_credits = v_non_expiring,
+        balance = v_new_total,
+        lifetime_used = lifetime_used + v_amount,
+        updated_at = NOW()
+    WHERE account_id = p_account_id;
+
+    INSERT INTO credit_ledger (
+        account_id, amount, balance_after, type, description,
+        reference_id, reference_type, metadata, is_expiring
+    ) VALUES (
+        p_account_id, -v_amount, v_new_total, 'usage', p_description,
+        p_reference_id, p_reference_type, v_metadata, v_from_expiring > 0
+    ) RETURNING id INTO v_transaction_id;
+
+    RETURN QUERY SELECT TRUE, FALSE, v_amount, v_from_expiring, v_from_non_expiring,
+        v_expiring, v_non_expiring, v_new_total, v_transaction_id;
+END;
+$$;
+
+COMMENT ON FUNCTION deduct_credits IS 'Atomically deducts usage from credit_accounts and appends the matching credit_ledger entry';
+
+REVOKE ALL ON FUNCTION deduct_credits(UUID, DECIMAL, TEXT, UUID, TEXT, JSONB, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION deduct_credits(UUID, DECIMAL, TEXT, UUID, TEXT, JSONB, BOOLEAN) TO service_role;
+
+COMMIT;
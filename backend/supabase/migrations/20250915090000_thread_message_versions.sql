@@ -0,0 +1,52 @@
+BEGIN;
+
+-- A counter per thread that changes whenever one of its messages is inserted,
+-- updated or deleted. GET /threads/{thread_id}/messages derives its ETag from
+-- it, so checking If-None-Match is a primary-key lookup instead of a scan of
+-- the thread's messages.
+CREATE TABLE IF NOT EXISTS thread_message_versions (
+    thread_id UUID PRIMARY KEY REFERENCES threads(thread_id) ON DELETE CASCADE,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+ALTER TABLE thread_message_versions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role manages thread message versions" ON thread_message_versions
+    FOR ALL USING (auth.role() = 'service_role');
+
+CREATE OR REPLACE FUNCTION bump_thread_message_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_thread_id UUID := CASE WHEN TG_OP = 'DELETE' THEN OLD.thread_id ELSE NEW.thread_id END;
+BEGIN
+    -- Messages deleted along with their thread have nothing left to version
+    IF TG_OP = 'DELETE' AND NOT EXISTS (SELECT 1 FROM threads WHERE thread_id = v_thread_id) THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO thread_message_versions (thread_id, version)
+    VALUES (v_thread_id, 1)
+    ON CONFLICT (thread_id) DO UPDATE SET version = thread_message_versions.version + 1;
+
+    -- A message moved to another thread changes both
+    IF TG_OP = 'UPDATE' AND OLD.thread_id IS DISTINCT FROM NEW.thread_id THEN
+        INSERT INTO thread_message_versions (thread_id, version)
+        VALUES (OLD.thread_id, 1)
+        ON CONFLICT (thread_id) DO UPDATE SET version = thread_message_versions.version + 1;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS bump_thread_message_version ON messages;
+CREATE TRIGGER bump_thread_message_version
+    AFTER INSERT OR UPDATE OR DELETE ON messages
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_thread_message_version();
+
+COMMIT;
@@ -0,0 +1,238 @@
+BEGIN;
+
+-- admin_list_users returned COUNT(*) OVER () and sorted with CASE
+-- expressions, which made every page evaluate every account. The page query
+-- now sorts on a plain column with an index behind it and continues from a
+-- (sort value, id) keyset cursor, so it reads only the rows it returns plus
+-- those its filters skip. The total is a separate function whose result the
+-- API caches.
+--
+-- created_at, balance and tier sorts are index-backed. email and
+-- last_activity are computed per account, so sorting on them, and the email
+-- filter, still evaluate every account that passes the other filters.
+DROP FUNCTION IF EXISTS public.admin_list_users(TEXT, TEXT, UUID[], TEXT[], TEXT[], TEXT[], NUMERIC, NUMERIC, TIMESTAMPTZ, TIMESTAMPTZ, TIMESTAMPTZ, TEXT, TEXT, INTEGER, INTEGER);
+
+-- The filtered rows, shared by the page and count functions. It stays a plain
+-- SQL function without SECURITY DEFINER or SET so the planner inlines it and
+-- can drive the page query from an index.
+CREATE OR REPLACE FUNCTION public.admin_user_rows(
+    p_email_contains TEXT DEFAULT NULL,
+    p_name_contains TEXT DEFAULT NULL,
+    p_account_ids UUID[] DEFAULT NULL,
+    p_tiers TEXT[] DEFAULT NULL,
+    p_subscription_statuses TEXT[] DEFAULT NULL,
+    p_trial_statuses TEXT[] DEFAULT NULL,
+    p_balance_min NUMERIC DEFAULT NULL,
+    p_balance_max NUMERIC DEFAULT NULL,
+    p_created_after TIMESTAMPTZ DEFAULT NULL,
+    p_created_before TIMESTAMPTZ DEFAULT NULL,
+    p_activity_since TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    email TEXT,
+    created_at TIMESTAMPTZ,
+    tier TEXT,
+    credit_balance NUMERIC,
+    total_purchased NUMERIC,
+    total_used NUMERIC,
+    subscription_status TEXT,
+    trial_status TEXT,
+    last_activity TIMESTAMPTZ,
+    credit_account_id UUID
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT *
+    FROM (
+        SELECT
+            a.id,
+            a.name,
+            COALESCE(
+                NULLIF(bc.email, ''),
+                u.email,
+                u.raw_user_meta_data->>'email',
+                u.raw_user_meta_data->>'user_email'
+            )::TEXT AS email,
+            a.created_at,
+            COALESCE(ca.tier, 'free')::TEXT AS tier,
+            ca.balance AS credit_balance,
+            ca.lifetime_purchased AS total_purchased,
+            ca.lifetime_used AS total_used,
+            bs.status::TEXT AS subscription_status,
+            ca.trial_status::TEXT AS trial_status,
+            activity.last_activity,
+            -- Equal to id; lets keyset conditions on the balance and tier
+            -- sorts match credit_accounts' (sort key, account_id) indexes
+            ca.account_id AS credit_account_id
+        FROM basejump.accounts a
+        -- Every account gets a credit account when it is created
+        -- (auto_create_free_tier), so this join drops nothing and lets the
+        -- balance and tier sorts start from credit_accounts' indexes.
+        JOIN public.credit_accounts ca ON ca.account_id = a.id
+        LEFT JOIN auth.users u ON u.id = a.primary_owner_user_id
+        LEFT JOIN LATERAL (
+            SELECT c.email
+            FROM basejump.billing_customers c
+            WHERE c.account_id = a.id
+            ORDER BY (c.email IS NULL OR c.email = ''), c.active DESC NULLS LAST
+            LIMIT 1
+        ) bc ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT s.status
+            FROM basejump.billing_subscriptions s
+            WHERE s.account_id = a.id
+            ORDER BY s.created DESC
+            LIMIT 1
+        ) bs ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT MAX(r.created_at) AS last_activity
+            FROM public.threads t
+            JOIN public.agent_runs r ON r.thread_id = t.thread_id
+            WHERE p_activity_since IS NOT NULL
+              AND t.account_id = a.id
+              AND r.created_at >= p_activity_since
+        ) activity ON TRUE
+        WHERE (p_account_ids IS NULL OR a.id = ANY(p_account_ids))
+          AND (p_name_contains IS NULL OR a.name ILIKE '%' || p_name_contains || '%')
+          AND (p_created_after IS NULL OR a.created_at >= p_created_after)
+          AND (p_created_before IS NULL OR a.created_at <= p_created_before)
+          AND (p_tiers IS NULL OR COALESCE(ca.tier, 'free') = ANY(p_tiers))
+          AND (p_trial_statuses IS NULL OR ca.trial_status = ANY(p_trial_statuses))
+          AND (p_balance_min IS NULL OR ca.balance >= p_balance_min)
+          AND (p_balance_max IS NULL OR ca.balance <= p_balance_max)
+    ) users
+    WHERE (p_email_contains IS NULL OR lower(users.email) LIKE '%' || lower(p_email_contains) || '%')
+      AND (p_subscription_statuses IS NULL OR users.subscription_status = ANY(p_subscription_statuses))
+      AND (p_activity_since IS NULL OR users.last_activity IS NOT NULL);
+$$;
+
+CREATE OR REPLACE FUNCTION public.admin_list_users(
+    p_email_contains TEXT DEFAULT NULL,
+    p_name_contains TEXT DEFAULT NULL,
+    p_account_ids UUID[] DEFAULT NULL,
+    p_tiers TEXT[] DEFAULT NULL,
+    p_subscription_statuses TEXT[] DEFAULT NULL,
+    p_trial_statuses TEXT[] DEFAULT NULL,
+    p_balance_min NUMERIC DEFAULT NULL,
+    p_balance_max NUMERIC DEFAULT NULL,
+    p_created_after TIMESTAMPTZ DEFAULT NULL,
+    p_created_before TIMESTAMPTZ DEFAULT NULL,
+    p_activity_since TIMESTAMPTZ DEFAULT NULL,
+    p_sort_by TEXT DEFAULT 'created_at',
+    p_sort_order TEXT DEFAULT 'desc',
+    p_limit INTEGER DEFAULT 20,
+    p_cursor_value TEXT DEFAULT NULL,
+    p_cursor_id UUID DEFAULT NULL,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    email TEXT,
+    created_at TIMESTAMPTZ,
+    tier TEXT,
+    credit_balance NUMERIC,
+    total_purchased NUMERIC,
+    total_used NUMERIC,
+    subscription_status TEXT,
+    trial_status TEXT,
+    last_activity TIMESTAMPTZ,
+    sort_value TEXT
+)
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_sort_key TEXT;
+    v_sort_type TEXT;
+    v_id_key TEXT := 'r.id';
+    v_direction TEXT := CASE WHEN lower(p_sort_order) = 'asc' THEN 'ASC' ELSE 'DESC' END;
+    v_comparison TEXT := CASE WHEN lower(p_sort_order) = 'asc' THEN '>' ELSE '<' END;
+    v_keyset TEXT := 'TRUE';
+BEGIN
+    -- Sort keys are never NULL, so (sort key, id) orders every row and a
+    -- cursor resumes exactly after the last row of the previous page.
+    CASE p_sort_by
+        WHEN 'balance' THEN v_sort_key := 'r.credit_balance'; v_sort_type := 'NUMERIC'; v_id_key := 'r.credit_account_id';
+        WHEN 'tier' THEN v_sort_key := 'r.tier'; v_sort_type := 'TEXT'; v_id_key := 'r.credit_account_id';
+        WHEN 'email' THEN v_sort_key := 'COALESCE(r.email, '''')'; v_sort_type := 'TEXT';
+        WHEN 'last_activity' THEN v_sort_key := 'COALESCE(r.last_activity, ''-infinity'')'; v_sort_type := 'TIMESTAMPTZ';
+        ELSE v_sort_key := 'r.created_at'; v_sort_type := 'TIMESTAMPTZ';
+    END CASE;
+
+    IF p_cursor_id IS NOT NULL THEN
+        -- A row comparison, so an index on (sort key, id) starts right after
+        -- the cursor instead of at the first row with the same sort key
+        v_keyset := format('(%1$s, %2$s) %3$s ($12::%4$s, $13)', v_sort_key, v_id_key, v_comparison, v_sort_type);
+    END IF;
+
+    -- Built per call so each page is planned for its own filters and sort
+    RETURN QUERY EXECUTE format(
+        'SELECT r.id, r.name, r.email, r.created_at, r.tier, r.credit_balance, r.total_purchased,
+                r.total_used, r.subscription_status, r.trial_status, r.last_activity, (%1$s)::TEXT
+         FROM public.admin_user_rows($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11) r
+         WHERE %2$s
+         ORDER BY %1$s %3$s, %4$s %3$s
+         LIMIT $14 OFFSET $15',
+        v_sort_key, v_keyset, v_direction, v_id_key
+    )
+    USING p_email_contains, p_name_contains, p_account_ids, p_tiers, p_subscription_statuses,
+        p_trial_statuses, p_balance_min, p_balance_max, p_created_after, p_created_before,
+        p_activity_since, p_cursor_value, p_cursor_id, p_limit, p_offset;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.admin_count_users(
+    p_email_contains TEXT DEFAULT NULL,
+    p_name_contains TEXT DEFAULT NULL,
+    p_account_ids UUID[] DEFAULT NULL,
+    p_tiers TEXT[] DEFAULT NULL,
+    p_subscription_statuses TEXT[] DEFAULT NULL,
+    p_trial_statuses TEXT[] DEFAULT NULL,
+    p_balance_min NUMERIC DEFAULT NULL,
+    p_balance_max NUMERIC DEFAULT NULL,
+    p_created_after TIMESTAMPTZ DEFAULT NULL,
+    p_created_before TIMESTAMPTZ DEFAULT NULL,
+    p_activity_since TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS BIGINT
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT COUNT(*)
+    FROM public.admin_user_rows(
+        p_email_contains, p_name_contains, p_account_ids, p_tiers, p_subscription_statuses,
+        p_trial_statuses, p_balance_min, p_balance_max, p_created_after, p_created_before,
+        p_activity_since
+    );
+$$;
+
+REVOKE ALL ON FUNCTION public.admin_user_rows(TEXT, TEXT, UUID[], TEXT[], TEXT[], TEXT[], NUMERIC, NUMERIC, TIMESTAMPTZ, TIMESTAMPTZ, TIMESTAMPTZ) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.admin_list_users(TEXT, TEXT, UUID[], TEXT[], TEXT[], TEXT[], NUMERIC, NUMERIC, TIMESTAMPTZ, TIMESTAMPTZ, TIMESTAMPTZ, TEXT, TEXT, INTEGER, TEXT, UUID, INTEGER) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.admin_list_users(TEXT, TEXT, UUID[], TEXT[], TEXT[], TEXT[], NUMERIC, NUMERIC, TIMESTAMPTZ, TIMESTAMPTZ, TIMESTAMPTZ, TEXT, TEXT, INTEGER, TEXT, UUID, INTEGER) TO service_role;
+REVOKE ALL ON FUNCTION public.admin_count_users(TEXT, TEXT, UUID[], TEXT[], TEXT[], TEXT[], NUMERIC, NUMERIC, TIMESTAMPTZ, TIMESTAMPTZ, TIMESTAMPTZ) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.admin_count_users(TEXT, TEXT, UUID[], TEXT[], TEXT[], TEXT[], NUMERIC, NUMERIC, TIMESTAMPTZ, TIMESTAMPTZ, TIMESTAMPTZ) TO service_role;
+
+-- Keyset order for each index-backed sort, id breaking ties
+DROP INDEX IF EXISTS public.idx_credit_accounts_balance;
+
+CREATE INDEX IF NOT EXISTS idx_accounts_created_at_id
+    ON basejump.accounts (created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_credit_accounts_balance_account
+    ON public.credit_accounts (balance, account_id);
+
+CREATE INDEX IF NOT EXISTS idx_credit_accounts_tier_account
+    ON public.credit_accounts ((COALESCE(tier, 'free')::TEXT), account_id);
+
+ANALYZE basejump.accounts;
+ANALYZE public.credit_accounts;
+
+COMMIT;
@@ -0,0 +1,100 @@
+BEGIN;
+
+-- Counters that change whenever something a thread access check depends on
+-- changes: a project's visibility, or an account's members. The frontend
+-- edits both directly in Supabase, so the backend cannot invalidate its
+-- cached grants itself. Instead it keys them on thread_access_stamp(), and a
+-- grant cached before a change is simply never looked up again.
+CREATE TABLE IF NOT EXISTS access_versions (
+    scope TEXT NOT NULL CHECK (scope IN ('project', 'account')),
+    id UUID NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, id)
+);
+
+ALTER TABLE access_versions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role manages access versions" ON access_versions
+    FOR ALL USING (auth.role() = 'service_role');
+
+CREATE OR REPLACE FUNCTION bump_access_version(p_scope TEXT, p_id UUID)
+RETURNS VOID
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    INSERT INTO access_versions (scope, id, version)
+    VALUES (p_scope, p_id, 1)
+    ON CONFLICT (scope, id) DO UPDATE SET version = access_versions.version + 1;
+$$;
+
+CREATE OR REPLACE FUNCTION bump_project_access_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    -- Versions outlive deleted projects, so a project restored under the same
+    -- ID does not match grants from before it was deleted
+    IF TG_OP = 'DELETE' THEN
+        PERFORM bump_access_version('project', OLD.project_id);
+    ELSIF OLD.is_public IS DISTINCT FROM NEW.is_public THEN
+        PERFORM bump_access_version('project', NEW.project_id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS bump_project_access_version ON projects;
+CREATE TRIGGER bump_project_access_version
+    AFTER UPDATE OF is_public OR DELETE ON projects
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_project_access_version();
+
+CREATE OR REPLACE FUNCTION bump_account_access_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_access_version('account', OLD.account_id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND OLD.account_id IS DISTINCT FROM NEW.account_id) THEN
+        PERFORM bump_access_version('account', NEW.account_id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS bump_account_access_version ON basejump.account_user;
+CREATE TRIGGER bump_account_access_version
+    AFTER INSERT OR UPDATE OR DELETE ON basejump.account_user
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_account_access_version();
+
+-- Everything a thread access decision depends on, as one string: the
+-- thread's project and account, and their versions. NULL if the thread does
+-- not exist. Moving a thread changes the IDs in it, so threads need no
+-- counter of their own.
+CREATE OR REPLACE FUNCTION thread_access_stamp(p_thread_id UUID)
+RETURNS TEXT
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT format('%s:%s:%s:%s', t.project_id, COALESCE(pv.version, 0), t.account_id, COALESCE(av.version, 0))
+    FROM threads t
+    LEFT JOIN access_versions pv ON pv.scope = 'project' AND pv.id = t.project_id
+    LEFT JOIN access_versions av ON av.scope = 'account' AND av.id = t.account_id
+    WHERE t.thread_id = p_thread_id;
+$$;
+
+REVOKE ALL ON FUNCTION bump_access_version(TEXT, UUID) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION thread_access_stamp(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION thread_access_stamp(UUID) TO service_role;
+
+COMMIT;
@@ -314,7 +314,8 @@ export function ToolCallSidePanel({
       'browser-navigate-to',
       'browser-act', 
       'browser-extract-content',
-      'browser-screenshot'
+      'browser-screenshot',
+      'browser-run-actions'
     ].includes(lowerName);
   }, []);
 
@@ -48,6 +48,7 @@ export function getToolTitle(toolName: string): string {
     'browser-act': 'Browser Action',
     'browser-extract-content': 'Browser Extract',
     'browser-screenshot': 'Browser Screenshot',
+    'browser-run-actions': 'Browser Actions',
     'load-image': 'Load Image',
     'ask': 'Ask',
     'complete': 'Task Complete',
@@ -1260,6 +1261,7 @@ export function getToolComponent(toolName: string): string {
     case 'browser_act':
     case 'browser_extract_content':
     case 'browser_screenshot':
+    case 'browser_run_actions':
       return 'BrowserToolView';
 
     // Command execution
@@ -63,6 +63,7 @@ const defaultRegistry: ToolViewRegistryType = {
   'browser-act': BrowserToolView,
   'browser-extract-content': BrowserToolView,
   'browser-screenshot': BrowserToolView,
+  'browser-run-actions': BrowserToolView,
 
   'execute-command': CommandToolView,
   'check-command-output': CheckCommandOutputToolView,
@@ -117,6 +118,7 @@ const defaultRegistry: ToolViewRegistryType = {
   
   // New per-slide presentation tools
   'create-slide': PresentationViewer,
+  'create-slides': PresentationViewer,
   'list-slides': PresentationViewer,
   'list-presentations': ListPresentationsToolView,
   'delete-slide': DeleteSlideToolView,
@@ -224,6 +226,7 @@ export function ToolView({ name = 'default', assistantContent, toolContent, ...p
   // define presentation-related tools that shouldn't be transformed
   const presentationTools = [
     'create-slide',
+    'create-slides',
     'list-slides',
     'delete-slide',
     'delete-presentation',
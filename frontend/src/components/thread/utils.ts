@@ -87,6 +87,7 @@ export const getToolIcon = (toolName: string): ElementType => {
     case 'browser-act':
     case 'browser-extract-content':
     case 'browser-screenshot':
+    case 'browser-run-actions':
       return Globe;
 
     // File operations
@@ -324,6 +325,7 @@ const TOOL_DISPLAY_NAMES = new Map([
   ['browser_act', 'Performing Action'],
   ['browser_extract_content', 'Extracting Content'],
   ['browser_screenshot', 'Taking Screenshot'],
+  ['browser_run_actions', 'Running Browser Actions'],
 
   ['execute-data-provider-call', 'Calling data provider'],
   ['execute_data-provider_call', 'Calling data provider'],
@@ -383,6 +385,7 @@ const TOOL_DISPLAY_NAMES = new Map([
   ['browser_act', 'Performing Action'],
   ['browser_extract_content', 'Extracting Content'],
   ['browser_screenshot', 'Taking Screenshot'],
+  ['browser_run_actions', 'Running Browser Actions'],
 
   ['execute_data_provider_call', 'Calling data provider'],
   ['get_data_provider_endpoints', 'Getting endpoints'],
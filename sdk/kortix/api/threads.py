@@ -1,5 +1,5 @@
 from dataclasses import dataclass, asdict
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncGenerator
 import httpx
 from datetime import datetime
 
@@ -132,6 +132,8 @@ class PaginationInfo:
     limit: int
     total: int
     pages: int
+    has_more: bool = False
+    next_cursor: Optional[str] = None
 
 
 @dataclass
@@ -140,9 +142,21 @@ class ThreadsResponse:
     pagination: PaginationInfo
 
 
+@dataclass
+class MessagesPagination:
+    limit: int
+    has_more: bool
+    before_cursor: Optional[str] = None
+    after_cursor: Optional[str] = None
+    next_since: Optional[str] = None
+
+
 @dataclass
 class MessagesResponse:
     messages: List[Message]
+    pagination: Optional[MessagesPagination] = None
+    etag: Optional[str] = None
+    not_modified: bool = False
 
 
 @dataclass
@@ -323,12 +337,14 @@ class ThreadsClient:
         self,
         page: int = 1,
         limit: int = 1000,
+        cursor: Optional[str] = None,
     ) -> ThreadsResponse:
-        """Get all threads for the current user with associated project data.
+        """Get threads for the current user with associated project data.
 
         Args:
-            page: Page number (1-based)
+            page: Page number (1-based), ignored when ``cursor`` is given
             limit: Number of items per page (max 1000)
+            cursor: Cursor from a previous response's ``pagination.next_cursor``
 
         Returns:
             ThreadsResponse containing paginated threads
@@ -337,6 +353,8 @@ class ThreadsClient:
             "page": page,
             "limit": limit,
         }
+        if cursor:
+            params["cursor"] = cursor
 
         response = await self.client.get("/threads", params=params)
         data = self._handle_response(response)
@@ -369,6 +387,27 @@ class ThreadsClient:
 
         return ThreadsResponse(threads=threads, pagination=pagination)
 
+    async def iter_threads(self, limit: int = 100) -> AsyncGenerator[Thread, None]:
+        """Iterate over all threads for the current user, newest first.
+
+        Pages are fetched lazily with keyset cursors, so each request costs the
+        same regardless of how far into the history the iteration is.
+
+        Args:
+            limit: Number of threads fetched per request (max 1000)
+
+        Yields:
+            Thread objects
+        """
+        cursor = None
+        while True:
+            page = await self.get_threads(limit=limit, cursor=cursor)
+            for thread in page.threads:
+                yield thread
+            cursor = page.pagination.next_cursor
+            if not page.pagination.has_more or not cursor:
+                break
+
     async def get_thread(self, thread_id: str) -> Thread:
         """Get a specific thread by ID with complete related data.
 
@@ -400,25 +439,77 @@ class ThreadsClient:
         )
 
     async def get_thread_messages(
-        self, thread_id: str, order: str = "desc"
+        self,
+        thread_id: str,
+        order: str = "desc",
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        since: Optional[str] = None,
+        types: Optional[List[str]] = None,
+        exclude_types: Optional[List[str]] = None,
+        llm_only: bool = False,
+        etag: Optional[str] = None,
     ) -> MessagesResponse:
-        """Get ALL messages for a thread.
+        """Get messages for a thread.
+
+        Without ``limit`` or cursors every message is returned. With them a
+        single page is returned together with cursors for the neighbouring
+        pages.
 
         Args:
             thread_id: The thread ID
             order: Order by created_at: 'asc' or 'desc'
+            limit: Page size (max 1000)
+            before: Cursor from ``pagination.before_cursor`` to load older messages
+            after: Cursor from ``pagination.after_cursor`` to load newer messages
+            since: ISO timestamp, or ``pagination.next_since`` from the previous poll, to
+                fetch new or edited messages. Deleted messages are not reported; a
+                changed ETag with no new messages means the thread should be reloaded
+            types: Only include these message types
+            exclude_types: Exclude these message types (e.g. ``["status"]``)
+            llm_only: Only include messages that are part of the LLM context
+            etag: ETag from a previous response; if the thread is unchanged the
+                server answers 304 and ``not_modified`` is set with no messages
 
         Returns:
-            MessagesResponse containing all messages
+            MessagesResponse containing the requested messages
         """
-        params = {"order": order}
+        params: Dict[str, Any] = {"order": order}
+        if limit is not None:
+            params["limit"] = limit
+        if before:
+            params["before"] = before
+        if after:
+            params["after"] = after
+        if since:
+            params["since"] = since
+        if types:
+            params["types"] = ",".join(types)
+        if exclude_types:
+            params["exclude_types"] = ",".join(exclude_types)
+        if llm_only:
+            params["llm_only"] = "true"
+
+        headers = {"If-None-Match": etag} if etag else None
         response = await self.client.get(
-            f"/threads/{thread_id}/messages", params=params
+            f"/threads/{thread_id}/messages", params=params, headers=headers
         )
+        if response.status_code == 304:
+            return MessagesResponse(
+                messages=[], etag=response.headers.get("etag", etag), not_modified=True
+            )
         data = self._handle_response(response)
 
         messages = [from_dict(Message, msg_data) for msg_data in data["messages"]]
-        return MessagesResponse(messages=messages)
+        pagination = None
+        if data.get("pagination"):
+            pagination = from_dict(MessagesPagination, data["pagination"])
+        return MessagesResponse(
+            messages=messages,
+            pagination=pagination,
+            etag=response.headers.get("etag"),
+        )
 
     async def add_message_to_thread(self, thread_id: str, message: str) -> Message:
         """Add a simple message to a thread.